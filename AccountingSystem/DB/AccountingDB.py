@@ -64,6 +64,11 @@ class AccountingDB( DB ):
                                "Accounting",
                                "seconds",
                                gMonitor.OP_MEAN )
+    gMonitor.registerActivity( "insertionrate",
+                               "Records insertion rate",
+                               "Accounting",
+                               "records/s",
+                               gMonitor.OP_MEAN )
 
     self.__compactTime = datetime.time( hour = 2,
                                         minute = random.randint( 0, 59 ),
@@ -524,15 +529,18 @@ class AccountingDB( DB ):
     if not retVal[ 'OK' ]:
       return retVal
     connection = retVal[ 'Value' ]
-    self.log.info( "Value %s for key %s didn't exist, inserting" % ( keyValue, keyName ) )
-    retVal = self.insertFields( keyTable, [ 'id', 'value' ], [ 0, keyValue ], connection )
-    if not retVal[ 'OK' ] and retVal[ 'Message' ].find( "Duplicate key" ) == -1:
-      return retVal
-    result = self.__getIdForKeyValue( typeName, keyName, keyValue, connection )
-    if not result[ 'OK' ]:
+    try:
+      self.log.info( "Value %s for key %s didn't exist, inserting" % ( keyValue, keyName ) )
+      retVal = self.insertFields( keyTable, [ 'id', 'value' ], [ 0, keyValue ], connection )
+      if not retVal[ 'OK' ] and retVal[ 'Message' ].find( "Duplicate key" ) == -1:
+        return retVal
+      result = self.__getIdForKeyValue( typeName, keyName, keyValue, connection )
+      if not result[ 'OK' ]:
+        return result
+      keyCache[ keyValue ] = result[ 'Value' ]
       return result
-    keyCache[ keyValue ] = result[ 'Value' ]
-    return result
+    finally:
+      self._releaseConnection()
 
   def calculateBucketLengthForTime( self, typeName, now, when ):
     """
@@ -624,18 +632,129 @@ class AccountingDB( DB ):
     Do the real insert and delete from the in buffer table
     """
     self.log.verbose( "Received bundle to process", "of %s elements" % len( recordTuples ) )
+    recordsByType = {}
     for record in recordTuples:
-      iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
-      result = self.insertRecordDirectly( typeName, startTime, endTime, valuesList )
-      if not result[ 'OK' ]:
-        self._update( "UPDATE `%s` SET taken=0 WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
-        self.log.error( "Can't insert row", result[ 'Message' ] )
+      recordsByType.setdefault( record[1], [] ).append( record )
+    for typeName, typeRecords in recordsByType.items():
+      inTableName = _getTableName( "in", typeName )
+      result = self.insertRecordBundleDirectly( typeName,
+                                                [ ( startTime, endTime, valuesList )
+                                                  for _iD, _typeName, startTime, endTime, valuesList, _epoch in typeRecords ] )
+      if result[ 'OK' ]:
+        result = self._update( "DELETE FROM `%s` WHERE id in (%s)" % ( inTableName,
+                                                                     ", ".join( str( record[0] ) for record in typeRecords ) ) )
+        if not result[ 'OK' ]:
+          self.log.error( "Can't delete rows from the IN table", result[ 'Message' ] )
+        now = Time.toEpoch()
+        for record in typeRecords:
+          gMonitor.addMark( "insertiontime", now - record[-1] )
         continue
-      result = self._update( "DELETE FROM `%s` WHERE id=%s" % ( _getTableName( "in", typeName ), iD ) )
-      if not result[ 'OK' ]:
-        self.log.error( "Can't delete row from the IN table", result[ 'Message' ] )
-      gMonitor.addMark( "insertiontime", Time.toEpoch() - insertionEpoch )
+      #Fall back to one record at a time so that a faulty record does not block the whole bundle
+      self.log.warn( "Can't insert bundle, inserting records one by one", result[ 'Message' ] )
+      for record in typeRecords:
+        iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
+        result = self.insertRecordDirectly( typeName, startTime, endTime, valuesList )
+        if not result[ 'OK' ]:
+          self._update( "UPDATE `%s` SET taken=0 WHERE id=%s" % ( inTableName, iD ) )
+          self.log.error( "Can't insert row", result[ 'Message' ] )
+          continue
+        result = self._update( "DELETE FROM `%s` WHERE id=%s" % ( inTableName, iD ) )
+        if not result[ 'OK' ]:
+          self.log.error( "Can't delete row from the IN table", result[ 'Message' ] )
+        gMonitor.addMark( "insertiontime", Time.toEpoch() - insertionEpoch )
+
+  def insertRecordBundleDirectly( self, typeName, recordsList ):
+    """
+    Add a bundle of entries of the same type to the type contents. The key ids are resolved
+    through the keys cache, the contributions of all the records to each bucket are added up
+    in memory and the buckets are written with a single multi-row upsert, the raw records
+    and the buckets being inserted in one transaction
+
+    :param str typeName: type of the records
+    :param list recordsList: list of ( startTime, endTime, valuesList ) tuples
+    """
+    if self.__readOnly:
+      return S_ERROR( "ReadOnly mode enabled. No modification allowed" )
+    if not typeName in self.dbCatalog:
+      return S_ERROR( "Type %s has not been defined in the db" % typeName )
+    if not recordsList:
+      return S_OK()
+    startEpoch = time.time()
+    keyFields = self.dbCatalog[ typeName ][ 'keys' ]
+    numKeys = len( keyFields )
+    numFields = numKeys + len( self.dbCatalog[ typeName ][ 'values' ] )
+    nowEpoch = int( Time.toEpoch( Time.dateTime() ) )
+    typeRows = []
+    #( startTime, bucketLength, keyIds ) -> [ entriesInBucket, value1, value2, ... ]
+    bucketsData = {}
+    for startTime, endTime, valuesList in recordsList:
+      if len( valuesList ) != numFields:
+        return S_ERROR( "Fields mismatch for record %s. %s fields and %s expected" % ( typeName,
+                                                                                       len( valuesList ),
+                                                                                       numFields ) )
+      keyIds = []
+      for keyPos in range( numKeys ):
+        retVal = self.__addKeyValue( typeName, keyFields[ keyPos ], valuesList[ keyPos ] )
+        if not retVal[ 'OK' ]:
+          return retVal
+        keyIds.append( retVal[ 'Value' ] )
+      typeRows.append( keyIds + list( valuesList[ numKeys: ] ) + [ startTime, endTime ] )
+      keyIds = tuple( keyIds )
+      values = [ 1 ] + [ float( value ) for value in valuesList[ numKeys: ] ]
+      for bStartTime, bProportion, bLength in self.calculateBuckets( typeName, startTime, endTime, nowEpoch ):
+        bucketKey = ( bStartTime, bLength, keyIds )
+        bucketValues = bucketsData.get( bucketKey )
+        if bucketValues is None:
+          bucketValues = [ 0.0 ] * len( values )
+          bucketsData[ bucketKey ] = bucketValues
+        for valPos in range( len( values ) ):
+          bucketValues[ valPos ] += values[ valPos ] * bProportion
+
+    valuesGroups = []
+    for typeRow in typeRows:
+      retVal = self._escapeValues( typeRow )
+      if not retVal[ 'OK' ]:
+        return retVal
+      valuesGroups.append( "( %s )" % ", ".join( retVal[ 'Value' ] ) )
+    typeCmd = "INSERT INTO `%s` ( %s ) VALUES %s" % ( _getTableName( "type", typeName ),
+                                                      ", ".join( "`%s`" % field for field in self.dbCatalog[ typeName ][ 'typeFields' ] ),
+                                                      ", ".join( valuesGroups ) )
+    bucketsGroups = []
+    for ( bStartTime, bLength, keyIds ), bucketValues in bucketsData.iteritems():
+      sqlValues = [ bStartTime, bLength, repr( bucketValues[0] ) ] + list( keyIds ) + \
+                  [ repr( value ) for value in bucketValues[1:] ]
+      bucketsGroups.append( "( %s )" % ",".join( str( val ) for val in sqlValues ) )
 
+    retVal = self._getConnection()
+    if not retVal[ 'OK' ]:
+      return retVal
+    connObj = retVal[ 'Value' ]
+    try:
+      retVal = self.__startTransaction( connObj )
+      if not retVal[ 'OK' ]:
+        return retVal
+      retVal = self._update( typeCmd, conn = connObj )
+      if retVal[ 'OK' ]:
+        retVal = self.__upsertBuckets( typeName, bucketsGroups, connObj = connObj )
+      if not retVal[ 'OK' ]:
+        self.__rollbackTransaction( connObj )
+        return retVal
+      retVal = self.__commitTransaction( connObj )
+      if not retVal[ 'OK' ]:
+        self.__rollbackTransaction( connObj )
+        return retVal
+    finally:
+      self._releaseConnection()
+
+    elapsed = time.time() - startEpoch
+    self.log.verbose( "Inserted bundle", "of %s records for type %s in %s buckets in %.3f seconds" % ( len( recordsList ),
+                                                                                                      typeName,
+                                                                                                      len( bucketsGroups ),
+                                                                                                      elapsed ) )
+    gMonitor.addMark( "registeradded", len( recordsList ) )
+    gMonitor.addMark( "registeradded:%s" % typeName, len( recordsList ) )
+    gMonitor.addMark( "insertionrate", len( recordsList ) / max( elapsed, 0.001 ) )
+    return S_OK( len( recordsList ) )
 
   def insertRecordDirectly( self, typeName, startTime, endTime, valuesList ):
     """
@@ -684,7 +803,7 @@ class AccountingDB( DB ):
         return retVal
       return self.__commitTransaction( connObj )
     finally:
-      connObj.close()
+      self._releaseConnection()
 
   def deleteRecord( self, typeName, startTime, endTime, valuesList ):
     """
@@ -730,28 +849,33 @@ class AccountingDB( DB ):
     if not retVal[ 'OK' ]:
       return retVal
     connObj = retVal[ 'Value' ]
-    retVal = self.__startTransaction( connObj )
-    if not retVal[ 'OK' ]:
-      return retVal
-    retVal = self._update( "DELETE FROM `%s` WHERE %s" % ( mainTable, " AND ".join( sqlCond ) ),
-                           conn = connObj )
-    if not retVal[ 'OK' ]:
-      return retVal
-    numInsertions = retVal[ 'Value' ]
-    #Deleted from type, now the buckets
-    #HACK: One more record to split in the buckets to be able to count total entries
-    if numInsertions == 0:
-      return S_OK( 0 )
-    sqlValues.append( 1 )
-    retVal = self.__deleteFromBuckets( typeName, startTime, endTime, sqlValues, numInsertions, connObj = connObj )
-    if not retVal[ 'OK' ]:
-      self.__rollbackTransaction( connObj )
-      return retVal
-    retVal = self.__commitTransaction( connObj )
-    if not retVal[ 'OK' ]:
-      self.__rollbackTransaction( connObj )
-      return retVal
-    return S_OK( numInsertions )
+    try:
+      retVal = self.__startTransaction( connObj )
+      if not retVal[ 'OK' ]:
+        return retVal
+      retVal = self._update( "DELETE FROM `%s` WHERE %s" % ( mainTable, " AND ".join( sqlCond ) ),
+                             conn = connObj )
+      if not retVal[ 'OK' ]:
+        self.__rollbackTransaction( connObj )
+        return retVal
+      numInsertions = retVal[ 'Value' ]
+      #Deleted from type, now the buckets
+      #HACK: One more record to split in the buckets to be able to count total entries
+      if numInsertions == 0:
+        self.__rollbackTransaction( connObj )
+        return S_OK( 0 )
+      sqlValues.append( 1 )
+      retVal = self.__deleteFromBuckets( typeName, startTime, endTime, sqlValues, numInsertions, connObj = connObj )
+      if not retVal[ 'OK' ]:
+        self.__rollbackTransaction( connObj )
+        return retVal
+      retVal = self.__commitTransaction( connObj )
+      if not retVal[ 'OK' ]:
+        self.__rollbackTransaction( connObj )
+        return retVal
+      return S_OK( numInsertions )
+    finally:
+      self._releaseConnection()
 
   def __splitInBuckets( self, typeName, startTime, endTime, valuesList, connObj = False ):
     """
@@ -866,16 +990,6 @@ class AccountingDB( DB ):
   def __writeBuckets( self, typeName, buckets, keyValues, valuesList, connObj = False ):
     """ Insert or update a bucket
     """
-#     tableName = _getTableName( "bucket", typeName )
-    #INSERT PART OF THE QUERY
-    sqlFields = [ '`startTime`', '`bucketLength`', '`entriesInBucket`' ]
-    for keyPos in range( len( self.dbCatalog[ typeName ][ 'keys' ] ) ):
-      sqlFields.append( "`%s`" % self.dbCatalog[ typeName ][ 'keys' ][ keyPos ] )
-    sqlUpData = [ "`entriesInBucket`=`entriesInBucket`+VALUES(`entriesInBucket`)" ]
-    for valPos in range( len( self.dbCatalog[ typeName ][ 'values' ] ) ):
-      valueField = "`%s`" % self.dbCatalog[ typeName ][ 'values' ][ valPos ]
-      sqlFields.append( valueField )
-      sqlUpData.append( "%s=%s+VALUES(%s)" % ( valueField, valueField, valueField ) )
     valuesGroups = []
     for bucketInfo in buckets:
       bStartTime = bucketInfo[0]
@@ -888,6 +1002,23 @@ class AccountingDB( DB ):
 #         value = valuesList[ valPos ]
         sqlValues.append( "(%s*%s)" % ( valuesList[ valPos ], bProportion ) )
       valuesGroups.append( "( %s )" % ",".join( str( val ) for val in sqlValues ) )
+    return self.__upsertBuckets( typeName, valuesGroups, connObj = connObj )
+
+  def __upsertBuckets( self, typeName, valuesGroups, connObj = False ):
+    """ Add the contributions to the buckets, creating the ones that do not exist yet
+
+    :param list valuesGroups: SQL rows with the startTime, bucketLength, entriesInBucket,
+                              the key ids and the values of each bucket
+    """
+    #INSERT PART OF THE QUERY
+    sqlFields = [ '`startTime`', '`bucketLength`', '`entriesInBucket`' ]
+    for keyPos in range( len( self.dbCatalog[ typeName ][ 'keys' ] ) ):
+      sqlFields.append( "`%s`" % self.dbCatalog[ typeName ][ 'keys' ][ keyPos ] )
+    sqlUpData = [ "`entriesInBucket`=`entriesInBucket`+VALUES(`entriesInBucket`)" ]
+    for valPos in range( len( self.dbCatalog[ typeName ][ 'values' ] ) ):
+      valueField = "`%s`" % self.dbCatalog[ typeName ][ 'values' ][ valPos ]
+      sqlFields.append( valueField )
+      sqlUpData.append( "%s=%s+VALUES(%s)" % ( valueField, valueField, valueField ) )
 
     cmd = "INSERT INTO `%s` ( %s ) " % ( _getTableName( "bucket", typeName ), ", ".join( sqlFields ) )
     cmd += "VALUES %s " % ", ".join( valuesGroups)
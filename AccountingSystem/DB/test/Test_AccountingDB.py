@@ -390,6 +390,68 @@ ORDER BY startTime" % (expectedStartTime, expectedEndTime)
     self.assertTrue(retVal)
     self.assertEqual(retVal, expectedQuery)
 
+
+class InsertBundle(TestCase):
+  """ testing the insertion of a bundle of records
+  """
+
+  def setUp(self):
+    super(InsertBundle, self).setUp()
+    self.module = self.testClass()
+    self.module.dbCatalog = {'aType': {'keys': ['User', 'Site'],
+                                       'values': ['CPUTime', 'Jobs'],
+                                       'typeFields': ['User', 'Site', 'CPUTime', 'Jobs', 'startTime', 'endTime']}}
+    self.module.dbBucketsLength['aType'] = [(86400 * 365 * 100, 3600)]
+    self.keyIds = {}
+    self.updates = []
+    self.module._getConnection = MagicMock(return_value={'OK': True, 'Value': 'aConnection'})
+    self.module._releaseConnection = MagicMock()
+    self.module._escapeString = lambda value: {'OK': True, 'Value': "'%s'" % value}
+    self.module._escapeValues = lambda values: {'OK': True, 'Value': [str(value) for value in values]}
+    self.module._query = MagicMock(side_effect=self.query)
+    self.module._update = MagicMock(side_effect=self.update)
+
+  def query(self, cmd, conn=None):  # pylint: disable=unused-argument
+    if cmd.startswith('SELECT `id`'):
+      return {'OK': True, 'Value': ((self.keyIds.setdefault(cmd, len(self.keyIds) + 1),),)}
+    return {'OK': True, 'Value': ()}
+
+  def update(self, cmd, conn=None):  # pylint: disable=unused-argument
+    self.updates.append(cmd)
+    return {'OK': True, 'Value': 1}
+
+  def test_insertRecordBundleDirectly(self):
+    """ Records sharing keys and buckets are added up before being written
+    """
+    startTime = 1500000000 - 1500000000 % 3600
+    records = [(startTime, startTime + 10, ['user1', 'site1', 10, 1]),
+               (startTime + 20, startTime + 30, ['user1', 'site1', 20, 1]),
+               (startTime, startTime, ['user2', 'site1', 5, 1]),
+               (startTime + 1800, startTime + 5400, ['user1', 'site1', 100, 1])]
+    retVal = self.module.insertRecordBundleDirectly('aType', records)
+    self.assertTrue(retVal['OK'])
+    self.assertEqual(retVal['Value'], 4)
+
+    # Three distinct key values, each looked up once
+    self.assertEqual(len(self.keyIds), 3)
+    self.assertEqual(len(self.updates), 2)
+    typeCmd, bucketCmd = self.updates
+    self.assertEqual(typeCmd.count('), ('), 3)
+    self.assertEqual(bucketCmd.count('), ('), 2)
+    self.assertTrue("( %s,3600,2.5,1,2,80.0,2.5 )" % startTime in bucketCmd)
+    self.assertTrue("( %s,3600,1.0,3,2,5.0,1.0 )" % startTime in bucketCmd)
+    self.assertTrue("( %s,3600,0.5,1,2,50.0,0.5 )" % (startTime + 3600) in bucketCmd)
+    self.assertEqual(self.module._query.call_args_list[-1][0][0], 'COMMIT')
+    # The connection of the transaction is given back once it is over
+    self.assertEqual(self.module._releaseConnection.call_count, self.module._getConnection.call_count)
+
+  def test_insertRecordBundleDirectlyMismatch(self):
+    """ A record with the wrong number of fields makes the whole bundle fail
+    """
+    retVal = self.module.insertRecordBundleDirectly('aType', [(0, 10, ['user1', 'site1', 10])])
+    self.assertFalse(retVal['OK'])
+    self.assertFalse(self.updates)
+
 #############################################################################
 # Test Suite run
 #############################################################################
@@ -398,4 +460,5 @@ ORDER BY startTime" % (expectedStartTime, expectedEndTime)
 if __name__ == '__main__':
   suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestCase)
   suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(MakeQuery))
+  suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(InsertBundle))
   testResult = unittest.TextTestRunner(verbosity=2).run(suite)
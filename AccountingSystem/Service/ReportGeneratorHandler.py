@@ -55,7 +55,8 @@ class ReportGeneratorHandler( RequestHandler ):
     except IOError:
       gLogger.fatal( "Can't write to %s" % dataPath )
       return S_ERROR( "Data location is not writable" )
-    gDataCache.setGraphsLocation( dataPath )
+    cacheSize = gConfig.getValue( "%s/PlotCacheSize" % reportSection, 1024 )
+    gDataCache.setGraphsLocation( dataPath, maxSize = cacheSize * 1048576 )
     gMonitor.registerActivity( "plotsDrawn", "Drawn plot images", "Accounting reports", "plots", gMonitor.OP_SUM )
     gMonitor.registerActivity( "reportsRequested", "Generated reports", "Accounting reports", "reports", gMonitor.OP_SUM )
     return S_OK()
@@ -139,6 +140,13 @@ class ReportGeneratorHandler( RequestHandler ):
     reportRequest[ 'generatePlot' ] = False
     return reporter.generate( reportRequest, self.getRemoteCredentials() )
 
+  types_getPlotCacheStats = []
+  def export_getPlotCacheStats( self ):
+    """
+    Get the hits, misses and generation time of the plots cache
+    """
+    return S_OK( gDataCache.getPlotStats() )
+
   types_listReports = [ types.StringTypes ]
   def export_listReports( self, typeName ):
     """
@@ -1,6 +1,8 @@
 """ Class that collects utilities used in Accounting and Monitoring systems
 """
 
+import numpy
+
 from DIRAC.Core.Utilities import Time
 
 class DBUtils(object):
@@ -75,51 +77,74 @@ class DBUtils(object):
     nowEpoch = Time.toEpoch()
     return self._acDB.calculateBucketLengthForTime( self._setup, typeName, nowEpoch, momentEpoch )
 
-  def _spanToGranularity( self, granularity, bucketsData ):
+  def _rebinToGranularity( self, granularity, bucketsData, groupIndexes = None ):
     """
+    Split the buckets in bins of the given granularity, each bucket contributing to
+    a bin proportionally to the time they share, and sum the contributions per bin.
+    The buckets are loaded in arrays and the splitting and the sums are done at once
+    on all of them.
     bucketsData must be a list of lists where each list contains
       - field 0: datetime
       - field 1: bucketLength
       - fields 2-n: numericalFields
+    groupIndexes is the group (0 to n) each bucket belongs to, the bins of different
+    groups are kept apart. All the buckets belong to group 0 if not given.
+    Returns the arrays of group indexes and epochs of the bins, sorted by group and
+    epoch, and an array with one row per bin holding the sum of the numerical fields
+    followed by the sum of the proportions
     """
-    normData = {}
+    if not bucketsData:
+      return numpy.zeros( 0, dtype = numpy.int64 ), numpy.zeros( 0, dtype = numpy.int64 ), numpy.zeros( ( 0, 1 ) )
+    #None values become NaN and count as 0
+    bucketsArray = numpy.array( bucketsData, dtype = float ).reshape( len( bucketsData ), -1 )
+    startEpochs = bucketsArray[ :, 0 ].astype( numpy.int64 )
+    bucketLengths = bucketsArray[ :, 1 ].astype( numpy.int64 )
+    values = bucketsArray[ :, 2: ]
+    values[ numpy.isnan( values ) ] = 0
+    if groupIndexes is None:
+      groupIndexes = numpy.zeros( len( bucketsData ), dtype = numpy.int64 )
+    else:
+      groupIndexes = numpy.asarray( groupIndexes, dtype = numpy.int64 )
+
+    #Buckets already at the right granularity are kept as they are, the others
+    #are split in as many bins as they overlap
+    toSplit = ( bucketLengths != granularity ) & ( bucketLengths != 0 )
+    firstBins = numpy.where( bucketLengths == granularity, startEpochs, startEpochs - startEpochs % granularity )
+    endEpochs = startEpochs + bucketLengths
+    numBins = numpy.ones( len( bucketsData ), dtype = numpy.int64 )
+    numBins[ toSplit ] = ( endEpochs[ toSplit ] - firstBins[ toSplit ] + granularity - 1 ) // granularity
+
+    bucketIndexes = numpy.repeat( numpy.arange( len( bucketsData ) ), numBins )
+    binOffsets = numpy.arange( len( bucketIndexes ) ) - numpy.repeat( numpy.cumsum( numBins ) - numBins, numBins )
+    binEpochs = firstBins[ bucketIndexes ] + binOffsets * granularity
+    proportions = numpy.ones( len( bucketIndexes ) )
+    splitBins = toSplit[ bucketIndexes ]
+    splitIndexes = bucketIndexes[ splitBins ]
+    overlaps = numpy.minimum( binEpochs[ splitBins ] + granularity, endEpochs[ splitIndexes ] ) - \
+               numpy.maximum( binEpochs[ splitBins ], startEpochs[ splitIndexes ] )
+    proportions[ splitBins ] = overlaps.astype( float ) / bucketLengths[ splitIndexes ]
+
+    #One id per ( group, epoch ) to sum all the contributions to a bin at once
+    minEpoch = binEpochs.min()
+    epochSpan = binEpochs.max() - minEpoch + 1
+    binIds, binIndexes = numpy.unique( groupIndexes[ bucketIndexes ] * epochSpan + ( binEpochs - minEpoch ),
+                                       return_inverse = True )
+    sums = numpy.empty( ( len( binIds ), values.shape[1] + 1 ) )
+    for iP in range( values.shape[1] ):
+      sums[ :, iP ] = numpy.bincount( binIndexes, weights = values[ bucketIndexes, iP ] * proportions,
+                                      minlength = len( binIds ) )
+    sums[ :, -1 ] = numpy.bincount( binIndexes, weights = proportions, minlength = len( binIds ) )
+    return binIds // epochSpan, binIds % epochSpan + minEpoch, sums
 
-    def addToNormData( bucketDate, data, proportion = 1.0 ):
-      if bucketDate in normData:
-        for iP in range( len( data ) ):
-          val = data[ iP ]
-          if val == None:
-            val = 0
-          normData[ bucketDate ][iP] += float( val ) * proportion
-        normData[ bucketDate ][ -1 ] += proportion
-      else:
-        normData[ bucketDate ] = []
-        for fD in data:
-          if fD == None:
-            fD = 0
-          normData[ bucketDate ].append( float( fD ) * proportion )
-        normData[ bucketDate ].append( proportion )
-
-    for bucketData in bucketsData:
-      bucketDate = bucketData[0]
-      originalBucketLength = bucketData[1]
-      bucketValues = bucketData[2:]
-      if originalBucketLength == granularity:
-        addToNormData( bucketDate, bucketValues )
-      else:
-        startEpoch = bucketDate
-        endEpoch = bucketDate + originalBucketLength
-        newBucketEpoch = startEpoch - startEpoch % granularity
-        if startEpoch == endEpoch:
-          addToNormData( newBucketEpoch, bucketValues )
-        else:
-          while newBucketEpoch < endEpoch:
-            start = max( newBucketEpoch, startEpoch )
-            end = min( newBucketEpoch + granularity, endEpoch )
-            proportion = float( end - start ) / originalBucketLength
-            addToNormData( newBucketEpoch, bucketValues, proportion )
-            newBucketEpoch += granularity
-    return normData
+  def _spanToGranularity( self, granularity, bucketsData ):
+    """
+    bucketsData must be a list of lists where each list contains
+      - field 0: datetime
+      - field 1: bucketLength
+      - fields 2-n: numericalFields
+    """
+    _groups, binEpochs, sums = self._rebinToGranularity( granularity, bucketsData )
+    return dict( zip( binEpochs.tolist(), sums.tolist() ) )
 
   def _sumToGranularity( self, granularity, bucketsData ):
     """
@@ -128,10 +153,8 @@ class DBUtils(object):
       - field 1: bucketLength
       - fields 2-n: numericalFields
     """
-    normData = self._spanToGranularity( granularity, bucketsData )
-    for bDate in normData:
-      del( normData[ bDate ][-1] )
-    return normData
+    _groups, binEpochs, sums = self._rebinToGranularity( granularity, bucketsData )
+    return dict( zip( binEpochs.tolist(), sums[ :, :-1 ].tolist() ) )
 
   def _averageToGranularity( self, granularity, bucketsData ):
     """
@@ -140,11 +163,31 @@ class DBUtils(object):
       - field 1: bucketLength
       - fields 2-n: numericalFields
     """
-    normData = self._spanToGranularity( granularity, bucketsData )
-    for bDate in normData:
-      for iP in range( len( normData[ bDate ] ) ):
-        normData[ bDate ][iP] = float( normData[ bDate ][iP] ) / normData[ bDate ][-1]
-      del( normData[ bDate ][-1] )
+    _groups, binEpochs, sums = self._rebinToGranularity( granularity, bucketsData )
+    return dict( zip( binEpochs.tolist(), ( sums[ :, :-1 ] / sums[ :, -1: ] ).tolist() ) )
+
+  def _groupsToGranularity( self, granularity, dataDict, average = False ):
+    """
+    Same as _sumToGranularity, or _averageToGranularity if average is set, for all the keys at once
+      - dataDict = { 'key' : bucketsData, 'key2'.. } as returned by _groupByField
+    """
+    keyList = list( dataDict )
+    bucketsData = []
+    groupIndexes = []
+    for keyIndex, key in enumerate( keyList ):
+      bucketsData.extend( dataDict[ key ] )
+      groupIndexes.extend( [ keyIndex ] * len( dataDict[ key ] ) )
+    binGroups, binEpochs, sums = self._rebinToGranularity( granularity, bucketsData, groupIndexes )
+    if average:
+      binValues = ( sums[ :, :-1 ] / sums[ :, -1: ] ).tolist()
+    else:
+      binValues = sums[ :, :-1 ].tolist()
+    binEpochs = binEpochs.tolist()
+    groupLimits = numpy.searchsorted( binGroups, numpy.arange( len( keyList ) + 1 ) ).tolist()
+    normData = {}
+    for keyIndex, key in enumerate( keyList ):
+      firstBin, lastBin = groupLimits[ keyIndex ], groupLimits[ keyIndex + 1 ]
+      normData[ key ] = dict( zip( binEpochs[ firstBin:lastBin ], binValues[ firstBin:lastBin ] ) )
     return normData
 
   def _convertNoneToZero( self, bucketsData ):
@@ -168,11 +211,12 @@ class DBUtils(object):
       - dataDict = { 'key' : { time1 : value,  time2 : value... }, 'key2'.. }
     """
     startBucketEpoch = startEpoch - startEpoch % granularity
+    timeEpochs = numpy.arange( int( startBucketEpoch ), int( endEpoch ), granularity, dtype = numpy.int64 )
     for key in dataDict:
       currentDict = dataDict[ key ]
-      for timeEpoch in range( int( startBucketEpoch ), int( endEpoch ), granularity ):
-        if timeEpoch not in currentDict:
-          currentDict[ timeEpoch ] = 0
+      presentEpochs = numpy.fromiter( currentDict, dtype = numpy.int64, count = len( currentDict ) )
+      missingEpochs = timeEpochs[ ~numpy.in1d( timeEpochs, presentEpochs, assume_unique = True ) ]
+      currentDict.update( dict.fromkeys( missingEpochs.tolist(), 0 ) )
     return dataDict
 
   def _getAccumulationMaxValue( self, dataDict ):
@@ -228,13 +272,19 @@ class DBUtils(object):
       - dataDict = { 'key' : { time1 : value,  time2 : value... }, 'key2'.. }
     """
     startBucketEpoch = startEpoch - startEpoch % granularity
+    timeEpochs = numpy.arange( startBucketEpoch, endEpoch, granularity, dtype = numpy.int64 )
+    timeEpochsList = timeEpochs.tolist()
     for key in dataDict:
       currentDict = dataDict[ key ]
-      lastValue = 0
-      for timeEpoch in range( startBucketEpoch, endEpoch, granularity ):
-        if timeEpoch in currentDict:
-          lastValue += currentDict[ timeEpoch ]
-        currentDict[ timeEpoch ] = lastValue
+      presentEpochs = numpy.fromiter( currentDict, dtype = numpy.int64, count = len( currentDict ) )
+      #Only the values of the bins between startEpoch and endEpoch are accumulated
+      binIndexes = numpy.searchsorted( timeEpochs, presentEpochs )
+      inRange = binIndexes < len( timeEpochs )
+      inRange[ inRange ] = timeEpochs[ binIndexes[ inRange ] ] == presentEpochs[ inRange ]
+      values = numpy.zeros( len( timeEpochs ) )
+      values[ binIndexes[ inRange ] ] = numpy.fromiter( currentDict.itervalues(), dtype = float,
+                                                        count = len( currentDict ) )[ inRange ]
+      currentDict.update( zip( timeEpochsList, numpy.cumsum( values ).tolist() ) )
     return dataDict
 
   def stripDataField( self, dataDict, fieldId ):
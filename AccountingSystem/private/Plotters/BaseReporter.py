@@ -159,14 +159,14 @@ class BaseReporter( DBUtils ):
     dataDict = self._groupByField( 0, retVal[ 'Value' ] )
     coarsestGranularity = self._getBucketLengthForTime( self._typeName, startTime )
     #Transform!
-    for keyField in dataDict:
-      if metadataDict[ self._PARAM_CHECK_FOR_NONE ]:
+    if metadataDict[ self._PARAM_CHECK_FOR_NONE ]:
+      for keyField in dataDict:
         dataDict[ keyField ] = self._convertNoneToZero( dataDict[ keyField ] )
-      if metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] == "average":
-        dataDict[ keyField ] = self._averageToGranularity( coarsestGranularity, dataDict[ keyField ] )
-      if metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] == "sum":
-        dataDict[ keyField ] = self._sumToGranularity( coarsestGranularity, dataDict[ keyField ] )
-      if self._PARAM_CONSOLIDATION_FUNCTION in metadataDict:
+    #All the keys are converted to the granularity at once
+    dataDict = self._groupsToGranularity( coarsestGranularity, dataDict,
+                                          metadataDict[ self._PARAM_CONVERT_TO_GRANULARITY ] == "average" )
+    if self._PARAM_CONSOLIDATION_FUNCTION in metadataDict:
+      for keyField in dataDict:
         dataDict[ keyField ] = self._executeConsolidation( metadataDict[ self._PARAM_CONSOLIDATION_FUNCTION ], dataDict[ keyField ] )
     if metadataDict[ self._PARAM_CALCULATE_PROPORTIONAL_GAUGES ]:
       dataDict = self._calculateProportionalGauges( dataDict )
@@ -0,0 +1,68 @@
+""" Unit tests of the re-binning of the accounting buckets done in DBUtils
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+from decimal import Decimal
+
+import pytest
+
+from DIRAC.AccountingSystem.private.DBUtils import DBUtils
+
+dbUtils = DBUtils(None, 'aSetup')
+
+# Two hourly buckets, a daily one spanning 3 days bins, a 15 minutes one and an empty one
+bucketsData = [[7200, 3600, 10, 1],
+               [10800, 3600, Decimal('20.5'), None],
+               [0, 86400, 24, 2],
+               [9000, 900, 4, 4],
+               [3600, 0, 1, 1]]
+
+
+def test_sumToGranularity():
+  normData = dbUtils._sumToGranularity(3 * 3600, bucketsData)
+  assert sorted(normData) == [0, 3 * 3600, 6 * 3600, 9 * 3600, 12 * 3600, 15 * 3600, 18 * 3600, 21 * 3600]
+  assert normData[0] == pytest.approx([10 + 4 + 3 + 1, 1 + 4 + 0.25 + 1])
+  assert normData[3 * 3600] == pytest.approx([20.5 + 3, 0.25])
+  assert normData[6 * 3600] == pytest.approx([3, 0.25])
+
+
+def test_spanToGranularity():
+  normData = dbUtils._spanToGranularity(3600, bucketsData)
+  # Buckets already at the right granularity are kept, the last value is the sum of the proportions
+  assert normData[7200] == pytest.approx([10 + 1 + 4, 1 + 1 / 12. + 4, 1 + 1 / 24. + 1])
+  assert normData[3600] == pytest.approx([1 + 1, 1 + 1 / 12., 1 + 1 / 24.])
+  assert len(normData) == 24
+
+
+def test_averageToGranularity():
+  normData = dbUtils._averageToGranularity(7200, [[0, 3600, 10, 2], [3600, 3600, 20, 4], [7200, 14400, 8, 8]])
+  assert normData[0] == pytest.approx([15, 3])
+  assert normData[7200] == pytest.approx([8, 8])
+  assert normData[14400] == pytest.approx([8, 8])
+
+
+def test_groupsToGranularity():
+  dataDict = {'Site1': [list(bucket) for bucket in bucketsData],
+              'Site2': [[0, 3600, 1, 1]],
+              'Site3': []}
+  normData = dbUtils._groupsToGranularity(3 * 3600, dataDict)
+  assert normData['Site1'] == dbUtils._sumToGranularity(3 * 3600, bucketsData)
+  assert normData['Site2'] == {0: [1, 1]}
+  assert normData['Site3'] == {}
+  normData = dbUtils._groupsToGranularity(3 * 3600, dataDict, average=True)
+  assert normData['Site2'] == {0: [1, 1]}
+  assert dbUtils._groupsToGranularity(3600, {}) == {}
+
+
+def test_fillAndAccumulate():
+  dataDict = {'Site1': {3600: 1, 10800: 2, 100000: 7}, 'Site2': {}}
+  dataDict = dbUtils._fillWithZero(3600, 1800, 4 * 3600, dataDict)
+  assert dataDict['Site1'] == {0: 0, 3600: 1, 7200: 0, 10800: 2, 100000: 7}
+  assert dataDict['Site2'] == {0: 0, 3600: 0, 7200: 0, 10800: 0}
+  dataDict = dbUtils._accumulate(3600, 1800, 4 * 3600, dataDict)
+  # Values out of the time range are left untouched
+  assert dataDict['Site1'] == {0: 0, 3600: 1, 7200: 1, 10800: 3, 100000: 7}
+  assert dataDict['Site2'] == {0: 0, 3600: 0, 7200: 0, 10800: 0}
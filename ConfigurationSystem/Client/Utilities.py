@@ -561,6 +561,17 @@ def getDBParameters(fullname):
   dbName = result['Value']
   parameters['DBName'] = dbName
 
+  # Optional maximum number of connections shared by the threads
+  result = gConfig.getOption(cs_path + '/MaxQueueSize')
+  if not result['OK']:
+    # No individual value found, try at the common place
+    result = gConfig.getOption('/Systems/Databases/MaxQueueSize')
+  if result['OK']:
+    try:
+      parameters['MaxQueueSize'] = int(result['Value'])
+    except ValueError:
+      return S_ERROR('Wrong value for the configuration parameter MaxQueueSize: %s' % result['Value'])
+
   return S_OK(parameters)
 
 
@@ -42,6 +42,22 @@ class ConfigurationHandler(RequestHandler):
       retDict['data'] = gServiceInterface.getCompressedConfigurationData()
     return S_OK(retDict)
 
+  types_getModificationsIfNewer = [basestring]
+
+  def export_getModificationsIfNewer(self, sClientVersion):
+    """ Like getCompressedDataIfNewer, but only sends the modifications since the client version
+        if they are still in the history of the server
+    """
+    sVersion = gServiceInterface.getVersion()
+    retDict = {'newestVersion': sVersion}
+    if sClientVersion < sVersion:
+      modificationsList = gServiceInterface.getModificationsSince(sClientVersion)
+      if modificationsList is None:
+        retDict['data'] = gServiceInterface.getCompressedConfigurationData()
+      else:
+        retDict['modifications'] = modificationsList
+    return S_OK(retDict)
+
   types_publishSlaveServer = [basestring]
 
   def export_publishSlaveServer(self, sURL):
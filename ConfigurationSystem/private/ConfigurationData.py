@@ -26,6 +26,14 @@ class ConfigurationData( object ):
     self.threadingLock = lr.getLock()
     self.runningThreadsNumber = 0
     self.__compressedConfigurationData = None
+    # Services keep the modifications between the last versions of the remote CFG
+    self.__historyLock = lr.getLock()
+    self.__historyCFG = None
+    self.__historyVersion = None
+    self.__modificationsHistory = []
+    # ( mergedCFG, { "/path/to/option" : value } ) for lock free lookups in the merged CFG
+    self.__optionsIndex = None
+    self.__lookupStats = { 'Lookups' : 0, 'Hits' : 0, 'IndexBuilds' : 0 }
     self.configurationPath = "/DIRAC/Configuration"
     self.backupsDir = os.path.join( DIRAC.rootPath, "etc", "csbackup" )
     self._isService = False
@@ -47,6 +55,7 @@ class ConfigurationData( object ):
   def sync( self ):
     gLogger.debug( "Updating configuration internals" )
     self.mergedCFG = self.remoteCFG.mergeWith( self.localCFG )
+    self.__optionsIndex = None
     self.remoteServerList = []
     localServers = self.extractOptionFromCFG( "%s/Servers" % self.configurationPath,
                                               self.localCFG,
@@ -60,6 +69,8 @@ class ConfigurationData( object ):
       self.remoteServerList.extend( List.fromChar( remoteServers, "," ) )
     self.remoteServerList = List.uniqueElements( self.remoteServerList )
     self.__compressedConfigurationData = None
+    if self._isService:
+      self.__updateModificationsHistory()
 
   def loadFile( self, fileName ):
     try:
@@ -92,6 +103,25 @@ class ConfigurationData( object ):
     self.unlock()
     self.sync()
 
+  def applyRemoteModifications( self, modificationsList, version ):
+    """
+    Apply to the remote CFG the modifications sent by a configuration server
+    The remote CFG is only replaced if all of them apply and lead to the expected version
+    """
+    newCFG = self.remoteCFG.clone()
+    for modList in modificationsList:
+      retVal = newCFG.applyModifications( modList )
+      if not retVal[ 'OK' ]:
+        return retVal
+    newVersion = self.getVersion( newCFG )
+    if newVersion != version:
+      return S_ERROR( "Modifications lead to version %s instead of %s" % ( newVersion, version ) )
+    self.lock()
+    self.remoteCFG = newCFG
+    self.unlock()
+    self.sync()
+    return S_OK()
+
   def loadConfigurationData( self, fileName = False ):
     name = self.getName()
     self.lock()
@@ -145,9 +175,51 @@ class ConfigurationData( object ):
       pass
     return self.dangerZoneEnd( None )
 
+  def __getOptionsIndex( self ):
+    """
+    Get the path -> value index of the options of the merged CFG, building it if the merged CFG changed
+    The index is never modified once built, so it can be used without locking
+    """
+    mergedCFG = self.mergedCFG
+    optionsIndex = self.__optionsIndex
+    if optionsIndex is None or optionsIndex[0] is not mergedCFG:
+      # The merged CFG is never modified, sync replaces it
+      index = {}
+      sectionsToIndex = [ ( "", mergedCFG ) ]
+      while sectionsToIndex:
+        sectionPath, sectionCFG = sectionsToIndex.pop()
+        for option in sectionCFG.listOptions():
+          index[ "%s/%s" % ( sectionPath, option ) ] = sectionCFG[ option ]
+        for section in sectionCFG.listSections():
+          sectionsToIndex.append( ( "%s/%s" % ( sectionPath, section ), sectionCFG[ section ] ) )
+      optionsIndex = ( mergedCFG, index )
+      self.__optionsIndex = optionsIndex
+      self.__lookupStats[ 'IndexBuilds' ] += 1
+    return optionsIndex[1]
+
+  def getLookupStats( self ):
+    """
+    Get the number of option lookups in the merged CFG, how many found the option
+    and how many times the index was built
+    """
+    stats = dict( self.__lookupStats )
+    stats[ 'HitRate' ] = float( stats[ 'Hits' ] ) / stats[ 'Lookups' ] if stats[ 'Lookups' ] else 0.
+    return stats
+
   def extractOptionFromCFG( self, path, cfg = False, disableDangerZones = False ):
-    if not cfg:
-      cfg = self.mergedCFG
+    if not cfg or cfg is self.mergedCFG:
+      # Counters are not protected, they are only indicative
+      self.__lookupStats[ 'Lookups' ] += 1
+      optionsIndex = self.__getOptionsIndex()
+      if path in optionsIndex:
+        self.__lookupStats[ 'Hits' ] += 1
+        return optionsIndex[ path ]
+      # Not a normalized path (extra or missing slashes, spaces)
+      path = "/%s" % "/".join( [ level.strip() for level in path.split( "/" ) if level.strip() != "" ] )
+      if path in optionsIndex:
+        self.__lookupStats[ 'Hits' ] += 1
+        return optionsIndex[ path ]
+      return None
     if not disableDangerZones:
       self.dangerZoneStart()
     try:
@@ -235,6 +307,12 @@ class ConfigurationData( object ):
     except:
       return 600
 
+  def getModificationsHistorySize( self ):
+    try:
+      return int( self.extractOptionFromCFG( "%s/ModificationsHistorySize" % self.configurationPath, self.mergedCFG ) )
+    except:
+      return 50
+
   def mergingEnabled( self ):
     try:
       val = self.extractOptionFromCFG( "%s/EnableAutoMerge" % self.configurationPath, self.mergedCFG )
@@ -274,6 +352,42 @@ class ConfigurationData( object ):
       self.__compressedConfigurationData = zlib.compress( str( self.remoteCFG ), 9 )
     return self.__compressedConfigurationData
 
+  def __updateModificationsHistory( self ):
+    """
+    Record the modifications of the remote CFG each time its version changes
+    """
+    version = self.getVersion()
+    self.__historyLock.acquire()
+    try:
+      if version == self.__historyVersion:
+        return
+      remoteCFG = self.remoteCFG.clone()
+      if self.__historyCFG is not None:
+        self.__modificationsHistory.append( ( self.__historyVersion, version,
+                                              self.__historyCFG.getModifications( remoteCFG ) ) )
+        historySize = max( 0, self.getModificationsHistorySize() )
+        del self.__modificationsHistory[ :len( self.__modificationsHistory ) - historySize ]
+      self.__historyCFG = remoteCFG
+      self.__historyVersion = version
+    finally:
+      self.__historyLock.release()
+
+  def getModificationsSince( self, version ):
+    """
+    Get the lists of modifications to apply, in order, to the remote CFG of the given version
+    to get the current one. None if the history does not go back to that version
+    """
+    self.__historyLock.acquire()
+    try:
+      if version == self.__historyVersion:
+        return []
+      for iPos, modEntry in enumerate( self.__modificationsHistory ):
+        if modEntry[0] == version:
+          return [ modList for _fromVersion, _toVersion, modList in self.__modificationsHistory[ iPos: ] ]
+    finally:
+      self.__historyLock.release()
+    return None
+
   def isMaster( self ):
     value = self.extractOptionFromCFG( "%s/Master" % self.configurationPath, self.localCFG )
     if value and value.lower() in ( "yes", "true", "y" ):
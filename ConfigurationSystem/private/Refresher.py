@@ -16,18 +16,37 @@ from DIRAC.Core.Utilities.EventDispatcher import gEventDispatcher
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 
 
+def _loadCompressedData(localVersion, dataDict):
+  if localVersion < dataDict['newestVersion']:
+    gLogger.debug("New version available", "Updating to version %s..." % dataDict['newestVersion'])
+    gConfigurationData.loadRemoteCFGFromCompressedMem(dataDict['data'])
+    gLogger.debug("Updated to version %s" % gConfigurationData.getVersion())
+    gEventDispatcher.triggerEvent("CSNewVersion", dataDict['newestVersion'], threaded=True)
+  return S_OK()
+
+
 def _updateFromRemoteLocation(serviceClient):
   gLogger.debug("", "Trying to refresh from %s" % serviceClient.serviceURL)
   localVersion = gConfigurationData.getVersion()
+  # If there is already a remote configuration, only the modifications since its version are needed
+  if localVersion != "0":
+    retVal = serviceClient.getModificationsIfNewer(localVersion)
+    if retVal['OK']:
+      dataDict = retVal['Value']
+      if 'modifications' not in dataDict:
+        return _loadCompressedData(localVersion, dataDict)
+      result = gConfigurationData.applyRemoteModifications(dataDict['modifications'], dataDict['newestVersion'])
+      if result['OK']:
+        gLogger.debug("Updated to version %s" % gConfigurationData.getVersion())
+        gEventDispatcher.triggerEvent("CSNewVersion", dataDict['newestVersion'], threaded=True)
+        return S_OK()
+      gLogger.warn("Cannot apply the configuration modifications, getting the full configuration", result['Message'])
+    # Servers of older versions can only send the full configuration
+    elif retVal['Message'].find("Unknown method") == -1:
+      return retVal
   retVal = serviceClient.getCompressedDataIfNewer(localVersion)
   if retVal['OK']:
-    dataDict = retVal['Value']
-    if localVersion < dataDict['newestVersion']:
-      gLogger.debug("New version available", "Updating to version %s..." % dataDict['newestVersion'])
-      gConfigurationData.loadRemoteCFGFromCompressedMem(dataDict['data'])
-      gLogger.debug("Updated to version %s" % gConfigurationData.getVersion())
-      gEventDispatcher.triggerEvent("CSNewVersion", dataDict['newestVersion'], threaded=True)
-    return S_OK()
+    return _loadCompressedData(localVersion, retVal['Value'])
   return retVal
 
 
@@ -160,6 +160,9 @@ class ServiceInterface(threading.Thread):
   def getVersion(self):
     return gConfigurationData.getVersion()
 
+  def getModificationsSince(self, version):
+    return gConfigurationData.getModificationsSince(version)
+
   def getCommitHistory(self):
     files = self.__getCfgBackups(gConfigurationData.getBackupDir())
     backups = [".".join(fileName.split(".")[1:-1]).split("@") for fileName in files]
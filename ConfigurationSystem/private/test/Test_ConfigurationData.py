@@ -0,0 +1,119 @@
+""" Test the propagation of the configuration modifications from the servers to the clients
+"""
+
+# pylint: disable=missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+
+initialCFG = """
+DIRAC
+{
+  Configuration
+  {
+    Name = aCS
+    Version = 2018-01-01 00:00:00.000001
+  }
+}
+Systems
+{
+  WorkloadManagement
+  {
+    # Some comment
+    Agents
+    {
+      JobCleaningAgent
+      {
+        PollingTime = 3600
+        JobByJob = True
+      }
+    }
+  }
+}
+"""
+
+
+def getServer():
+  server = ConfigurationData(False)
+  server.setAsService()
+  server.loadRemoteCFGFromMem(initialCFG)
+  return server
+
+
+def getClient():
+  client = ConfigurationData(False)
+  client.loadRemoteCFGFromMem(initialCFG)
+  return client
+
+
+def modifyServer(server, version):
+  server.setOptionInCFG("/Systems/WorkloadManagement/Agents/JobCleaningAgent/PollingTime",
+                        version[-2:], server.remoteCFG)
+  server.setOptionInCFG("/Systems/WorkloadManagement/Agents/Agent%s/PollingTime" % version[-2:],
+                        "10", server.remoteCFG)
+  server.deleteOptionInCFG("/Systems/WorkloadManagement/Agents/JobCleaningAgent/JobByJob", server.remoteCFG)
+  server.setVersion(version)
+
+
+def test_modifications():
+  server = getServer()
+  client = getClient()
+  clientVersion = client.getVersion()
+  assert server.getModificationsSince(clientVersion) == []
+
+  modifyServer(server, "2018-01-01 00:00:00.000002")
+  modifyServer(server, "2018-01-01 00:00:00.000003")
+  modificationsList = server.getModificationsSince(clientVersion)
+  assert len(modificationsList) == 2
+
+  assert client.applyRemoteModifications(modificationsList, server.getVersion())['OK']
+  assert client.getVersion() == server.getVersion()
+  assert str(client.getRemoteCFG()) == str(server.getRemoteCFG())
+  assert client.extractOptionFromCFG("/Systems/WorkloadManagement/Agents/Agent02/PollingTime") == "10"
+  assert client.extractOptionFromCFG("/Systems/WorkloadManagement/Agents/JobCleaningAgent/PollingTime") == "03"
+
+
+def test_history():
+  server = getServer()
+  server.setOptionInCFG("/DIRAC/Configuration/ModificationsHistorySize", "2")
+  client = getClient()
+  for version in xrange(2, 6):
+    modifyServer(server, "2018-01-01 00:00:00.00000%s" % version)
+  # Too old for the history, the full configuration is needed
+  assert server.getModificationsSince(client.getVersion()) is None
+  assert len(server.getModificationsSince("2018-01-01 00:00:00.000003")) == 2
+
+
+def test_wrongVersion():
+  server = getServer()
+  client = getClient()
+  modifyServer(server, "2018-01-01 00:00:00.000002")
+  modificationsList = server.getModificationsSince(client.getVersion())
+
+  # The client CFG is only replaced if the expected version is reached
+  result = client.applyRemoteModifications(modificationsList, "2018-01-01 00:00:00.000003")
+  assert not result['OK']
+  assert str(client.getRemoteCFG()) == str(getClient().getRemoteCFG())
+
+  # Modifications that do not apply are rejected as well
+  client.setOptionInCFG("/Systems/WorkloadManagement/Agents/Agent02/PollingTime", "10", client.remoteCFG)
+  assert not client.applyRemoteModifications(modificationsList, server.getVersion())['OK']
+
+
+def test_optionsIndex():
+  client = getClient()
+  assert client.extractOptionFromCFG("/Systems/WorkloadManagement/Agents/JobCleaningAgent/PollingTime") == "3600"
+  assert client.extractOptionFromCFG("Systems/WorkloadManagement//Agents/JobCleaningAgent/PollingTime/") == "3600"
+  assert client.extractOptionFromCFG("/Systems/WorkloadManagement/Agents/JobCleaningAgent") is None
+  assert client.extractOptionFromCFG("/Systems/WorkloadManagement/Agents/JobCleaningAgent/Missing") is None
+  assert client.extractOptionFromCFG("") is None
+  stats = client.getLookupStats()
+  assert stats['Lookups'] == 5
+  assert stats['Hits'] == 2
+  assert stats['IndexBuilds'] == 1
+
+  # The index follows the modifications
+  client.setOptionInCFG("/Systems/WorkloadManagement/Agents/JobCleaningAgent/PollingTime", "60")
+  assert client.extractOptionFromCFG("/Systems/WorkloadManagement/Agents/JobCleaningAgent/PollingTime") == "60"
+  assert client.getLookupStats()['IndexBuilds'] == 2
@@ -22,6 +22,7 @@ from DIRAC.Core.Utilities.ReturnValues import isReturnStructure
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 from DIRAC.ConfigurationSystem.Client import PathFinder
 from DIRAC.FrameworkSystem.Client.MonitoringClient import MonitoringClient
+from DIRAC.Core.DISET.private.ConnectionPool import getGlobalConnectionPool
 
 
 class AgentModule(object):
@@ -379,6 +380,10 @@ class AgentModule(object):
     elapsedPollingRate = averageElapsedTime * 100 / self.am_getOption('PollingTime')
     self.log.notice(" Polling time: %s seconds" % self.am_getOption('PollingTime'))
     self.log.notice(" Average execution/polling time: %.2f%%" % elapsedPollingRate)
+    connectionStats = getGlobalConnectionPool().getStats()
+    self.log.notice(" Service connections: %d opened, %d reused (%.1f%%)" % (connectionStats['Connections'],
+                                                                            connectionStats['Reused'],
+                                                                            connectionStats['ReuseRate'] * 100))
     if cycleResult['OK']:
       self.log.notice(" Cycle was successful")
     else:
@@ -3,7 +3,7 @@
 """
 
 from DIRAC import gLogger, gConfig
-from DIRAC.Core.Utilities.MySQL import MySQL
+from DIRAC.Core.Utilities.MySQL import MySQL, MAXCONNECTIONS
 from DIRAC.ConfigurationSystem.Client.Utilities import getDBParameters
 from DIRAC.ConfigurationSystem.Client.PathFinder import getDatabaseSection
 
@@ -30,13 +30,15 @@ class DB(MySQL):
     self.dbUser = dbParameters['User']
     self.dbPass = dbParameters['Password']
     self.dbName = dbParameters['DBName']
+    self.dbMaxQueueSize = dbParameters.get('MaxQueueSize', MAXCONNECTIONS)
 
     super(DB, self).__init__(hostName=self.dbHost,
                              userName=self.dbUser,
                              passwd=self.dbPass,
                              dbName=self.dbName,
                              port=self.dbPort,
-                             debug=debug)
+                             debug=debug,
+                             maxQueueSize=self.dbMaxQueueSize)
 
     if not self._connected:
       raise RuntimeError("Can not connect to DB '%s', exiting..." % self.dbName)
@@ -47,6 +49,7 @@ class DB(MySQL):
     self.log.info("Port:           " + str(self.dbPort))
     #self.log.info("Password:       "+self.dbPass)
     self.log.info("DBName:         " + self.dbName)
+    self.log.info("MaxQueueSize:   " + str(self.dbMaxQueueSize))
     self.log.info("==================================================")
 
 #############################################################################
@@ -1,4 +1,8 @@
 """ The mind is a service the distributes "task" to executors
+
+    Several minds can share the tasks: with the Shards and ShardIndex options, each instance only
+    accepts the tasks whose id falls in its shard, and owns their queues and freezer. The executors
+    then connect to all the minds, listed in their Minds option.
 """
 
 import types
@@ -8,7 +12,7 @@ from DIRAC import gLogger
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR, isReturnStructure
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
-from DIRAC.Core.Utilities.ExecutorDispatcher import ExecutorDispatcher, ExecutorDispatcherCallbacks
+from DIRAC.Core.Utilities.ExecutorDispatcher import ExecutorDispatcher, ExecutorDispatcherCallbacks, getTaskShard
 
 
 class ExecutorMindHandler( RequestHandler ):
@@ -74,6 +78,12 @@ class ExecutorMindHandler( RequestHandler ):
                                                          cls.exec_taskError )
     cls.__eDispatch.setCallbacks( cls.__callbacks )
     cls.__allowedClients = []
+    cls.__shards = max( 1, cls.srv_getCSOption( "Shards", 1 ) )
+    cls.__shardIndex = cls.srv_getCSOption( "ShardIndex", 0 )
+    if not 0 <= cls.__shardIndex < cls.__shards:
+      return S_ERROR( "ShardIndex %s is not in [0, %s)" % ( cls.__shardIndex, cls.__shards ) )
+    if cls.__shards > 1:
+      gLogger.notice( "Handling shard %s of %s" % ( cls.__shardIndex, cls.__shards ) )
     if cls.log.shown( "VERBOSE" ):
       gThreadScheduler.setMinValidPeriod( 1 )
       gThreadScheduler.addPeriodicTask( 10, lambda: cls.log.verbose( "== Internal state ==\n%s\n===========" % pprint.pformat( cls.__eDispatch._internals() ) ) )
@@ -138,7 +148,7 @@ class ExecutorMindHandler( RequestHandler ):
       numTasks = max( 1, int( kwargs[ 'maxTasks' ] ) )
     except:
       numTasks = 1
-    self.__eDispatch.addExecutor( trid, kwargs[ 'executorTypes' ] )
+    self.__eDispatch.addExecutor( trid, kwargs[ 'executorTypes' ], numTasks )
     return self.exec_executorConnected( trid, kwargs[ 'executorTypes' ] )
 
   auth_conn_drop = [ 'all' ]
@@ -210,6 +220,15 @@ class ExecutorMindHandler( RequestHandler ):
     self.__eDispatch.removeExecutor( self.srv_getTransportID() )
     return self.srv_disconnect()
 
+  types_getDispatcherStats = []
+  def export_getDispatcherStats( self ):
+    """ Get the tasks queued, the dispatch latency and the utilization of the executors of each type
+    """
+    stats = self.__eDispatch.getStats()
+    stats[ 'Shard' ] = self.__shardIndex
+    stats[ 'Shards' ] = self.__shards
+    return S_OK( stats )
+
   #######
   # Utilities functions
   #######
@@ -218,6 +237,14 @@ class ExecutorMindHandler( RequestHandler ):
   def getTaskIds( cls ):
     return cls.__eDispatch.getTaskIds()
 
+  @classmethod
+  def getShards( cls ):
+    return cls.__shards
+
+  @classmethod
+  def ownsTask( cls, taskId ):
+    return getTaskShard( taskId, cls.__shards ) == cls.__shardIndex
+
   @classmethod
   def getExecutorsConnected( cls ):
     return cls.__eDispatch.getExecutorsConnected()
@@ -259,6 +286,8 @@ class ExecutorMindHandler( RequestHandler ):
 
   @classmethod
   def executeTask( cls, taskId, taskObj ):
+    if not cls.ownsTask( taskId ):
+      return S_ERROR( "Task %s belongs to shard %s" % ( taskId, getTaskShard( taskId, cls.__shards ) ) )
     return cls.__eDispatch.addTask( taskId, taskObj )
 
   @classmethod
@@ -106,6 +106,12 @@ class ExecutorModule( object ):
   def ex_getMind( cls ):
     return cls.__mindName
 
+  @classmethod
+  def ex_getMinds( cls ):
+    """ The minds to connect to: the Minds option, for minds sharing their tasks, else the mind set
+    """
+    return cls.ex_getOption( "Minds", [] ) or [ cls.__mindName ]
+
   @classmethod
   def ex_getExtraArguments( cls ):
     return cls.__mindExtraArgs
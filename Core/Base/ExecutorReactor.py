@@ -232,11 +232,11 @@ class ExecutorReactor( object ):
       result = exeClass._ex_initialize( name, self.__executorModules[ name ][ 'loadName' ] )
       if not result[ 'OK' ]:
         return result
-      mind = exeClass.ex_getMind()
-      if mind not in self.__minds:
-        self.__minds[ mind ] = self.MindCluster( mind, self.__aliveLock )
-      mc = self.__minds[ mind ]
-      mc.addModule( name, exeClass )
+      for mind in exeClass.ex_getMinds():
+        if mind not in self.__minds:
+          self.__minds[ mind ] = self.MindCluster( mind, self.__aliveLock )
+        mc = self.__minds[ mind ]
+        mc.addModule( name, exeClass )
     for mindName in self.__minds:
       gLogger.info( "Trying to connect to %s" % mindName )
       result = self.__minds[ mindName ].connect()
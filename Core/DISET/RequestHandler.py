@@ -135,6 +135,9 @@ class RequestHandler(object):
       gLogger.error(message)
       retVal = S_ERROR(message)
     self.__logRemoteQueryResponse(retVal, time.time() - startTime)
+    # The clients using persistent connections identify their requests, the id is sent back with the response
+    if len(proposalTuple) > 3 and isinstance(proposalTuple[3], dict) and 'requestId' in proposalTuple[3]:
+      retVal['requestId'] = proposalTuple[3]['requestId']
     result = self.__trPool.send(self.__trid, retVal)  # this will delete the value from the S_OK(value)
     del retVal
     retVal = None
@@ -487,6 +490,12 @@ class RequestHandler(object):
                           'children system time': stTimes[3],
                           'elapsed real time': stTimes[4]
                           }
+    # Compression of the messages of each method
+    if 'compressionStats' in self.serviceInfoDict:
+      dInfo['compression'] = self.serviceInfoDict['compressionStats'].getStats()
+    # Times of the handshakes, of the waits for a thread and of the executions
+    if 'serviceTimes' in self.serviceInfoDict:
+      dInfo['times'] = self.serviceInfoDict['serviceTimes'].getStats()
 
     return S_OK(dInfo)
 
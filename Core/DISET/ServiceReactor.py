@@ -15,9 +15,7 @@
 
 """
 
-import select
 import time
-import socket
 
 try:
   import multiprocessing
@@ -27,11 +25,11 @@ except:
 from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.Core.DISET.private.Service import Service
 from DIRAC.Core.DISET.private.GatewayService import GatewayService
+from DIRAC.Core.DISET.private.ConnectionReactor import ConnectionReactor
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
 from DIRAC.Core.Utilities import Time
 from DIRAC.Core.Base.private.ModuleLoader import ModuleLoader
 from DIRAC.Core.DISET.private.Protocols import gProtocolDict
-from DIRAC.ConfigurationSystem.Client.Helpers import Registry
 from DIRAC.ConfigurationSystem.Client import PathFinder
 
 
@@ -134,72 +132,48 @@ class ServiceReactor(object):
           p = multiprocessing.Process(target=self.__startCloneProcess, args=(svcName, i))
           p.start()
           gLogger.always("Started clone process %s for %s" % (i, svcName))
-    while self.__alive:
-      self.__acceptIncomingConnection()
+    self.__acceptIncomingConnection()
 
   # This function runs in a different process
   def __startCloneProcess(self, svcName, i):
     self.__services[svcName].setCloneProcessId(i)
     self.__alive = i
-    while self.__alive:
-      self.__acceptIncomingConnection(svcName)
-
-  def __getListeningSocketsList(self, svcName=False):
-    if svcName:
-      sockets = [self.__listeningConnections[svcName]['socket']]
-    else:
-      sockets = []
-      for svcName in self.__listeningConnections:
-        sockets.append(self.__listeningConnections[svcName]['socket'])
-    return sockets
+    self.__acceptIncomingConnection(svcName)
 
   def __acceptIncomingConnection(self, svcName=False):
     """
-      This method just gets the incoming connection, checks IP address
-      and generates job. SSL/TLS handshake and execution of the remote call
-      are made by Service._processInThread() (in another thread) so
-      the service can accept other clients while another thread handling remote call
+      This method runs the event loop of the listening connections. The ConnectionReactor
+      accepts the incoming connections, checks their IP address, does the SSL/TLS handshake
+      and receives the action proposal without blocking. Only then the connection is handed
+      to the service, and the execution of the remote call is made by Service._processInThread()
+      (in another thread), so the threads of the service never wait for slow clients
 
       :param str svcName=False: Name of a service if you use multiple
                                 services at the same time
     """
-    sockets = self.__getListeningSocketsList(svcName)
-    while self.__alive:
-      try:
-        inList, _outList, _exList = select.select(sockets, [], [], 10)
-        if len(inList) == 0:
-          return
-        for inSocket in inList:
-          for svcName in self.__listeningConnections:
-            if inSocket == self.__listeningConnections[svcName]['socket']:
-              retVal = self.__listeningConnections[svcName]['transport'].acceptConnection()
-              if not retVal['OK']:
-                gLogger.warn("Error while accepting a connection: ", retVal['Message'])
-                return
-              clientTransport = retVal['Value']
-      except socket.error:
-        return
-      self.__maxFD = max(self.__maxFD, clientTransport.oSocket.fileno())
-      # Is it banned?
-      clientIP = clientTransport.getRemoteAddress()[0]
-      if clientIP in Registry.getBannedIPs():
-        gLogger.warn("Client connected from banned ip %s" % clientIP)
-        clientTransport.close()
-        continue
-      # Handle connection
-      self.__stats.connectionStablished()
-      self.__services[svcName].handleConnection(clientTransport)
-      # Renew context?
-      now = time.time()
-      renewed = False
-      for svcName in self.__listeningConnections:
-        tr = self.__listeningConnections[svcName]['transport']
-        if now - tr.latestServerRenewTime() > self.__services[svcName].getConfig().getContextLifeTime():
-          result = tr.renewServerContext()
-          if result['OK']:
-            renewed = True
-      if renewed:
-        sockets = self.__getListeningSocketsList()
+    reactor = ConnectionReactor(self.__handleConnection)
+    for listenerName in self.__listeningConnections:
+      if not svcName or listenerName == svcName:
+        reactor.addListener(listenerName, self.__listeningConnections[listenerName]['transport'],
+                            self.__services[listenerName].getConfig().getHandshakeTimeout())
+    try:
+      while self.__alive:
+        reactor.processEvents(1)
+        # Renew context?
+        now = time.time()
+        for listenerName in self.__listeningConnections:
+          tr = self.__listeningConnections[listenerName]['transport']
+          if now - tr.latestServerRenewTime() > self.__services[listenerName].getConfig().getContextLifeTime():
+            tr.renewServerContext()
+    finally:
+      reactor.closePending()
+
+  def __handleConnection(self, svcName, clientTransport, handshakeTime):
+    """ Hands a connection whose proposal was received to its service
+    """
+    self.__maxFD = max(self.__maxFD, clientTransport.oSocket.fileno())
+    self.__stats.connectionStablished()
+    self.__services[svcName].handleConnection(clientTransport, handshakeTime)
 
   def __closeListeningConnections(self):
     for svcName in self.__listeningConnections:
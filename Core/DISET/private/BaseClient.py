@@ -6,6 +6,7 @@ __RCSID__ = "$Id$"
 
 import time
 import thread
+from hashlib import md5
 import DIRAC
 from DIRAC.Core.DISET.private.Protocols import gProtocolDict
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
@@ -15,6 +16,8 @@ from DIRAC.ConfigurationSystem.Client.Config import gConfig
 from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceURL, getServiceFailoverURL
 from DIRAC.Core.Security import CS
 from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+from DIRAC.Core.DISET.private.ConnectionPool import getGlobalConnectionPool
+from DIRAC.Core.DISET.private.Compression import COMPRESSION_CODECS, DEFAULT_COMPRESSION_THRESHOLD
 from DIRAC.Core.DISET.ThreadConfig import ThreadConfig
 
 
@@ -38,6 +41,8 @@ class BaseClient(object):
   KW_PROXY_CHAIN = "proxyChain"
   KW_SKIP_CA_CHECK = "skipCACheck"
   KW_KEEP_ALIVE_LAPSE = "keepAliveLapse"
+  KW_PERSISTENT_CONNECTION = "persistentConnection"
+  KW_COMPRESSION_THRESHOLD = "compressionThreshold"
 
   __threadConfig = ThreadConfig()
 
@@ -57,6 +62,9 @@ class BaseClient(object):
       :param proxyChain: Specify the proxy chain
       :param skipCACheck: Do not check the CA
       :param keepAliveLapse: Duration for keepAliveLapse (heartbeat like)
+      :param persistentConnection: Keep the connection open after an RPC call, to reuse it for the next ones
+      :param compressionThreshold: Size above which the messages are compressed if the server accepts it, 0 to
+                                   not offer compression
     """
 
     if not isinstance(serviceName, basestring):
@@ -80,10 +88,13 @@ class BaseClient(object):
     self.__nbOfRetry = 3  # by default we try try times
     self.__retryCounter = 1
     self.__bannedUrls = []
+    self.__persistentConnection = False
+    self.__compressionThreshold = 0
     for initFunc in (self.__discoverSetup, self.__discoverVO, self.__discoverTimeout,
                      self.__discoverURL, self.__discoverCredentialsToUse,
                      self.__checkTransportSanity,
-                     self.__setKeepAliveLapse):
+                     self.__setKeepAliveLapse, self.__setPersistentConnection,
+                     self.__setCompressionThreshold):
       result = initFunc()
       if not result['OK'] and self.__initStatus['OK']:
         self.__initStatus = result
@@ -414,13 +425,8 @@ and this is thread %s
       gLogger.error("DISET client thread safety error", msgTxt)
       # raise Exception( msgTxt )
 
-  def _connect(self):
-    """ Establish the connection.
-        It uses the URL discovered in __discoverURL.
-        In case the connection cannot be established, __discoverURL
-        is called again, and _connect calls itself.
-        We stop after trying self.__nbOfRetry * self.__nbOfUrls
-
+  def __prepareConnection(self):
+    """ Checks the credentials to use before connecting, or before reusing a connection
     """
     # Check if the useServerCertificate configuration changed
     # Note: I am not really sure that  all this block makes
@@ -441,6 +447,19 @@ and this is thread %s
       return self.__initStatus
     if self.__enableThreadCheck:
       self.__checkThreadID()
+    return S_OK()
+
+  def _connect(self):
+    """ Establish the connection.
+        It uses the URL discovered in __discoverURL.
+        In case the connection cannot be established, __discoverURL
+        is called again, and _connect calls itself.
+        We stop after trying self.__nbOfRetry * self.__nbOfUrls
+
+    """
+    result = self.__prepareConnection()
+    if not result['OK']:
+      return result
 
     gLogger.debug("Trying to connect to: %s" % self.serviceURL)
     try:
@@ -486,17 +505,45 @@ and this is thread %s
     # We add the connection to the transport pool
     gLogger.debug("Connected to: %s" % self.serviceURL)
     trid = getGlobalTransportPool().add(transport)
+    getGlobalConnectionPool().connectionOpened()
 
     return S_OK((trid, transport))
 
-  def _disconnect(self, trid):
+  def _getIdleConnection(self):
+    """ Takes an idle persistent connection to the service, opened by a previous call with the same credentials.
+        The service may have closed it in the meantime, the caller has to connect again if proposing fails.
+
+        :return: tuple (trid, transport), None if there is no idle connection or if the connection is not persistent
+    """
+    if not self.__persistentConnection:
+      return None
+    if not self.__prepareConnection()['OK']:
+      return None
+    return getGlobalConnectionPool().get(self.__getConnectionKey())
+
+  def _disconnect(self, trid, keepConnection=False):
     """ Disconnect the connection.
 
         :param trid: Transport ID in the transportPool
+        :param bool keepConnection: if the connection is persistent, keep it open for the next calls
     """
-    getGlobalTransportPool().close(trid)
+    if keepConnection and self.__persistentConnection:
+      getGlobalConnectionPool().release(trid, self.__getConnectionKey())
+    else:
+      getGlobalConnectionPool().release(trid)
 
-  def _proposeAction(self, transport, action):
+  def __getConnectionKey(self):
+    """ The connections can be reused by the calls to the same address with the same credentials
+    """
+    proxyString = self.kwargs.get(self.KW_PROXY_STRING)
+    return (tuple(self.__URLTuple[:3]),
+            self.kwargs.get(self.KW_USE_CERTIFICATES),
+            self.kwargs.get(self.KW_PROXY_LOCATION),
+            md5(proxyString).hexdigest() if proxyString else None,
+            self.kwargs.get(self.KW_SKIP_CA_CHECK),
+            str(self.__extraCredentials))
+
+  def _proposeAction(self, transport, action, persistent=False):
     """ Proposes an action by sending a tuple containing
 
           * System/Component
@@ -510,10 +557,17 @@ and this is thread %s
         The server might ask for a delegation, in which case it is done here.
         The result of the delegation is then returned.
 
+        A dictionary of options is added to the tuple, with the compression codecs known by the
+        client and, for persistent connections, a request id and a flag asking the server to keep
+        the connection open. The servers that do not know it ignore it, they neither compress the
+        messages nor keep the connection open. The others send back the request id, 'persistent'
+        if they keep the connection open and the 'compression' codec they chose.
+
         :param transport: the Transport object returned by _connect
         :param action: tuple (<action type>, <action name>). It depends on the
                        subclasses of BaseClient. <action type> can be for example
                        'RPC' or 'FileTransfer'
+        :param bool persistent: ask the server to keep the connection open after the action
 
        :return: whatever the server sent back
 
@@ -523,12 +577,21 @@ and this is thread %s
     stConnectionInfo = ((self.__URLTuple[3], self.setup, self.vo),
                         action,
                         self.__extraCredentials)
+    options = {}
+    if persistent and self.__persistentConnection:
+      options.update({'persistent': True, 'requestId': getGlobalConnectionPool().generateRequestId()})
+    if self.__compressionThreshold:
+      options['compression'] = COMPRESSION_CODECS
+    if options:
+      stConnectionInfo += (options,)
 
     # Send the connection info and get the answer back
     retVal = transport.sendData(S_OK(stConnectionInfo))
     if not retVal['OK']:
       return retVal
     serverReturn = transport.receiveData()
+    codec = serverReturn.get('compression') if self.__compressionThreshold else None
+    transport.setCompression(codec if codec in COMPRESSION_CODECS else None, self.__compressionThreshold)
 
     # TODO: Check if delegation is required. This seems to be used only for the GatewayService
     if serverReturn['OK'] and 'Value' in serverReturn and isinstance(serverReturn['Value'], dict):
@@ -585,6 +648,33 @@ and this is thread %s
     self.kwargs[self.KW_KEEP_ALIVE_LAPSE] = kaa
     return S_OK()
 
+  def __setPersistentConnection(self):
+    """ Use persistent connections if asked in kwargs[KW_PERSISTENT_CONNECTION],
+        which can come from the /DIRAC/ConnConf/<host>:<port> section,
+        or by default for all the services in /DIRAC/PersistentConnections
+    """
+    persistent = self.kwargs.get(self.KW_PERSISTENT_CONNECTION)
+    if persistent is None:
+      persistent = gConfig.getValue("/DIRAC/PersistentConnections", False)
+    self.__persistentConnection = str(persistent).lower() in ("true", "yes", "1")
+    self.kwargs[self.KW_PERSISTENT_CONNECTION] = self.__persistentConnection
+    return S_OK()
+
+  def __setCompressionThreshold(self):
+    """ Offer compression to the server for the messages bigger than kwargs[KW_COMPRESSION_THRESHOLD],
+        which can come from the /DIRAC/ConnConf/<host>:<port> section, or by default from
+        /DIRAC/CompressionThreshold. 0 disables the compression.
+    """
+    threshold = self.kwargs.get(self.KW_COMPRESSION_THRESHOLD)
+    if threshold is None:
+      threshold = gConfig.getValue("/DIRAC/CompressionThreshold", DEFAULT_COMPRESSION_THRESHOLD)
+    try:
+      self.__compressionThreshold = max(0, int(threshold))
+    except (TypeError, ValueError):
+      return S_ERROR("Invalid compression threshold: %s" % threshold)
+    self.kwargs[self.KW_COMPRESSION_THRESHOLD] = self.__compressionThreshold
+    return S_OK()
+
   def _getBaseStub(self):
     """ Returns a tuple with (self._destinationSrv, newKwargs)
         self._destinationSrv is what was given as first parameter of the init serviceName
@@ -0,0 +1,75 @@
+""" Compression of the DISET messages, negotiated in the action proposal
+
+    The clients offer the codecs they know in the options of the proposal, and the service answers
+    with the one it chose. Each side then compresses the messages bigger than its own threshold.
+    Clients and services which do not know about it neither offer nor choose a codec, so the
+    messages between them and the others stay uncompressed.
+"""
+
+__RCSID__ = "$Id$"
+
+import zlib
+import threading
+
+# Codecs known, by order of preference
+COMPRESSION_CODECS = ( 'zlib', )
+# Messages bigger than this are compressed by default
+DEFAULT_COMPRESSION_THRESHOLD = 65536
+
+
+def compressData( codec, data ):
+  """ Compresses the data with the fastest level of the codec
+  """
+  if codec == 'zlib':
+    return zlib.compress( data, 1 )
+  raise ValueError( "Unknown compression codec %s" % codec )
+
+
+def decompressData( codec, data, maxSize = 0 ):
+  """ Decompresses the data, refusing to produce more than maxSize bytes if given
+  """
+  if codec != 'zlib':
+    raise ValueError( "Unknown compression codec %s" % codec )
+  decompressor = zlib.decompressobj()
+  decompressed = decompressor.decompress( data, maxSize )
+  if decompressor.unconsumed_tail:
+    raise ValueError( "Read limit exceeded (%s chars)" % maxSize )
+  decompressed += decompressor.flush()
+  if maxSize and len( decompressed ) > maxSize:
+    raise ValueError( "Read limit exceeded (%s chars)" % maxSize )
+  return decompressed
+
+
+class CompressionStats( object ):
+  """ Compression statistics of the messages of each method
+  """
+
+  def __init__( self ):
+    self.__lock = threading.Lock()
+    self.__stats = {}
+
+  def add( self, method, transportStats ):
+    """ Adds the statistics of a transport, as returned by its getCompressionStats, to the method
+    """
+    if not transportStats[ 'Messages' ]:
+      return
+    with self.__lock:
+      methodStats = self.__stats.setdefault( method, { 'Messages' : 0, 'RawBytes' : 0, 'CompressedBytes' : 0,
+                                                       'Time' : 0. } )
+      for key in methodStats:
+        methodStats[ key ] += transportStats[ key ]
+
+  def getStats( self ):
+    """ Messages compressed or decompressed for each method, their size before and after compression,
+        the compression ratio and the time spent compressing and decompressing them
+
+        :return: dict
+    """
+    with self.__lock:
+      stats = dict( ( method, dict( methodStats ) ) for method, methodStats in self.__stats.items() )
+    for methodStats in stats.values():
+      methodStats[ 'Ratio' ] = float( methodStats[ 'RawBytes' ] ) / max( methodStats[ 'CompressedBytes' ], 1 )
+    return stats
+
+
+gClientCompressionStats = CompressionStats()
@@ -0,0 +1,176 @@
+""" Pool of the persistent connections of the DISET clients
+
+    The clients using persistent connections give back their transport after a call instead of
+    closing it, when the service accepted to keep the connection open. The next calls to the same
+    service with the same credentials take it from the pool instead of connecting and doing the
+    handshake again. Each transport is used by one call at a time: concurrent calls open as many
+    connections as needed, up to maxIdleConnections of them being kept per service and credentials.
+    The transports idle for more than maxIdleTime are closed, before the service closes them.
+    A forked process starts with a new pool, the connections of its parent are not shared.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import select
+import threading
+
+from DIRAC.FrameworkSystem.Client.Logger import gLogger
+from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
+
+
+class ConnectionPool( object ):
+  """ Idle persistent transports by service address and credentials
+  """
+
+  def __init__( self, maxIdleTime = 60, maxIdleConnections = 10 ):
+    """ c'tor
+
+        :param int maxIdleTime: seconds after which an idle transport is closed
+        :param int maxIdleConnections: maximum number of idle transports kept per service and credentials
+    """
+    self.__maxIdleTime = maxIdleTime
+    self.__maxIdleConnections = maxIdleConnections
+    self.__lock = threading.Lock()
+    # key : list of ( releaseTime, trid ), the most recently used last
+    self.__idle = {}
+    self.__requestCounter = 0
+    self.__pid = os.getpid()
+    self.__stats = { 'Connections' : 0, 'Reused' : 0, 'Expired' : 0, 'Broken' : 0 }
+    self.log = gLogger.getSubLogger( "ConnectionPool" )
+    result = gThreadScheduler.addPeriodicTask( maxIdleTime, self.__closeExpired )
+    if not result[ 'OK' ]:
+      self.log.error( "Cannot add task to thread scheduler", result[ 'Message' ] )
+
+  def connectionOpened( self ):
+    """ Counts the connections opened, each of them with a handshake
+    """
+    with self.__lock:
+      self.__stats[ 'Connections' ] += 1
+
+  def get( self, key ):
+    """ Takes an idle transport to the service with the given credentials
+
+        :return: tuple ( trid, transport ), None if there is no idle transport
+    """
+    now = time.time()
+    while True:
+      with self.__lock:
+        connections = self.__idle.get( key )
+        if not connections:
+          return None
+        releaseTime, trid = connections.pop()
+        if not connections:
+          del self.__idle[ key ]
+        if now - releaseTime > self.__maxIdleTime:
+          self.__stats[ 'Expired' ] += 1 + len( connections )
+          expired = [ trid ] + [ connTrid for _releaseTime, connTrid in connections ]
+          self.__idle.pop( key, None )
+          trid = None
+        elif self.__isAlive( trid ):
+          self.__stats[ 'Reused' ] += 1
+          expired = []
+        else:
+          self.__stats[ 'Broken' ] += 1
+          expired = [ trid ]
+          trid = None
+      for expiredTrid in expired:
+        getGlobalTransportPool().close( expiredTrid )
+      if trid:
+        return trid, getGlobalTransportPool().get( trid )
+
+  @staticmethod
+  def __isAlive( trid ):
+    """ An idle transport is broken if it was removed, or if the peer closed it or sent something
+    """
+    transport = getGlobalTransportPool().get( trid )
+    if not transport:
+      return False
+    # poll, select does not take the file descriptors above FD_SETSIZE
+    try:
+      poller = select.poll()
+      poller.register( transport.getSocket(), select.POLLIN )
+      return not poller.poll( 0 )
+    except Exception:
+      return False
+
+  def release( self, trid, key = None ):
+    """ Gives back a transport after a call, it is closed unless the service accepted to keep it open
+
+        :param str trid: transport id in the transport pool
+        :param key: service address and credentials of the transport, to keep it for the next calls with this key
+    """
+    toClose = [ trid ]
+    if key is not None:
+      with self.__lock:
+        connections = self.__idle.setdefault( key, [] )
+        connections.append( ( time.time(), trid ) )
+        toClose = [ connTrid for _releaseTime, connTrid in connections[ :-self.__maxIdleConnections ] ]
+        del connections[ :-self.__maxIdleConnections ]
+    for connTrid in toClose:
+      getGlobalTransportPool().close( connTrid )
+
+  def generateRequestId( self ):
+    """ Identifier of a call, sent to the service and returned in its response
+    """
+    with self.__lock:
+      self.__requestCounter += 1
+      return self.__requestCounter
+
+  def __closeExpired( self ):
+    """ Closes the transports idle for more than maxIdleTime
+    """
+    limit = time.time() - self.__maxIdleTime
+    toClose = []
+    with self.__lock:
+      for key in list( self.__idle ):
+        connections = self.__idle[ key ]
+        expired = [ trid for releaseTime, trid in connections if releaseTime < limit ]
+        if expired:
+          toClose += expired
+          connections[ :len( expired ) ] = []
+          if not connections:
+            del self.__idle[ key ]
+      self.__stats[ 'Expired' ] += len( toClose )
+    for trid in toClose:
+      getGlobalTransportPool().close( trid )
+
+  def closeAll( self ):
+    """ Closes all the idle transports
+    """
+    with self.__lock:
+      toClose = [ trid for connections in self.__idle.values() for _releaseTime, trid in connections ]
+      self.__idle = {}
+    for trid in toClose:
+      getGlobalTransportPool().close( trid )
+
+  def isInherited( self ):
+    """ Whether the pool was created by the parent of the current process
+    """
+    return self.__pid != os.getpid()
+
+  def getStats( self ):
+    """ Connections opened, each of them with a handshake, calls done through an idle connection and
+        reuse rate, idle connections closed because they expired or were broken
+
+        :return: dict
+    """
+    with self.__lock:
+      stats = dict( self.__stats )
+      stats[ 'IdleConnections' ] = sum( len( connections ) for connections in self.__idle.values() )
+    calls = stats[ 'Connections' ] + stats[ 'Reused' ]
+    stats[ 'ReuseRate' ] = float( stats[ 'Reused' ] ) / calls if calls else 0.
+    return stats
+
+
+gConnectionPool = None
+
+def getGlobalConnectionPool():
+  global gConnectionPool
+  # The idle transports inherited from the parent process are dropped without closing them,
+  # closing would shut down the connections of the parent
+  if not gConnectionPool or gConnectionPool.isInherited():
+    gConnectionPool = ConnectionPool()
+  return gConnectionPool
@@ -0,0 +1,207 @@
+""" Event loop accepting the connections of the services before they reach their threads
+
+    The ConnectionReactor watches the listening sockets and the accepted connections with epoll (poll where
+    epoll is not available). The handshake of the accepted connections and the reception of their action
+    proposal are done without blocking, step by step as the clients send their data. Only the connections
+    whose proposal is there are handed to the services, so slow or idle clients do not hold any thread,
+    and the clients which do not send their proposal in time are closed.
+"""
+
+__RCSID__ = "$Id$"
+
+import time
+import errno
+import select
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.ConfigurationSystem.Client.Helpers import Registry
+
+
+class Poller( object ):
+  """ Minimal wrapper of epoll, or of poll where epoll is not available
+  """
+
+  def __init__( self ):
+    if hasattr( select, 'epoll' ):
+      self.__poller = select.epoll()
+      self.__masks = { 'read' : select.EPOLLIN, 'write' : select.EPOLLOUT }
+      self.__timeoutUnit = 1
+    else:
+      self.__poller = select.poll()
+      self.__masks = { 'read' : select.POLLIN, 'write' : select.POLLOUT }
+      self.__timeoutUnit = 1000
+
+  def register( self, fd, waitFor = 'read' ):
+    self.__poller.register( fd, self.__masks[ waitFor ] )
+
+  def modify( self, fd, waitFor ):
+    self.__poller.modify( fd, self.__masks[ waitFor ] )
+
+  def unregister( self, fd ):
+    try:
+      self.__poller.unregister( fd )
+    except ( IOError, KeyError, ValueError ):
+      pass
+
+  def poll( self, timeout ):
+    """ File descriptors ready, waiting at most timeout seconds
+
+        :return: list of ( fd, event )
+    """
+    try:
+      return self.__poller.poll( timeout * self.__timeoutUnit )
+    except ( IOError, select.error ) as e:
+      if e.args[0] == errno.EINTR:
+        return []
+      raise
+
+
+class ConnectionReactor( object ):
+  """ Accepts the connections of the listening transports, does their handshake and receives their
+      proposal without blocking, and hands them to the callback once their proposal is there
+  """
+
+  # The services refuse the proposals bigger than this
+  maxProposalSize = 1024
+
+  def __init__( self, connectionCallback ):
+    """
+      :param connectionCallback: function called with the name of the listener, the client transport and
+                                 the seconds taken by its handshake and proposal
+    """
+    self.__callback = connectionCallback
+    self.__poller = Poller()
+    # fd : { 'name', 'transport', 'timeout' }
+    self.__listeners = {}
+    # fd : { 'name', 'transport', 'startTime', 'deadline', 'waitFor', 'handshakeDone' }
+    self.__pending = {}
+    self.__lastExpiration = time.time()
+    self.__stats = { 'Accepted' : 0, 'Handed' : 0, 'Banned' : 0, 'Failed' : 0, 'TimedOut' : 0, 'MaxFD' : 0 }
+
+  def addListener( self, name, transport, handshakeTimeout ):
+    """ Watches a listening transport
+
+        :param str name: name given to the callback with the connections of the transport
+        :param transport: listening transport
+        :param int handshakeTimeout: seconds given to the clients to do the handshake and send their proposal
+    """
+    fd = transport.getSocket().fileno()
+    self.__listeners[ fd ] = { 'name' : name, 'transport' : transport, 'timeout' : handshakeTimeout }
+    self.__poller.register( fd )
+    return S_OK()
+
+  def getStats( self ):
+    """ Connections accepted, handed to the services, refused, failed, timed out and pending,
+        and maximum file descriptor seen
+
+        :return: dict
+    """
+    stats = dict( self.__stats )
+    stats[ 'Pending' ] = len( self.__pending )
+    return stats
+
+  def processEvents( self, timeout = 1 ):
+    """ Processes the events of the sockets, waiting at most timeout seconds for them
+    """
+    for fd, _event in self.__poller.poll( timeout ):
+      if fd in self.__listeners:
+        self.__acceptConnection( fd )
+      elif fd in self.__pending:
+        self.__advanceConnection( fd )
+    now = time.time()
+    if now - self.__lastExpiration >= 1:
+      self.__lastExpiration = now
+      for fd in [ fd for fd in self.__pending if self.__pending[ fd ][ 'deadline' ] < now ]:
+        self.__stats[ 'TimedOut' ] += 1
+        self.__dropConnection( fd, "Handshake and proposal timeout exceeded" )
+
+  def closePending( self ):
+    """ Closes the connections not handed to the callback yet
+    """
+    for fd in self.__pending.keys():
+      self.__dropConnection( fd, "Reactor stopped" )
+
+  def __acceptConnection( self, listenerFD ):
+    listener = self.__listeners[ listenerFD ]
+    try:
+      result = listener[ 'transport' ].acceptConnection()
+    except Exception as e:
+      gLogger.warn( "Error while accepting a connection: ", str( e ) )
+      return
+    if not result[ 'OK' ]:
+      gLogger.warn( "Error while accepting a connection: ", result[ 'Message' ] )
+      return
+    clientTransport = result[ 'Value' ]
+    self.__stats[ 'Accepted' ] += 1
+    # Is it banned?
+    clientIP = clientTransport.getRemoteAddress()[0]
+    if clientIP in Registry.getBannedIPs():
+      gLogger.warn( "Client connected from banned ip %s" % clientIP )
+      self.__stats[ 'Banned' ] += 1
+      clientTransport.close()
+      return
+    clientTransport.setBlocking( False )
+    fd = clientTransport.getSocket().fileno()
+    self.__stats[ 'MaxFD' ] = max( self.__stats[ 'MaxFD' ], fd )
+    now = time.time()
+    self.__pending[ fd ] = { 'name' : listener[ 'name' ], 'transport' : clientTransport, 'startTime' : now,
+                             'deadline' : now + listener[ 'timeout' ], 'waitFor' : 'read',
+                             'handshakeDone' : False }
+    self.__poller.register( fd )
+    # The client may have sent its data already
+    self.__advanceConnection( fd )
+
+  def __advanceConnection( self, fd ):
+    """ Goes on with the handshake and the reception of the proposal as far as possible
+    """
+    pending = self.__pending[ fd ]
+    clientTransport = pending[ 'transport' ]
+    try:
+      if not pending[ 'handshakeDone' ]:
+        result = clientTransport.handshakeStep()
+        if not result[ 'OK' ]:
+          self.__stats[ 'Failed' ] += 1
+          self.__dropConnection( fd, result[ 'Message' ] )
+          return
+        if result[ 'Value' ]:
+          self.__waitFor( fd, result[ 'Value' ] )
+          return
+        pending[ 'handshakeDone' ] = True
+      result = clientTransport.bufferIncomingData( self.maxProposalSize )
+    except Exception as e:
+      gLogger.exception( "Exception while receiving a connection" )
+      result = S_ERROR( str( e ) )
+    if not result[ 'OK' ]:
+      self.__stats[ 'Failed' ] += 1
+      self.__dropConnection( fd, result[ 'Message' ] )
+      return
+    if not result[ 'Value' ]:
+      self.__waitFor( fd, 'read' )
+      return
+    # The proposal is there, the connection goes on in the threads of the service
+    self.__poller.unregister( fd )
+    del self.__pending[ fd ]
+    self.__stats[ 'Handed' ] += 1
+    try:
+      clientTransport.setBlocking( True )
+      self.__callback( pending[ 'name' ], clientTransport, time.time() - pending[ 'startTime' ] )
+    except Exception:
+      gLogger.exception( "Exception while handling a connection" )
+      clientTransport.close()
+
+  def __waitFor( self, fd, waitFor ):
+    pending = self.__pending[ fd ]
+    if pending[ 'waitFor' ] != waitFor:
+      pending[ 'waitFor' ] = waitFor
+      self.__poller.modify( fd, waitFor )
+
+  def __dropConnection( self, fd, reason ):
+    pending = self.__pending.pop( fd )
+    self.__poller.unregister( fd )
+    clientTransport = pending[ 'transport' ]
+    gLogger.verbose( "Closing connection before its proposal", "%s: %s" % ( str( clientTransport.getRemoteAddress() ),
+                                                                             reason ) )
+    try:
+      clientTransport.close()
+    except Exception:
+      pass
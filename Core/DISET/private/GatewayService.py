@@ -116,6 +116,11 @@ class GatewayService( Service ):
       self._transportPool.close( trid )
     return result
 
+  def _acceptPersistentConnection( self, proposalTuple ):
+    """ The gateway closes the connections after each action
+    """
+    return False
+
   def _receiveAndCheckProposal( self, trid ):
     clientTransport = self._transportPool.get( trid )
     #Get the peer credentials
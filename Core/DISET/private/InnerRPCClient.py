@@ -4,8 +4,9 @@
 __RCSID__ = "$Id$"
 
 from DIRAC.Core.DISET.private.BaseClient import BaseClient
-from DIRAC.Core.Utilities.ReturnValues import S_OK
-from DIRAC.Core.Utilities.DErrno import cmpError, ENOAUTH
+from DIRAC.Core.DISET.private.Compression import gClientCompressionStats
+from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
+from DIRAC.Core.Utilities.DErrno import cmpError, ENOAUTH, ECONNLOST
 
 class InnerRPCClient( BaseClient ):
   """ This class instruments the BaseClient to perform RPC calls.
@@ -15,6 +16,10 @@ class InnerRPCClient( BaseClient ):
         * sends the method parameters
         * retrieve the result
         * disconnect
+
+      With persistent connections, it reuses the connection of a previous call
+      instead of connecting, and it does not disconnect if the server agreed to
+      keep the connection open.
   """
 
   # Number of times we retry the call.
@@ -32,18 +37,39 @@ class InnerRPCClient( BaseClient ):
 
 
     """
-    retVal = self._connect()
-
     # Generate the stub which contains all the connection and call options
     stub = ( self._getBaseStub(), functionName, args )
+
+    # Try the idle persistent connections first. The server may have closed them, in which
+    # case the action could not be proposed and the next one is tried. Any other error is the
+    # answer of the server to the proposal and is returned as is
+    connection = self._getIdleConnection()
+    while connection:
+      trid, transport = connection
+      keepConnection = False
+      try:
+        retVal = self._proposeAction( transport, ( "RPC", functionName ), persistent = True )
+        if retVal[ 'OK' ]:
+          retVal, keepConnection = self.__sendArguments( transport, retVal, args, stub )
+          return retVal
+        if not cmpError( retVal, ECONNLOST ):
+          retVal[ 'rpcStub' ] = stub
+          return retVal
+      finally:
+        self._disconnect( trid, keepConnection )
+      connection = self._getIdleConnection()
+
+    retVal = self._connect()
+
     if not retVal[ 'OK' ]:
       retVal[ 'rpcStub' ] = stub
       return retVal
     # Get the transport connection ID as well as the Transport object
     trid, transport = retVal[ 'Value' ]
+    keepConnection = False
     try:
       # Handshake to perform the RPC call for functionName
-      retVal = self._proposeAction( transport, ( "RPC", functionName ) )
+      retVal = self._proposeAction( transport, ( "RPC", functionName ), persistent = True )
       if not retVal['OK']:
         if cmpError( retVal, ENOAUTH ):  # This query is unauthorized
           retVal[ 'rpcStub' ] = stub
@@ -56,15 +82,39 @@ class InnerRPCClient( BaseClient ):
             retVal[ 'rpcStub' ] = stub
             return retVal
 
-      # Send the arguments to the function
-      retVal = transport.sendData( S_OK( args ) )
-      if not retVal[ 'OK' ]:
-        return retVal
-
-      # Get the result of the call and append the stub to it
-      receivedData = transport.receiveData()
-      if isinstance( receivedData, dict ):
-        receivedData[ 'rpcStub' ] = stub
-      return receivedData
+      retVal, keepConnection = self.__sendArguments( transport, retVal, args, stub )
+      return retVal
     finally:
-      self._disconnect( trid )
+      self._disconnect( trid, keepConnection )
+
+  @staticmethod
+  def __sendArguments( transport, proposalResult, args, stub ):
+    """ Send the arguments of the accepted action and receive its result
+
+        :param transport: the Transport object
+        :param dict proposalResult: what the server answered to the proposal
+        :param args: arguments to the function
+        :param stub: the connection stub, added to the result
+
+        :return: tuple ( result of the call, True if the connection can be used for other calls )
+    """
+    # Send the arguments to the function
+    retVal = transport.sendData( S_OK( args ) )
+    if not retVal[ 'OK' ]:
+      return retVal, False
+
+    # Get the result of the call and append the stub to it
+    receivedData = transport.receiveData()
+    gClientCompressionStats.add( stub[1], transport.getCompressionStats() )
+    keepConnection = False
+    if isinstance( receivedData, dict ):
+      # The servers keeping the connection open tag the result with the id of the request
+      requestId = receivedData.pop( 'requestId', None )
+      if requestId is not None:
+        if requestId == proposalResult.get( 'requestId' ):
+          keepConnection = proposalResult.get( 'persistent', False )
+        else:
+          receivedData = S_ERROR( "Received the response to request %s instead of %s" % ( requestId,
+                                                                                          proposalResult.get( 'requestId' ) ) )
+      receivedData[ 'rpcStub' ] = stub
+    return receivedData, keepConnection
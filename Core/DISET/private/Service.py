@@ -21,6 +21,9 @@ from DIRAC.Core.DISET.private.LockManager import LockManager
 from DIRAC.FrameworkSystem.Client.MonitoringClient import MonitoringClient
 from DIRAC.Core.DISET.private.ServiceConfiguration import ServiceConfiguration
 from DIRAC.Core.DISET.private.TransportPool import getGlobalTransportPool
+from DIRAC.Core.DISET.private.Compression import COMPRESSION_CODECS, CompressionStats
+from DIRAC.Core.DISET.private.ServiceTimes import ServiceTimes
+from DIRAC.Core.DISET.private.ConnectionReactor import Poller
 from DIRAC.Core.DISET.private.MessageBroker import MessageBroker, MessageSender
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.Core.Utilities.ThreadPool import ThreadPool
@@ -65,11 +68,22 @@ class Service( object ):
     else:
       self._monitor = MonitoringClient()
     self.__monitorLastStatsUpdate = time.time()
-    self._stats = { 'queries' : 0, 'connections' : 0 }
+    self._stats = { 'queries' : 0, 'connections' : 0, 'reusedConnections' : 0 }
     self._authMgr = AuthManager( "%s/Authorization" % PathFinder.getServiceSection( serviceData[ 'loadName' ] ) )
     self._transportPool = getGlobalTransportPool()
     self.__cloneId = 0
     self.__maxFD = 0
+    # Persistent connections waiting for the next proposal, trid : ( time since when they are idle, fd )
+    self.__idleTransports = {}
+    # fd : trid of the idle connections, watched by the poller
+    self.__idleFDs = {}
+    self.__idlePoller = None
+    self.__idleTimeout = self._cfg.getPersistentConnectionTimeout()
+    self.__idleLock = threading.Lock()
+    self.__idleThread = None
+    self.__compressionThreshold = self._cfg.getCompressionThreshold()
+    self._compressionStats = CompressionStats()
+    self._times = ServiceTimes()
 
   def setCloneProcessId( self, cloneId ):
     self.__cloneId = cloneId
@@ -106,7 +120,9 @@ class Service( object ):
                               'URL' : self._cfg.getURL(),
                               'messageSender' : MessageSender( self._name, self._msgBroker ),
                               'validNames' : self._validNames,
-                              'csPaths' : [ PathFinder.getServiceSection( svcName ) for svcName in self._validNames ]
+                              'csPaths' : [ PathFinder.getServiceSection( svcName ) for svcName in self._validNames ],
+                              'compressionStats' : self._compressionStats,
+                              'serviceTimes' : self._times
                             }
     #Call static initialization function
     try:
@@ -248,6 +264,16 @@ class Service( object ):
     self._monitor.registerActivity( 'ActiveQueries', "Active queries", 'Framework', 'threads', MonitoringClient.OP_MEAN )
     self._monitor.registerActivity( 'RunningThreads', "Running threads", 'Framework', 'threads', MonitoringClient.OP_MEAN )
     self._monitor.registerActivity( 'MaxFD', "Max File Descriptors", 'Framework', 'fd', MonitoringClient.OP_MEAN )
+    self._monitor.registerActivity( 'ReusedConnections', "Queries received on persistent connections", 'Framework',
+                                    "queries", MonitoringClient.OP_RATE )
+    self._monitor.registerActivity( 'IdleConnections', "Idle persistent connections", 'Framework',
+                                    "connections", MonitoringClient.OP_MEAN )
+    self._monitor.registerActivity( 'HandshakeTime', "Time to handshake and receive the proposal", 'Framework',
+                                    "seconds", MonitoringClient.OP_MEAN )
+    self._monitor.registerActivity( 'QueueTime', "Time waiting for a thread", 'Framework',
+                                    "seconds", MonitoringClient.OP_MEAN )
+    self._monitor.registerActivity( 'ExecutionTime', "Time to execute the actions", 'Framework',
+                                    "seconds", MonitoringClient.OP_MEAN )
 
     self._monitor.setComponentExtraParam( 'DIRACVersion', DIRAC.version )
     self._monitor.setComponentExtraParam( 'platform', DIRAC.getPlatform() )
@@ -270,6 +296,7 @@ class Service( object ):
     self._monitor.addMark( 'ActiveQueries', self._threadPool.numWorkingThreads() )
     self._monitor.addMark( 'RunningThreads', threading.activeCount() )
     self._monitor.addMark( 'MaxFD', self.__maxFD )
+    self._monitor.addMark( 'IdleConnections', len( self.__idleTransports ) )
     self.__maxFD = 0
 
 
@@ -278,18 +305,36 @@ class Service( object ):
 
   #End of initialization functions
 
-  def handleConnection( self, clientTransport ):
+  def handleConnection( self, clientTransport, handshakeTime = None ):
     """
       This method may be called by ServiceReactor.
       The method stacks openened connection in a queue, another thread
       read this queue and handle connection.
 
       :param clientTransport: Object wich describe opened connection (PlainTransport or SSLTransport)
+      :param handshakeTime: seconds taken by the handshake and the reception of the proposal,
+                            when the ServiceReactor did them before handing the connection
     """
     self._stats[ 'connections' ] += 1
     self._monitor.setComponentExtraParam( 'queries', self._stats[ 'connections' ] )
-    self._threadPool.generateJobAndQueueIt( self._processInThread,
-                                            args = ( clientTransport, ) )
+    self._monitor.addMark( "Connections" )
+    if handshakeTime is not None:
+      self.__addTime( 'Handshake', handshakeTime )
+    self.__queueJob( self._processInThread, clientTransport )
+
+  def __queueJob( self, function, *args ):
+    """
+    Queue a function in the thread pool, measuring the time it waits for a thread
+    """
+    self._threadPool.generateJobAndQueueIt( self.__runQueuedJob, args = ( function, time.time() ) + args )
+
+  def __runQueuedJob( self, function, queuedTime, *args ):
+    self.__addTime( 'Queue', time.time() - queuedTime )
+    return function( *args )
+
+  def __addTime( self, phase, seconds ):
+    self._times.add( phase, seconds )
+    self._monitor.addMark( "%sTime" % phase, seconds )
 
   #Threaded process function
   def _processInThread( self, clientTransport ):
@@ -298,7 +343,7 @@ class Service( object ):
     Connection may be opened via ServiceReactor.__acceptIncomingConnection
 
 
-    - Do the SSL/TLS Handshake (if dips is used) and extract credentials
+    - Do the SSL/TLS Handshake (if dips is used and ServiceReactor did not do it) and extract credentials
     - Get the action called by the client
     - Check if the client is authorized to perform ation
       - If not, connection is closed
@@ -311,6 +356,9 @@ class Service( object ):
     - Receive arguments/file/something else (depending on action) in the RequestHandler
     - Executing the action asked by the client
 
+    If the client asked for a persistent connection, the transport is not closed after a RPC
+    but waits for the next proposal, which is then processed by _processNextProposal.
+
     :param clientTransport: Object who describe the opened connection (SSLTransport or PlainTransport)
 
     :return: S_OK with "closeTransport" a boolean to indicate if th connection have to be closed
@@ -324,7 +372,7 @@ class Service( object ):
     except Exception:
       monReport = False
     try:
-      #Handshake
+      #Handshake, unless the ServiceReactor did it
       try:
         result = clientTransport.handshake()
         if not result[ 'OK' ]:
@@ -336,31 +384,149 @@ class Service( object ):
       trid = self._transportPool.add( clientTransport )
       if not trid:
         return
-      #Receive and check proposal
-      result = self._receiveAndCheckProposal( trid )
-      if not result[ 'OK' ]:
-        self._transportPool.sendAndClose( trid, result )
-        return
-      proposalTuple = result[ 'Value' ]
-      #Instantiate handler
-      result = self._instantiateHandler( trid, proposalTuple )
-      if not result[ 'OK' ]:
-        self._transportPool.sendAndClose( trid, result )
-        return
-      handlerObj = result[ 'Value' ]
-      #Execute the action
-      result = self._processProposal( trid, proposalTuple, handlerObj )
-      #Close the connection if required
-      if result[ 'closeTransport' ] or not result[ 'OK' ]:
-        if not result[ 'OK' ]:
-          gLogger.error( "Error processing proposal", result[ 'Message' ] )
-        self._transportPool.close( trid )
-      return result
+      #Keep the credentials of the handshake, the proposals of a persistent connection start from them
+      self._transportPool.associateData( trid, 'handshakeCredentials',
+                                         dict( clientTransport.getConnectingCredentials() ) )
+      return self.__processTransportProposal( trid )
     finally:
       self._lockManager.unlockGlobal()
       if monReport:
         self.__endReportToMonitoring( *monReport )
 
+  def _processNextProposal( self, trid ):
+    """
+    Threaded process of the next proposal of a persistent connection, started when
+    the idle connection received something. It is either a proposal, a keep alive
+    or the client closing the connection.
+
+    :param trid: id of the transport in the transport pool
+    """
+    result = self._transportPool.receive( trid, 1024, blockAfterKeepAlive = False, idleReceive = True )
+    if not result[ 'OK' ]:
+      gLogger.debug( "Persistent connection closed", "%s: %s" % ( trid, result[ 'Message' ] ) )
+      self._transportPool.close( trid )
+      return
+    if result.get( 'keepAlive' ):
+      self.__addIdleTransport( trid )
+      return
+    clientTransport = self._transportPool.get( trid )
+    if not clientTransport:
+      return
+    #The authorization of the previous proposals modified the credentials
+    credDict = clientTransport.getConnectingCredentials()
+    credDict.clear()
+    credDict.update( self._transportPool.getAssociatedData( trid, 'handshakeCredentials' ) or {} )
+    self._stats[ 'reusedConnections' ] += 1
+    self._monitor.addMark( 'ReusedConnections' )
+    self._lockManager.lockGlobal()
+    try:
+      monReport = self.__startReportToMonitoring()
+    except Exception:
+      monReport = False
+    try:
+      return self.__processTransportProposal( trid )
+    finally:
+      self._lockManager.unlockGlobal()
+      if monReport:
+        self.__endReportToMonitoring( *monReport )
+
+  def __processTransportProposal( self, trid ):
+    """
+    Receive, check and execute a proposal of a transport, and close it or keep it
+    waiting for the next proposal
+    """
+    startTime = time.time()
+    try:
+      return self.__executeTransportProposal( trid )
+    finally:
+      self.__addTime( 'Execution', time.time() - startTime )
+
+  def __executeTransportProposal( self, trid ):
+    #Receive and check proposal
+    result = self._receiveAndCheckProposal( trid )
+    if not result[ 'OK' ]:
+      self._transportPool.sendAndClose( trid, result )
+      return
+    proposalTuple = result[ 'Value' ]
+    #Instantiate handler
+    result = self._instantiateHandler( trid, proposalTuple )
+    if not result[ 'OK' ]:
+      self._transportPool.sendAndClose( trid, result )
+      return
+    handlerObj = result[ 'Value' ]
+    #Execute the action
+    result = self._processProposal( trid, proposalTuple, handlerObj )
+    #Close the connection if required
+    if result.get( 'closeTransport', True ) or not result[ 'OK' ]:
+      if not result[ 'OK' ]:
+        gLogger.error( "Error processing proposal", result[ 'Message' ] )
+      self._transportPool.close( trid )
+    elif result.get( 'keepConnection' ):
+      self.__addIdleTransport( trid )
+    return result
+
+  def __addIdleTransport( self, trid ):
+    """
+    Wait for the next proposal of a persistent connection
+    """
+    clientTransport = self._transportPool.get( trid )
+    if not clientTransport:
+      return
+    if clientTransport.byteStream or clientTransport.receivedMessages:
+      #The next proposal is already there
+      self.__queueJob( self._processNextProposal, trid )
+      return
+    fd = clientTransport.getSocket().fileno()
+    with self.__idleLock:
+      if not self.__idlePoller:
+        self.__idlePoller = Poller()
+      self.__idleTransports[ trid ] = ( time.time(), fd )
+      self.__idleFDs[ fd ] = trid
+      #The fd may be left registered by a connection closed since
+      self.__idlePoller.unregister( fd )
+      self.__idlePoller.register( fd )
+      if not self.__idleThread:
+        self.__idleThread = threading.Thread( target = self.__watchIdleTransports )
+        self.__idleThread.setDaemon( True )
+        self.__idleThread.start()
+
+  def __removeIdleTransport( self, trid ):
+    """
+    Stop watching an idle persistent connection, with the idle lock held
+    """
+    _idleSince, fd = self.__idleTransports.pop( trid )
+    if self.__idleFDs.get( fd ) == trid:
+      del self.__idleFDs[ fd ]
+      self.__idlePoller.unregister( fd )
+
+  def __watchIdleTransports( self ):
+    """
+    Queue the processing of the idle persistent connections receiving something, and
+    close the ones idle for more than the PersistentConnectionTimeout
+    """
+    while True:
+      with self.__idleLock:
+        limit = time.time() - self.__idleTimeout
+        expired = [ trid for trid in self.__idleTransports if self.__idleTransports[ trid ][0] < limit ]
+        for trid in self.__idleTransports.keys():
+          if trid in expired or not self._transportPool.get( trid ):
+            self.__removeIdleTransport( trid )
+        if not self.__idleTransports and not expired:
+          self.__idleThread = None
+          return
+      for trid in expired:
+        gLogger.debug( "Closing idle persistent connection", trid )
+        self._transportPool.close( trid )
+      if not self.__idleTransports:
+        continue
+      for fd, _event in self.__idlePoller.poll( 1 ):
+        with self.__idleLock:
+          trid = self.__idleFDs.get( fd )
+          if trid is None:
+            continue
+          self.__removeIdleTransport( trid )
+        self.__queueJob( self._processNextProposal, trid )
+
 
   def _createIdentityString( self, credDict, clientTransport = None ):
     if 'username' in credDict:
@@ -486,11 +652,55 @@ class Service( object ):
       return S_ERROR( "Server error while loading handler" )
     return S_OK( handlerInstance )
 
+  @staticmethod
+  def _getProposalOptions( proposalTuple ):
+    """
+    Options of the proposal, sent by the clients asking for a persistent connection
+    """
+    if len( proposalTuple ) > 3 and isinstance( proposalTuple[3], dict ):
+      return proposalTuple[3]
+    return {}
+
+  def _acceptPersistentConnection( self, proposalTuple ):
+    """
+    The connections of the RPC are kept open if the client asks for it,
+    unless the PersistentConnectionTimeout of the service is 0
+    """
+    return bool( self.__idleTimeout ) and proposalTuple[1][0] == 'RPC' and \
+        bool( self._getProposalOptions( proposalTuple ).get( 'persistent' ) )
+
+  def _acceptCompression( self, proposalTuple ):
+    """
+    Codec chosen among the ones offered by the client to compress the messages of the RPC,
+    None if the CompressionThreshold of the service is 0
+    """
+    if not self.__compressionThreshold or proposalTuple[1][0] != 'RPC':
+      return None
+    offeredCodecs = self._getProposalOptions( proposalTuple ).get( 'compression', () )
+    for codec in COMPRESSION_CODECS:
+      if codec in offeredCodecs:
+        return codec
+    return None
+
   def _processProposal( self, trid, proposalTuple, handlerObj ):
-    #Notify the client we're ready to execute the action
-    retVal = self._transportPool.send( trid, S_OK() )
+    #Notify the client we're ready to execute the action, if the connection will be kept open
+    #and if the messages can be compressed
+    persistent = self._acceptPersistentConnection( proposalTuple )
+    codec = self._acceptCompression( proposalTuple )
+    answer = S_OK()
+    options = self._getProposalOptions( proposalTuple )
+    if 'requestId' in options:
+      answer[ 'requestId' ] = options[ 'requestId' ]
+    if persistent:
+      answer[ 'persistent' ] = True
+    if codec:
+      answer[ 'compression' ] = codec
+    retVal = self._transportPool.send( trid, answer )
     if not retVal[ 'OK' ]:
       return retVal
+    clientTransport = self._transportPool.get( trid )
+    if clientTransport:
+      clientTransport.setCompression( codec, self.__compressionThreshold )
 
     messageConnection = False
     if proposalTuple[1] == ( 'Connection', 'new' ):
@@ -510,13 +720,16 @@ class Service( object ):
                                       listenToConnection = False )
 
     result = self._executeAction( trid, proposalTuple, handlerObj )
+    if codec and clientTransport:
+      self._compressionStats.add( proposalTuple[1][1], clientTransport.getCompressionStats() )
     if result[ 'OK' ] and messageConnection:
       self._msgBroker.listenToTransport( trid )
       result = self._mbConnect( trid, handlerObj )
       if not result[ 'OK' ]:
         self._msgBroker.removeTransport( trid )
 
-    result[ 'closeTransport' ] = not messageConnection or not result[ 'OK' ]
+    result[ 'closeTransport' ] = not ( messageConnection or persistent ) or not result[ 'OK' ]
+    result[ 'keepConnection' ] = persistent
     return result
 
   def _mbConnect( self, trid, handlerObj = None ):
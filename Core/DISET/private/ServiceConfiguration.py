@@ -5,6 +5,7 @@ from DIRAC.Core.Utilities import Network, List
 from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
 from DIRAC.ConfigurationSystem.Client import PathFinder
 from DIRAC.Core.DISET.private.Protocols import gDefaultProtocol
+from DIRAC.Core.DISET.private.Compression import DEFAULT_COMPRESSION_THRESHOLD
 
 class ServiceConfiguration:
 
@@ -80,6 +81,24 @@ class ServiceConfiguration:
     except:
       return 15
 
+  def getPersistentConnectionTimeout( self ):
+    try:
+      return int( self.getOption( "PersistentConnectionTimeout" ) )
+    except:
+      return 120
+
+  def getCompressionThreshold( self ):
+    try:
+      return int( self.getOption( "CompressionThreshold" ) )
+    except:
+      return DEFAULT_COMPRESSION_THRESHOLD
+
+  def getHandshakeTimeout( self ):
+    try:
+      return int( self.getOption( "HandshakeTimeout" ) )
+    except:
+      return 30
+
   def getCloneProcesses( self ):
     try:
       return int( self.getOption( "CloneProcesses" ) )
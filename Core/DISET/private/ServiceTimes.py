@@ -0,0 +1,41 @@
+""" Times spent by the connections of a service in each phase of their processing
+
+    * Handshake: from the connection to the reception of the proposal, handshake included
+    * Queue: waiting in the queue of the thread pool of the service
+    * Execution: from the proposal to the result of the action
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+
+SERVICE_PHASES = ( 'Handshake', 'Queue', 'Execution' )
+
+
+class ServiceTimes( object ):
+  """ Number, mean and maximum of the times of each phase, thread safe
+  """
+
+  def __init__( self ):
+    self.__lock = threading.Lock()
+    self.__times = dict( ( phase, { 'Count' : 0, 'Total' : 0., 'Max' : 0. } ) for phase in SERVICE_PHASES )
+
+  def add( self, phase, seconds ):
+    """ Adds the time of a connection to a phase
+    """
+    with self.__lock:
+      phaseTimes = self.__times[ phase ]
+      phaseTimes[ 'Count' ] += 1
+      phaseTimes[ 'Total' ] += seconds
+      phaseTimes[ 'Max' ] = max( phaseTimes[ 'Max' ], seconds )
+
+  def getStats( self ):
+    """ Number of connections, total, mean and maximum time in seconds of each phase
+
+        :return: dict
+    """
+    with self.__lock:
+      stats = dict( ( phase, dict( phaseTimes ) ) for phase, phaseTimes in self.__times.items() )
+    for phaseTimes in stats.values():
+      phaseTimes[ 'Mean' ] = phaseTimes[ 'Total' ] / max( phaseTimes[ 'Count' ], 1 )
+    return stats
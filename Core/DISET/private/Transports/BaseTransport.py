@@ -21,13 +21,31 @@ Client <- Service        : Close
 __RCSID__ = "$Id$"
 
 import time
+import errno
 import select
-import cStringIO
+import socket
 from hashlib import md5
 
 from DIRAC.Core.Utilities.ReturnValues import S_ERROR, S_OK
+from DIRAC.Core.Utilities.DErrno import ECONNLOST
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 from DIRAC.Core.Utilities import DEncode
+from DIRAC.Core.DISET.private.Compression import compressData, decompressData
+
+# errno of the socket errors telling that the peer is gone, -1 being the unexpected EOF of the SSL layer
+CONNECTION_LOST_ERRNOS = ( errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED, -1 )
+
+def connectionError( message, exception ):
+  """ Builds the error of a failed socket operation, with the ECONNLOST errno when the peer is gone,
+      so that the callers know that the connection can be replaced by a new one
+
+      :param str message: what was being done
+      :param exception: the exception raised by the socket
+  """
+  message = "%s: %s" % ( message, str( exception ) )
+  if exception.args and exception.args[0] in CONNECTION_LOST_ERRNOS:
+    return S_ERROR( ECONNLOST, message )
+  return S_ERROR( message )
 
 class BaseTransport( object ):
   """ Invokes DEncode for marshaling/unmarshaling of data calls in transit
@@ -40,6 +58,9 @@ class BaseTransport( object ):
   iListenQueueSize = 128
   iReadTimeout = 600
   keepAliveMagic = "dka"
+  compressionMagic = "z"
+  # Bytes of payload sent in the same write as the length header, the rest is sent without copy
+  iHeaderPayloadSize = 65536
 
   def __init__( self, stServerAddress, bServerMode = False, **kwargs ):
     self.bServerMode = bServerMode
@@ -56,6 +77,9 @@ class BaseTransport( object ):
     self.sentKeepAlives = 0
     self.waitingForKeepAlivePong = False
     self.__keepAliveLapse = 0
+    self.__compressionCodec = None
+    self.__compressionThreshold = 0
+    self.__compressionStats = { 'Messages' : 0, 'RawBytes' : 0, 'CompressedBytes' : 0, 'Time' : 0. }
     self.oSocket = None
     if 'keepAliveLapse' in kwargs:
       try:
@@ -75,11 +99,51 @@ class BaseTransport( object ):
   def getKeepAliveLapse( self ):
     return self.__keepAliveLapse
 
+  def setCompression( self, codec, threshold = 0 ):
+    """ Compresses the messages bigger than threshold with the codec negotiated with the peer
+
+        :param codec: codec accepted by the peer, None to send the messages uncompressed
+        :param int threshold: size in bytes above which the messages are compressed
+    """
+    self.__compressionCodec = codec
+    self.__compressionThreshold = threshold
+
+  def getCompressionStats( self ):
+    """ Messages compressed or decompressed since the previous call, their size before and
+        after compression and the time spent compressing and decompressing them
+
+        :return: dict
+    """
+    stats = self.__compressionStats
+    self.__compressionStats = dict( ( key, 0 ) for key in stats )
+    return stats
+
+  def __addCompressionStats( self, rawBytes, compressedBytes, elapsedTime ):
+    self.__compressionStats[ 'Messages' ] += 1
+    self.__compressionStats[ 'RawBytes' ] += rawBytes
+    self.__compressionStats[ 'CompressedBytes' ] += compressedBytes
+    self.__compressionStats[ 'Time' ] += elapsedTime
+
   def handshake( self ):
     """ This method is overwritten by SSLTransport if we use a secured transport.
     """
     return S_OK()
 
+  def handshakeStep( self ):
+    """ Advances the handshake without blocking, overwritten by SSLTransport as the handshake.
+
+        :return: S_OK with 'read' or 'write' while the handshake waits for the socket, False once it is done
+    """
+    return S_OK( False )
+
+  def setBlocking( self, blocking ):
+    """ Switches the socket to non blocking mode, and back to its timeout
+    """
+    if blocking:
+      self.oSocket.settimeout( self.extraArgsDict.get( 'timeout' ) )
+    else:
+      self.oSocket.settimeout( 0 )
+
   def close( self ):
     self.oSocket.close()
 
@@ -143,40 +207,118 @@ class BaseTransport( object ):
       if skipReadyCheck or self._readReady():
         data = self.oSocket.recv( bufSize )
         if not data:
-          return S_ERROR( "Connection closed by peer" )
+          return S_ERROR( ECONNLOST, "Connection closed by peer" )
         else:
           return S_OK( data )
       else:
         return S_ERROR( "Connection seems stalled. Closing..." )
     except Exception as e:
-      return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
+      return connectionError( "Exception while reading from peer", e )
+
+  def _readNonBlocking( self, bufSize = 16384 ):
+    """ Reads what is available, the socket being non blocking
+
+        :return: S_OK( data ), S_OK( None ) if nothing is available yet
+    """
+    try:
+      data = self.oSocket.recv( bufSize )
+    except socket.error as e:
+      if e.args[0] in ( errno.EAGAIN, errno.EWOULDBLOCK ):
+        return S_OK( None )
+      return connectionError( "Exception while reading from peer", e )
+    if not data:
+      return S_ERROR( ECONNLOST, "Connection closed by peer" )
+    return S_OK( data )
+
+  def bufferIncomingData( self, maxBufferSize = 0 ):
+    """ Appends to the byteStream what the peer sent, without blocking. The socket must be non blocking.
+
+        :param int maxBufferSize: size above which the message is refused
+        :return: S_OK( True ) once the byteStream holds a whole message or keep alive, S_OK( False ) until then
+    """
+    while True:
+      result = self._readNonBlocking()
+      if not result[ 'OK' ]:
+        return result
+      if result[ 'Value' ] is None:
+        break
+      self.byteStream += result[ 'Value' ]
+      #Enough for a whole message of the maximum size, the rest is for later
+      if maxBufferSize and len( self.byteStream ) > maxBufferSize + 11:
+        break
+    if self.byteStream.startswith( BaseTransport.keepAliveMagic ):
+      return S_OK( True )
+    iSeparatorPosition = self.byteStream.find( ":", 0, 11 )
+    if iSeparatorPosition == -1:
+      if len( self.byteStream ) > 11:
+        return S_ERROR( "Invalid message header" )
+      return S_OK( False )
+    isCompressed = self.byteStream.startswith( BaseTransport.compressionMagic )
+    try:
+      pkgSize = int( self.byteStream[ int( isCompressed ):iSeparatorPosition ] )
+    except ValueError:
+      return S_ERROR( "Invalid message header" )
+    if maxBufferSize and pkgSize > maxBufferSize:
+      return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
+    return S_OK( len( self.byteStream ) - iSeparatorPosition - 1 >= pkgSize )
+
+  def _readInto( self, view ):
+    """ Reads into the given memoryview, the transports able to receive without copy overwrite it
+
+        :return: S_OK( number of bytes read )
+    """
+    result = self._read( len( view ), skipReadyCheck = True )
+    if not result[ 'OK' ]:
+      return result
+    data = result[ 'Value' ]
+    view[ :len( data ) ] = data
+    return S_OK( len( data ) )
 
   def _write( self, buffer ):
     return S_OK( self.oSocket.send( buffer ) )
 
   def sendData( self, uData, prefix = False ):
+    """ Sends the encoded data after its length. The length is sent with the beginning of the data, the rest of the
+        data is written by packets of packetSize from a memoryview, without copying it
+    """
     self.__updateLastActionTimestamp()
     sCodedData = DEncode.encode( uData )
-    if prefix:
-      dataToSend = "%s%s:%s" % ( prefix, len( sCodedData ), sCodedData )
-    else:
-      dataToSend = "%s:%s" % ( len( sCodedData ), sCodedData )
-    for index in range( 0, len( dataToSend ), self.packetSize ):
-      bytesToSend = min( self.packetSize, len( dataToSend ) - index )
-      packSentBytes = 0
-      while packSentBytes < bytesToSend:
-        try:
-          result = self._write( dataToSend[ index + packSentBytes : index + bytesToSend ] )
-          if not result[ 'OK' ]:
-            return result
-          sentBytes = result[ 'Value' ]
-        except Exception as e:
-          return S_ERROR( "Exception while sending data: %s" % e )
-        if sentBytes == 0:
-          return S_ERROR( "Connection closed by peer" )
-        packSentBytes += sentBytes
-    del sCodedData
-    sCodedData=None
+    if self.__compressionCodec and not prefix and len( sCodedData ) > self.__compressionThreshold:
+      startTime = time.time()
+      rawBytes = len( sCodedData )
+      sCodedData = compressData( self.__compressionCodec, sCodedData )
+      self.__addCompressionStats( rawBytes, len( sCodedData ), time.time() - startTime )
+      prefix = BaseTransport.compressionMagic
+    header = "%s%s:" % ( prefix or "", len( sCodedData ) )
+    payload = memoryview( sCodedData )
+    # Small write followed by the rest would wait for the peer acknowledgment
+    firstPacket = header + sCodedData[ :self.iHeaderPayloadSize ]
+    result = self.__writeAll( firstPacket )
+    if not result[ 'OK' ]:
+      return result
+    for index in xrange( self.iHeaderPayloadSize, len( sCodedData ), self.packetSize ):
+      result = self.__writeAll( payload[ index : index + self.packetSize ] )
+      if not result[ 'OK' ]:
+        return result
+    return S_OK()
+
+  def __writeAll( self, packet ):
+    """ Writes the whole packet, a string or a memoryview, going on after partial writes
+    """
+    if isinstance( packet, str ):
+      packet = memoryview( packet )
+    packSentBytes = 0
+    while packSentBytes < len( packet ):
+      try:
+        result = self._write( packet[ packSentBytes: ] )
+        if not result[ 'OK' ]:
+          return result
+        sentBytes = result[ 'Value' ]
+      except Exception as e:
+        return connectionError( "Exception while sending data", e )
+      if sentBytes == 0:
+        return S_ERROR( ECONNLOST, "Connection closed by peer" )
+      packSentBytes += sentBytes
     return S_OK()
 
 
@@ -187,8 +329,8 @@ class BaseTransport( object ):
     #Buffer size can't be less than 0
     maxBufferSize = max( maxBufferSize, 0 )
     try:
-      #Look either for message length of keep alive magic string
-      iSeparatorPosition = self.byteStream.find( ":", 0, 10 )
+      #Look either for message length of keep alive magic string, the length can follow the compression magic
+      iSeparatorPosition = self.byteStream.find( ":", 0, 11 )
       keepAliveMagicLen = len( BaseTransport.keepAliveMagic )
       isKeepAlive = self.byteStream.find( BaseTransport.keepAliveMagic, 0, keepAliveMagicLen ) == 0
       #While not found the message length or the ka, keep receiving
@@ -199,11 +341,11 @@ class BaseTransport( object ):
           return retVal
         #If closed return error
         if not retVal[ 'Value' ]:
-          return S_ERROR( "Peer closed connection" )
+          return S_ERROR( ECONNLOST, "Peer closed connection" )
         #New data!
         self.byteStream += retVal[ 'Value' ]
         #Look again for either message length of ka magic string
-        iSeparatorPosition = self.byteStream.find( ":", 0, 10 )
+        iSeparatorPosition = self.byteStream.find( ":", 0, 11 )
         isKeepAlive = self.byteStream.find( BaseTransport.keepAliveMagic, 0, keepAliveMagicLen ) == 0
         #Over the limit?
         if maxBufferSize and len( self.byteStream ) > maxBufferSize and iSeparatorPosition == -1 :
@@ -216,37 +358,41 @@ class BaseTransport( object ):
         return self.__processKeepAlive( maxBufferSize, blockAfterKeepAlive )
       #From here it must be a real message!
       #Process the size and remove the msg length from the bytestream
-      pkgSize = int( self.byteStream[ :iSeparatorPosition ] )
-      pkgData = self.byteStream[ iSeparatorPosition + 1: ]
-      readSize = len( pkgData )
+      isCompressed = self.byteStream.startswith( BaseTransport.compressionMagic )
+      pkgSize = int( self.byteStream[ int( isCompressed ):iSeparatorPosition ] )
+      readSize = len( self.byteStream ) - iSeparatorPosition - 1
       if readSize >= pkgSize:
         #If we already have all the data we need
-        data = pkgData[ :pkgSize ]
-        self.byteStream = pkgData[ pkgSize: ]
+        data = self.byteStream[ iSeparatorPosition + 1 : iSeparatorPosition + 1 + pkgSize ]
+        self.byteStream = self.byteStream[ iSeparatorPosition + 1 + pkgSize: ]
       else:
-        #If we still need to read stuff
-        pkgMem = cStringIO.StringIO()
-        pkgMem.write( pkgData )
+        if maxBufferSize and pkgSize > maxBufferSize:
+          return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
+        #If we still need to read stuff, receive it in a buffer of the message size
+        pkgMem = bytearray( pkgSize )
+        pkgView = memoryview( pkgMem )
+        pkgView[ :readSize ] = self.byteStream[ iSeparatorPosition + 1: ]
+        self.byteStream = ""
         #Receive while there's still data to be received
         while readSize < pkgSize:
-          retVal = self._read( pkgSize - readSize, skipReadyCheck = True )
+          retVal = self._readInto( pkgView[ readSize: ] )
           if not retVal[ 'OK' ]:
             return retVal
           if not retVal[ 'Value' ]:
-            return S_ERROR( "Peer closed connection" )
-          rcvData = retVal[ 'Value' ]
-          readSize += len( rcvData )
-          pkgMem.write( rcvData )
-          if maxBufferSize and readSize > maxBufferSize:
-            return S_ERROR( "Read limit exceeded (%s chars)" % maxBufferSize )
-        #Data is here! take it out from the bytestream, dencode and return
-        if readSize == pkgSize:
-          data = pkgMem.getvalue()
-          self.byteStream = ""
-        else: #readSize > pkgSize:
-          pkgMem.seek( 0, 0 )
-          data = pkgMem.read( pkgSize )
-          self.byteStream = pkgMem.read()
+            return S_ERROR( ECONNLOST, "Peer closed connection" )
+          readSize += retVal[ 'Value' ]
+        #Data is here! dencode and return
+        del pkgView
+        data = str( pkgMem )
+        del pkgMem
+      if isCompressed:
+        try:
+          startTime = time.time()
+          compressedBytes = len( data )
+          data = decompressData( self.__compressionCodec, data, maxBufferSize )
+          self.__addCompressionStats( len( data ), compressedBytes, time.time() - startTime )
+        except Exception as e:
+          return S_ERROR( "Could not decompress received data: %s" % str( e ) )
       try:
         data = DEncode.decode( data )[0]
       except Exception as e:
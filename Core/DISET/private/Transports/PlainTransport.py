@@ -4,9 +4,10 @@ import socket
 import select
 import time
 import os
-from DIRAC.Core.DISET.private.Transports.BaseTransport import BaseTransport
+from DIRAC.Core.DISET.private.Transports.BaseTransport import BaseTransport, connectionError
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 from DIRAC.Core.Utilities.ReturnValues import S_ERROR, S_OK
+from DIRAC.Core.Utilities.DErrno import ECONNLOST
 
 class PlainTransport( BaseTransport ):
 
@@ -83,7 +84,26 @@ class PlainTransport( BaseTransport ):
         if e[0] == 11:
           time.sleep( 0.001 )
         else:
-          return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
+          return connectionError( "Exception while reading from peer", e )
+      except Exception as e:
+        return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
+
+  def _readInto( self, view ):
+    start = time.time()
+    timeout = False
+    if 'timeout' in self.extraArgsDict:
+      timeout = self.extraArgsDict[ 'timeout' ]
+    while True:
+      if timeout:
+        if time.time() - start > timeout:
+          return S_ERROR( "Socket read timeout exceeded" )
+      try:
+        return S_OK( self.oSocket.recv_into( view ) )
+      except socket.error, e:
+        if e[0] == 11:
+          time.sleep( 0.001 )
+        else:
+          return connectionError( "Exception while reading from peer", e )
       except Exception as e:
         return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
 
@@ -101,14 +121,14 @@ class PlainTransport( BaseTransport ):
             return S_ERROR( "Socket write timeout exceeded" )
         sent = self.oSocket.send( buffer[ sentBytes: ] )
         if sent == 0:
-          return S_ERROR( "Connection closed by peer" )
+          return S_ERROR( ECONNLOST, "Connection closed by peer" )
         if sent > 0:
           sentBytes += sent
       except socket.error, e:
         if e[0] == 11:
           time.sleep( 0.001 )
         else:
-          return S_ERROR( "Exception while sending to peer: %s" % str( e ) )
+          return connectionError( "Exception while sending to peer", e )
       except Exception as e:
         return S_ERROR( "Error while sending: %s" % str( e ) )
     return S_OK( sentBytes )
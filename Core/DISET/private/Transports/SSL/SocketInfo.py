@@ -4,6 +4,7 @@ __RCSID__ = "$Id$"
 import time
 import copy
 import os.path
+import hashlib
 import GSI
 from DIRAC.Core.Utilities.ReturnValues import S_ERROR, S_OK
 from DIRAC.Core.Utilities.Network import checkHostsMatch
@@ -14,15 +15,27 @@ from DIRAC.FrameworkSystem.Client.Logger import gLogger
 
 DEFAULT_SSL_CIPHERS = "ECDH+AESGCM:DH+AESGCM:ECDH+AES256:DH+AES256:ECDH+AES128:DH+AES:ECDH+3DES:DH+3DES:RSA+AESGCM:RSA+AES:RSA+3DES:!aNULL:!MD5:!DSS"
 
+# Options of the infoDict used to create the SSL contexts
+CONTEXT_OPTIONS = ( 'clientMode', 'sslMethod', 'sslCiphers', 'gsiEnable', 'skipCACheck', 'IgnoreCRLs',
+                    'SSLSessionTimeout' )
+# Maximum number of SSL contexts kept in the cache
+MAX_CACHED_CONTEXTS = 100
+
 class SocketInfo:
 
   __cachedCAsCRLs = False
   __cachedCAsCRLsLastLoaded = 0
+  __cachedCAsCRLsStamp = None
+  __cachedCAsCRLsGeneration = 0
   __cachedCAsCRLsLoadLock = LockRing().getLock()
-
+  # ( options, credentials ) : [ ( credentials files stamp, CAs generation ), sslContext, lastUsed ]
+  __cachedContexts = {}
+  __cachedContextsStats = { 'Hits' : 0, 'Misses' : 0, 'Invalidated' : 0 }
+  __cachedContextsLock = LockRing().getLock()
 
   def __init__( self, infoDict, sslContext = None ):
     self.__retry = 0
+    self.__handshakeStarted = False
     self.infoDict = infoDict
     if sslContext:
       self.sslContext = sslContext
@@ -127,20 +140,33 @@ class SocketInfo:
   def _serverCallback( self, conn, cert, errnum, depth, ok ):
     return ok
 
-  def __getCAStore( self ):
+  @staticmethod
+  def __getCAsCRLsStamp( casPath ):
+    """ The CAs directory is modified when CAs or CRLs are added, removed or replaced
+    """
+    try:
+      return ( casPath, os.stat( casPath ).st_mtime )
+    except OSError:
+      return ( casPath, None )
+
+  def __getCAsCRLs( self ):
+    """ Loads the valid CAs and CRLs, again when the CAs directory changed or after 15 minutes
+
+        :return: S_OK( ( generation, CAs list, CRLs list ) ), the generation changes at each load
+    """
+    casPath = Locations.getCAsLocation()
+    if not casPath:
+      return S_ERROR( "No valid CAs location found" )
+    stamp = self.__getCAsCRLsStamp( casPath )
     SocketInfo.__cachedCAsCRLsLoadLock.acquire()
     try:
-      if not SocketInfo.__cachedCAsCRLs or time.time() - SocketInfo.__cachedCAsCRLsLastLoaded > 900:
-        #Need to generate the CA Store
+      if not SocketInfo.__cachedCAsCRLs or stamp != SocketInfo.__cachedCAsCRLsStamp or \
+         time.time() - SocketInfo.__cachedCAsCRLsLastLoaded > 900:
         casDict = {}
         crlsDict = {}
-        casPath = Locations.getCAsLocation()
-        if not casPath:
-          return S_ERROR( "No valid CAs location found" )
         gLogger.debug( "CAs location is %s" % casPath )
         casFound = 0
         crlsFound = 0
-        SocketInfo.__caStore = GSI.crypto.X509Store()
         for fileName in os.listdir( casPath ):
           filePath = os.path.join( casPath, fileName )
           if not os.path.isfile( filePath ):
@@ -165,40 +191,127 @@ class SocketInfo:
           except:
             if fileName.find( ".0" ) == len( fileName ) - 2:
               gLogger.exception( "LOADING %s" % filePath )
-          if 'IgnoreCRLs' not in self.infoDict or not self.infoDict[ 'IgnoreCRLs' ]:
-            #Try to load CRL
-            try:
-              crl = GSI.crypto.load_crl( GSI.crypto.FILETYPE_PEM, pemData )
-              if crl.has_expired():
-                continue
-              crlID = crl.get_issuer().one_line()
-              crlsDict[ crlID ] = crl 
-              crlsFound += 1
+          #Try to load CRL
+          try:
+            crl = GSI.crypto.load_crl( GSI.crypto.FILETYPE_PEM, pemData )
+            if crl.has_expired():
               continue
-            except Exception as e:
-              if fileName.find( ".r0" ) == len( fileName ) - 2:
-                gLogger.exception( "LOADING %s ,Exception: %s" % ( filePath , str(e) ) )
+            crlID = crl.get_issuer().one_line()
+            crlsDict[ crlID ] = crl
+            crlsFound += 1
+            continue
+          except Exception as e:
+            if fileName.find( ".r0" ) == len( fileName ) - 2:
+              gLogger.exception( "LOADING %s ,Exception: %s" % ( filePath , str(e) ) )
 
         gLogger.debug( "Loaded %s CAs [%s CRLs]" % ( casFound, crlsFound ) )
         SocketInfo.__cachedCAsCRLs = ( [ casDict[k][1] for k in casDict ],
                                        [ crlsDict[k] for k in crlsDict ] )
         SocketInfo.__cachedCAsCRLsLastLoaded = time.time()
+        SocketInfo.__cachedCAsCRLsStamp = stamp
+        SocketInfo.__cachedCAsCRLsGeneration += 1
     except:
       gLogger.exception( "Failed to init CA store" )
     finally:
       SocketInfo.__cachedCAsCRLsLoadLock.release()
-    #Generate CA Store
+    if not SocketInfo.__cachedCAsCRLs:
+      return S_ERROR( "Failed to init CA store" )
+    return S_OK( ( SocketInfo.__cachedCAsCRLsGeneration, ) + SocketInfo.__cachedCAsCRLs )
+
+  def __getCAStore( self, casCRLs ):
     caStore = GSI.crypto.X509Store()
-    caList = SocketInfo.__cachedCAsCRLs[0]
-    for caCert in caList:
+    for caCert in casCRLs[1]:
       caStore.add_cert( caCert )
-    crlList = SocketInfo.__cachedCAsCRLs[1]
-    for crl in crlList:
-      caStore.add_crl( crl )
-    return S_OK( caStore )
+    if not self.__getValue( 'IgnoreCRLs', False ):
+      for crl in casCRLs[2]:
+        caStore.add_crl( crl )
+    return caStore
+
+  @staticmethod
+  def __getFilesStamp( filePaths ):
+    """ Modification time, size and inode of the credential files, to create the context again when they change
+    """
+    stamp = []
+    for filePath in filePaths:
+      try:
+        fileStat = os.stat( filePath )
+        stamp.append( ( fileStat.st_mtime, fileStat.st_size, fileStat.st_ino ) )
+      except OSError:
+        stamp.append( None )
+    return tuple( stamp )
+
+  def __getCachedContext( self, credentialsID, credentialsFiles, loadCredentials ):
+    """ Takes the SSL context of these options and credentials from the cache. It is created, and the credentials
+        loaded with loadCredentials, when it is not there yet, when the credential files were modified or when the
+        CAs and CRLs were loaded again
+
+        :param credentialsID: identifies the credentials: their files or a hash of the proxy string
+        :param tuple credentialsFiles: files of the credentials
+        :param loadCredentials: function loading the credentials in self.sslContext
+    """
+    casCRLs = None
+    caGeneration = None
+    if not self.__getValue( 'skipCACheck', False ):
+      result = self.__getCAsCRLs()
+      if not result[ 'OK' ]:
+        return result
+      casCRLs = result[ 'Value' ]
+      caGeneration = casCRLs[0]
+    contextKey = ( tuple( str( self.infoDict.get( option ) ) for option in CONTEXT_OPTIONS ), credentialsID )
+    stamp = ( self.__getFilesStamp( credentialsFiles ), caGeneration )
+    SocketInfo.__cachedContextsLock.acquire()
+    try:
+      cached = SocketInfo.__cachedContexts.get( contextKey )
+      if cached and cached[0] == stamp:
+        SocketInfo.__cachedContextsStats[ 'Hits' ] += 1
+        cached[2] = time.time()
+        self.sslContext = cached[1]
+        return S_OK()
+      SocketInfo.__cachedContextsStats[ 'Misses' ] += 1
+      if cached:
+        SocketInfo.__cachedContextsStats[ 'Invalidated' ] += 1
+      retVal = self.__createContext( casCRLs )
+      if not retVal[ 'OK' ]:
+        return retVal
+      loadCredentials()
+      if len( SocketInfo.__cachedContexts ) >= MAX_CACHED_CONTEXTS and contextKey not in SocketInfo.__cachedContexts:
+        oldestKey = min( SocketInfo.__cachedContexts, key = lambda key: SocketInfo.__cachedContexts[ key ][2] )
+        del SocketInfo.__cachedContexts[ oldestKey ]
+      SocketInfo.__cachedContexts[ contextKey ] = [ stamp, self.sslContext, time.time() ]
+      return S_OK()
+    finally:
+      SocketInfo.__cachedContextsLock.release()
+
+  @staticmethod
+  def getContextCacheStats():
+    """ Contexts taken from the cache (Hits) or created (Misses), among them the ones created again because their
+        credentials or the CAs changed (Invalidated), and the number of cached contexts
+    """
+    SocketInfo.__cachedContextsLock.acquire()
+    try:
+      stats = dict( SocketInfo.__cachedContextsStats )
+      stats[ 'Contexts' ] = len( SocketInfo.__cachedContexts )
+    finally:
+      SocketInfo.__cachedContextsLock.release()
+    stats[ 'CAsGeneration' ] = SocketInfo.__cachedCAsCRLsGeneration
+    return stats
 
+  @staticmethod
+  def clearContextCache():
+    """ Empties the cache of the contexts, the CAs and CRLs are loaded again for the next context
+    """
+    SocketInfo.__cachedContextsLock.acquire()
+    try:
+      SocketInfo.__cachedContexts.clear()
+    finally:
+      SocketInfo.__cachedContextsLock.release()
+    SocketInfo.__cachedCAsCRLsLoadLock.acquire()
+    try:
+      SocketInfo.__cachedCAsCRLs = False
+    finally:
+      SocketInfo.__cachedCAsCRLsLoadLock.release()
 
-  def __createContext( self ):
+  def __createContext( self, casCRLs ):
     clientContext = self.__getValue( 'clientMode', False )
     # Initialize context
     contextOptions = GSI.SSL.OP_ALL
@@ -228,29 +341,25 @@ class SocketInfo:
     if not self.__getValue( 'skipCACheck', False ):
       #self.sslContext.set_verify( SSL.VERIFY_PEER|SSL.VERIFY_FAIL_IF_NO_PEER_CERT, self.verifyCallback ) # Demand a certificate
       self.sslContext.set_verify( GSI.SSL.VERIFY_PEER | GSI.SSL.VERIFY_FAIL_IF_NO_PEER_CERT, None, gsiEnable ) # Demand a certificate
-      result = self.__getCAStore()
-      if not result[ 'OK' ]:
-        return result
-      caStore = result[ 'Value' ]
-      self.sslContext.set_cert_store( caStore )
+      self.sslContext.set_cert_store( self.__getCAStore( casCRLs ) )
     else:
       self.sslContext.set_verify( GSI.SSL.VERIFY_NONE, None, gsiEnable ) # Demand a certificate
     return S_OK()
 
-  def __generateContextWithCerts( self ):
+  def __generateContextWithCerts( self, loadCredentials = None ):
     certKeyTuple = Locations.getHostCertificateAndKeyLocation()
     if not certKeyTuple:
       return S_ERROR( "No valid certificate or key found" )
     self.setLocalCredentialsLocation( certKeyTuple )
     gLogger.debug( "Using certificate %s\nUsing key %s" % certKeyTuple )
-    retVal = self.__createContext()
-    if not retVal[ 'OK' ]:
-      return retVal
+    return self.__getCachedContext( certKeyTuple, certKeyTuple, loadCredentials or self.__loadCertificates )
+
+  def __loadCertificates( self ):
+    certKeyTuple = self.getLocalCredentialsLocation()
     #Verify depth to 20 to ensure accepting proxies of proxies of proxies....
     self.sslContext.set_verify_depth( 50 )
     self.sslContext.use_certificate_chain_file( certKeyTuple[0] )
     self.sslContext.use_privatekey_file( certKeyTuple[1] )
-    return S_OK()
 
   def __generateContextWithProxy( self ):
     if 'proxyLocation' in self.infoDict:
@@ -263,35 +372,35 @@ class SocketInfo:
         return S_ERROR( "No valid proxy found" )
     self.setLocalCredentialsLocation( ( proxyPath, proxyPath ) )
     gLogger.debug( "Using proxy %s" % proxyPath )
-    retVal = self.__createContext()
-    if not retVal[ 'OK' ]:
-      return retVal
+    return self.__getCachedContext( proxyPath, ( proxyPath, ), self.__loadProxy )
+
+  def __loadProxy( self ):
+    proxyPath = self.getLocalCredentialsLocation()[0]
     self.sslContext.use_certificate_chain_file( proxyPath )
     self.sslContext.use_privatekey_file( proxyPath )
-    return S_OK()
 
   def __generateContextWithProxyString( self ):
     proxyString = self.infoDict[ 'proxyString' ]
     self.setLocalCredentialsLocation( ( proxyString, proxyString ) )
     gLogger.debug( "Using string proxy" )
-    retVal = self.__createContext()
-    if not retVal[ 'OK' ]:
-      return retVal
+    return self.__getCachedContext( hashlib.md5( proxyString ).hexdigest(), (), self.__loadProxyString )
+
+  def __loadProxyString( self ):
+    proxyString = self.infoDict[ 'proxyString' ]
     self.sslContext.use_certificate_chain_string( proxyString )
     self.sslContext.use_privatekey_string( proxyString )
-    return S_OK()
 
   def __generateServerContext( self ):
-    retVal = self.__generateContextWithCerts()
-    if not retVal[ 'OK' ]:
-      return retVal
+    return self.__generateContextWithCerts( self.__loadServerCertificates )
+
+  def __loadServerCertificates( self ):
+    self.__loadCertificates()
     self.sslContext.set_session_id( "DISETConnection%s" % str( time.time() ) )
     #self.sslContext.get_cert_store().set_flags( GSI.crypto.X509_CRL_CHECK )
     if 'SSLSessionTimeout' in self.infoDict:
       timeout = int( self.infoDict['SSLSessionTimeout'] )
       gLogger.debug( "Setting session timeout to %s" % timeout )
       self.sslContext.set_session_timeout( timeout )
-    return S_OK()
 
   def doClientHandshake( self ):
     self.sslSocket.set_connect_state()
@@ -301,6 +410,30 @@ class SocketInfo:
     self.sslSocket.set_accept_state()
     return self.__sslHandshake()
 
+  def stepServerHandshake( self ):
+    """
+      Advance the server side of the SSL handshake as far as possible without blocking,
+      the socket being non blocking
+
+      :return: S_ERROR / S_OK with 'read' or 'write' while the handshake waits for the socket,
+               with the dictionary of user credentials once it is done
+    """
+    if not self.__handshakeStarted:
+      self.sslSocket.set_accept_state()
+      self.__handshakeStarted = True
+    try:
+      self.sslSocket.do_handshake()
+    except GSI.SSL.WantReadError:
+      return S_OK( 'read' )
+    except GSI.SSL.WantWriteError:
+      return S_OK( 'write' )
+    except Exception, v:
+      gLogger.warn( "Error while handshaking", v )
+      return S_ERROR( "Error while handshaking" )
+    credentialsDict = self.gatherPeerCredentials()
+    gLogger.debug( "", "Authenticated peer (%s)" % credentialsDict[ 'DN' ] )
+    return S_OK( credentialsDict )
+
   #@gSynchro
   def __sslHandshake( self ):
     """
@@ -5,7 +5,8 @@ import time
 import GSI
 from DIRAC.Core.Utilities.LockRing import LockRing
 from DIRAC.Core.Utilities.ReturnValues import S_ERROR, S_OK
-from DIRAC.Core.DISET.private.Transports.BaseTransport import BaseTransport
+from DIRAC.Core.Utilities.DErrno import ECONNLOST
+from DIRAC.Core.DISET.private.Transports.BaseTransport import BaseTransport, connectionError
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 from DIRAC.Core.DISET.private.Transports.SSL.SocketInfoFactory import gSocketInfoFactory
 from DIRAC.Core.Utilities.Devloader import Devloader
@@ -22,6 +23,7 @@ class SSLTransport( BaseTransport ):
   def __init__( self, *args, **kwargs ):
     self.__writesDone = 0
     self.__locked = False
+    self.__handshakeDone = False
     BaseTransport.__init__( self, *args, **kwargs )
 
   def __lock( self, timeout = 1000 ):
@@ -92,19 +94,41 @@ class SSLTransport( BaseTransport ):
 
   def handshake( self ):
     """
-      Initiate the client-server handshake and extract credentials
+      Initiate the client-server handshake and extract credentials,
+      unless the handshake was already done by handshakeStep
 
       :return: S_OK (with credentialDict if new session)
     """
+    if self.__handshakeDone:
+      return S_OK()
     retVal = self.oSocketInfo.doServerHandshake()
     if not retVal[ 'OK' ]:
       return retVal
-    creds = retVal[ 'Value' ]
+    self.__setPeerCredentials( retVal[ 'Value' ] )
+    return S_OK()
+
+  def handshakeStep( self ):
+    """
+      Advance the client-server handshake without blocking, and extract credentials once it is done
+
+      :return: S_OK with 'read' or 'write' while the handshake waits for the socket, False once it is done
+    """
+    if self.__handshakeDone:
+      return S_OK( False )
+    retVal = self.oSocketInfo.stepServerHandshake()
+    if not retVal[ 'OK' ]:
+      return retVal
+    if retVal[ 'Value' ] in ( 'read', 'write' ):
+      return retVal
+    self.__setPeerCredentials( retVal[ 'Value' ] )
+    return S_OK( False )
+
+  def __setPeerCredentials( self, creds ):
+    self.__handshakeDone = True
     if not self.oSocket.session_reused():
       gLogger.debug( "New session connecting from client at %s" % str( self.getRemoteAddress() ) )
     for key in creds.keys():
       self.peerCredentials[ key ] = creds[ key ]
-    return S_OK()
 
   def setClientSocket( self, oSocket ):
     if self.serverMode():
@@ -114,6 +138,12 @@ class SSLTransport( BaseTransport ):
     self.remoteAddress = self.oSocket.getpeername()
     self.oSocket.settimeout( self.oSocketInfo.infoDict[ 'timeout' ] )
 
+  def setBlocking( self, blocking ):
+    if blocking:
+      self.oSocket.settimeout( self.oSocketInfo.infoDict[ 'timeout' ] )
+    else:
+      self.oSocket.settimeout( 0 )
+
   def acceptConnection( self ):
     oClientTransport = SSLTransport( self.stServerAddress )
     oClientSocket, _stClientAddress = self.oSocket.accept()
@@ -144,9 +174,25 @@ class SSLTransport( BaseTransport ):
         except GSI.SSL.ZeroReturnError:
           return S_OK( "" )
         except Exception as e:
-          return S_ERROR( "Exception while reading from peer: %s" % str( e ) )
+          return connectionError( "Exception while reading from peer", e )
+    finally:
+      self.__unlock()
+
+  def _readNonBlocking( self, bufSize = 16384 ):
+    self.__lock()
+    try:
+      data = self.oSocket.recv( bufSize )
+    except ( GSI.SSL.WantReadError, GSI.SSL.WantWriteError ):
+      return S_OK( None )
+    except GSI.SSL.ZeroReturnError:
+      return S_ERROR( ECONNLOST, "Connection closed by peer" )
+    except Exception as e:
+      return connectionError( "Exception while reading from peer", e )
     finally:
       self.__unlock()
+    if not data:
+      return S_ERROR( ECONNLOST, "Connection closed by peer" )
+    return S_OK( data )
 
   def isLocked( self ):
     return self.__locked
@@ -168,6 +214,9 @@ class SSLTransport( BaseTransport ):
               return S_ERROR( "Renegotiation failed: %s" % str( e ) )
 
 
+      #GSI writes strings, the packets given as memoryview are copied one by one
+      if isinstance( buffer, memoryview ):
+        buffer = buffer.tobytes()
       sentBytes = 0
       timeout = self.oSocketInfo.infoDict[ 'timeout' ]
       if timeout:
@@ -179,7 +228,7 @@ class SSLTransport( BaseTransport ):
               return S_ERROR( "Socket write timeout exceeded" )
           sent = self.oSocket.write( buffer[ sentBytes: ] )
           if sent == 0:
-            return S_ERROR( "Connection closed by peer" )
+            return S_ERROR( ECONNLOST, "Connection closed by peer" )
           if sent > 0:
             sentBytes += sent
         except GSI.SSL.WantWriteError:
@@ -187,7 +236,7 @@ class SSLTransport( BaseTransport ):
         except GSI.SSL.WantReadError:
           time.sleep( 0.001 )
         except Exception as e:
-          return S_ERROR( "Error while sending: %s" % str( e ) )
+          return connectionError( "Error while sending", e )
       return S_OK( sentBytes )
     finally:
       self.__unlock()
@@ -0,0 +1,137 @@
+""" Test the framing of the messages sent and received by the transports, through a pair of connected sockets
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import socket
+import threading
+
+import pytest
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities.DErrno import cmpError, ECONNLOST
+from DIRAC.Core.DISET.private.Transports.BaseTransport import BaseTransport
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+
+class PartialWriteTransport(PlainTransport):
+  """ Writes at most 1000 bytes at a time and reads through _read, as the SSL transport """
+
+  _readInto = BaseTransport._readInto
+
+  def __init__(self, *args, **kwargs):
+    super(PartialWriteTransport, self).__init__(*args, **kwargs)
+    self.writes = []
+
+  def _write(self, buffer):
+    self.writes.append(type(buffer))
+    return S_OK(self.oSocket.send(buffer[:1000]))
+
+
+def getTransports(transportClass=PlainTransport):
+  sockets = socket.socketpair()
+  transports = []
+  for oSocket in sockets:
+    transport = transportClass(None)
+    transport.setClientSocket(oSocket)
+    transports.append(transport)
+  return transports
+
+
+def sendInThread(transport, messages):
+  results = []
+
+  def sendMessages():
+    for message in messages:
+      results.append(transport.sendData(message))
+
+  thread = threading.Thread(target=sendMessages)
+  thread.setDaemon(True)
+  thread.start()
+  return thread, results
+
+
+@pytest.mark.parametrize('transportClass', [PlainTransport, PartialWriteTransport])
+def test_largeMessages(transportClass):
+  sender, receiver = getTransports(transportClass)
+  sender.packetSize = 100000
+  replicas = dict(('/lhcb/data/file%06d' % index, {'CERN-DST': 'root://eos/file%06d' % index})
+                  for index in xrange(30000))
+  messages = [S_OK(replicas), S_OK('small'), S_OK('x' * 65530), S_OK(range(1000))]
+  thread, results = sendInThread(sender, messages)
+  for message in messages:
+    assert receiver.receiveData() == message
+  thread.join()
+  assert all(result['OK'] for result in results)
+  assert receiver.byteStream == ""
+  if transportClass is PartialWriteTransport:
+    # The partial writes go on from a memoryview of the data, without copying it
+    assert sender.writes.count(memoryview) > 1000
+    assert sender.writes.count(str) == 0
+
+
+def test_keepAliveAndLimits():
+  sender, receiver = getTransports()
+  # Several messages and a keep alive received in the same read
+  sender.sendData(S_OK(1))
+  sender.sendKeepAlive(responseId='ka')
+  sender.sendData(S_OK(2))
+  assert receiver.receiveData() == S_OK(1)
+  assert receiver.receiveData(blockAfterKeepAlive=False).get('keepAlive')
+  assert receiver.receiveData() == S_OK(2)
+
+  # A message larger than the limit is refused before being received
+  sender.sendData(S_OK('x' * 200000))
+  result = receiver.receiveData(maxBufferSize=1000)
+  assert not result['OK']
+  assert 'Read limit exceeded' in result['Message']
+
+  # The peer closing the connection in the middle of a message
+  sender, receiver = getTransports()
+  sender._write(memoryview('100:%s' % ('x' * 50)))
+  sender.close()
+  result = receiver.receiveData()
+  assert not result['OK']
+
+
+def test_compression():
+  sender, receiver = getTransports()
+  for transport in (sender, receiver):
+    transport.setCompression('zlib', 1000)
+  replicas = S_OK(dict(('/lhcb/data/file%06d' % index, 'root://eos/file%06d' % index) for index in xrange(10000)))
+  thread, results = sendInThread(sender, [replicas, S_OK('small')])
+  assert receiver.receiveData() == replicas
+  assert receiver.receiveData() == S_OK('small')
+  thread.join()
+  assert all(result['OK'] for result in results)
+  # Only the large message is compressed
+  sentStats = sender.getCompressionStats()
+  assert sentStats['Messages'] == 1
+  assert sentStats['RawBytes'] > 5 * sentStats['CompressedBytes']
+  receivedStats = receiver.getCompressionStats()
+  for key in ('Messages', 'RawBytes', 'CompressedBytes'):
+    assert receivedStats[key] == sentStats[key]
+  assert sender.getCompressionStats()['Messages'] == 0
+
+  # The limit applies to the decompressed message
+  sender.sendData(S_OK('x' * 100000))
+  result = receiver.receiveData(maxBufferSize=50000)
+  assert not result['OK']
+  assert 'Read limit exceeded' in result['Message']
+
+  # A peer which did not negotiate the compression refuses the compressed messages
+  receiver.setCompression(None)
+  sender.sendData(S_OK('x' * 100000))
+  assert not receiver.receiveData()['OK']
+
+
+def test_connectionLost():
+  sender, receiver = getTransports()
+  receiver.oSocket.close()
+  # The errors of a peer gone are told apart from the other ones
+  result = sender.receiveData()
+  assert cmpError(result, ECONNLOST)
+  result = sender.sendData(S_OK('x' * 100000))
+  assert cmpError(result, ECONNLOST)
@@ -0,0 +1,99 @@
+""" Test the ConnectionReactor, with clients sending their proposal through raw sockets
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import time
+import socket
+import threading
+
+import pytest
+
+from DIRAC import S_OK
+from DIRAC.Core.Utilities import DEncode
+from DIRAC.Core.DISET.private.ConnectionReactor import ConnectionReactor
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+PROPOSAL = (('Framework/Test', 'Test', 'vo'), ('RPC', 'ping'), '', {'persistent': True})
+
+
+def encodeMessage(message):
+  data = DEncode.encode(message)
+  return '%s:%s' % (len(data), data)
+
+
+@pytest.fixture
+def reactor():
+  listener = PlainTransport(('', 0), bServerMode=True)
+  listener.initAsServer()
+  handed = []
+  connectionReactor = ConnectionReactor(lambda name, transport, handshakeTime:
+                                        handed.append((name, transport, handshakeTime)))
+  connectionReactor.addListener('Framework/Test', listener, 1)
+  running = [True]
+
+  def processEvents():
+    while running[0]:
+      connectionReactor.processEvents(0.1)
+
+  thread = threading.Thread(target=processEvents)
+  thread.setDaemon(True)
+  thread.start()
+
+  def connect():
+    return socket.create_connection(('localhost', listener.getSocket().getsockname()[1]))
+
+  yield connectionReactor, connect, handed
+  running[0] = False
+  thread.join()
+  connectionReactor.closePending()
+  listener.close()
+
+
+def waitFor(condition, timeout=2):
+  for _ in range(int(timeout * 100)):
+    if condition():
+      return True
+    time.sleep(0.01)
+  return False
+
+
+def test_handOver(reactor):
+  connectionReactor, connect, handed = reactor
+  # Clients sending nothing do not prevent the others from being handed over
+  idleClients = [connect() for _ in range(5)]
+  client = connect()
+  stream = encodeMessage(S_OK(PROPOSAL))
+  client.sendall(stream[:10])
+  time.sleep(0.3)
+  assert not handed
+  client.sendall(stream[10:] + encodeMessage(S_OK('arguments')))
+  assert waitFor(lambda: handed)
+  name, transport, handshakeTime = handed[0]
+  assert name == 'Framework/Test'
+  assert 0.25 <= handshakeTime < 2
+  # The transport is blocking again, with the proposal and what followed it already received
+  assert transport.getSocket().gettimeout() is None
+  assert transport.receiveData(1024) == S_OK(PROPOSAL)
+  assert transport.receiveData() == S_OK('arguments')
+  stats = connectionReactor.getStats()
+  assert (stats['Accepted'], stats['Handed'], stats['Pending']) == (6, 1, 5)
+
+  # The clients not sending their proposal in time are closed
+  assert waitFor(lambda: connectionReactor.getStats()['TimedOut'] == 5, 3)
+  for idleClient in idleClients:
+    assert idleClient.recv(10) == ''
+  assert connectionReactor.getStats()['Pending'] == 0
+
+
+def test_invalidProposals(reactor):
+  connectionReactor, connect, handed = reactor
+  for stream in ('x' * 20, '2000:%s' % ('x' * 2000), ''):
+    client = connect()
+    client.sendall(stream)
+    client.close()
+  assert waitFor(lambda: connectionReactor.getStats()['Failed'] == 3)
+  assert not handed
+  assert connectionReactor.getStats()['Pending'] == 0
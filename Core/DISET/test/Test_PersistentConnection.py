@@ -0,0 +1,255 @@
+""" Test the persistent connections and the compression of the RPC calls, with a service and its clients
+    talking through dip, the connections being accepted by a ConnectionReactor
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import types
+import resource
+import threading
+
+import pytest
+from mock import patch
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+from DIRAC.Core.Utilities.CFG import CFG
+from DIRAC.Core.DISET.RequestHandler import RequestHandler
+from DIRAC.Core.DISET.RPCClient import RPCClient
+from DIRAC.Core.DISET.private.Service import Service
+from DIRAC.Core.DISET.private import ConnectionPool as connectionPoolModule
+from DIRAC.Core.DISET.private.ConnectionPool import ConnectionPool, getGlobalConnectionPool
+from DIRAC.Core.DISET.private.ConnectionReactor import ConnectionReactor
+from DIRAC.Core.DISET.private.Compression import gClientCompressionStats
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+testCFG = """
+DIRAC
+{
+  Setup = Test
+  Setups
+  {
+    Test
+    {
+      Framework = Test
+    }
+  }
+}
+"""
+
+
+class PersistentTestHandler(RequestHandler):
+
+  types_add = [int, int]
+
+  def export_add(self, first, second):
+    time.sleep(0.05)
+    return S_OK(first + second)
+
+  types_getCredentials = []
+
+  def export_getCredentials(self):
+    credentials = dict(self.getRemoteCredentials())
+    # As the authorization does, for the next calls to check that they do not see it
+    self.getRemoteCredentials().update({'username': 'modified', 'group': 'modified'})
+    return S_OK(credentials)
+
+
+@pytest.fixture
+def service():
+  gConfigurationData.localCFG.loadFromBuffer(testCFG)
+  gConfigurationData.sync()
+  module = types.ModuleType('PersistentTestHandler')
+  module.PersistentTestHandler = PersistentTestHandler
+  testService = Service({'modName': 'Framework/PersistentTest', 'loadName': 'Framework/PersistentTest',
+                         'standalone': True, 'moduleObj': module, 'classObj': PersistentTestHandler})
+  listener = PlainTransport(('', 0), bServerMode=True)
+  listener.initAsServer()
+  reactor = ConnectionReactor(lambda _name, clientTransport, handshakeTime:
+                              testService.handleConnection(clientTransport, handshakeTime))
+  reactor.addListener('Framework/PersistentTest', listener, 30)
+  running = [True]
+
+  def acceptConnections():
+    while running[0]:
+      reactor.processEvents(0.1)
+
+  pool = ConnectionPool()
+  with patch.object(Service, '_authorizeProposal', return_value=S_OK()), \
+          patch('DIRAC.Core.DISET.private.BaseClient.getGlobalConnectionPool', return_value=pool):
+    assert testService.initialize()['OK']
+    acceptThread = threading.Thread(target=acceptConnections)
+    acceptThread.setDaemon(True)
+    acceptThread.start()
+    yield testService, 'dip://localhost:%s/Framework/PersistentTest' % listener.getSocket().getsockname()[1], pool
+    running[0] = False
+    acceptThread.join()
+    listener.close()
+  gConfigurationData.localCFG = CFG()
+  gConfigurationData.sync()
+
+
+def test_reuse(service):
+  testService, url, pool = service
+  client = RPCClient(url, persistentConnection=True)
+  assert [client.add(index, 1)['Value'] for index in range(5)] == [1, 2, 3, 4, 5]
+  stats = pool.getStats()
+  assert (stats['Connections'], stats['Reused'], stats['IdleConnections'], stats['ReuseRate']) == (1, 4, 1, 0.8)
+  assert (testService._stats['connections'], testService._stats['reusedConnections']) == (1, 4)
+
+  # Without persistent connection, each call connects again
+  client = RPCClient(url)
+  for _ in range(2):
+    assert client.add(1, 1)['Value'] == 2
+  assert pool.getStats()['Connections'] == 3
+
+  # Concurrent calls use different connections, which are all kept for the next calls
+  client = RPCClient(url, persistentConnection=True)
+  results = []
+  threads = [threading.Thread(target=lambda index=index: results.append(client.add(index, 0)['Value']))
+             for index in range(3)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert sorted(results) == [0, 1, 2]
+  stats = pool.getStats()
+  assert (stats['Connections'], stats['IdleConnections']) == (5, 3)
+  # The credentials of each call are the ones of the handshake and of its proposal
+  assert client.getCredentials()['Value'] == {}
+  assert client.getCredentials()['Value'] == {}
+  client = RPCClient(url, persistentConnection=True, extraCredentials='hosts')
+  assert client.getCredentials()['Value'] == {'extraCredentials': 'hosts'}
+  assert client.getCredentials()['Value'] == {'extraCredentials': 'hosts'}
+  assert pool.getStats()['Connections'] == 6
+
+
+def test_closedByService(service):
+  testService, url, pool = service
+  client = RPCClient(url, persistentConnection=True)
+  testService._Service__idleTimeout = 0.5
+  assert client.add(1, 1)['OK']
+  # The service closes the idle connection, the client connects again
+  time.sleep(1.5)
+  assert client.add(1, 2)['Value'] == 3
+  stats = pool.getStats()
+  assert (stats['Connections'], stats['Reused'], stats['Broken']) == (2, 0, 1)
+
+  # The connection is lost between the check and the proposal
+  with patch.object(ConnectionPool, '_ConnectionPool__isAlive', return_value=True):
+    time.sleep(1.5)
+    assert client.add(2, 2)['Value'] == 4
+  stats = pool.getStats()
+  assert (stats['Connections'], stats['Reused']) == (3, 1)
+
+  # A service not keeping the connections open closes them after each call
+  testService._Service__idleTimeout = 0
+  time.sleep(1.5)
+  for _ in range(2):
+    assert client.add(1, 1)['OK']
+  stats = pool.getStats()
+  assert (stats['Connections'], stats['IdleConnections']) == (5, 0)
+
+
+def test_proposalRefused(service):
+  _testService, url, pool = service
+  client = RPCClient(url, persistentConnection=True)
+  assert client.add(1, 1)['OK']
+  # The error sent back by the service is returned, without trying another connection
+  with patch.object(Service, '_authorizeProposal', return_value=S_ERROR('Refused')):
+    result = client.add(1, 2)
+  assert not result['OK']
+  assert 'Refused' in result['Message']
+  assert 'rpcStub' in result
+  stats = pool.getStats()
+  assert (stats['Connections'], stats['Reused']) == (1, 1)
+
+
+def getCompressedMessages(stats, method):
+  return stats.getStats().get(method, {}).get('Messages', 0)
+
+
+def waitFor(condition):
+  """ The service records its statistics after sending the result to the client """
+  for _ in range(100):
+    if condition():
+      return True
+    time.sleep(0.01)
+  return False
+
+
+def test_compression(service):
+  testService, url, _pool = service
+  data = 'DIRAC ' * 20000
+  # Both the arguments and the result are compressed
+  assert RPCClient(url).echo(data)['Value'] == data
+  assert getCompressedMessages(gClientCompressionStats, 'echo') == 2
+  assert waitFor(lambda: getCompressedMessages(testService._compressionStats, 'echo') == 2)
+  serviceStats = RPCClient(url).ping()['Value']['compression']['echo']
+  assert serviceStats['Ratio'] > 100
+  assert serviceStats['RawBytes'] > 2 * len(data)
+
+  # Not above the threshold of the client, nor for the clients not offering it
+  assert RPCClient(url, compressionThreshold=200000).echo(data)['OK']
+  assert RPCClient(url, compressionThreshold=0).echo(data)['OK']
+  assert getCompressedMessages(gClientCompressionStats, 'echo') == 3
+  assert waitFor(lambda: getCompressedMessages(testService._compressionStats, 'echo') == 3)
+
+  # Nor by the services not accepting it, the persistent connections negotiating it for each call
+  client = RPCClient(url, persistentConnection=True)
+  assert client.echo(data)['OK']
+  testService._Service__compressionThreshold = 0
+  assert client.echo(data)['OK']
+  assert getCompressedMessages(gClientCompressionStats, 'echo') == 5
+  assert waitFor(lambda: getCompressedMessages(testService._compressionStats, 'echo') == 5)
+
+
+def test_times(service):
+  testService, url, _pool = service
+  client = RPCClient(url, persistentConnection=True)
+  for _ in range(3):
+    assert client.add(1, 1)['OK']
+  assert 'Handshake' in RPCClient(url).ping()['Value']['times']
+  # Only the new connections go through the handshake, all the calls wait for a thread and are executed
+  assert waitFor(lambda: testService._times.getStats()['Execution']['Count'] == 4)
+  times = testService._times.getStats()
+  assert times['Handshake']['Count'] == 2
+  assert times['Queue']['Count'] == 4
+  assert 0.05 <= times['Execution']['Max'] < 1
+  assert times['Execution']['Mean'] > times['Handshake']['Mean']
+
+
+def test_highFileDescriptors(service):
+  testService, url, pool = service
+  if resource.getrlimit(resource.RLIMIT_NOFILE)[0] < 1200:
+    pytest.skip("Cannot open enough file descriptors")
+  # The sockets of the connections get file descriptors above FD_SETSIZE, that select does not take
+  fillers = [os.open(os.devnull, os.O_RDONLY) for _ in xrange(1100)]
+  try:
+    client = RPCClient(url, persistentConnection=True)
+    assert [client.add(index, 1)['Value'] for index in range(3)] == [1, 2, 3]
+    stats = pool.getStats()
+    assert (stats['Connections'], stats['Reused'], stats['Broken']) == (1, 2, 0)
+    assert testService._stats['reusedConnections'] == 2
+  finally:
+    for fd in fillers:
+      os.close(fd)
+
+
+def test_fork():
+  with patch.object(connectionPoolModule, 'gConnectionPool', None), \
+          patch('DIRAC.Core.DISET.private.ConnectionPool.getGlobalTransportPool') as mockTransportPool:
+    pool = getGlobalConnectionPool()
+    pool.release('trid', 'key')
+    assert getGlobalConnectionPool() is pool
+    # A forked process does not use nor close the connections of its parent
+    with patch('DIRAC.Core.DISET.private.ConnectionPool.os.getpid', return_value=os.getpid() + 1):
+      childPool = getGlobalConnectionPool()
+      assert childPool is not pool
+      assert getGlobalConnectionPool() is childPool
+      assert childPool.get('key') is None
+    assert not mockTransportPool.return_value.close.called
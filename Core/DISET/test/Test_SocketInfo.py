@@ -0,0 +1,126 @@
+""" Unit tests of the cache of the SSL contexts of SocketInfo, GSI is replaced by a mock
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import pytest
+from mock import MagicMock, patch
+
+from DIRAC.Core.DISET.private.Transports.SSL.SocketInfo import SocketInfo
+
+
+def getStats(before):
+  after = SocketInfo.getContextCacheStats()
+  return dict((key, after[key] - before[key]) for key in ('Hits', 'Misses', 'Invalidated', 'CAsGeneration'))
+
+
+def loadCertificate(_fileType, pemData):
+  if pemData.startswith('CRL'):
+    raise ValueError('Not a certificate')
+  certificate = MagicMock()
+  certificate.has_expired.return_value = False
+  return certificate
+
+
+@pytest.fixture
+def credentials(tmpdir):
+  casDir = tmpdir.mkdir('certificates')
+  casDir.join('ca1.0').write('CA1')
+  casDir.join('ca1.r0').write('CRL1')
+  proxy = tmpdir.join('proxy')
+  proxy.write('PROXY')
+  hostCert = tmpdir.join('hostcert.pem')
+  hostCert.write('CERT')
+  hostKey = tmpdir.join('hostkey.pem')
+  hostKey.write('KEY')
+  gsi = MagicMock()
+  gsi.crypto.load_certificate.side_effect = loadCertificate
+  gsi.crypto.load_crl.return_value.has_expired.return_value = False
+  gsi.SSL.Context.side_effect = lambda method: MagicMock()
+  SocketInfo.clearContextCache()
+  with patch('DIRAC.Core.DISET.private.Transports.SSL.SocketInfo.GSI', gsi), \
+          patch('DIRAC.Core.Security.Locations.getCAsLocation', return_value=str(casDir)), \
+          patch('DIRAC.Core.Security.Locations.getHostCertificateAndKeyLocation',
+                return_value=(str(hostCert), str(hostKey))):
+    yield gsi, casDir, proxy
+  SocketInfo.clearContextCache()
+
+
+def test_clientContexts(credentials):
+  gsi, casDir, proxy = credentials
+  before = SocketInfo.getContextCacheStats()
+  infoDict = {'clientMode': True, 'proxyLocation': str(proxy), 'timeout': 600}
+  context = SocketInfo(dict(infoDict)).getSSLContext()
+  assert SocketInfo(dict(infoDict, hostname='other', timeout=10)).getSSLContext() is context
+  assert getStats(before) == {'Hits': 1, 'Misses': 1, 'Invalidated': 0, 'CAsGeneration': 1}
+  context.use_certificate_chain_file.assert_called_once_with(str(proxy))
+  assert gsi.crypto.X509Store.return_value.add_crl.call_count == 1
+
+  # Other options or credentials have their own context
+  assert SocketInfo(dict(infoDict, skipCACheck=True)).getSSLContext() is not context
+  assert SocketInfo(dict(infoDict, useCertificates=True)).getSSLContext() is not context
+  proxyStringContext = SocketInfo({'clientMode': True, 'proxyString': 'PROXY'}).getSSLContext()
+  assert SocketInfo({'clientMode': True, 'proxyString': 'PROXY'}).getSSLContext() is proxyStringContext
+  assert SocketInfo({'clientMode': True, 'proxyString': 'OTHER'}).getSSLContext() is not proxyStringContext
+  # Without the CRLs
+  gsi.crypto.X509Store.return_value.add_crl.reset_mock()
+  assert SocketInfo(dict(infoDict, IgnoreCRLs=True)).getSSLContext() is not context
+  assert not gsi.crypto.X509Store.return_value.add_crl.called
+  assert getStats(before) == {'Hits': 2, 'Misses': 6, 'Invalidated': 0, 'CAsGeneration': 1}
+  assert gsi.crypto.load_certificate.call_count == 2
+
+  # The context is created again when the proxy is renewed
+  proxy.write('RENEWED PROXY')
+  renewedContext = SocketInfo(dict(infoDict)).getSSLContext()
+  assert renewedContext is not context
+  assert SocketInfo(dict(infoDict)).getSSLContext() is renewedContext
+  assert getStats(before) == {'Hits': 3, 'Misses': 7, 'Invalidated': 1, 'CAsGeneration': 1}
+
+  # Or when the CAs change, all the CAs and CRLs are loaded again
+  casDir.join('ca2.0').write('CA2')
+  assert SocketInfo(dict(infoDict)).getSSLContext() is not renewedContext
+  assert getStats(before) == {'Hits': 3, 'Misses': 8, 'Invalidated': 2, 'CAsGeneration': 2}
+  assert gsi.crypto.load_certificate.call_count == 5
+
+
+def test_serverContexts(credentials):
+  gsi, _casDir, _proxy = credentials
+  before = SocketInfo.getContextCacheStats()
+  socketInfo = SocketInfo({'clientMode': False, 'timeout': 30, 'SSLSessionTimeout': 600})
+  context = socketInfo.getSSLContext()
+  context.set_session_timeout.assert_called_once_with(600)
+  assert socketInfo.getLocalCredentialsLocation()[0].endswith('hostcert.pem')
+  # The renewed server contexts and the accepted connections use the same context
+  assert SocketInfo({'clientMode': False, 'timeout': 30, 'SSLSessionTimeout': 600}).getSSLContext() is context
+  assert socketInfo.clone()['Value'].getSSLContext() is context
+  # The clients using the host certificate have their own
+  assert SocketInfo({'clientMode': True, 'useCertificates': True}).getSSLContext() is not context
+  assert getStats(before) == {'Hits': 1, 'Misses': 2, 'Invalidated': 0, 'CAsGeneration': 1}
+  assert gsi.SSL.Context.call_count == 2
+
+  # A failure to load the credentials is raised and nothing is cached
+  gsi.SSL.Context.side_effect = None
+  gsi.SSL.Context.return_value.use_privatekey_file.side_effect = ValueError('Bad key')
+  with pytest.raises(ValueError):
+    SocketInfo({'clientMode': False, 'timeout': 30})
+  assert SocketInfo.getContextCacheStats()['Contexts'] == 2
+
+
+def test_stepServerHandshake(credentials):
+  gsi, _casDir, _proxy = credentials
+  gsi.SSL.WantReadError = type('WantReadError', (Exception,), {})
+  gsi.SSL.WantWriteError = type('WantWriteError', (Exception,), {})
+  socketInfo = SocketInfo({'clientMode': False, 'timeout': 30})
+  sslSocket = MagicMock()
+  sslSocket.do_handshake.side_effect = [gsi.SSL.WantReadError(), gsi.SSL.WantWriteError(), None,
+                                        ValueError('Bad certificate')]
+  socketInfo.setSSLSocket(sslSocket)
+  with patch.object(SocketInfo, 'gatherPeerCredentials', return_value={'DN': '/CN=user'}):
+    # The handshake goes on as the socket is ready, without starting again
+    assert socketInfo.stepServerHandshake() == {'OK': True, 'Value': 'read'}
+    assert socketInfo.stepServerHandshake() == {'OK': True, 'Value': 'write'}
+    assert socketInfo.stepServerHandshake()['Value'] == {'DN': '/CN=user'}
+    sslSocket.set_accept_state.assert_called_once_with()
+    assert not socketInfo.stepServerHandshake()['OK']
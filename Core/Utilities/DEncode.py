@@ -375,28 +375,237 @@ g_dEncodeFunctions[types.DictType] = encodeDict
 g_dDecodeFunctions["d"] = decodeDict
 
 
+# Fast path
+#
+# The functions below produce and consume exactly the same wire format as the
+# ones above. The difference is that the containers (list, tuple, dict) handle
+# the most common leaf types (str and int) inline instead of going through the
+# dispatch table and an extra function call for every single token, and that
+# datetimes are encoded without building intermediate tuples.
+# Any other type is delegated to the per-type functions.
+
+g_dFastEncodeFunctions = dict(g_dEncodeFunctions)
+g_dFastDecodeFunctions = dict(g_dDecodeFunctions)
+
+
+def fastEncodeList(lValue, eList):
+  """ Encoding list, with inlined str and int items """
+
+  extend = eList.extend
+  encodeFunctions = g_dFastEncodeFunctions
+  eList.append("l")
+  for uObject in lValue:
+    objType = type(uObject)
+    if objType is str:
+      extend(('s', str(len(uObject)), ':', uObject))
+    elif objType is int:
+      extend(('i', str(uObject), 'e'))
+    else:
+      encodeFunctions[objType](uObject, eList)
+  eList.append("e")
+
+
+def fastEncodeTuple(lValue, eList):
+  """ Encoding tuple, with inlined str and int items """
+
+  extend = eList.extend
+  encodeFunctions = g_dFastEncodeFunctions
+  eList.append("t")
+  for uObject in lValue:
+    objType = type(uObject)
+    if objType is str:
+      extend(('s', str(len(uObject)), ':', uObject))
+    elif objType is int:
+      extend(('i', str(uObject), 'e'))
+    else:
+      encodeFunctions[objType](uObject, eList)
+  eList.append("e")
+
+
+def fastEncodeDict(dValue, eList):
+  """ Encoding dictionary, with inlined str and int keys and values """
+
+  extend = eList.extend
+  encodeFunctions = g_dFastEncodeFunctions
+  eList.append("d")
+  for key in sorted(dValue):
+    objType = type(key)
+    if objType is str:
+      extend(('s', str(len(key)), ':', key))
+    elif objType is int:
+      extend(('i', str(key), 'e'))
+    else:
+      encodeFunctions[objType](key, eList)
+    uObject = dValue[key]
+    objType = type(uObject)
+    if objType is str:
+      extend(('s', str(len(uObject)), ':', uObject))
+    elif objType is int:
+      extend(('i', str(uObject), 'e'))
+    else:
+      encodeFunctions[objType](uObject, eList)
+  eList.append("e")
+
+
+def fastEncodeDateTime(oValue, eList):
+  """ Encoding datetime, without going through an intermediate tuple """
+
+  extend = eList.extend
+  if isinstance(oValue, _dateTimeType):
+    eList.append("zat")
+    for iValue in (oValue.year, oValue.month, oValue.day,
+                   oValue.hour, oValue.minute, oValue.second, oValue.microsecond):
+      extend(('i', str(iValue), 'e'))
+    g_dFastEncodeFunctions[type(oValue.tzinfo)](oValue.tzinfo, eList)
+  elif isinstance(oValue, _dateType):
+    eList.append("zdt")
+    for iValue in (oValue.year, oValue.month, oValue.day):
+      extend(('i', str(iValue), 'e'))
+  elif isinstance(oValue, _timeType):
+    eList.append("ztt")
+    for iValue in (oValue.hour, oValue.minute, oValue.second, oValue.microsecond):
+      extend(('i', str(iValue), 'e'))
+    g_dFastEncodeFunctions[type(oValue.tzinfo)](oValue.tzinfo, eList)
+  else:
+    raise Exception("Unexpected type %s while encoding a datetime object" % str(type(oValue)))
+  eList.append("e")
+
+
+g_dFastEncodeFunctions[types.ListType] = fastEncodeList
+g_dFastEncodeFunctions[types.TupleType] = fastEncodeTuple
+g_dFastEncodeFunctions[types.DictType] = fastEncodeDict
+g_dFastEncodeFunctions[_dateTimeType] = fastEncodeDateTime
+g_dFastEncodeFunctions[_dateType] = fastEncodeDateTime
+g_dFastEncodeFunctions[_timeType] = fastEncodeDateTime
+
+
+def fastDecodeList(data, i):
+  """ Decoding list, with inlined str and int items """
+
+  index = data.index
+  decodeFunctions = g_dFastDecodeFunctions
+  oL = []
+  append = oL.append
+  i += 1
+  dataType = data[i]
+  while dataType != "e":
+    if dataType == "s":
+      colon = index(":", i + 1)
+      i = colon + 1 + int(data[i + 1: colon])
+      append(data[colon + 1: i])
+    elif dataType == "i":
+      end = index("e", i + 1)
+      append(int(data[i + 1: end]))
+      i = end + 1
+    else:
+      ob, i = decodeFunctions[dataType](data, i)
+      append(ob)
+    dataType = data[i]
+  return (oL, i + 1)
+
+
+def fastDecodeTuple(data, i):
+  """ Decoding tuple, with inlined str and int items """
+
+  oL, i = fastDecodeList(data, i)
+  return (tuple(oL), i)
+
+
+def fastDecodeDict(data, i):
+  """ Decoding dictionary, with inlined str and int keys and values """
+
+  index = data.index
+  decodeFunctions = g_dFastDecodeFunctions
+  oD = {}
+  i += 1
+  dataType = data[i]
+  while dataType != "e":
+    if dataType == "s":
+      colon = index(":", i + 1)
+      i = colon + 1 + int(data[i + 1: colon])
+      k = data[colon + 1: i]
+    elif dataType == "i":
+      end = index("e", i + 1)
+      k = int(data[i + 1: end])
+      i = end + 1
+    else:
+      k, i = decodeFunctions[dataType](data, i)
+    dataType = data[i]
+    if dataType == "s":
+      colon = index(":", i + 1)
+      i = colon + 1 + int(data[i + 1: colon])
+      oD[k] = data[colon + 1: i]
+    elif dataType == "i":
+      end = index("e", i + 1)
+      oD[k] = int(data[i + 1: end])
+      i = end + 1
+    else:
+      oD[k], i = decodeFunctions[dataType](data, i)
+    dataType = data[i]
+  return (oD, i + 1)
+
+
+def fastDecodeDateTime(data, i):
+  """ Decoding datetime """
+
+  dataType = data[i + 1]
+  tupleObject, i = g_dFastDecodeFunctions[data[i + 2]](data, i + 2)
+  if dataType == 'a':
+    dtObject = datetime.datetime(*tupleObject)
+  elif dataType == 'd':
+    dtObject = datetime.date(*tupleObject)
+  elif dataType == 't':
+    dtObject = datetime.time(*tupleObject)
+  else:
+    raise Exception("Unexpected type %s while decoding a datetime object" % dataType)
+  return (dtObject, i)
+
+
+g_dFastDecodeFunctions["l"] = fastDecodeList
+g_dFastDecodeFunctions["t"] = fastDecodeTuple
+g_dFastDecodeFunctions["d"] = fastDecodeDict
+g_dFastDecodeFunctions["z"] = fastDecodeDateTime
+
+
+def legacyEncode(uObject):
+  """ Encoding function using only the original per-type functions.
+      It is kept as a reference for the tests and the benchmarks, and is used
+      by encode when DIRAC_DEBUG_DENCODE_CALLSTACK is set
+  """
+
+  eList = []
+  g_dEncodeFunctions[type(uObject)](uObject, eList)
+  return "".join(eList)
+
+
+def legacyDecode(data):
+  """ Decoding function using only the original per-type functions.
+      It is kept as a reference for the tests and the benchmarks, and is used
+      by decode when DIRAC_DEBUG_DENCODE_CALLSTACK is set
+  """
+  if not data:
+    return data
+  return g_dDecodeFunctions[data[0]](data, 0)
+
+
 # Encode function
 def encode(uObject):
   """ Generic encoding function """
 
-  try:
-    eList = []
-    # print "ENCODE FUNCTION : %s" % g_dEncodeFunctions[ type( uObject ) ]
-    g_dEncodeFunctions[type(uObject)](uObject, eList)
-    return "".join(eList)
-  except Exception:
-    raise
+  if DIRAC_DEBUG_DENCODE_CALLSTACK:
+    return legacyEncode(uObject)
+  eList = []
+  g_dFastEncodeFunctions[type(uObject)](uObject, eList)
+  return "".join(eList)
 
 
 def decode(data):
   """ Generic decoding function """
   if not data:
     return data
-  try:
-    # print "DECODE FUNCTION : %s" % g_dDecodeFunctions[ sStream [ iIndex ] ]
-    return g_dDecodeFunctions[data[0]](data, 0)
-  except Exception:
-    raise
+  if DIRAC_DEBUG_DENCODE_CALLSTACK:
+    return legacyDecode(data)
+  return g_dFastDecodeFunctions[data[0]](data, 0)
 
 
 if __name__ == "__main__":
@@ -87,6 +87,7 @@ ENOGROUP = 1108
 # DISET: 1X
 EDISET = 1110
 ENOAUTH = 1111
+ECONNLOST = 1112
 # 3rd party security: 2X
 E3RDPARTY = 1120
 EVOMS = 1121
@@ -163,6 +164,7 @@ dErrorCode = {
     # 111X: DISET
     1110: 'EDISET',
     1111: 'ENOAUTH',
+    1112: 'ECONNLOST',
     # 112X: 3rd party security
     1120: 'E3RDPARTY',
     1121: 'EVOMS',
@@ -235,6 +237,7 @@ dStrError = {  # Generic (10XX)
     # 111X: DISET
     EDISET: "DISET Error",
     ENOAUTH: "Unauthorized query",
+    ECONNLOST: "Connection lost",
     # 112X: 3rd party security
     E3RDPARTY: "3rd party security service error",
     EVOMS: "VOMS Error",
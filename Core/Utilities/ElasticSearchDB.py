@@ -6,6 +6,7 @@ Elasticsearch database.
 
 __RCSID__ = "$Id$"
 
+import threading
 from datetime import datetime
 from datetime import timedelta
 
@@ -34,6 +35,8 @@ class ElasticSearchDB(object):
   __chunk_size = 1000
   __url = ""
   __timeout = 120
+  # Maximum number of index names remembered as existing
+  __maxKnownIndexes = 1000
   clusterName = ''
   RESULT_SIZE = 10000
 
@@ -51,6 +54,9 @@ class ElasticSearchDB(object):
 
     self.__indexPrefix = indexPrefix
     self._connected = False
+    # Indexes known to exist, their names contain the period so that a new period is checked again
+    self.__knownIndexes = set()
+    self.__knownIndexesLock = threading.Lock()
     if user and password:
       gLogger.debug("Specified username and password")
       self.__url = "https://%s:%s@%s:%d" % (user, password, host, port)
@@ -187,6 +193,25 @@ class ElasticSearchDB(object):
     """
     return self.__client.indices.exists(indexName)
 
+  def __isKnownIndex(self, indexName):
+    """
+    It checks the existence of an index, remembering the indexes that exist
+    :param str indexName: the name of the index
+    """
+    with self.__knownIndexesLock:
+      if indexName in self.__knownIndexes:
+        return True
+    if not self.exists(indexName):
+      return False
+    self.__addKnownIndex(indexName)
+    return True
+
+  def __addKnownIndex(self, indexName):
+    with self.__knownIndexesLock:
+      if len(self.__knownIndexes) >= self.__maxKnownIndexes:
+        self.__knownIndexes.clear()
+      self.__knownIndexes.add(indexName)
+
   ########################################################################
 
   def createIndex(self, indexPrefix, mapping, period=None):
@@ -198,12 +223,13 @@ class ElasticSearchDB(object):
 
     """
     fullIndex = generateFullIndexName(indexPrefix, period)  # we have to create an index each day...
-    if self.exists(fullIndex):
+    if self.__isKnownIndex(fullIndex):
       return S_OK(fullIndex)
 
     try:
       gLogger.info("Create index: ", fullIndex + str(mapping))
       self.__client.indices.create(fullIndex, body={'mappings': mapping})
+      self.__addKnownIndex(fullIndex)
       return S_OK(fullIndex)
     except Exception as e:  # pylint: disable=broad-except
       gLogger.error("Can not create the index:", e)
@@ -213,6 +239,9 @@ class ElasticSearchDB(object):
     """
     :param str indexName the name of the index to be deleted...
     """
+    # The name can be a pattern
+    with self.__knownIndexesLock:
+      self.__knownIndexes.clear()
     try:
       retVal = self.__client.indices.delete(indexName)
     except NotFoundError as e:
@@ -261,48 +290,60 @@ class ElasticSearchDB(object):
 
     indexName = generateFullIndexName(indexprefix, period)
     gLogger.debug("inserting datat to %s index" % indexName)
-    if not self.exists(indexName):
+    if not self.__isKnownIndex(indexName):
       retVal = self.createIndex(indexprefix, mapping, period)
       if not retVal['OK']:
         return retVal
-    docs = []
-    for row in data:
-      body = {
-          '_index': indexName,
-          '_type': doc_type,
-          '_source': {}
-      }
-      body['_source'] = row
-
-      if 'timestamp' not in row:
-        gLogger.warn("timestamp is not given! Note: the actual time is used!")
-
-      # if the timestamp is not provided, we use the current utc time.
-      timestamp = row.get('timestamp', int(Time.toEpoch()))
-      try:
-        if isinstance(timestamp, datetime):
-          body['_source']['timestamp'] = int(timestamp.strftime('%s')) * 1000
-        elif isinstance(timestamp, basestring):
-          timeobj = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S.%f')
-          body['_source']['timestamp'] = int(timeobj.strftime('%s')) * 1000
-        else:  # we assume  the timestamp is an unix epoch time (integer).
-          body['_source']['timestamp'] = timestamp * 1000
-      except (TypeError, ValueError) as e:
-        # in case we are not able to convert the timestamp to epoch time....
-        gLogger.error("Wrong timestamp", e)
-        body['_source']['timestamp'] = int(Time.toEpoch()) * 1000
-      docs += [body]
+    # The documents are generated while they are sent, chunk by chunk
+    nbDocs = [0]
+
+    def generateDocs():
+      for row in data:
+        nbDocs[0] += 1
+        yield self.__getBulkAction(indexName, doc_type, row)
+
     try:
-      res = bulk(self.__client, docs, chunk_size=self.__chunk_size)
+      res = bulk(self.__client, generateDocs(), chunk_size=self.__chunk_size)
     except BulkIndexError as e:
       return S_ERROR(e)
 
-    if res[0] == len(docs):
+    if res[0] == nbDocs[0]:
       # we have inserted all documents...
-      return S_OK(len(docs))
-    else:
-      return S_ERROR(res)
-    return res
+      return S_OK(nbDocs[0])
+    return S_ERROR(res)
+
+  @staticmethod
+  def __getBulkAction(indexName, doc_type, row):
+    """
+    It returns the bulk action indexing a record, its timestamp is converted to milliseconds
+    :param str indexName: the name of the index
+    :param str doc_type: the type of the document
+    :param dict row: the record, which is not modified so that it can be inserted again in case of failure
+    """
+    body = {
+        '_index': indexName,
+        '_type': doc_type,
+        '_source': dict(row)
+    }
+
+    if 'timestamp' not in row:
+      gLogger.warn("timestamp is not given! Note: the actual time is used!")
+
+    # if the timestamp is not provided, we use the current utc time.
+    timestamp = row.get('timestamp', int(Time.toEpoch()))
+    try:
+      if isinstance(timestamp, datetime):
+        body['_source']['timestamp'] = int(timestamp.strftime('%s')) * 1000
+      elif isinstance(timestamp, basestring):
+        timeobj = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S.%f')
+        body['_source']['timestamp'] = int(timeobj.strftime('%s')) * 1000
+      else:  # we assume  the timestamp is an unix epoch time (integer).
+        body['_source']['timestamp'] = timestamp * 1000
+    except (TypeError, ValueError) as e:
+      # in case we are not able to convert the timestamp to epoch time....
+      gLogger.error("Wrong timestamp", e)
+      body['_source']['timestamp'] = int(Time.toEpoch()) * 1000
+    return body
 
   def getUniqueValue(self, indexName, key, orderBy=False):
     """
@@ -3,12 +3,24 @@
 
 import threading
 import time
+import zlib
 
 from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities.ReturnValues import isReturnStructure
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 
 
+def getTaskShard(taskId, shards):
+  """ Index of the shard, among shards, owning a task. Integer ids are distributed round robin,
+      other ids by their checksum, so that all the processes agree
+  """
+  if shards <= 1:
+    return 0
+  if isinstance(taskId, (int, long)):
+    return taskId % shards
+  return (zlib.crc32(str(taskId)) & 0xffffffff) % shards
+
+
 class ExecutorState(object):
 
   def __init__(self, log=False):
@@ -93,6 +105,22 @@ class ExecutorState(object):
       pass
     return execs
 
+  def getUtilization(self, eType):
+    """ Tasks being executed and task slots of the executors of a type
+    """
+    busy = 0
+    slots = 0
+    try:
+      for eId in list(self.__typeToId[eType]):
+        try:
+          busy += len(self.__execTasks[eId])
+          slots += self.__maxTasks[eId]
+        except KeyError:
+          pass
+    except KeyError:
+      pass
+    return busy, slots
+
   def getIdleExecutor(self, eType):
     idleId = None
     maxFreeSlots = 0
@@ -280,6 +308,7 @@ class ExecutorDispatcher:
       self.frozenMsg = False
       self.eType = False
       self.sendTime = 0
+      self.queuedSince = 0
       self.retries = 0
 
     def __repr__(self):
@@ -303,6 +332,8 @@ class ExecutorDispatcher:
     self.__states = ExecutorState(self.__log)
     self.__cbHolder = ExecutorDispatcherCallbacks()
     self.__monitor = monitor
+    # eType : [ tasks sent, total and maximum seconds they waited in the queue ]
+    self.__latencies = {}
     gThreadScheduler.addPeriodicTask(60, self.__doPeriodicStuff)
     # If a task is frozen too many times, send error or forget task?
     self.__failedOnTooFrozen = True
@@ -317,6 +348,8 @@ class ExecutorDispatcher:
                                       "Executors", "tasks", self.__monitor.OP_RATE, 300)
       self.__monitor.registerActivity("taskTime", "Task processing time",
                                       "Executors", "seconds", self.__monitor.OP_MEAN, 300)
+      self.__monitor.registerActivity("dispatchLatency", "Time waiting for an executor",
+                                      "Executors", "seconds", self.__monitor.OP_MEAN, 300)
 
   def setFailedOnTooFrozen(self, value):
     self.__failedOnTooFrozen = value
@@ -357,6 +390,9 @@ class ExecutorDispatcher:
         self.__monitor.addMark("executors-%s" % eType, self.__execTypes[eType])
       except KeyError:
         pass
+      self.__monitor.addMark("queue-%s" % eType, self.__queues.waitingTasks(eType))
+      busy, slots = self.__states.getUtilization(eType)
+      self.__monitor.addMark("utilization-%s" % eType, 100. * busy / slots if slots else 0.)
     self.__monitor.addMark("executors", len(self.__idMap))
 
   def addExecutor(self, eId, eTypes, maxTasks=1):
@@ -379,6 +415,10 @@ class ExecutorDispatcher:
                                             "Executors", "tasks", self.__monitor.OP_RATE, 300)
             self.__monitor.registerActivity("taskTime-%s" % eType, "Task processing time for %s" % eType,
                                             "Executors", "seconds", self.__monitor.OP_MEAN, 300)
+            self.__monitor.registerActivity("queue-%s" % eType, "Tasks waiting for %s" % eType,
+                                            "Executors", "tasks", self.__monitor.OP_MEAN, 300)
+            self.__monitor.registerActivity("utilization-%s" % eType, "Task slots of %s in use" % eType,
+                                            "Executors", "%", self.__monitor.OP_MEAN, 300)
         self.__execTypes[eType] += 1
     finally:
       self.__executorsLock.release()
@@ -545,6 +585,10 @@ class ExecutorDispatcher:
       self.__log.verbose("Executor type %s has not connected. Forgetting task %s" % (eType, taskId))
       return self.removeTask(taskId)
 
+    try:
+      self.__tasks[taskId].queuedSince = time.time()
+    except KeyError:
+      pass
     self.__queues.pushTask(eType, taskId)
     self.__fillExecutors(eType, defrozeIfNeeded=defrozeIfNeeded)
     return S_OK()
@@ -601,6 +645,32 @@ class ExecutorDispatcher:
 
     return result
 
+  def __addLatency(self, eType, latency):
+    latencies = self.__latencies.setdefault(eType, [0, 0., 0.])
+    latencies[0] += 1
+    latencies[1] += latency
+    latencies[2] = max(latencies[2], latency)
+    if self.__monitor:
+      self.__monitor.addMark("dispatchLatency", latency)
+
+  def getStats(self):
+    """ Per executor type: executors connected, tasks queued, dispatch latency and utilization
+        of the task slots, plus the number of tasks known and frozen
+    """
+    stats = {'Tasks': len(self.__tasks), 'Frozen': len(self.__taskFreezer), 'Types': {}}
+    for eType in set(self.__execTypes) | set(self.__queues.getExecutorList()):
+      busy, slots = self.__states.getUtilization(eType)
+      sent, totalLatency, maxLatency = self.__latencies.get(eType, (0, 0., 0.))
+      stats['Types'][eType] = {'Executors': self.__execTypes.get(eType, 0),
+                               'Queued': self.__queues.waitingTasks(eType),
+                               'Sent': sent,
+                               'MeanDispatchLatency': totalLatency / sent if sent else 0.,
+                               'MaxDispatchLatency': maxLatency,
+                               'BusySlots': busy,
+                               'Slots': slots,
+                               'Utilization': float(busy) / slots if slots else 0.}
+    return stats
+
   def getTaskIds(self):
     return self.__tasks.keys()
 
@@ -791,9 +861,12 @@ class ExecutorDispatcher:
 
   def __msgTaskToExecutor(self, taskId, eId, eType):
     try:
-      self.__tasks[taskId].sendTime = time.time()
+      eTask = self.__tasks[taskId]
     except KeyError:
       return S_ERROR("Task %s has been deleted" % taskId)
+    eTask.sendTime = time.time()
+    if eTask.queuedSince:
+      self.__addLatency(eType, eTask.sendTime - eTask.queuedSince)
     try:
       result = self.__cbHolder.cbSendTask(taskId, self.__tasks[taskId].taskObj, eId, eType)
     except BaseException:
@@ -1,18 +1,17 @@
 """ DIRAC Basic MySQL Class
     It provides access to the basic MySQL methods in a multithread-safe mode
-    keeping used connections in a python Queue for further reuse.
+    keeping used connections in a pool shared by all the threads for further reuse.
 
     These are the coded methods:
 
 
-    __init__( host, user, passwd, name, [maxConnsInQueue=10] )
+    __init__( host, user, passwd, name, [maxQueueSize=10] )
 
-    Initializes the Queue and tries to connect to the DB server,
+    Initializes the pool and tries to connect to the DB server,
     using the _connect method.
-    "maxConnsInQueue" defines the size of the Queue of open connections
-    that are kept for reuse. It also defined the maximum number of open
-    connections available from the object.
-    maxConnsInQueue = 0 means unlimited and it is not supported.
+    "maxQueueSize" defines the maximum number of connections used at the
+    same time by the threads for single queries. When all of them are busy,
+    a thread waits for one to be given back to the pool.
 
 
     _except( methodName, exception, errorMessage )
@@ -32,20 +31,18 @@
     _query( cmd, [conn] )
 
     Executes SQL command "cmd".
-    Gets a connection from the Queue (or open a new one if none is available),
-    the used connection is  back into the Queue.
-    If a connection to the the DB is passed as second argument this connection
-    is used and is not  in the Queue.
+    Checks out a connection from the pool (or open a new one if none is available),
+    the used connection is given back to the pool.
+    If the thread has a dedicated connection (see _getConnection), this one is used.
     Returns S_OK with fetchall() out in Value or S_ERROR upon failure.
 
 
     _update( cmd, [conn] )
 
     Executes SQL command "cmd" and issue a commit
-    Gets a connection from the Queue (or open a new one if none is available),
-    the used connection is  back into the Queue.
-    If a connection to the the DB is passed as second argument this connection
-    is used and is not  in the Queue
+    Checks out a connection from the pool (or open a new one if none is available),
+    the used connection is given back to the pool.
+    If the thread has a dedicated connection (see _getConnection), this one is used.
     Returns S_OK with number of updated registers in Value or S_ERROR upon failure.
 
 
@@ -56,10 +53,15 @@
 
     _getConnection()
 
-    Gets a connection from the Queue (or open a new one if none is available)
+    Gets a connection dedicated to the calling thread (or open a new one if none is available)
     Returns S_OK with connection in Value or S_ERROR
-    the calling method is responsible for closing this connection once it is no
-    longer needed.
+    All the queries of the thread use this connection until the thread finishes or
+    the connection is not used for a while, after which it goes back to the pool.
+
+
+    _getConnectionPoolStats()
+
+    Returns S_OK with the statistics of the connection pool.
 
 
 
@@ -156,6 +158,7 @@ from DIRAC import gLogger
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Time import fromString
 from DIRAC.Core.Utilities import DErrno
+from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 
 # This is for proper initialization of embedded server, it should only be called once
 try:
@@ -169,6 +172,14 @@ __RCSID__ = "$Id$"
 
 
 MAXCONNECTRETRY = 10
+# Default maximum number of connections shared by the threads of a pool
+MAXCONNECTIONS = 10
+# Connections not seen working for longer than this (in seconds) are pinged before being used
+PINGAGE = 30
+# Maximum time (in seconds) to wait for a connection when all of them are busy
+WAITTIMEOUT = 300
+# Minimum time (in seconds) between two cleanings of the pool
+CLEANINTERVAL = 10
 
 
 def _checkFields(inFields, inValues):
@@ -216,19 +227,50 @@ class MySQL(object):
 
   class ConnectionPool(object):
     """
-    Management of connections per thread
+    Management of a bounded set of connections shared by all the threads
+
+    Connections are checked out for the duration of a single query (checkout)
+    and given back afterwards (checkin), so that many threads can be served by
+    a few connections. At most maxConnections of them are used that way, if all
+    of them are busy the callers wait for one to be given back.
+
+    A connection can also be dedicated to a thread with get(), for callers that
+    need the same connection for several queries (table locks, transactions).
+    It is returned by checkout for that thread until every get has been matched
+    by a release. Dedicated connections count against maxConnections as well.
+    The ones that are never released are taken back when their thread dies or
+    when they have not been used for graceTime seconds.
+
+    Connections are only pinged when they have not been seen working for pingAge seconds.
+    Connections closed by their users are replaced.
     """
 
-    def __init__(self, host, user, passwd, port=3306, graceTime=600):
+    def __init__(self, host, user, passwd, port=3306, graceTime=600,
+                 maxConnections=MAXCONNECTIONS, pingAge=PINGAGE, waitTimeout=WAITTIMEOUT):
       self.__host = host
       self.__user = user
       self.__passwd = passwd
       self.__port = port
       self.__graceTime = graceTime
+      self.__maxConnections = max(1, maxConnections)
+      self.__pingAge = pingAge
+      self.__waitTimeout = waitTimeout
+      self.__lock = threading.Condition()
+      # Connections are kept as [ conn, dbName, lastUseTime, lastCheckTime ]
       self.__spares = collections.deque()
-      self.__maxSpares = 10
+      self.__checkedOut = {}
+      self.__connecting = 0
       self.__lastClean = 0
       self.__assigned = {}
+      # Number of gets not released yet per thread with a dedicated connection
+      self.__pinDepth = {}
+      self.__stats = {'Created': 0,
+                      'Closed': 0,
+                      'Pings': 0,
+                      'Checkouts': 0,
+                      'Waits': 0,
+                      'WaitTime': 0.}
+      self.__monitorReady = False
 
     @property
     def __thid(self):
@@ -241,8 +283,23 @@ class MySQL(object):
                              passwd=self.__passwd)
 
       self.__execute(conn, "SET AUTOCOMMIT=1")
+      with self.__lock:
+        self.__stats['Created'] += 1
+      self.__addMark('MySQLConnCreated', 1)
       return conn
 
+    def __close(self, conn):
+      with self.__lock:
+        self.__stats['Closed'] += 1
+      if not conn.open:
+        return
+      try:
+        conn.close()
+      except MySQLdb.ProgrammingError as exc:
+        gLogger.warn("ProgrammingError exception while closing MySQL connection: %s" % exc)
+      except BaseException as exc:
+        gLogger.warn("Exception while closing MySQL connection: %s" % exc)
+
     def __execute(self, conn, cmd):
       cursor = conn.cursor()
       res = cursor.execute(cmd)
@@ -250,85 +307,225 @@ class MySQL(object):
       cursor.close()
       return res
 
+    def __registerActivities(self):
+      """ Register the pool activities in gMonitor, which only accepts them once initialized
+      """
+      gMonitor.registerActivity('MySQLConnWaitTime', "Time waiting for a MySQL connection",
+                                "MySQL", "seconds", gMonitor.OP_MEAN)
+      gMonitor.registerActivity('MySQLConnInUse', "MySQL connections in use",
+                                "MySQL", "connections", gMonitor.OP_MEAN)
+      gMonitor.registerActivity('MySQLConnCreated', "MySQL connections created",
+                                "MySQL", "connections", gMonitor.OP_RATE)
+      self.__monitorReady = 'MySQLConnCreated' in gMonitor.activitiesDefinitions
+
+    def __addMark(self, name, value):
+      if not self.__monitorReady:
+        self.__registerActivities()
+        if not self.__monitorReady:
+          return
+      gMonitor.addMark(name, value)
+
     def get(self, dbName, retries=10):
+      """ Get a connection dedicated to the current thread
+
+          :param str dbName: database to select on the connection
+          :param int retries: number of connection attempts
+          :return: S_OK(connection)/S_ERROR
+      """
       retries = max(0, min(MAXCONNECTRETRY, retries))
       self.clean()
-      return self.__getWithRetry(dbName, retries, retries)
-
-    def __getWithRetry(self, dbName, totalRetries, retriesLeft):
-      sleepTime = 5 * (totalRetries - retriesLeft)
-      if sleepTime > 0:
-        time.sleep(sleepTime)
-      try:
-        conn, lastName, thid = self.__innerGet()
-      except MySQLdb.MySQLError as excp:
-        if retriesLeft >= 0:
-          return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
-        return S_ERROR(DErrno.EMYSQL, "Could not connect: %s" % excp)
-
-      if not self.__ping(conn):
-        try:
-          self.__assigned.pop(thid)
-        except KeyError:
-          pass
-        if retriesLeft >= 0:
-          return self.__getWithRetry(dbName, totalRetries, retriesLeft)
-        return S_ERROR(DErrno.EMYSQL, "Could not connect")
+      result = self.__getWithRetry(dbName, retries, pinned=True)
+      if result['OK']:
+        thid = self.__thid
+        with self.__lock:
+          self.__pinDepth[thid] = self.__pinDepth.get(thid, 0) + 1
+      return result
+
+    def release(self):
+      """ Give back the connection dedicated to the current thread by get.
+          It goes back to the pool once every get of the thread has been released.
+      """
+      thid = self.__thid
+      with self.__lock:
+        depth = self.__pinDepth.get(thid, 0) - 1
+        if depth > 0:
+          self.__pinDepth[thid] = depth
+          return
+      self.__pop(thid)
+
+    def checkout(self, dbName, retries=10):
+      """ Get a connection for a single use, it has to be given back with checkin.
+          If the current thread has a dedicated connection, that one is returned.
+
+          :param str dbName: database to select on the connection
+          :param int retries: number of connection attempts
+          :return: S_OK(connection)/S_ERROR
+      """
+      retries = max(0, min(MAXCONNECTRETRY, retries))
+      if time.time() - self.__lastClean > CLEANINTERVAL:
+        self.clean()
+      return self.__getWithRetry(dbName, retries, pinned=False)
+
+    def checkin(self, conn, excp=None):
+      """ Give back a connection obtained with checkout
+
+          :param conn: connection
+          :param excp: exception raised while using it, if any. If it means the
+                       connection is no longer usable, the connection is dropped
+      """
+      broken = self.__isBroken(excp)
+      thid = self.__thid
+      data = self.__assigned.get(thid)
+      if data and data[0] is conn:
+        if broken:
+          self.__discard(data)
+        else:
+          data[3] = time.time()
+        return
+      with self.__lock:
+        data = self.__checkedOut.pop(conn, None)
+        if data:
+          if broken:
+            self.__close(conn)
+          else:
+            data[2] = data[3] = time.time()
+            self.__spares.append(data)
+          self.__lock.notify()
+
+    @staticmethod
+    def __isBroken(excp):
+      # InterfaceError is raised when the connection has been closed
+      if isinstance(excp, MySQLdb.InterfaceError):
+        return True
+      return isinstance(excp, MySQLdb.OperationalError) and excp.args and excp.args[0] in (2006, 2013)
 
-      if lastName != dbName:
+    def __getWithRetry(self, dbName, totalRetries, pinned):
+      retriesLeft = totalRetries
+      while True:
         try:
-          conn.select_db(dbName)
+          data = self.__innerGet(pinned)
         except MySQLdb.MySQLError as excp:
-          if retriesLeft >= 0:
-            return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
-          return S_ERROR(DErrno.EMYSQL, "Could not select db %s: %s" % (dbName, excp))
-        try:
-          self.__assigned[thid][1] = dbName
-        except KeyError:
-          if retriesLeft >= 0:
-            return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
-          return S_ERROR(DErrno.EMYSQL, "Could not connect")
-      return S_OK(conn)
+          if retriesLeft <= 0:
+            return S_ERROR(DErrno.EMYSQL, "Could not connect: %s" % excp)
+          retriesLeft -= 1
+          time.sleep(5 * (totalRetries - retriesLeft))
+          continue
+        if not data:
+          return S_ERROR(DErrno.EMYSQL, "Could not get a connection in %s seconds" % self.__waitTimeout)
+
+        conn = data[0]
+        now = time.time()
+        # A connection closed by its user is replaced. The other ones are only checked when they
+        # have not been seen working for a while, a stale one is simply replaced and does not count as a retry
+        if not conn.open:
+          self.__discard(data)
+          continue
+        if now - data[3] > self.__pingAge:
+          if not self.__ping(conn):
+            self.__discard(data)
+            continue
+          data[3] = now
+
+        if data[1] != dbName:
+          try:
+            conn.select_db(dbName)
+          except MySQLdb.MySQLError as excp:
+            self.__discard(data)
+            if retriesLeft <= 0:
+              return S_ERROR(DErrno.EMYSQL, "Could not select db %s: %s" % (dbName, excp))
+            retriesLeft -= 1
+            time.sleep(5 * (totalRetries - retriesLeft))
+            continue
+          data[1] = dbName
+        data[2] = now
+        return S_OK(conn)
 
     def __ping(self, conn):
+      with self.__lock:
+        self.__stats['Pings'] += 1
       try:
-        conn.ping(True)
+        conn.ping()
         return True
       except BaseException:
         return False
 
-    def __innerGet(self):
+    def __discard(self, data):
+      """ Forget and close a connection that can no longer be used
+      """
+      with self.__lock:
+        for thid, assigned in self.__assigned.items():
+          if assigned is data:
+            del self.__assigned[thid]
+        self.__checkedOut.pop(data[0], None)
+        self.__lock.notify()
+      self.__close(data[0])
+
+    def __innerGet(self, pinned):
       thid = self.__thid
-      now = time.time()
       if thid in self.__assigned:
-        data = self.__assigned[thid]
-        conn = data[0]
-        data[2] = now
-        return data[0], data[1], thid
-      # Not cached
-      try:
-        conn, dbName = self.__spares.pop()
-      except IndexError:
-        conn = self.__newConn()
-        dbName = ""
+        return self.__assigned[thid]
+
+      startTime = time.time()
+      waited = False
+      data = None
+      with self.__lock:
+        while not self.__spares and \
+                len(self.__checkedOut) + len(self.__assigned) + self.__connecting >= self.__maxConnections:
+          waited = True
+          remaining = self.__waitTimeout - (time.time() - startTime)
+          if remaining <= 0:
+            self.__stats['Waits'] += 1
+            self.__stats['WaitTime'] += time.time() - startTime
+            return None
+          self.__lock.wait(remaining)
+        if self.__spares:
+          data = self.__spares.pop()
+          self.__book(thid, data, pinned)
+        else:
+          # Book the slot before connecting outside of the lock
+          self.__connecting += 1
 
-      self.__assigned[thid] = [conn, dbName, now]
-      return conn, dbName, thid
+      if data is None:
+        try:
+          data = [self.__newConn(), "", time.time(), time.time()]
+        finally:
+          with self.__lock:
+            self.__connecting -= 1
+            if data:
+              self.__book(thid, data, pinned)
+            else:
+              self.__lock.notify()
+
+      waitTime = time.time() - startTime
+      with self.__lock:
+        self.__stats['Checkouts'] += 1
+        if waited:
+          self.__stats['Waits'] += 1
+          self.__stats['WaitTime'] += waitTime
+      self.__addMark('MySQLConnWaitTime', waitTime)
+      return data
+
+    def __book(self, thid, data, pinned):
+      """ Record a connection as used, the lock has to be held
+      """
+      if pinned:
+        self.__assigned[thid] = data
+      else:
+        self.__checkedOut[data[0]] = data
 
     def __pop(self, thid):
-      try:
-        data = self.__assigned.pop(thid)
-        if len(self.__spares) < self.__maxSpares:
-          self.__spares.append((data[0], data[1]))
-        else:
-          try:
-            data[0].close()
-          except MySQLdb.ProgrammingError as exc:
-            gLogger.warn("ProgrammingError exception while closing MySQL connection: %s" % exc)
-          except BaseException as exc:
-            gLogger.warn("Exception while closing MySQL connection: %s" % exc)
-      except KeyError:
-        pass
+      """ Take back the connection dedicated to a thread
+      """
+      with self.__lock:
+        self.__pinDepth.pop(thid, None)
+        data = self.__assigned.pop(thid, None)
+        if not data:
+          return
+        self.__lock.notify()
+        if len(self.__spares) + len(self.__checkedOut) + len(self.__assigned) < self.__maxConnections:
+          self.__spares.append(data)
+          return
+      self.__close(data[0])
 
     def clean(self, now=False):
       if not now:
@@ -343,6 +540,30 @@ class MySQL(object):
           continue
         if now - data[2] > self.__graceTime:
           self.__pop(thid)
+      # Close the spare connections that have not been used for a while
+      with self.__lock:
+        oldSpares = [data for data in self.__spares if now - data[2] > self.__graceTime]
+        for data in oldSpares:
+          self.__spares.remove(data)
+      for data in oldSpares:
+        self.__close(data[0])
+      with self.__lock:
+        inUse = len(self.__checkedOut) + len(self.__assigned)
+      self.__addMark('MySQLConnInUse', inUse)
+
+    def getStats(self):
+      """ Get the statistics of the pool
+
+          :return: dictionary with the counters since the creation of the pool and
+                   the current number of connections per state
+      """
+      with self.__lock:
+        stats = dict(self.__stats)
+        stats['Spare'] = len(self.__spares)
+        stats['InUse'] = len(self.__checkedOut)
+        stats['Assigned'] = len(self.__assigned)
+      stats['MaxConnections'] = self.__maxConnections
+      return stats
 
     def transactionStart(self, dbName):
       result = self.get(dbName)
@@ -355,34 +576,37 @@ class MySQL(object):
         return S_ERROR(DErrno.EMYSQL, "Could not begin transaction: %s" % excp)
 
     def transactionCommit(self, dbName):
-      result = self.get(dbName)
-      if not result['OK']:
-        return result
-      conn = result['Value']
-      try:
-        result = self.__execute(conn, "COMMIT")
-        return S_OK(result)
-      except MySQLdb.MySQLError as excp:
-        return S_ERROR(DErrno.EMYSQL, "Could not commit transaction: %s" % excp)
+      return self.__transactionEnd("COMMIT", "commit")
 
     def transactionRollback(self, dbName):
-      result = self.get(dbName)
-      if not result['OK']:
-        return result
-      conn = result['Value']
+      return self.__transactionEnd("ROLLBACK", "rollback")
+
+    def __transactionEnd(self, cmd, action):
+      """ Run cmd on the connection of the transaction, and release it
+      """
+      data = self.__assigned.get(self.__thid)
       try:
-        result = self.__execute(conn, "ROLLBACK")
-        return S_OK(result)
-      except MySQLdb.MySQLError as excp:
-        return S_ERROR(DErrno.EMYSQL, "Could not rollback transaction: %s" % excp)
+        if not data:
+          return S_ERROR(DErrno.EMYSQL, "Could not %s transaction: no transaction started" % action)
+        try:
+          return S_OK(self.__execute(data[0], cmd))
+        except MySQLdb.MySQLError as excp:
+          return S_ERROR(DErrno.EMYSQL, "Could not %s transaction: %s" % (action, excp))
+      finally:
+        # Matches the get of transactionStart
+        self.release()
 
   __connectionPools = {}
 
-  def __init__(self, hostName='localhost', userName='dirac', passwd='dirac', dbName='', port=3306, debug=False):
+  def __init__(self, hostName='localhost', userName='dirac', passwd='dirac', dbName='', port=3306, debug=False,
+               maxQueueSize=MAXCONNECTIONS):
     """
     set MySQL connection parameters and try to connect
 
     :param debug: unused
+    :param int maxQueueSize: maximum number of connections shared by the threads. The connections
+                             are shared by all the instances using the same server and credentials,
+                             the first one to be created sets the size, a different size is ignored.
     """
     global gInstancesCount
     gInstancesCount += 1
@@ -404,8 +628,12 @@ class MySQL(object):
     self.__port = port
     cKey = (self.__hostName, self.__userName, self.__passwd, self.__port)
     if cKey not in MySQL.__connectionPools:
-      MySQL.__connectionPools[cKey] = MySQL.ConnectionPool(*cKey)
+      MySQL.__connectionPools[cKey] = MySQL.ConnectionPool(*cKey, maxConnections=maxQueueSize)
     self.__connectionPool = MySQL.__connectionPools[cKey]
+    poolSize = self.__connectionPool.getStats()['MaxConnections']
+    if poolSize != max(1, maxQueueSize):
+      self.log.warn("Connection pool already created with another size, ignoring MaxQueueSize",
+                    "%s: %s connections used instead of %s" % (self.__dbName, poolSize, maxQueueSize))
 
     self.__initialized = True
     result = self._connect()
@@ -455,11 +683,6 @@ class MySQL(object):
     It also includes quotation marks " around the given string
     """
 
-    retDict = self._getConnection()
-    if not retDict['OK']:
-      return retDict
-    connection = retDict['Value']
-
     try:
       myString = str(myString)
     except ValueError:
@@ -483,7 +706,14 @@ class MySQL(object):
           self.log.debug('__escape_string: Could not escape string', '"%s"' % myString)
           return S_ERROR(DErrno.EMYSQL, '__escape_string: Could not escape string')
 
-      escape_string = connection.escape_string(str(myString))
+      retDict = self.__connectionPool.checkout(self.__dbName)
+      if not retDict['OK']:
+        return retDict
+      connection = retDict['Value']
+      try:
+        escape_string = connection.escape_string(str(myString))
+      finally:
+        self.__connectionPool.checkin(connection)
       self.log.debug('__escape_string: returns', '"%s"' % escape_string)
       return S_OK('"%s"' % escape_string)
     except BaseException as x:
@@ -598,11 +828,12 @@ class MySQL(object):
 
     self.logger.debug('_query: %s' % self._safeCmd(cmd))
 
-    retDict = self._getConnection()
+    retDict = self.__connectionPool.checkout(self.__dbName)
     if not retDict['OK']:
       return retDict
     connection = retDict['Value']
 
+    error = None
     try:
       cursor = connection.cursor()
       if cursor.execute(cmd):
@@ -621,11 +852,13 @@ class MySQL(object):
     except BaseException as x:
       self.log.debug('_query: %s' % self._safeCmd(cmd))
       retDict = self._except('_query', x, 'Execution failed.')
+      error = x
 
     try:
       cursor.close()
     except BaseException:
       pass
+    self.__connectionPool.checkin(connection, error)
 
     return retDict
 
@@ -640,11 +873,12 @@ class MySQL(object):
 
     self.logger.debug('_update: %s' % self._safeCmd(cmd))
 
-    retDict = self._getConnection()
+    retDict = self.__connectionPool.checkout(self.__dbName)
     if not retDict['OK']:
       return retDict
     connection = retDict['Value']
 
+    error = None
     try:
       cursor = connection.cursor()
       res = cursor.execute(cmd)
@@ -656,11 +890,13 @@ class MySQL(object):
     except Exception as x:
       self.log.debug('_update: %s: %s' % (self._safeCmd(cmd), str(x)))
       retDict = self._except('_update', x, 'Execution failed.')
+      error = x
 
     try:
       cursor.close()
     except Exception:
       pass
+    self.__connectionPool.checkin(connection, error)
 
     return retDict
 
@@ -676,10 +912,10 @@ class MySQL(object):
     if not isinstance(cmdList, list):
       return S_ERROR(DErrno.EMYSQL, "_transaction: wrong type (%s) for cmdList" % type(cmdList))
 
-    # # get connection
+    # # get connection, the same one is used for all the commands
     connection = conn
     if not connection:
-      retDict = self._getConnection()
+      retDict = self.__connectionPool.checkout(self.__dbName)
       if not retDict['OK']:
         return retDict
       connection = retDict['Value']
@@ -692,12 +928,19 @@ class MySQL(object):
         cmdRet.append((cmd, cursor.execute(cmd)))
       connection.commit()
     except Exception as error:
-      self.logger.execption(error)
+      self.logger.exception(error)
       # # rollback, put back connection to the pool
-      connection.rollback()
+      try:
+        connection.rollback()
+      except Exception:
+        pass
+      if not conn:
+        self.__connectionPool.checkin(connection, error)
       return S_ERROR(DErrno.EMYSQL, error)
     # # close cursor, put back connection to the pool
     cursor.close()
+    if not conn:
+      self.__connectionPool.checkin(connection)
     return S_OK(cmdRet)
 
   def _createViews(self, viewsDict, force=False):
@@ -941,11 +1184,16 @@ class MySQL(object):
     return param[0].tostring()
 
   def _getConnection(self):
-    """ Return  a new connection to the DB,
+    """ Return a connection to the DB dedicated to the current thread,
 
-        Try the Queue, if it is empty add a newConnection to the Queue and retry
+        Take a spare one from the pool or open a new one if none is available,
         it will retry MAXCONNECTRETRY to open a new connection and will return
-        an error if it fails.
+        an error if it fails. All the queries of the thread will then use it
+        until it is given back with _releaseConnection, which has to be called
+        once the lock or the transaction it is needed for is over.
+        It is only needed when several queries must go through the same
+        connection (e.g. table locks), the query methods take one from the pool
+        for each query otherwise.
     """
     self.log.debug('_getConnection:')
 
@@ -956,6 +1204,20 @@ class MySQL(object):
 
     return self.__connectionPool.get(self.__dbName)
 
+  def _releaseConnection(self):
+    """ Give back the connection obtained with _getConnection
+    """
+    self.__connectionPool.release()
+
+  def _getConnectionPoolStats(self):
+    """ Statistics of the connection pool used by this instance
+
+        :return: S_OK(dict) with the number of connections created, closed, checked out,
+                 the number of times and total time spent waiting for a connection,
+                 and the current number of spare, in use and thread assigned connections
+    """
+    return S_OK(self.__connectionPool.getStats())
+
 ########################################################################################
 #
 #  Transaction functions
@@ -1441,12 +1703,13 @@ class MySQL(object):
                         (table, inFieldString, inValueString), conn)
 
   def executeStoredProcedure(self, packageName, parameters, outputIds):
-    conDict = self._getConnection()
+    conDict = self.__connectionPool.checkout(self.__dbName)
     if not conDict['OK']:
       return conDict
 
     connection = conDict['Value']
     cursor = connection.cursor()
+    error = None
     try:
       cursor.callproc(packageName, parameters)
       row = []
@@ -1457,22 +1720,25 @@ class MySQL(object):
       retDict = S_OK(row)
     except Exception as x:
       retDict = self._except('_query', x, 'Execution failed.')
+      error = x
       connection.rollback()
 
     try:
       cursor.close()
     except Exception:
       pass
+    self.__connectionPool.checkin(connection, error)
     return retDict
 
   # For the procedures that execute a select without storing the result
   def executeStoredProcedureWithCursor(self, packageName, parameters):
-    conDict = self._getConnection()
+    conDict = self.__connectionPool.checkout(self.__dbName)
     if not conDict['OK']:
       return conDict
 
     connection = conDict['Value']
     cursor = connection.cursor()
+    error = None
     try:
       #       execStr = "call %s(%s);" % ( packageName, ",".join( map( str, parameters ) ) )
       execStr = "call %s(%s);" % (packageName, ",".join(
@@ -1482,10 +1748,12 @@ class MySQL(object):
       retDict = S_OK(rows)
     except Exception as x:
       retDict = self._except('_query', x, 'Execution failed.')
+      error = x
       connection.rollback()
     try:
       cursor.close()
     except Exception:
       pass
+    self.__connectionPool.checkin(connection, error)
 
     return retDict
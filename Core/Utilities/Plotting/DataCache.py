@@ -1,4 +1,6 @@
 """ Accounting Cache
+
+    The report data is kept in memory, the plots on disk in a PlotFileCache shared by the service clones
 """
 
 __RCSID__ = "$Id$"
@@ -7,8 +9,9 @@ import os.path
 import time
 import threading
 
-from DIRAC import S_OK, S_ERROR, gLogger, rootPath, gConfig
+from DIRAC import S_OK, rootPath, gConfig
 from DIRAC.Core.Utilities.DictCache import DictCache
+from DIRAC.Core.Utilities.Plotting.PlotFileCache import PlotFileCache
 
 
 class DataCache( object ):
@@ -21,23 +24,21 @@ class DataCache( object ):
     self.purgeThread.setDaemon( 1 )
     self.purgeThread.start()
     self.__dataCache = DictCache()
-    self.__graphCache = DictCache( deleteFunction = self._deleteGraph )
     self.__dataLifeTime = 600
     self.__graphLifeTime = 3600
+    self.__graphCache = PlotFileCache( lifeTime = self.__graphLifeTime )
 
-  def setGraphsLocation( self, graphsDir ):
+  def setGraphsLocation( self, graphsDir, maxSize = 1024 * 1048576 ):
     self.graphsLocation = graphsDir
-    for graphName in os.listdir( self.graphsLocation ):
-      if graphName.find( ".png" ) > 0:
-        graphLocation = "%s/%s" % ( self.graphsLocation, graphName )
-        gLogger.verbose( "Purging %s" % graphLocation )
-        os.unlink( graphLocation )
+    self.__graphCache.maxSize = maxSize
+    self.__graphCache.setLocation( graphsDir )
 
   def purgeExpired( self ):
     while self.alive:
       time.sleep( 600 )
-      self.__graphCache.purgeExpired()
       self.__dataCache.purgeExpired()
+      if self.__graphCache.location:
+        self.__graphCache.evict()
 
   def getReportData( self, reportRequest, reportHash, dataFunc ):
     """
@@ -56,9 +57,7 @@ class DataCache( object ):
     """
     Get report data from cache if exists, else generate it
     """
-    plotDict = self.__graphCache.get( reportHash )
-    if not plotDict:
-      basePlotFileName = "%s/%s" % ( self.graphsLocation, reportHash )
+    def generatePlot( basePlotFileName ):
       retVal = plotFunc( reportRequest, reportData, basePlotFileName )
       if not retVal[ 'OK' ]:
         return retVal
@@ -67,32 +66,18 @@ class DataCache( object ):
         plotDict[ 'plot' ] = "%s.png" % reportHash
       if plotDict[ 'thumbnail' ]:
         plotDict[ 'thumbnail' ] = "%s.thb.png" % reportHash
-      self.__graphCache.add( reportHash, self.__graphLifeTime, plotDict )
-    return S_OK( plotDict )
+      return retVal
+
+    return self.__graphCache.getPlot( reportHash, generatePlot )
 
   def getPlotData( self, plotFileName ):
-    filename = "%s/%s" % ( self.graphsLocation, plotFileName )
-    try:
-      fd = file( filename, "rb" )
-      data = fd.read()
-      fd.close()
-    except Exception as e:
-      return S_ERROR( "Can't open file %s: %s" % ( plotFileName, str( e ) ) )
-    return S_OK( data )
-
-  def _deleteGraph( self, plotDict ):
-    try:
-      for key in plotDict:
-        value = plotDict[ key ]
-        if value:
-          fPath = os.path.join( self.graphsLocation, str( value ) )
-          if os.path.isfile( fPath ):
-            gLogger.info( "Deleting plot from cache", value )
-            os.unlink( fPath )
-          else:
-            gLogger.info( "Plot has already been deleted", value )
-    except:
-      pass
+    return self.__graphCache.getPlotData( plotFileName )
+
+  def getPlotStats( self ):
+    """
+    Hits, misses and generation time of the plots cache
+    """
+    return self.__graphCache.getStats()
 
 
 
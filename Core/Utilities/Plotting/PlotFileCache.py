@@ -0,0 +1,247 @@
+""" Persistent cache of the plot files, shared by the clones of a service on a host
+
+    The plots are files in a directory, indexed in a sqlite database of the same directory that keeps,
+    for each plot hash, the dictionary of its files, their size, creation and last access times.
+    The index survives restarts and is shared by all the processes using the directory:
+
+    * a plot is looked up in the index and regenerated if missing or older than its life time,
+    * concurrent requests of the same plot wait for a single generation: the threads of a process
+      on the first one, and the processes on a lock file of the plot,
+    * when the plots exceed the maximum size, the least recently used are deleted.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import errno
+import fcntl
+import sqlite3
+import threading
+
+from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities import DEncode
+
+INDEX_FILE = 'plotIndex.db'
+
+
+class _Generation( object ):
+  """ A plot being generated, and its result once done """
+
+  def __init__( self ):
+    self.done = threading.Event()
+    self.result = None
+
+
+class PlotFileCache( object ):
+
+  def __init__( self, location = False, maxSize = 1024 * 1048576, lifeTime = 0 ):
+    """ c'tor
+
+    :param str location: directory of the plots and of their index
+    :param int maxSize: maximum size in bytes of the plots
+    :param int lifeTime: seconds after which a plot is regenerated, 0 to keep it until it is evicted
+    """
+    self.location = False
+    self.maxSize = maxSize
+    self.lifeTime = lifeTime
+    self.log = gLogger.getSubLogger( 'PlotFileCache' )
+    self.__dbConn = None
+    # Protects the connection, the generations in progress and the statistics
+    self.__lock = threading.Lock()
+    self.__generations = {}
+    self.__stats = { 'Hits' : 0, 'Misses' : 0, 'Coalesced' : 0, 'Generations' : 0,
+                     'GenerationTime' : 0., 'Failures' : 0, 'Evictions' : 0 }
+    if location:
+      self.setLocation( location )
+
+  def setLocation( self, location, orphanAge = 3600 ):
+    """ Opens the index of a directory, and deletes the plots it does not know that are older than
+        orphanAge, left by a crash or an older version
+    """
+    with self.__lock:
+      self.location = location
+      self.__dbConn = sqlite3.connect( os.path.join( location, INDEX_FILE ), timeout = 60,
+                                       isolation_level = None, check_same_thread = False )
+      self.__dbConn.execute( "CREATE TABLE IF NOT EXISTS Plots ( Hash VARCHAR(64) PRIMARY KEY, PlotDict BLOB, "
+                             "Bytes INTEGER, CreationTime REAL, LastAccessTime REAL )" )
+      self.__dbConn.execute( "CREATE INDEX IF NOT EXISTS LRU ON Plots ( LastAccessTime )" )
+      knownFiles = set()
+      for ( plotDict, ) in self.__dbConn.execute( "SELECT PlotDict FROM Plots" ):
+        knownFiles.update( self.__getFiles( DEncode.decode( str( plotDict ) )[0] ) )
+    limit = time.time() - orphanAge
+    for fileName in os.listdir( location ):
+      if fileName.endswith( '.png' ) and fileName not in knownFiles:
+        filePath = os.path.join( location, fileName )
+        try:
+          if os.path.getmtime( filePath ) < limit:
+            gLogger.verbose( "Purging %s" % filePath )
+            os.unlink( filePath )
+        except OSError:
+          pass
+
+  def __getFiles( self, plotDict ):
+    """ Names of the files of a plot """
+    return [ str( value ) for value in plotDict.values() if value and isinstance( value, basestring ) ]
+
+  def __lookup( self, plotHash ):
+    """ The plot dictionary if the plot is in the index, valid and its files are there """
+    with self.__lock:
+      row = self.__dbConn.execute( "SELECT PlotDict, CreationTime FROM Plots WHERE Hash = ?",
+                                   ( plotHash, ) ).fetchone()
+      if not row:
+        return None
+      plotDict = DEncode.decode( str( row[0] ) )[0]
+      if self.lifeTime and row[1] + self.lifeTime < time.time():
+        return None
+      for fileName in self.__getFiles( plotDict ):
+        if not os.path.isfile( os.path.join( self.location, fileName ) ):
+          return None
+      self.__dbConn.execute( "UPDATE Plots SET LastAccessTime = ? WHERE Hash = ?", ( time.time(), plotHash ) )
+    return plotDict
+
+  def getPlot( self, plotHash, generateFunc ):
+    """ Get a plot from the cache if it is there, else generate it once for all the concurrent requests
+
+    :param str plotHash: hash of the plot request
+    :param generateFunc: function of the base name of the plot files returning S_OK( plotDict ), the
+                         values of plotDict being the names of the plot files in the cache location
+    :return: S_OK( plotDict )
+    """
+    plotDict = self.__lookup( plotHash )
+    if plotDict is not None:
+      with self.__lock:
+        self.__stats[ 'Hits' ] += 1
+      return S_OK( plotDict )
+
+    with self.__lock:
+      generation = self.__generations.get( plotHash )
+      leader = generation is None
+      if leader:
+        generation = self.__generations[ plotHash ] = _Generation()
+        self.__stats[ 'Misses' ] += 1
+      else:
+        self.__stats[ 'Coalesced' ] += 1
+    if not leader:
+      generation.done.wait()
+      result = generation.result
+      return S_OK( dict( result[ 'Value' ] ) ) if result[ 'OK' ] else result
+
+    try:
+      generation.result = self.__generate( plotHash, generateFunc )
+    except Exception as e:  # pylint: disable=broad-except
+      self.log.exception( "Failed to generate plot", plotHash, lException = e )
+      generation.result = S_ERROR( "Failed to generate plot: %s" % repr( e ) )
+    finally:
+      if generation.result is None:
+        generation.result = S_ERROR( "Failed to generate plot" )
+      with self.__lock:
+        del self.__generations[ plotHash ]
+      generation.done.set()
+    result = generation.result
+    return S_OK( dict( result[ 'Value' ] ) ) if result[ 'OK' ] else result
+
+  def __generate( self, plotHash, generateFunc ):
+    """ Generates a plot under its lock file, unless another process just did it """
+    lockFile = os.path.join( self.location, "%s.lock" % plotHash )
+    with open( lockFile, 'a' ) as lockFD:
+      fcntl.flock( lockFD, fcntl.LOCK_EX )
+      try:
+        plotDict = self.__lookup( plotHash )
+        if plotDict is not None:
+          with self.__lock:
+            self.__stats[ 'Coalesced' ] += 1
+          return S_OK( plotDict )
+        startTime = time.time()
+        result = generateFunc( os.path.join( self.location, plotHash ) )
+        generationTime = time.time() - startTime
+        with self.__lock:
+          self.__stats[ 'Generations' ] += 1
+          self.__stats[ 'GenerationTime' ] += generationTime
+          self.__stats[ 'Failures' ] += not result[ 'OK' ]
+        if not result[ 'OK' ]:
+          return result
+        plotDict = result[ 'Value' ]
+        self.__add( plotHash, plotDict )
+      finally:
+        try:
+          os.unlink( lockFile )
+        except OSError:
+          pass
+        fcntl.flock( lockFD, fcntl.LOCK_UN )
+    self.evict( keep = plotHash )
+    return S_OK( plotDict )
+
+  def __add( self, plotHash, plotDict ):
+    """ Indexes a generated plot """
+    size = 0
+    for fileName in self.__getFiles( plotDict ):
+      try:
+        size += os.path.getsize( os.path.join( self.location, fileName ) )
+      except OSError:
+        pass
+    now = time.time()
+    with self.__lock:
+      self.__dbConn.execute( "REPLACE INTO Plots ( Hash, PlotDict, Bytes, CreationTime, LastAccessTime ) "
+                             "VALUES ( ?, ?, ?, ?, ? )",
+                             ( plotHash, sqlite3.Binary( DEncode.encode( plotDict ) ), size, now, now ) )
+
+  def evict( self, keep = None ):
+    """ Deletes the expired plots, then the least recently used ones while the plots exceed the maximum size
+
+    :param str keep: hash of a plot not to delete
+    :return: number of plots deleted
+    """
+    with self.__lock:
+      toDelete = []
+      if self.lifeTime:
+        toDelete = self.__dbConn.execute( "SELECT Hash, PlotDict FROM Plots WHERE CreationTime < ?",
+                                          ( time.time() - self.lifeTime, ) ).fetchall()
+      excess = self.__dbConn.execute( "SELECT TOTAL( Bytes ) FROM Plots" ).fetchone()[0] - self.maxSize
+      if excess > 0:
+        for plotHash, plotDict, size in self.__dbConn.execute( "SELECT Hash, PlotDict, Bytes FROM Plots "
+                                                               "ORDER BY LastAccessTime" ).fetchall():
+          if excess <= 0:
+            break
+          if plotHash == keep:
+            continue
+          toDelete.append( ( plotHash, plotDict ) )
+          excess -= size
+      deleted = set()
+      for plotHash, plotDict in toDelete:
+        if plotHash in deleted:
+          continue
+        deleted.add( plotHash )
+        self.__dbConn.execute( "DELETE FROM Plots WHERE Hash = ?", ( plotHash, ) )
+        for fileName in self.__getFiles( DEncode.decode( str( plotDict ) )[0] ):
+          try:
+            os.unlink( os.path.join( self.location, fileName ) )
+          except OSError as e:
+            if e.errno != errno.ENOENT:
+              self.log.warn( "Cannot delete plot", "%s: %s" % ( fileName, repr( e ) ) )
+      self.__stats[ 'Evictions' ] += len( deleted )
+    return len( deleted )
+
+  def getPlotData( self, plotFileName ):
+    filename = os.path.join( self.location, plotFileName )
+    try:
+      with open( filename, "rb" ) as fd:
+        data = fd.read()
+    except Exception as e:  # pylint: disable=broad-except
+      return S_ERROR( "Can't open file %s: %s" % ( plotFileName, str( e ) ) )
+    return S_OK( data )
+
+  def getStats( self ):
+    """ Hits, misses, coalesced requests, generations and their duration, evictions, plots and bytes cached
+
+    :return: dict
+    """
+    with self.__lock:
+      stats = dict( self.__stats )
+      if self.__dbConn:
+        stats[ 'Plots' ], stats[ 'Bytes' ] = self.__dbConn.execute( "SELECT COUNT(*), TOTAL( Bytes ) "
+                                                                    "FROM Plots" ).fetchone()
+    requests = stats[ 'Hits' ] + stats[ 'Misses' ] + stats[ 'Coalesced' ]
+    stats[ 'HitRatio' ] = float( stats[ 'Hits' ] + stats[ 'Coalesced' ] ) / requests if requests else 0.
+    stats[ 'MeanGenerationTime' ] = stats[ 'GenerationTime' ] / stats[ 'Generations' ] if stats[ 'Generations' ] else 0.
+    return stats
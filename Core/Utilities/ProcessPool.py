@@ -95,6 +95,20 @@ The first types of callbacks could be used in case various callable objects are
 so you probably want to handle them differently depending on their results, while the second types are for
 executing same type of callables in subprocesses and  hence you are expecting the same type of results
 everywhere.
+
+Batched mode
+
+For many short tasks the communication with the workers dominates. With::
+
+  pool = ProcessPool( minSize, maxSize, maxQueuedRequests, batchSize = 10 )
+
+each worker takes up to :batchSize: tasks at once from the pending queue, runs them one after the other in the
+same executor thread, and only sends back a compact tuple with the results instead of the whole task. The task
+objects stay in the ProcessPool, where their callbacks are executed. In this mode the results of all tasks come
+back, so :ProcessPool.processResults: (or the daemon mode) has to be used even for tasks without callbacks.
+
+In both modes the time spent by the returned tasks waiting in the queue, executing and coming back are kept for
+profiling, see :ProcessPool.getTaskTimes:.
 """
 
 __RCSID__ = "$Id$"
@@ -107,6 +121,7 @@ import os
 import signal
 import Queue
 import errno
+import collections
 from types import FunctionType, TypeType, ClassType
 
 try:
@@ -151,7 +166,7 @@ class WorkingProcess(multiprocessing.Process):
 
   """
 
-  def __init__(self, pendingQueue, resultsQueue, stopEvent, keepRunning):
+  def __init__(self, pendingQueue, resultsQueue, stopEvent, keepRunning, batchSize=1):
     """ c'tor
 
     :param self: self reference
@@ -161,6 +176,7 @@ class WorkingProcess(multiprocessing.Process):
     :type resultsQueue: multiprocessing.Queue
     :param stopEvent: event to stop processing
     :type stopEvent: multiprocessing.Event
+    :param int batchSize: maximal number of tasks read at once, above 1 the pool is in batched mode
     """
     multiprocessing.Process.__init__(self)
     # # daemonize
@@ -177,6 +193,11 @@ class WorkingProcess(multiprocessing.Process):
     self.__stopEvent = stopEvent
     # # keep process running until stop event
     self.__keepRunning = keepRunning
+    # # tasks read at once in batched mode
+    self.__batchSize = batchSize
+    # # queues to and from the executor thread in batched mode
+    self.__executorQueue = None
+    self.__executedQueue = None
     # # placeholder for watchdog thread
     self.__watchdogThread = None
     # # placeholder for process thread
@@ -230,6 +251,17 @@ class WorkingProcess(multiprocessing.Process):
     if self.task:
       self.task.process()
 
+  def __executeTasks(self):
+    """
+    processThread target in batched mode, executing the tasks one after the other
+
+    :param self: self reference
+    """
+    while True:
+      task = self.__executorQueue.get()
+      task.process()
+      self.__executedQueue.put(task)
+
   def run(self):
     """
     Task execution
@@ -251,6 +283,10 @@ class WorkingProcess(multiprocessing.Process):
       lr._openAll()
       lr._setAllEvents()
 
+    if self.__batchSize > 1:
+      self.__runBatches()
+      return
+
     # # zero processed task counter
     taskCounter = 0
     # # zero idle loop counter
@@ -322,6 +358,101 @@ class WorkingProcess(multiprocessing.Process):
       # # toggle __working flag
       self.__working.value = 0
 
+  def __runBatches(self):
+    """
+    Task execution in batched mode
+
+    Reads up to :batchSize: ( taskKey, ProcessTask ) pairs at once out of pending queue, executes them
+    one by one in the same processThread and pushes their results to the results queue as
+    ( taskKey, result, exception, exceptionRaised, startTime, endTime ) tuples.
+
+    :param self: self reference
+    """
+    self.__executorQueue = Queue.Queue()
+    self.__executedQueue = Queue.Queue()
+    self.__processThread = threading.Thread(target=self.__executeTasks)
+    self.__processThread.daemon = True
+    self.__processThread.start()
+
+    # # zero processed task counter
+    taskCounter = 0
+    # # zero idle loop counter
+    idleLoopCount = 0
+
+    # # main loop
+    while True:
+
+      # # draining, stopEvent is set, exiting
+      if self.__stopEvent.is_set():
+        return
+
+      # # clear task
+      self.task = None
+
+      # # read from queue, waiting only for the first task of the batch
+      try:
+        batch = [self.__pendingQueue.get(block=True, timeout=10)]
+      except Queue.Empty:
+        # # idle loop?
+        idleLoopCount += 1
+        # # 10th idle loop - exit, nothing to do
+        if idleLoopCount == 10 and not self.__keepRunning:
+          return
+        continue
+      try:
+        while len(batch) < self.__batchSize:
+          batch.append(self.__pendingQueue.get_nowait())
+      except Queue.Empty:
+        pass
+
+      # # toggle __working flag
+      self.__working.value = 1
+      # # reset idle loop counter
+      idleLoopCount = 0
+
+      while batch:
+        taskKey, self.task = batch.pop(0)
+        self.__executorQueue.put(self.task)
+
+        timeout = False
+        noResults = False
+        # # wait for the executor with or without timeout
+        try:
+          if self.task.getTimeOut():
+            self.__executedQueue.get(timeout=self.task.getTimeOut() + 10)
+          else:
+            self.__executedQueue.get()
+        except Queue.Empty:
+          self.task.setResult(S_ERROR(errno.ETIME, "Timed out"))
+          timeout = True
+        # if the task finished with no results, something bad happened, e.g.
+        # undetected timeout
+        if not self.task.taskResults() and not self.task.taskException():
+          self.task.setResult(S_ERROR("Task produced no results"))
+          noResults = True
+
+        startTime, endTime = self.task.getTimes()[1:]
+        self.__resultsQueue.put((taskKey, self.task.taskResults(), self.task.taskException(),
+                                 self.task.exceptionRaised(), startTime, endTime))
+        if timeout or noResults:
+          # # the tasks not started yet go back to the pending queue, or fail if it is full
+          for taskKey, task in batch:
+            try:
+              self.__pendingQueue.put((taskKey, task), block=False)
+            except Queue.Full:
+              self.__resultsQueue.put((taskKey, S_ERROR("Worker stopped before executing the task"),
+                                       None, False, None, None))
+          # The task execution timed out, stop the process to prevent it from running
+          # in the background
+          time.sleep(1)
+          os.kill(self.pid, signal.SIGKILL)
+          return
+        # # increase task counter
+        taskCounter += 1
+        self.__taskCounter = taskCounter
+      # # toggle __working flag
+      self.__working.value = 0
+
 
 class ProcessTask(object):
   """ Defines task to be executed in WorkingProcess together with its callbacks.
@@ -383,6 +514,10 @@ class ProcessTask(object):
     self.__taskException = None
     self.__taskResult = None
     self.__usePoolCallbacks = usePoolCallbacks
+    # # epochs of the queuing, the start and the end of the execution
+    self.__queuedTime = None
+    self.__startTime = None
+    self.__endTime = None
 
   def taskResults(self):
     """
@@ -506,6 +641,35 @@ class ProcessTask(object):
     """
     self.__taskResult = result
 
+  def setProcessed(self, result, exception, exceptionRaised, startTime, endTime):
+    """
+    Set the outcome of the task executed in a worker of a batched :ProcessPool:
+
+    :param self: self reference
+    """
+    self.__done = True
+    self.__taskResult = result
+    self.__taskException = exception
+    self.__exceptionRaised = exceptionRaised
+    self.__startTime = startTime
+    self.__endTime = endTime
+
+  def setQueued(self):
+    """
+    Record the time the task is put in the pending queue
+
+    :param self: self reference
+    """
+    self.__queuedTime = time.time()
+
+  def getTimes(self):
+    """
+    Get the epochs of the queuing, the start and the end of the execution, None when unknown
+
+    :param self: self reference
+    """
+    return self.__queuedTime, self.__startTime, self.__endTime
+
   def process(self):
     """
     Execute task
@@ -513,6 +677,7 @@ class ProcessTask(object):
     :param self: self reference
     """
     self.__done = True
+    self.__startTime = time.time()
     try:
       # # it's a function?
       if isinstance(self.__taskFunction, FunctionType):
@@ -535,6 +700,8 @@ class ProcessTask(object):
         retDict['Value'] = str(x)
         retDict['Exc_info'] = sys.exc_info()[1]
         self.__taskException = retDict
+    finally:
+      self.__endTime = time.time()
 
 
 class ProcessPool(object):
@@ -589,7 +756,7 @@ class ProcessPool(object):
 
   def __init__(self, minSize=2, maxSize=0, maxQueuedRequests=10,
                strictLimits=True, poolCallback=None, poolExceptionCallback=None,
-               keepProcessesRunning=True):
+               keepProcessesRunning=True, batchSize=1):
     """ c'tor
 
     :param self: self reference
@@ -599,6 +766,7 @@ class ProcessPool(object):
     :param bool strictLimits: flag to workers overcommitment
     :param callable poolCallbak: results callback
     :param callable poolExceptionCallback: exception callback
+    :param int batchSize: number of tasks taken at once by the workers, above 1 the pool is in batched mode
     """
     # # min workers
     self.__minSize = max(1, minSize)
@@ -608,6 +776,13 @@ class ProcessPool(object):
     self.__maxQueuedRequests = maxQueuedRequests
     # # flag to worker overcommit
     self.__strictLimits = strictLimits
+    # # tasks taken at once by the workers
+    self.__batchSize = max(1, batchSize)
+    # # tasks being processed in batched mode, the workers only know their keys
+    self.__batchedTasks = {}
+    self.__lastTaskKey = 0
+    # # ( taskID, queue wait, execution, results IPC ) times of the last processed tasks
+    self.__taskTimes = collections.deque(maxlen=1000)
 
     # # pool results callback
     self.__poolCallback = poolCallback
@@ -733,7 +908,8 @@ class ProcessPool(object):
     """
     self.__prListLock.acquire()
     try:
-      worker = WorkingProcess(self.__pendingQueue, self.__resultsQueue, self.__stopEvent, self.__keepRunning)
+      worker = WorkingProcess(self.__pendingQueue, self.__resultsQueue, self.__stopEvent, self.__keepRunning,
+                              self.__batchSize)
       while worker.pid is None:
         time.sleep(0.1)
       self.__workersDict[worker.pid] = worker
@@ -792,9 +968,15 @@ class ProcessPool(object):
     if usePoolCallbacks and (self.__poolCallback or self.__poolExceptionCallback):
       task.enablePoolCallbacks()
 
+    task.setQueued()
     self.__prListLock.acquire()
     try:
-      self.__pendingQueue.put(task, block=blocking)
+      if self.__batchSize > 1:
+        self.__lastTaskKey += 1
+        self.__pendingQueue.put((self.__lastTaskKey, task), block=blocking)
+        self.__batchedTasks[self.__lastTaskKey] = task
+      else:
+        self.__pendingQueue.put(task, block=blocking)
     except Queue.Full:
       self.__prListLock.release()
       return S_ERROR("Queue is full")
@@ -863,6 +1045,31 @@ class ProcessPool(object):
     """
     return not self.__pendingQueue.empty() or self.getNumWorkingProcesses()
 
+  def getTaskTimes(self):
+    """
+    Get the times spent in seconds by the last processed tasks waiting in the pending queue, executing
+    and sending back their results
+
+    :param self: self reference
+    :return: list of ( taskID, queue wait, execution, results IPC ), None for the unknown times
+    """
+    return list(self.__taskTimes)
+
+  def __recordTaskTimes(self, task):
+    """
+    Keep the times of a processed task
+
+    :param self: self reference
+    :param ProcessTask task: task coming out of the results queue
+    """
+    queuedTime, startTime, endTime = task.getTimes()
+    times = (task.getTaskID(),
+             startTime - queuedTime if queuedTime and startTime else None,
+             endTime - startTime if startTime and endTime else None,
+             time.time() - endTime if endTime else None)
+    self.__taskTimes.append(times)
+    return times
+
   def processResults(self):
     """
     Execute tasks' callbacks removing them from results queue
@@ -899,6 +1106,21 @@ class ProcessPool(object):
       # # get task
       task = self.__resultsQueue.get()
       log.debug("__resultsQueue.get", 't=%.2f' % (time.time() - start))
+      if self.__batchSize > 1:
+        # # only the results come back in batched mode
+        taskKey, result, exception, exceptionRaised, startTime, endTime = task
+        self.__prListLock.acquire()
+        try:
+          task = self.__batchedTasks.pop(taskKey, None)
+        finally:
+          self.__prListLock.release()
+        if not task:
+          log.warn("Results of an unknown task", str(taskKey))
+          continue
+        task.setProcessed(result, exception, exceptionRaised, startTime, endTime)
+      log.debug("Task times", "%s: queue %s execution %s IPC %s" % self.__recordTaskTimes(task))
+      if not task.hasCallback():
+        continue
       # # execute callbacks
       try:
         task.doExceptionCallback()
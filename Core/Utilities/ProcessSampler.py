@@ -0,0 +1,309 @@
+########################################################################
+# File :   ProcessSampler.py
+########################################################################
+
+""" The Process Sampler keeps a persistent view of the process tree of a PID in a linux /proc
+    file system, and samples the resources it consumes at a low cost:
+
+    * the /proc directory is listed once per sample, only the processes that were not there at
+      the previous sample have their /proc/<pid>/stat read to know whether they belong to the tree,
+    * the stat, statm, smaps_rollup and io files of the processes of the tree are opened once and
+      read again at each sample, a read failing once the process is gone. Not to exhaust the
+      descriptors of the process, of which select() only handles the first 1024, at most
+      maxOpenFiles are kept open, the other files being opened at each sample,
+    * the cumulative counters (CPU, bytes read and written, time waiting for IO) are updated with
+      the deltas since the previous sample, the counters of a process reaped by a parent of the
+      tree are then found in those of the parent, the other ones are kept as exited.
+
+    The samples of the tree and of each of its processes are kept as time series.
+"""
+
+import os
+import time
+from collections import deque
+
+from DIRAC import gLogger, S_OK, S_ERROR
+
+__RCSID__ = "$Id$"
+
+# Fields of the samples of a process
+PROCESS_FIELDS = ( 'Time', 'CPU', 'Vsize', 'RSS', 'PSS', 'ReadBytes', 'WriteBytes', 'IOWait' )
+# Cumulative counters, accounted to the parent that reaps a process
+REAPED_COUNTERS = ( 'CPU', 'ReadBytes', 'WriteBytes' )
+
+READ_SIZE = 4096
+
+
+class _ProcessEntry( object ):
+  """ A process of the tree, its open /proc files and its samples """
+
+  def __init__( self, pid, ppid, pgrp, command, maxSamples ):
+    self.pid = pid
+    self.ppid = ppid
+    self.pgrp = pgrp
+    self.command = command
+    # Descriptors of the files kept open, None for the files that can not be read
+    self.fds = {}
+    self.values = dict.fromkeys( PROCESS_FIELDS[1:], 0 )
+    self.samples = deque( maxlen = maxSamples )
+
+  def close( self ):
+    """ Closes the files of the process, returns how many were open """
+    fds = [ fd for fd in self.fds.values() if fd is not None ]
+    for fd in fds:
+      os.close( fd )
+    self.fds = {}
+    return len( fds )
+
+
+class ProcessSampler( object ):
+
+  #############################################################################
+  def __init__( self, pid, procPath = '/proc', maxSamples = 120, readPSS = True, maxOpenFiles = 256 ):
+    """ Standard constructor
+
+    :param int pid: PID of the root of the tree
+    :param str procPath: mount point of the proc file system
+    :param int maxSamples: number of samples kept in the time series
+    :param bool readPSS: read the proportional set size, which needs a walk of the pages of each process
+    :param int maxOpenFiles: number of /proc files kept open between the samples
+    """
+    self.log = gLogger.getSubLogger( 'ProcessSampler' )
+    self.pid = int( pid )
+    self.procPath = procPath
+    self.maxSamples = maxSamples
+    self.readPSS = readPSS
+    self.maxOpenFiles = maxOpenFiles
+    self.pageSize = os.sysconf( 'SC_PAGESIZE' )
+    self.clockTicks = float( os.sysconf( 'SC_CLK_TCK' ) )
+    # Processes of the tree, and the other ones seen in the last listing
+    self.__tree = {}
+    self.__others = set()
+    self.__totals = dict.fromkeys( ( 'CPU', 'ReadBytes', 'WriteBytes', 'IOWait' ), 0. )
+    self.__exited = 0
+    self.__openFiles = 0
+    self.__samples = deque( maxlen = maxSamples )
+
+  #############################################################################
+  def __read( self, entry, name ):
+    """ Content of a /proc file of a process, None if it can not be read
+
+        The file is kept open after the first read if less than maxOpenFiles are
+    """
+    fd = entry.fds.get( name, -1 )
+    if fd is None:
+      return None
+    if fd >= 0:
+      os.lseek( fd, 0, os.SEEK_SET )
+      return os.read( fd, READ_SIZE )
+    try:
+      fd = os.open( os.path.join( self.procPath, str( entry.pid ), name ), os.O_RDONLY )
+    except OSError:
+      entry.fds[name] = None
+      return None
+    if self.__openFiles < self.maxOpenFiles:
+      entry.fds[name] = fd
+      self.__openFiles += 1
+      return os.read( fd, READ_SIZE )
+    try:
+      return os.read( fd, READ_SIZE )
+    finally:
+      os.close( fd )
+
+  def __parseStat( self, content ):
+    """ ( command, fields from the state on ) of a /proc/<pid>/stat content, see proc(5)
+
+        The command is between parentheses and may contain spaces and parentheses
+    """
+    start = content.index( '(' )
+    end = content.rindex( ')' )
+    return content[start + 1:end], content[end + 2:].split()
+
+  #############################################################################
+  def __readStat( self, pid ):
+    """ ( command, ppid, pgrp ) of a process that is not in the tree, None if it is gone """
+    try:
+      with open( os.path.join( self.procPath, str( pid ), 'stat' ), 'r' ) as fd:
+        command, fields = self.__parseStat( fd.read() )
+      return command, int( fields[1] ), int( fields[2] )
+    except ( IOError, OSError, ValueError, IndexError ):
+      return None
+
+  def __sampleProcess( self, entry ):
+    """ Reads the values of a process of the tree
+
+    :return: dict of the values, None if the process is gone
+    """
+    try:
+      content = self.__read( entry, 'stat' )
+      if not content:
+        return None
+      command, fields = self.__parseStat( content )
+      # state is the field 3 of proc(5), so field N is fields[N - 3]
+      entry.ppid = int( fields[1] )
+      entry.command = command
+      values = { 'CPU' : sum( int( tick ) for tick in fields[11:15] ) / self.clockTicks,
+                 'Vsize' : int( fields[20] ),
+                 'RSS' : int( fields[21] ) * self.pageSize,
+                 'IOWait' : int( fields[39] ) / self.clockTicks if len( fields ) > 39 else 0.,
+                 'PSS' : 0,
+                 'ReadBytes' : entry.values['ReadBytes'],
+                 'WriteBytes' : entry.values['WriteBytes'] }
+    except ( OSError, ValueError, IndexError ):
+      return None
+
+    try:
+      content = self.__read( entry, 'statm' )
+      if content:
+        values['RSS'] = int( content.split()[1] ) * self.pageSize
+      content = self.__read( entry, 'smaps_rollup' ) if self.readPSS else None
+      for line in ( content or '' ).splitlines():
+        if line.startswith( 'Pss:' ):
+          values['PSS'] = int( line.split()[1] ) * 1024
+          break
+      # Only readable by the owner of the process
+      content = self.__read( entry, 'io' )
+      for line in ( content or '' ).splitlines():
+        if line.startswith( 'read_bytes:' ):
+          values['ReadBytes'] = int( line.split()[1] )
+        elif line.startswith( 'write_bytes:' ):
+          values['WriteBytes'] = int( line.split()[1] )
+    except ( OSError, ValueError, IndexError ):
+      # The process ended after its stat was read
+      pass
+    return values
+
+  #############################################################################
+  def __discover( self ):
+    """ Adds to the tree the processes started since the previous listing """
+    try:
+      pids = set( int( name ) for name in os.listdir( self.procPath ) if name.isdigit() )
+    except OSError as e:
+      return S_ERROR( 'Can not list %s: %s' % ( self.procPath, os.strerror( e.errno ) ) )
+    self.__others &= pids
+    newPIDs = pids - self.__others - set( self.__tree )
+    if not newPIDs:
+      return S_OK()
+
+    candidates = {}
+    for pid in newPIDs:
+      info = self.__readStat( pid )
+      if info:
+        candidates[pid] = info
+    if self.pid in candidates:
+      command, ppid, pgrp = candidates.pop( self.pid )
+      self.__tree[self.pid] = _ProcessEntry( self.pid, ppid, pgrp, command, self.maxSamples )
+    rootGroup = self.__tree[self.pid].pgrp if self.pid in self.__tree else None
+    # The new processes can be children of each other, so parents are added first
+    while candidates:
+      added = False
+      for pid, ( command, ppid, pgrp ) in candidates.items():
+        # Orphans of the process group of the root were reparented to init
+        if ppid in self.__tree or ( ppid == 1 and pgrp == rootGroup ):
+          self.__tree[pid] = _ProcessEntry( pid, ppid, pgrp, command, self.maxSamples )
+          del candidates[pid]
+          added = True
+        elif ppid not in candidates:
+          self.__others.add( pid )
+          del candidates[pid]
+          added = True
+      if not added:
+        # Only loops of parents are left, which can only happen with reused PIDs
+        self.__others.update( candidates )
+        break
+    return S_OK()
+
+  def __remove( self, entries ):
+    """ Removes the processes that are gone, their counters are kept unless a parent of the tree reaped them """
+    for entry in entries:
+      del self.__tree[entry.pid]
+      self.__openFiles -= entry.close()
+    self.__exited += len( entries )
+    for entry in entries:
+      if entry.ppid in self.__tree:
+        for counter in REAPED_COUNTERS:
+          self.__totals[counter] -= entry.values[counter]
+
+  #############################################################################
+  def sample( self ):
+    """ Samples the tree of processes
+
+    :return: S_OK( dict ) with the time of the sample, the CPU (s), bytes read and written and
+             time waiting for IO (s) consumed since the root started, the current Vsize, RSS
+             and PSS (bytes), the number of processes and the CPU rate (cores) since the previous sample
+    """
+    result = self.__discover()
+    if not result['OK']:
+      return result
+    if self.pid not in self.__tree:
+      return S_ERROR( 'Process %s does not exist' % self.pid )
+
+    now = time.time()
+    sample = { 'Time' : now, 'Vsize' : 0, 'RSS' : 0, 'PSS' : 0 }
+    gone = []
+    for entry in self.__tree.values():
+      values = self.__sampleProcess( entry )
+      if values is None:
+        gone.append( entry )
+        continue
+      for counter in self.__totals:
+        self.__totals[counter] += values[counter] - entry.values[counter]
+      entry.values = values
+      entry.samples.append( tuple( [now] + [values[field] for field in PROCESS_FIELDS[1:]] ) )
+      for field in ( 'Vsize', 'RSS', 'PSS' ):
+        sample[field] += values[field]
+    self.__remove( gone )
+    if self.pid not in self.__tree:
+      return S_ERROR( 'Process %s does not exist' % self.pid )
+
+    sample.update( self.__totals )
+    sample['Processes'] = len( self.__tree )
+    sample['CPURate'] = 0.
+    if self.__samples:
+      previous = self.__samples[-1]
+      if now > previous['Time']:
+        sample['CPURate'] = max( 0., ( sample['CPU'] - previous['CPU'] ) / ( now - previous['Time'] ) )
+    self.__samples.append( sample )
+    self.log.debug( 'Sampled %d processes: CPU %.2f s, RSS %d bytes' % ( len( self.__tree ), sample['CPU'],
+                                                                          sample['RSS'] ) )
+    return S_OK( dict( sample ) )
+
+  #############################################################################
+  def getLastSample( self ):
+    """ The last sample of the tree, None before the first one """
+    return dict( self.__samples[-1] ) if self.__samples else None
+
+  def getSeries( self ):
+    """ The samples of the tree, oldest first """
+    return [ dict( sample ) for sample in self.__samples ]
+
+  def getProcessSeries( self ):
+    """ The samples of each process alive at the last sample
+
+    :return: dict { pid : { 'Command', 'PPID', 'Samples' : [ dict with PROCESS_FIELDS ] } }
+    """
+    return dict( ( pid, { 'Command' : entry.command,
+                          'PPID' : entry.ppid,
+                          'Samples' : [ dict( zip( PROCESS_FIELDS, values ) ) for values in entry.samples ] } )
+                 for pid, entry in self.__tree.items() )
+
+  def getStats( self ):
+    """ Size of the tree and of the other processes followed, processes exited and files open """
+    return { 'Processes' : len( self.__tree ),
+             'OtherProcesses' : len( self.__others ),
+             'Exited' : self.__exited,
+             'OpenFiles' : self.__openFiles }
+
+  def close( self ):
+    """ Closes the files of the processes """
+    for entry in self.__tree.values():
+      entry.close()
+    self.__openFiles = 0
+    self.__tree = {}
+    self.__others = set()
+
+  def __del__( self ):
+    try:
+      self.close()
+    except Exception:  # pylint: disable=broad-except
+      pass
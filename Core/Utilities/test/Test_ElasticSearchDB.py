@@ -0,0 +1,56 @@
+""" Unit tests of the bulk insertions of ElasticSearchDB, the Elasticsearch client is replaced by a mock
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import threading
+import types
+
+from mock import MagicMock, patch
+
+from DIRAC.Core.Utilities.ElasticSearchDB import ElasticSearchDB, generateFullIndexName
+
+
+def getDB():
+  db = ElasticSearchDB.__new__(ElasticSearchDB)
+  db._ElasticSearchDB__client = MagicMock()
+  db._ElasticSearchDB__knownIndexes = set()
+  db._ElasticSearchDB__knownIndexesLock = threading.Lock()
+  return db
+
+
+def consumeActions(_client, actions, chunk_size=None):
+  assert isinstance(actions, types.GeneratorType)
+  consumeActions.actions = list(actions)
+  return len(consumeActions.actions), []
+
+
+@patch('DIRAC.Core.Utilities.ElasticSearchDB.bulk', side_effect=consumeActions)
+def test_bulkIndex(_mockBulk):
+  db = getDB()
+  client = db._ElasticSearchDB__client
+  client.indices.exists.return_value = False
+  records = [{'timestamp': 1500000000, 'Jobs': 1}, {'timestamp': 1500000060, 'Jobs': 2}]
+  assert db.bulk_index('test_wmshistory', 'WMSHistory', records, period='month')['Value'] == 2
+  indexName = generateFullIndexName('test_wmshistory', 'month')
+  client.indices.create.assert_called_once_with(indexName, body={'mappings': {}})
+  assert [action['_source'] for action in consumeActions.actions] == [{'timestamp': 1500000000000, 'Jobs': 1},
+                                                                      {'timestamp': 1500000060000, 'Jobs': 2}]
+  assert consumeActions.actions[0]['_index'] == indexName
+  # The records are left as they were, to be inserted again in case of failure
+  assert records[0] == {'timestamp': 1500000000, 'Jobs': 1}
+
+  # The index is known to exist for the next insertions
+  client.indices.exists.reset_mock()
+  assert db.bulk_index('test_wmshistory', 'WMSHistory', records, period='month')['OK']
+  assert db.bulk_index('test_wmshistory', 'WMSHistory', [], period='month')['Value'] == 0
+  assert not client.indices.exists.called
+  assert client.indices.create.call_count == 1
+
+  # Until it is deleted
+  client.indices.delete.return_value = {'acknowledged': True}
+  assert db.deleteIndex(indexName)['OK']
+  assert db.bulk_index('test_wmshistory', 'WMSHistory', records, period='month')['OK']
+  assert client.indices.create.call_count == 2
@@ -14,6 +14,7 @@ import sys
 
 
 from DIRAC.Core.Utilities.DEncode import encode as disetEncode, decode as disetDecode, g_dEncodeFunctions
+from DIRAC.Core.Utilities.DEncode import legacyEncode as disetLegacyEncode, legacyDecode as disetLegacyDecode
 from DIRAC.Core.Utilities.JEncode import encode as jsonEncode, decode as jsonDecode, JSerializable
 
 from hypothesis import given
@@ -30,9 +31,10 @@ parametrize = mark.parametrize
 # function, and add the tuple here
 
 disetTuple = (disetEncode, disetDecode)
+disetLegacyTuple = (disetLegacyEncode, disetLegacyDecode)
 jsonTuple = (jsonEncode, jsonDecode)
 
-enc_dec_imp = (disetTuple, jsonTuple)
+enc_dec_imp = (disetTuple, disetLegacyTuple, jsonTuple)
 
 
 # We define a custom datetime strategy in order
@@ -128,7 +130,7 @@ def test_BaseType_DateTime(enc_dec, data):
 
 
 # Json does not serialize keys as integers but as string
-@parametrize('enc_dec', [disetTuple])
+@parametrize('enc_dec', [disetTuple, disetLegacyTuple])
 @given(data=dictionaries(integers(), integers()))
 def test_BaseType_Dict(enc_dec, data):
   """ Test for basic dict"""
@@ -185,7 +187,7 @@ def test_BaseType_String(enc_dec, data):
 
 
 # Tuple are not serialized in JSON
-@parametrize('enc_dec', [disetTuple])
+@parametrize('enc_dec', [disetTuple, disetLegacyTuple])
 @given(data=tuples(integers()))
 def test_BaseType_Tuple(enc_dec, data):
   """ Test basic tuple """
@@ -200,13 +202,39 @@ def test_BaseType_Unicode(enc_dec, data):
 
 
 # Json will not pass this because of tuples and integers as dict keys
-@parametrize('enc_dec', [disetTuple])
+@parametrize('enc_dec', [disetTuple, disetLegacyTuple])
 @given(data=nestedStrategy)
 def test_nestedStructure(enc_dec, data):
   """ Test nested structure """
   agnosticTestFunction(enc_dec, data)
 
 
+@given(data=nestedStrategy)
+def test_fastWireFormat(data):
+  """ The fast DEncode path must produce and read exactly the same
+      wire format as the original one
+  """
+  encodedData = disetEncode(data)
+  assert encodedData == disetLegacyEncode(data)
+  assert disetDecode(encodedData) == disetLegacyDecode(encodedData)
+
+
+@parametrize('data', [1.5e-10, 2.0 * 10 ** 20, -3.25e+100, float('inf')])
+def test_fastFloatInContainer(data):
+  """ Floats written with an exponent are decoded identically by both paths """
+  encodedData = disetLegacyEncode([data, {'f': data}, (data,)])
+  assert disetDecode(encodedData) == disetLegacyDecode(encodedData)
+
+
+@parametrize('data', [datetime.datetime(2018, 3, 4, 5, 6, 7, 890), datetime.date(2018, 3, 4),
+                      datetime.time(5, 6, 7, 890)])
+def test_fastDateTimeTypes(data):
+  """ All the datetime flavours are encoded identically by both paths """
+  encodedData = disetEncode({'d': [data]})
+  assert encodedData == disetLegacyEncode({'d': [data]})
+  assert disetDecode(encodedData) == disetLegacyDecode(encodedData)
+
+
 # DEncode raises KeyError.....
 # Others raise TypeError
 @parametrize('enc_dec', enc_dec_imp)
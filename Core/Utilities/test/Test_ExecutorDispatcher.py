@@ -6,7 +6,9 @@
 __RCSID__ = "$Id$"
 
 
-from DIRAC.Core.Utilities.ExecutorDispatcher import ExecutorState, ExecutorQueues
+from DIRAC import S_OK
+from DIRAC.Core.Utilities.ExecutorDispatcher import ExecutorState, ExecutorQueues, ExecutorDispatcher, \
+    ExecutorDispatcherCallbacks, getTaskShard
 
 
 execState = ExecutorState()
@@ -28,6 +30,8 @@ def test_ExecutorState():
   assert execState.freeSlots(1) == 1
   assert execState.getFreeExecutors("type1") == {1: 1}
   assert execState.getTasksForExecutor(1) == {"t2"}
+  assert execState.getUtilization("type1") == (1, 2)
+  assert execState.getUtilization("type2") == (0, 0)
   assert execState.removeExecutor(1)
   assert execState._internals()
 
@@ -51,3 +55,49 @@ def test_execQueues():
   for i in xrange(3):
     assert eQ.popTask("type1")[0] == "t1%s" % i
   assert eQ._internals()
+
+
+def test_taskShard():
+  """ test of the partition of the tasks between minds
+  """
+  assert getTaskShard(12, 1) == 0
+  assert [getTaskShard(jid, 3) for jid in (12, 13L, 14)] == [0, 1, 2]
+  assert getTaskShard("aTask", 4) == getTaskShard("aTask", 4) < 4
+  assert len(set(getTaskShard("task%d" % i, 4) for i in xrange(100))) == 4
+
+
+class Callbacks(ExecutorDispatcherCallbacks):
+
+  def __init__(self):
+    self.sent = []
+
+  def cbDispatch(self, taskId, taskObj, pathExecuted):
+    return S_OK("type1" if not pathExecuted else None)
+
+  def cbSendTask(self, taskId, taskObj, eId, eType):
+    self.sent.append((taskId, eId))
+    return S_OK()
+
+
+def test_dispatcherStats():
+  """ test of the queue depth, dispatch latency and utilization statistics
+  """
+  dispatcher = ExecutorDispatcher()
+  callbacks = Callbacks()
+  dispatcher.setCallbacks(callbacks)
+  dispatcher.addExecutor("e1", ["type1"], 2)
+  for taskId in xrange(3):
+    assert dispatcher.addTask(taskId, "task%d" % taskId)['OK']
+  assert callbacks.sent == [(0, "e1"), (1, "e1")]
+  stats = dispatcher.getStats()
+  assert stats['Tasks'] == 3
+  typeStats = stats['Types']["type1"]
+  assert (typeStats['Queued'], typeStats['Sent'], typeStats['BusySlots'], typeStats['Slots']) == (1, 2, 2, 2)
+  assert typeStats['Utilization'] == 1.
+  assert typeStats['MaxDispatchLatency'] >= typeStats['MeanDispatchLatency'] >= 0.
+
+  # The queued task goes to the freed slot
+  assert dispatcher.taskProcessed("e1", 0)['OK']
+  typeStats = dispatcher.getStats()['Types']["type1"]
+  assert (typeStats['Queued'], typeStats['Sent'], typeStats['BusySlots']) == (0, 3, 2)
+  assert dispatcher.getStats()['Tasks'] == 2
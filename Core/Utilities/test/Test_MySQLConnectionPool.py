@@ -0,0 +1,225 @@
+""" Unit tests of the MySQL connection pool, the MySQL server is replaced by mocks
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+import time
+
+import MySQLdb
+from mock import MagicMock, patch
+
+from DIRAC.Core.Utilities.MySQL import MySQL
+
+
+def connectMock(*_args, **_kwargs):
+  """ New mocked connection at each call """
+  return MagicMock()
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_boundedPool(mockConnect):
+  """ Many threads doing queries only open maxConnections connections """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=3)
+  errors = []
+  maxInUse = []
+
+  def worker():
+    for _ in xrange(20):
+      result = pool.checkout('aDB')
+      if not result['OK']:
+        errors.append(result['Message'])
+        continue
+      maxInUse.append(pool.getStats()['InUse'])
+      time.sleep(0.001)
+      pool.checkin(result['Value'])
+
+  threads = [threading.Thread(target=worker) for _ in xrange(20)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  assert not errors
+  assert mockConnect.call_count <= 3
+  assert max(maxInUse) <= 3
+  stats = pool.getStats()
+  assert stats['Checkouts'] == 400
+  assert stats['InUse'] == 0
+  assert stats['Spare'] == mockConnect.call_count
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_lazyPing(_mockConnect):
+  """ Connections are only pinged after having been idle for pingAge seconds """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd', pingAge=0.05)
+  conn = pool.checkout('aDB')['Value']
+  pool.checkin(conn)
+  assert pool.checkout('aDB')['Value'] is conn
+  pool.checkin(conn)
+  conn.ping.assert_not_called()
+
+  time.sleep(0.1)
+  assert pool.checkout('aDB')['Value'] is conn
+  pool.checkin(conn)
+  conn.ping.assert_called_once_with()
+
+  # A stale connection is replaced
+  time.sleep(0.1)
+  conn.ping.side_effect = MySQLdb.OperationalError(2006, 'MySQL server has gone away')
+  newConn = pool.checkout('aDB')['Value']
+  assert newConn is not conn
+  conn.close.assert_called_once_with()
+  pool.checkin(newConn)
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_selectDB(_mockConnect):
+  """ The database is only selected when it changes """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=1)
+  conn = pool.checkout('aDB')['Value']
+  pool.checkin(conn)
+  pool.checkout('aDB')
+  pool.checkin(conn)
+  conn.select_db.assert_called_once_with('aDB')
+  pool.checkout('anotherDB')
+  pool.checkin(conn)
+  assert conn.select_db.call_count == 2
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_dedicatedConnection(_mockConnect):
+  """ A thread with a dedicated connection uses it for all its queries """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=2)
+  dedicated = pool.get('aDB')['Value']
+  conn = pool.checkout('aDB')['Value']
+  assert conn is dedicated
+  pool.checkin(conn)
+  assert pool.getStats()['Assigned'] == 1
+
+  # Other threads still get a connection from the pool
+  otherConns = []
+
+  def worker():
+    otherConns.append(pool.checkout('aDB')['Value'])
+    pool.checkin(otherConns[-1])
+
+  thread = threading.Thread(target=worker)
+  thread.start()
+  thread.join()
+  assert otherConns[0] is not dedicated
+
+  # Once the grace time is over, the connection is released
+  pool.clean(now=time.time() + 3600)
+  assert pool.getStats()['Assigned'] == 0
+  dedicated.close.assert_called_once_with()
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_releaseDedicatedConnection(_mockConnect):
+  """ Dedicated connections count in maxConnections and go back to the pool once released """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=1, waitTimeout=0.1)
+  dedicated = pool.get('aDB')['Value']
+  # Nested users of the dedicated connection
+  assert pool.get('aDB')['Value'] is dedicated
+  otherResults = []
+
+  def worker():
+    result = pool.checkout('aDB')
+    otherResults.append(result)
+    if result['OK']:
+      pool.checkin(result['Value'])
+
+  thread = threading.Thread(target=worker)
+  thread.start()
+  thread.join()
+  assert not otherResults[0]['OK']
+
+  pool.release()
+  assert pool.getStats()['Assigned'] == 1
+  pool.release()
+  stats = pool.getStats()
+  assert stats['Assigned'] == 0
+  assert stats['Spare'] == 1
+
+  thread = threading.Thread(target=worker)
+  thread.start()
+  thread.join()
+  assert otherResults[1]['Value'] is dedicated
+  dedicated.close.assert_not_called()
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_transaction(_mockConnect):
+  """ The connection of a transaction is released when it ends """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=1)
+  assert pool.transactionStart('aDB')['OK']
+  conn = pool.checkout('aDB')['Value']
+  pool.checkin(conn)
+  assert pool.getStats()['Assigned'] == 1
+  assert pool.transactionCommit('aDB')['OK']
+  assert pool.getStats()['Assigned'] == 0
+  assert conn.cursor.return_value.execute.call_args[0][0] == 'COMMIT'
+
+  # Without a transaction there is nothing to commit
+  assert not pool.transactionRollback('aDB')['OK']
+  assert pool.getStats()['Spare'] == 1
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_brokenConnection(_mockConnect):
+  """ A connection that lost the server is not given back to the pool """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd')
+  conn = pool.checkout('aDB')['Value']
+  pool.checkin(conn, MySQLdb.OperationalError(2013, 'Lost connection to MySQL server during query'))
+  conn.close.assert_called_once_with()
+  assert pool.getStats()['Spare'] == 0
+
+  # Other errors leave the connection usable
+  conn = pool.checkout('aDB')['Value']
+  pool.checkin(conn, MySQLdb.ProgrammingError(1064, 'You have an error in your SQL syntax'))
+  assert pool.getStats()['Spare'] == 1
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_waitTimeout(_mockConnect):
+  """ When all the connections are busy for too long, checkout fails """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd', maxConnections=1, waitTimeout=0.1)
+  conn = pool.checkout('aDB')['Value']
+  otherResults = []
+
+  def worker():
+    otherResults.append(pool.checkout('aDB'))
+
+  thread = threading.Thread(target=worker)
+  thread.start()
+  thread.join()
+  assert not otherResults[0]['OK']
+  pool.checkin(conn)
+  assert pool.getStats()['Waits'] == 1
+
+
+@patch('DIRAC.Core.Utilities.MySQL.MySQLdb.connect', side_effect=connectMock)
+def test_closedConnection(_mockConnect):
+  """ A connection closed by its user is replaced, even if it was used recently """
+
+  pool = MySQL.ConnectionPool('host', 'user', 'passwd')
+  dedicated = pool.get('aDB')['Value']
+  dedicated.open = 0
+  conn = pool.get('aDB')['Value']
+  assert conn is not dedicated
+  dedicated.close.assert_not_called()
+  assert pool.getStats()['Assigned'] == 1
+
+  conn = pool.checkout('aDB')['Value']
+  pool.checkin(conn, MySQLdb.InterfaceError(0, ''))
+  assert pool.getStats()['Assigned'] == 0
+  conn.close.assert_called_once_with()
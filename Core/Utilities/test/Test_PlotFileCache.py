@@ -0,0 +1,110 @@
+""" Test the persistent cache of the plot files
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Utilities.Plotting.PlotFileCache import PlotFileCache
+
+
+@pytest.fixture
+def plotsDir():
+  directory = tempfile.mkdtemp()
+  yield directory
+  shutil.rmtree(directory)
+
+
+class Plotter(object):
+  """ Writes plots of a given size, counting the generations """
+
+  def __init__(self, size=100, delay=0.):
+    self.size = size
+    self.delay = delay
+    self.generated = []
+
+  def __call__(self, basePlotFileName):
+    self.generated.append(os.path.basename(basePlotFileName))
+    time.sleep(self.delay)
+    with open("%s.png" % basePlotFileName, 'w') as fd:
+      fd.write('x' * self.size)
+    return S_OK({'plot': "%s.png" % os.path.basename(basePlotFileName), 'thumbnail': False})
+
+
+def test_persistence(plotsDir):
+  plotter = Plotter()
+  cache = PlotFileCache(plotsDir)
+  assert cache.getPlot('hash1', plotter)['Value'] == {'plot': 'hash1.png', 'thumbnail': False}
+  assert cache.getPlot('hash1', plotter)['OK']
+  assert plotter.generated == ['hash1']
+  stats = cache.getStats()
+  assert (stats['Hits'], stats['Misses'], stats['Generations'], stats['Plots'], stats['Bytes']) == (1, 1, 1, 1, 100)
+
+  # Another process, or a restart, finds the plot
+  newCache = PlotFileCache(plotsDir)
+  assert newCache.getPlot('hash1', plotter)['Value']['plot'] == 'hash1.png'
+  assert plotter.generated == ['hash1']
+  # Unless its file is gone
+  os.unlink(os.path.join(plotsDir, 'hash1.png'))
+  assert newCache.getPlot('hash1', plotter)['OK']
+  assert plotter.generated == ['hash1', 'hash1']
+
+  # Failures are not cached
+  assert not newCache.getPlot('hash2', lambda _base: S_ERROR('No data'))['OK']
+  assert newCache.getPlot('hash2', plotter)['OK']
+  assert newCache.getStats()['Failures'] == 1
+
+
+def test_eviction(plotsDir):
+  plotter = Plotter()
+  cache = PlotFileCache(plotsDir, maxSize=250)
+  for plotHash in ('hash1', 'hash2'):
+    cache.getPlot(plotHash, plotter)
+  # hash1 is now the most recently used
+  cache.getPlot('hash1', plotter)
+  cache.getPlot('hash3', plotter)
+  assert sorted(name for name in os.listdir(plotsDir) if name.endswith('.png')) == ['hash1.png', 'hash3.png']
+  assert cache.getStats()['Evictions'] == 1
+
+  # Expired plots are regenerated
+  cache.lifeTime = 1
+  cache._PlotFileCache__dbConn.execute("UPDATE Plots SET CreationTime = CreationTime - 10 WHERE Hash = 'hash1'")
+  cache.getPlot('hash1', plotter)
+  assert plotter.generated == ['hash1', 'hash2', 'hash3', 'hash1']
+  assert cache.evict() == 0
+
+  # Plots that are not indexed are purged when opening the directory
+  with open(os.path.join(plotsDir, 'orphan.png'), 'w') as fd:
+    fd.write('x')
+  PlotFileCache(plotsDir)
+  assert os.path.exists(os.path.join(plotsDir, 'orphan.png'))
+  PlotFileCache(plotsDir).setLocation(plotsDir, orphanAge=-1)
+  assert not os.path.exists(os.path.join(plotsDir, 'orphan.png'))
+  assert os.path.exists(os.path.join(plotsDir, 'hash1.png'))
+
+
+def test_coalescing(plotsDir):
+  plotter = Plotter(delay=0.2)
+  cache = PlotFileCache(plotsDir)
+  results = []
+  threads = [threading.Thread(target=lambda: results.append(cache.getPlot('hash1', plotter))) for _ in range(5)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert plotter.generated == ['hash1']
+  assert [result['Value']['plot'] for result in results] == ['hash1.png'] * 5
+  stats = cache.getStats()
+  assert stats['Misses'] + stats['Hits'] + stats['Coalesced'] == 5
+  assert stats['Misses'] == 1
+  # The lock file is gone
+  assert sorted(os.listdir(plotsDir)) == ['hash1.png', 'plotIndex.db']
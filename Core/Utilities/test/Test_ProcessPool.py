@@ -340,6 +340,54 @@ class TaskTimeOutTests( unittest.TestCase ):
     gLock.release()
 
 
+########################################################################
+class BatchedProcessPoolTests( unittest.TestCase ):
+  """
+  .. class:: BatchedProcessPoolTests
+
+  test case for ProcessPool in batched mode
+  """
+
+  def setUp( self ):
+    """c'tor
+
+    :param self: self reference
+    """
+    gLogger.showHeaders( True )
+    self.log = gLogger.getSubLogger( self.__class__.__name__ )
+    self.results = {}
+    self.exceptions = {}
+    self.processPool = ProcessPool( 2, 2, 20,
+                                    poolCallback = self.poolCallback,
+                                    poolExceptionCallback = self.poolExceptionCallback,
+                                    batchSize = 5 )
+
+  def poolCallback( self, taskID, taskResult ):
+    self.results[taskID] = taskResult
+
+  def poolExceptionCallback( self, taskID, taskException ):
+    self.exceptions[taskID] = taskException
+
+  def testCallableFunc( self ):
+    """ CallableFunc in batches, results are sent back without the tasks """
+    for i in range( 20 ):
+      result = self.processPool.createAndQueueTask( CallableFunc,
+                                                    taskID = i,
+                                                    args = ( i, 0.1, i == 10 ),
+                                                    usePoolCallbacks = True,
+                                                    blocking = True )
+      self.assertTrue( result["OK"] )
+    self.processPool.processAllResults( 30 )
+    self.processPool.finalize( 2 )
+    self.assertEqual( sorted( self.results ), [i for i in range( 20 ) if i != 10] )
+    self.assertEqual( self.results[5], 0.1 )
+    self.assertEqual( self.exceptions.keys(), [10] )
+    taskTimes = self.processPool.getTaskTimes()
+    self.assertEqual( len( taskTimes ), 20 )
+    for _taskID, queueWait, execution, ipc in taskTimes:
+      self.assertTrue( queueWait >= 0 and execution >= 0.1 and ipc >= 0 )
+
+
 ## SUT suite execution
 if __name__ == "__main__":
 
@@ -347,6 +395,7 @@ if __name__ == "__main__":
   suitePPCT = testLoader.loadTestsFromTestCase( ProcessPoolCallbacksTests )  
   suiteTCT = testLoader.loadTestsFromTestCase( TaskCallbacksTests )
   suiteTTOT = testLoader.loadTestsFromTestCase( TaskTimeOutTests )
-  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT ] )
+  suiteBPPT = testLoader.loadTestsFromTestCase( BatchedProcessPoolTests )
+  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT, suiteBPPT ] )
   unittest.TextTestRunner(verbosity=3).run(suite)
 
@@ -0,0 +1,139 @@
+""" Test the sampling of the process trees, on a fake /proc file system
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import os
+import shutil
+import tempfile
+
+import pytest
+from mock import patch
+
+from DIRAC.Core.Utilities.ProcessSampler import ProcessSampler
+
+PAGE_SIZE = os.sysconf('SC_PAGESIZE')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+class FakeProc(object):
+  """ A /proc directory with the files read by the sampler """
+
+  def __init__(self, path):
+    self.path = path
+
+  def setProcess(self, pid, ppid, pgrp, cpuTicks=(0, 0, 0, 0), rssPages=10, pssKB=None, io=None, command='cmd'):
+    procDir = os.path.join(self.path, str(pid))
+    if not os.path.isdir(procDir):
+      os.mkdir(procDir)
+    fields = ['0'] * 45
+    fields[1:6] = [str(pid), '(%s)' % command, 'S', str(ppid), str(pgrp)]
+    fields[14:18] = [str(ticks) for ticks in cpuTicks]
+    fields[23:25] = [str(rssPages * PAGE_SIZE * 2), str(rssPages)]
+    fields[42] = str(CLOCK_TICKS)
+    # The files are rewritten in place, as the open descriptors of the sampler see them
+    self.__write(pid, 'stat', ' '.join(fields[1:]) + '\n')
+    self.__write(pid, 'statm', '%d %d 5 1 0 5 0\n' % (rssPages * 2, rssPages))
+    if pssKB is not None:
+      self.__write(pid, 'smaps_rollup', 'Rss: 100 kB\nPss: %d kB\nShared_Clean: 0 kB\n' % pssKB)
+    if io is not None:
+      self.__write(pid, 'io', 'rchar: 10\nwchar: 10\nread_bytes: %d\nwrite_bytes: %d\n' % io)
+
+  def __write(self, pid, name, content):
+    with open(os.path.join(self.path, str(pid), name), 'w') as fd:
+      fd.write(content)
+
+  def endProcess(self, pid):
+    """ The files of a process that is gone can not be read any more """
+    procDir = os.path.join(self.path, str(pid))
+    for name in os.listdir(procDir):
+      open(os.path.join(procDir, name), 'w').close()
+    shutil.rmtree(procDir)
+
+
+@pytest.fixture
+def fakeProc():
+  directory = tempfile.mkdtemp()
+  yield FakeProc(directory)
+  shutil.rmtree(directory)
+
+
+def test_tree(fakeProc):
+  fakeProc.setProcess(100, 50, 100, cpuTicks=(CLOCK_TICKS, 0, 0, 0), pssKB=8, io=(1000, 10))
+  fakeProc.setProcess(101, 100, 100, cpuTicks=(0, CLOCK_TICKS, 0, 0), pssKB=8, io=(1000, 10))
+  fakeProc.setProcess(102, 101, 100, cpuTicks=(CLOCK_TICKS, 0, 0, 0))
+  # Not in the tree: an unrelated process, and an orphan of another process group
+  fakeProc.setProcess(200, 1, 200, cpuTicks=(10 * CLOCK_TICKS, 0, 0, 0))
+  fakeProc.setProcess(301, 1, 301, cpuTicks=(10 * CLOCK_TICKS, 0, 0, 0))
+  # An orphan of the process group of the root is
+  fakeProc.setProcess(300, 1, 100, cpuTicks=(CLOCK_TICKS, 0, 0, 0), command='orphan (detached)')
+
+  sampler = ProcessSampler(100, procPath=fakeProc.path)
+  sample = sampler.sample()['Value']
+  assert sample['Processes'] == 4
+  assert sample['CPU'] == 4.
+  assert sample['RSS'] == 4 * 10 * PAGE_SIZE
+  assert sample['Vsize'] == 4 * 20 * PAGE_SIZE
+  assert sample['PSS'] == 16 * 1024
+  assert (sample['ReadBytes'], sample['WriteBytes'], sample['IOWait']) == (2000, 20, 4.)
+  processes = sampler.getProcessSeries()
+  assert sorted(processes) == [100, 101, 102, 300]
+  assert processes[300]['Command'] == 'orphan (detached)'
+  assert processes[102]['PPID'] == 101
+
+  # New children are found, the others are not read again
+  fakeProc.setProcess(103, 102, 100, cpuTicks=(CLOCK_TICKS, 0, 0, 0))
+  with patch('DIRAC.Core.Utilities.ProcessSampler.os.open', wraps=os.open) as mockOpen:
+    assert sampler.sample()['Value']['CPU'] == 5.
+    assert sorted(os.path.basename(os.path.dirname(call[0][0])) for call in mockOpen.call_args_list) == \
+        ['103'] * 4
+    mockOpen.reset_mock()
+    sampler.sample()
+    assert not mockOpen.called
+  assert sampler.getStats()['OtherProcesses'] == 2
+
+  # The files above the limit are opened at each sample
+  limitedSampler = ProcessSampler(100, procPath=fakeProc.path, maxOpenFiles=3)
+  limitedSample = limitedSampler.sample()['Value']
+  assert limitedSampler.sample()['Value']['CPU'] == limitedSample['CPU'] == 5.
+  assert limitedSample['PSS'] == sample['PSS']
+  assert limitedSampler.getStats()['OpenFiles'] == 3
+  limitedSampler.close()
+
+
+def test_counters(fakeProc):
+  fakeProc.setProcess(100, 50, 100, cpuTicks=(CLOCK_TICKS, 0, 0, 0), io=(0, 0))
+  fakeProc.setProcess(101, 100, 100, cpuTicks=(CLOCK_TICKS, 0, 0, 0), io=(100, 0))
+  fakeProc.setProcess(102, 101, 100, cpuTicks=(CLOCK_TICKS, 0, 0, 0))
+  fakeProc.setProcess(300, 1, 100, cpuTicks=(CLOCK_TICKS, 0, 0, 0), io=(0, 50))
+  sampler = ProcessSampler(100, procPath=fakeProc.path)
+  assert sampler.sample()['Value']['CPU'] == 4.
+
+  # 102 is reaped by 101: its CPU is now in the children CPU of 101
+  fakeProc.setProcess(102, 101, 100, cpuTicks=(2 * CLOCK_TICKS, 0, 0, 0))
+  assert sampler.sample()['Value']['CPU'] == 5.
+  fakeProc.endProcess(102)
+  fakeProc.setProcess(101, 100, 100, cpuTicks=(CLOCK_TICKS, 0, 2 * CLOCK_TICKS, 0), io=(100, 0))
+  sample = sampler.sample()['Value']
+  assert (sample['CPU'], sample['Processes'], sample['ReadBytes']) == (5., 3, 100)
+
+  # The orphan ends, reaped by init, and 101 reaped by 100: only the counters of the orphan are kept
+  fakeProc.endProcess(300)
+  fakeProc.endProcess(101)
+  fakeProc.setProcess(100, 50, 100, cpuTicks=(CLOCK_TICKS, 0, 3 * CLOCK_TICKS, 0), io=(100, 0))
+  sample = sampler.sample()['Value']
+  assert (sample['CPU'], sample['Processes'], sample['ReadBytes'], sample['WriteBytes']) == (5., 1, 100, 50)
+  assert sampler.getStats() == {'Processes': 1, 'OtherProcesses': 0, 'Exited': 3, 'OpenFiles': 3}
+
+  series = sampler.getSeries()
+  assert [sample['CPU'] for sample in series] == [4., 5., 5., 5.]
+  assert [sample['Time'] for sample in sampler.getProcessSeries()[100]['Samples']] == \
+      [sample['Time'] for sample in series]
+
+  # The root is gone
+  fakeProc.endProcess(100)
+  assert not sampler.sample()['OK']
+  assert sampler.getLastSample()['CPU'] == 5.
+  assert not ProcessSampler(999, procPath=fakeProc.path).sample()['OK']
@@ -0,0 +1,212 @@
+""" Index of many metadata queries, to find quickly which of them accept a given metadata dictionary
+
+    Matching a metadata dictionary against N queries with MetaQuery.applyQuery costs N full evaluations.
+    The MetaQueryIndex compiles all the queries once in conditions on a single metadata:
+
+    * equality and 'in' conditions go in inverted indexes value -> queries,
+    * comparisons are merged in one interval per metadata, kept sorted by lower bound,
+    * '!=' and 'nin' conditions go in inverted indexes of the excluded values,
+    * 'Any' only requires the metadata to be present.
+
+    A query matches when all its conditions are fulfilled, which is found by counting the fulfilled
+    conditions of each query, looking only at the metadata present in the dictionary. The rare queries
+    that can not be compiled (using 'Missing', or ill-typed) are evaluated with MetaQuery.applyQuery.
+"""
+
+__RCSID__ = "$Id$"
+
+import bisect
+from collections import defaultdict
+
+from DIRAC import S_OK, S_ERROR
+import DIRAC.Core.Utilities.Time as Time
+from DIRAC.DataManagementSystem.Client.MetaQuery import MetaQuery
+
+COMPARISONS = ( '>', '<', '>=', '<=' )
+EQUALITIES = ( '=', 'in' )
+EXCLUSIONS = ( '!=', 'nin' )
+
+
+def getTypedValue( value, mtype ):
+  """ Same typing of the values as in MetaQuery.applyQuery """
+  if mtype[0:3].lower() == 'int':
+    return int( value )
+  elif mtype[0:5].lower() == 'float':
+    return float( value )
+  elif mtype[0:4].lower() == 'date':
+    return Time.fromString( value )
+  return value
+
+
+class MetaQueryIndex( object ):
+
+  def __init__( self, queries, typeDict ):
+    """ Compiles the queries
+
+        :param queries: list of ( queryID, metaQueryDict )
+        :param dict typeDict: { metaName : metaType }
+    """
+    self.__typeDict = typeDict
+    # queryID : number of conditions to fulfill
+    self.__nbConditions = {}
+    # queries without condition, matching everything
+    self.__matchAll = []
+    # ( queryID, MetaQuery ) evaluated one by one
+    self.__unindexed = []
+    # meta : [ queryID ] for 'Any'
+    self.__present = defaultdict( list )
+    # meta : { value : [ queryID ] }
+    self.__equalities = defaultdict( lambda: defaultdict( list ) )
+    # meta : [ ( lowBound, lowStrict, highBound, highStrict, queryID ) ] sorted by lowBound
+    self.__intervals = defaultdict( list )
+    # meta : [ queryID ] having an exclusion condition, and { value : [ queryID ] } excluding it
+    self.__exclusions = defaultdict( list )
+    self.__excluded = defaultdict( lambda: defaultdict( list ) )
+
+    for queryID, queryDict in queries:
+      try:
+        conditions = self.__compileQuery( queryDict )
+      except ( ValueError, TypeError, KeyError ):
+        conditions = None
+      if conditions is None:
+        self.__unindexed.append( ( queryID, MetaQuery( queryDict, typeDict ) ) )
+      elif not conditions:
+        self.__matchAll.append( queryID )
+      else:
+        self.__nbConditions[queryID] = len( conditions )
+        for condition in conditions:
+          self.__addCondition( queryID, condition )
+
+    # Intervals without lower bound come first
+    self.__lowBounds = {}
+    for meta, intervals in self.__intervals.items():
+      intervals.sort( key = lambda interval: ( interval[0] is not None, interval[0] ) )
+      self.__lowBounds[meta] = [interval[0] for interval in intervals if interval[0] is not None]
+
+  def __compileQuery( self, queryDict ):
+    """ Conditions ( kind, meta, operand ) of a query, None if it can not be compiled
+    """
+    conditions = []
+    for meta, value in queryDict.items():
+      if str( value ).lower() == 'missing':
+        return None
+      if str( value ).lower() == 'any':
+        conditions.append( ( 'any', meta, None ) )
+        continue
+      mtype = self.__typeDict[meta]
+      if isinstance( value, list ):
+        operations = [( 'in', value )]
+      elif isinstance( value, dict ):
+        operations = value.items()
+      else:
+        operations = [( '=', value )]
+
+      allowed = None
+      excluded = set()
+      low = high = None
+      for operation, operand in operations:
+        if isinstance( operand, list ):
+          typedValue = [getTypedValue( x, mtype ) for x in operand]
+        else:
+          typedValue = getTypedValue( operand, mtype )
+        if operation in COMPARISONS:
+          if isinstance( typedValue, list ):
+            return None
+          if operation[0] == '>':
+            bound = ( typedValue, operation == '>' )
+            low = bound if low is None else max( low, bound )
+          else:
+            bound = ( typedValue, operation == '<' )
+            high = bound if high is None else min( high, bound, key = lambda b: ( b[0], not b[1] ) )
+        elif operation in EQUALITIES:
+          values = set( typedValue ) if isinstance( typedValue, list ) else set( [typedValue] )
+          allowed = values if allowed is None else allowed & values
+        elif operation in EXCLUSIONS:
+          excluded.update( typedValue if isinstance( typedValue, list ) else [typedValue] )
+        else:
+          # Unknown operations are ignored by applyQuery
+          continue
+
+      if allowed is not None:
+        conditions.append( ( 'in', meta, allowed ) )
+      if low is not None or high is not None:
+        conditions.append( ( 'interval', meta, ( low, high ) ) )
+      if excluded:
+        conditions.append( ( 'nin', meta, excluded ) )
+      if allowed is None and low is None and high is None and not excluded:
+        # Only requires the metadata to be there
+        conditions.append( ( 'any', meta, None ) )
+    return conditions
+
+  def __addCondition( self, queryID, condition ):
+    """ Index one condition of a query """
+    kind, meta, operand = condition
+    if kind == 'any':
+      self.__present[meta].append( queryID )
+    elif kind == 'in':
+      for value in operand:
+        self.__equalities[meta][value].append( queryID )
+    elif kind == 'interval':
+      low, high = operand
+      self.__intervals[meta].append( ( low[0] if low else None, low[1] if low else False,
+                                       high[0] if high else None, high[1] if high else False,
+                                       queryID ) )
+    elif kind == 'nin':
+      self.__exclusions[meta].append( queryID )
+      for value in operand:
+        self.__excluded[meta][value].append( queryID )
+
+  def __matchIntervals( self, meta, value ):
+    """ IDs of the queries whose interval on meta contains the value """
+    intervals = self.__intervals[meta]
+    lowBounds = self.__lowBounds[meta]
+    # All the intervals starting at or below value
+    end = len( intervals ) - len( lowBounds ) + bisect.bisect_right( lowBounds, value )
+    matching = []
+    for low, lowStrict, high, highStrict, queryID in intervals[:end]:
+      if lowStrict and low == value:
+        continue
+      if high is not None and ( high < value or ( highStrict and high == value ) ):
+        continue
+      matching.append( queryID )
+    return matching
+
+  def match( self, userMetaDict ):
+    """ IDs of all the queries accepting the metadata
+
+        :param dict userMetaDict: { metaName : value }
+        :return: S_OK( list of queryIDs )
+    """
+    fulfilled = defaultdict( int )
+    for meta, userValue in userMetaDict.items():
+      if userValue is None or meta not in self.__typeDict:
+        continue
+      matching = list( self.__present.get( meta, [] ) )
+      if not ( meta in self.__equalities or meta in self.__intervals or meta in self.__exclusions ):
+        for queryID in matching:
+          fulfilled[queryID] += 1
+        continue
+      try:
+        userValue = getTypedValue( userValue, self.__typeDict[meta] )
+      except ValueError:
+        return S_ERROR( 'Illegal type for metadata %s: %s in user data' % ( meta, str( userValue ) ) )
+
+      if meta in self.__equalities:
+        matching += self.__equalities[meta].get( userValue, [] )
+      if meta in self.__intervals:
+        matching += self.__matchIntervals( meta, userValue )
+      if meta in self.__exclusions:
+        excluded = set( self.__excluded[meta].get( userValue, [] ) )
+        matching += [queryID for queryID in self.__exclusions[meta] if queryID not in excluded]
+      for queryID in matching:
+        fulfilled[queryID] += 1
+
+    queryIDs = [queryID for queryID, count in fulfilled.items() if count == self.__nbConditions[queryID]]
+    queryIDs += self.__matchAll
+    for queryID, metaQuery in self.__unindexed:
+      result = metaQuery.applyQuery( userMetaDict )
+      if not result['OK']:
+        return result
+      if result['Value']:
+        queryIDs.append( queryID )
+    return S_OK( queryIDs )
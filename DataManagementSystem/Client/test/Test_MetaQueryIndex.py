@@ -0,0 +1,99 @@
+""" Unit tests of the MetaQueryIndex: it must select exactly the queries accepted by MetaQuery.applyQuery
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import random
+import unittest
+
+from DIRAC.DataManagementSystem.Client.MetaQuery import MetaQuery
+from DIRAC.DataManagementSystem.Client.MetaQueryIndex import MetaQueryIndex
+
+typeDict = {'NumberOfEvents': 'int', 'Energy': 'float', 'DataType': 'VARCHAR(128)',
+            'Run': 'INT', 'Date': 'DATETIME'}
+
+VALUES = {'NumberOfEvents': range(5),
+          'Run': range(5),
+          'Energy': [0.5, 1., 1.5, 2.],
+          'DataType': ['RAW', 'DST', 'MDST'],
+          'Date': ['2017-01-01', '2017-06-01', '2018-01-01']}
+
+
+def randomQuery(rand):
+  """ A query using all the kinds of operations """
+  query = {}
+  for meta in rand.sample(sorted(VALUES), rand.randint(0, 3)):
+    values = VALUES[meta]
+    kind = rand.choice(['value', 'list', 'dict', 'any', 'missing'])
+    if kind == 'value':
+      query[meta] = rand.choice(values)
+    elif kind == 'list':
+      query[meta] = rand.sample(values, 2)
+    elif kind == 'any':
+      query[meta] = 'Any'
+    elif kind == 'missing':
+      # MetaQuery fails to type 'Missing' if the metadata is there and is not a string
+      query[meta] = 'Missing' if meta == 'DataType' else 'Any'
+    else:
+      operations = {}
+      for operation in rand.sample(['>', '<', '>=', '<=', '=', '!=', 'in', 'nin'], rand.randint(1, 3)):
+        if operation in ('in', 'nin'):
+          operations[operation] = rand.sample(values, 2)
+        else:
+          operations[operation] = rand.choice(values)
+      query[meta] = operations
+  return query
+
+
+def randomMetadata(rand):
+  return dict((meta, rand.choice(values)) for meta, values in VALUES.items() if rand.random() < 0.8)
+
+
+class MetaQueryIndexTestCase(unittest.TestCase):
+
+  def assertSameMatch(self, queries, metadata):
+    expected = [queryID for queryID, query in queries
+                if MetaQuery(query, typeDict).applyQuery(metadata)['Value']]
+    result = MetaQueryIndex(queries, typeDict).match(metadata)
+    self.assertTrue(result['OK'])
+    self.assertEqual(sorted(result['Value']), expected)
+
+  def test_operations(self):
+    queries = [(0, {}),
+               (1, {'DataType': 'RAW'}),
+               (2, {'DataType': ['RAW', 'DST'], 'Run': {'>': 1, '<=': 3}}),
+               (3, {'Run': {'>=': 2, '>': 2}}),
+               (4, {'Run': {'nin': [1, 2]}, 'NumberOfEvents': 'Any'}),
+               (5, {'Run': {'in': [1, 2], '=': 2}}),
+               (6, {'Energy': {'<': 1.5}, 'DataType': 'Missing'}),
+               (7, {'Date': {'>': '2017-03-01'}})]
+    for metadata, expected in (({'DataType': 'RAW', 'Run': 2}, [0, 1, 2, 5]),
+                               ({'DataType': 'DST', 'Run': '3', 'NumberOfEvents': 10}, [0, 2, 3, 4]),
+                               ({'Energy': 1, 'Date': '2018-01-01'}, [0, 6, 7]),
+                               ({'DataType': 'MDST', 'Energy': '1.5'}, [0])):
+      result = MetaQueryIndex(queries, typeDict).match(metadata)
+      self.assertTrue(result['OK'])
+      self.assertEqual(sorted(result['Value']), expected)
+      self.assertSameMatch(queries, metadata)
+
+  def test_errors(self):
+    index = MetaQueryIndex([(1, {'Run': {'>': 'notAnInt'}}), (2, {'Run': 3})], typeDict)
+    self.assertFalse(index.match({'Run': 'three'})['OK'])
+    # The ill-typed filter is only reported when evaluated, as by MetaQuery
+    self.assertFalse(index.match({'Run': 3})['OK'])
+    self.assertFalse(MetaQueryIndex([(1, {'Run': {'>': [1, 2]}})], typeDict).match({'Run': 3})['OK'])
+    # 'Any' does not need a typed value
+    self.assertEqual(MetaQueryIndex([(1, {'Run': 'Any'})], typeDict).match({'Run': 'three'})['Value'], [1])
+
+  def test_random(self):
+    rand = random.Random(1234)
+    queries = [(queryID, randomQuery(rand)) for queryID in xrange(300)]
+    for _ in xrange(300):
+      self.assertSameMatch(queries, randomMetadata(rand))
+
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase(MetaQueryIndexTestCase)
+  unittest.TextTestRunner(verbosity=2).run(suite)
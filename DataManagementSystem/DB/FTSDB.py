@@ -121,6 +121,8 @@ class FTSDB( DB ):
   def _transaction( self, queries, connection = None ):
     """ execute transaction """
     queries = [ queries ] if isinstance( queries, basestring ) else queries
+    # # a connection taken here is given back at the end of the transaction
+    ownConnection = not connection
     # # get cursor and connection
     getCursorAndConnection = self.dictCursor( connection )
     if not getCursorAndConnection['OK']:
@@ -157,6 +159,9 @@ class FTSDB( DB ):
       # # close cursor
       cursor.close()
       return S_ERROR( str( error ) )
+    finally:
+      if ownConnection:
+        self._releaseConnection()
 
   def putFTSFile( self, ftsFile ):
     """ put FTSFile into fts db """
@@ -69,14 +69,6 @@ class DatasetManager( object ):
       gLogger.info( "Tables created: %s" % ','.join( result['Value'] ) )  
     return result
 
-  def _getConnection( self, connection=False ):
-    if connection:
-      return connection
-    res = self.db._getConnection()
-    if res['OK']:
-      return res['Value']
-    return connection
-
   def addDataset( self, datasets, credDict ):
     """
     :param dict datasets: dictionary describing dataset definitions
@@ -164,7 +156,6 @@ class DatasetManager( object ):
   
   def _findDatasets( self, datasets, connection=False ):
      
-    connection = self._getConnection( connection ) 
     fullNames = [ name for name in datasets if name.startswith('/') ]
     shortNames = [ name for name in datasets if not name.startswith('/') ]
     
@@ -258,9 +249,8 @@ class DatasetManager( object ):
   def addDatasetAnnotation( self, datasets, credDict ):
     """ Add annotation to the given dataset
     """
-    connection = self._getConnection()
     successful = {}
-    result = self._findDatasets( datasets.keys(), connection )
+    result = self._findDatasets( datasets.keys() )
     if not result['OK']:
       return result
     failed = result['Value']['Failed']
@@ -268,7 +258,7 @@ class DatasetManager( object ):
     for dataset, annotation in datasets.items():
       if dataset in datasetDict:
         req = "REPLACE FC_DatasetAnnotations (Annotation,DatasetID) VALUE ('%s',%d)" % (annotation,datasetDict[dataset]['DatasetID'])
-        result = self.db._update( req, connection)
+        result = self.db._update( req )
         if not result['OK']:
           failed[dataset] = "Failed to add annotation"
         else:
@@ -148,49 +148,55 @@ class DirectoryLevelTree(DirectoryTreeBase):
         names.append('LPATH%d' % i)
         values.append(epathList[i - 1])
 
+    # The insert and the path number update are done on a connection kept for the transaction
     result = self.db._getConnection()
-    conn = result['Value']
-    #result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE; ",conn)
-    result = self.db._insert('FC_DirectoryLevelTree', names, values, conn)
     if not result['OK']:
-      # resUnlock = self.db._query("UNLOCK TABLES;",conn)
-      if result['Message'].find('Duplicate') != -1:
-        # The directory is already added
-        resFind = self.findDir(path)
-        if not resFind['OK']:
-          return resFind
-        dirID = resFind['Value']
-        result = S_OK(dirID)
-        result['NewDirectory'] = False
-        return result
-      else:
-        return result
-    dirID = result['lastRowId']
-
-    # Update the path number
-    if parentDirID:
-      #       lPath = "LPATH%d" % (level)
-      #       req = " SELECT @tmpvar:=max(%s)+1 FROM FC_DirectoryLevelTree WHERE Parent=%d; " % (lPath,parentDirID)
-      #       resultLock = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE; ",conn)
-      #       result = self.db._query(req,conn)
-      #       req = "UPDATE FC_DirectoryLevelTree SET %s=@tmpvar WHERE DirID=%d; " % (lPath,dirID)
-      #       result = self.db._update(req,conn)
-      #       result = self.db._query("UNLOCK TABLES;",conn)
-      lPath = "LPATH%d" % (level)
-      req = " SELECT @tmpvar:=max(%s)+1 FROM FC_DirectoryLevelTree WHERE Parent=%d FOR UPDATE; " % (lPath, parentDirID)
-      resultLock = self.db._query("START TRANSACTION; ", conn)
-      result = self.db._query(req, conn)
-      req = "UPDATE FC_DirectoryLevelTree SET %s=@tmpvar WHERE DirID=%d; " % (lPath, dirID)
-      result = self.db._update(req, conn)
-      result = self.db._query("COMMIT;", conn)
+      return result
+    conn = result['Value']
+    try:
+      #result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE; ",conn)
+      result = self.db._insert('FC_DirectoryLevelTree', names, values, conn)
       if not result['OK']:
-        return result
-    else:
-      result = self.db._query("ROLLBACK;", conn)
+        # resUnlock = self.db._query("UNLOCK TABLES;",conn)
+        if result['Message'].find('Duplicate') != -1:
+          # The directory is already added
+          resFind = self.findDir(path)
+          if not resFind['OK']:
+            return resFind
+          dirID = resFind['Value']
+          result = S_OK(dirID)
+          result['NewDirectory'] = False
+          return result
+        else:
+          return result
+      dirID = result['lastRowId']
+
+      # Update the path number
+      if parentDirID:
+        #       lPath = "LPATH%d" % (level)
+        #       req = " SELECT @tmpvar:=max(%s)+1 FROM FC_DirectoryLevelTree WHERE Parent=%d; " % (lPath,parentDirID)
+        #       resultLock = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE; ",conn)
+        #       result = self.db._query(req,conn)
+        #       req = "UPDATE FC_DirectoryLevelTree SET %s=@tmpvar WHERE DirID=%d; " % (lPath,dirID)
+        #       result = self.db._update(req,conn)
+        #       result = self.db._query("UNLOCK TABLES;",conn)
+        lPath = "LPATH%d" % (level)
+        req = " SELECT @tmpvar:=max(%s)+1 FROM FC_DirectoryLevelTree WHERE Parent=%d FOR UPDATE; " % (lPath, parentDirID)
+        resultLock = self.db._query("START TRANSACTION; ", conn)
+        result = self.db._query(req, conn)
+        req = "UPDATE FC_DirectoryLevelTree SET %s=@tmpvar WHERE DirID=%d; " % (lPath, dirID)
+        result = self.db._update(req, conn)
+        result = self.db._query("COMMIT;", conn)
+        if not result['OK']:
+          return result
+      else:
+        result = self.db._query("ROLLBACK;", conn)
 
-    result = S_OK(dirID)
-    result['NewDirectory'] = True
-    return result
+      result = S_OK(dirID)
+      result['NewDirectory'] = True
+      return result
+    finally:
+      self.db._releaseConnection()
 
   def existsDir(self, path):
     """ Check the existence of a directory at the specified path
@@ -521,24 +527,22 @@ class DirectoryLevelTree(DirectoryTreeBase):
       if not result['OK']:
         continue
 
-      connection = self._getConnection()
+      # The lock belongs to the connection, which is kept until the tables are unlocked
+      result = self.db._getConnection()
+      if not result['OK']:
+        return result
+      connection = result['Value']
       result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE", connection)
       if not result['OK']:
         resUnlock = self.db._query("UNLOCK TABLES", connection)
+        self.db._releaseConnection()
         return result
       result = self.__rebuildLevelIndexes(parentID, connection)
       resUnlock = self.db._query("UNLOCK TABLES", connection)
+      self.db._releaseConnection()
 
     return S_OK()
 
-  def _getConnection(self, connection=False):
-    if connection:
-      return connection
-    res = self.db._getConnection()
-    if res['OK']:
-      return res['Value']
-    return connection
-
   def __rebuildLevelIndexes(self, parentID, connection=False):
     """ Rebuild level indexes for all the subdirectories
     """
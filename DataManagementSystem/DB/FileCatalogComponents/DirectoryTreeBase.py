@@ -64,15 +64,6 @@ class DirectoryTreeBase:
 ##########################################################################
 
 
-  def _getConnection( self, connection ):
-    if connection:
-      return connection
-    res = self.db._getConnection()
-    if res['OK']:
-      return res['Value']
-    gLogger.warn( "Failed to get MySQL connection", res['Message'] )
-    return connection
-
   def getTreeTable( self ):
     """ Get the string of the Directory Tree type
     """
@@ -738,12 +729,12 @@ class DirectoryTreeBase:
       resultLogical = self._getDirectoryLogicalSizeFromUsage( lfns, connection )
 
     if not resultLogical['OK']:
-      connection.close()
+      self.db._releaseConnection()
       return resultLogical
 
     resultDict = resultLogical['Value']
     if not resultDict['Successful']:
-      connection.close()
+      self.db._releaseConnection()
       return resultLogical
 
     if longOutput:
@@ -756,11 +747,11 @@ class DirectoryTreeBase:
         resultDict['QueryTime'] = time.time() - start
         result = S_OK( resultDict )
         result['Message'] = "Failed to get the physical size on storage"
-        connection.close()
+        self.db._releaseConnection()
         return result
       for lfn in resultPhysical['Value']['Successful']:
         resultDict['Successful'][lfn]['PhysicalSize'] = resultPhysical['Value']['Successful'][lfn]
-    connection.close()
+    self.db._releaseConnection()
     resultDict['QueryTime'] = time.time() - start
 
     return S_OK( resultDict )
@@ -1145,7 +1136,6 @@ class DirectoryTreeBase:
   def getDirectoryCounters( self, connection = False ):
     """ Get the total number of directories
     """
-    conn = self._getConnection( connection )
     resultDict = {}
     req = "SELECT COUNT(*) from FC_DirectoryInfo"
     res = self.db._query( req, connection )
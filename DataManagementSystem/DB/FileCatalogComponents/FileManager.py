@@ -25,7 +25,6 @@ class FileManager( FileManagerBase ):
   def _findFiles( self, lfns, metadata = ['FileID'], allStatus = False, connection = False ):
     """ Find file ID if it exists for the given list of LFNs """
 
-    connection = self._getConnection(connection)
     dirDict = self._getFileDirectories(lfns)
     failed = {}
     result = self.db.dtree.findDirs( dirDict.keys() )
@@ -65,7 +64,6 @@ class FileManager( FileManagerBase ):
   def _findFileIDs( self, lfns, connection=False ):
     """ Find lfn <-> FileID correspondence
     """
-    connection = self._getConnection(connection)
     dirDict = self._getFileDirectories(lfns)
     failed = {}
     successful = {}
@@ -112,7 +110,6 @@ class FileManager( FileManagerBase ):
     """
     metadata = list(metadata_input)
 
-    connection = self._getConnection(connection)
     # metadata can be any of ['FileID','Size','UID','GID','Status','Checksum','ChecksumType',
     # 'Type','CreationDate','ModificationDate','Mode']
     req = "SELECT FileName,DirID,FileID,Size,UID,GID,Status FROM FC_Files WHERE DirID=%d" % (dirID)
@@ -238,7 +235,6 @@ class FileManager( FileManagerBase ):
 
   def _insertFiles(self,lfns,uid,gid,connection=False):
 
-    connection = self._getConnection(connection)
     # Add the files
     failed = {}
     insertTuples = []
@@ -310,7 +306,6 @@ class FileManager( FileManagerBase ):
     return S_OK({'Successful':lfns,'Failed':failed})
 
   def _getFileIDFromGUID(self,guid,connection=False):
-    connection = self._getConnection(connection)
     if not guid:
       return S_OK({})
     if type(guid) not in [ListType,TupleType]:
@@ -327,7 +322,6 @@ class FileManager( FileManagerBase ):
   def getLFNForGUID( self, guids, connection = False ):
     """ Returns the lfns matching given guids"""
 
-    connection = self._getConnection( connection )
     if not guids:
       return S_OK( {} )
     if type( guids ) not in [ListType, TupleType]:
@@ -366,7 +360,6 @@ class FileManager( FileManagerBase ):
   #
 
   def _deleteFiles( self, fileIDs, connection = False ):
-    connection = self._getConnection(connection)
     replicaPurge = self.__deleteFileReplicas(fileIDs)
     filePurge = self.__deleteFiles(fileIDs,connection=connection)
     if not replicaPurge['OK']:
@@ -376,7 +369,6 @@ class FileManager( FileManagerBase ):
     return S_OK()
 
   def __deleteFileReplicas( self, fileIDs, connection = False ):
-    connection = self._getConnection(connection)
     res = self.__getFileIDReplicas(fileIDs,connection=connection)
     if not res['OK']:
       return res
@@ -384,7 +376,6 @@ class FileManager( FileManagerBase ):
     return self.__deleteReplicas(repIDs, connection=connection)
 
   def __deleteFiles( self, fileIDs, connection = False ):
-    connection = self._getConnection(connection)
     if type(fileIDs) not in [ ListType, TupleType]:
       fileIDs = [fileIDs]
     if not fileIDs:
@@ -407,7 +398,6 @@ class FileManager( FileManagerBase ):
   #
 
   def _insertReplicas( self, lfns, master = False, connection = False ):
-    connection = self._getConnection(connection)
     # Add the files
     failed = {}
     successful = {}
@@ -494,7 +484,6 @@ class FileManager( FileManagerBase ):
     return S_OK({'Successful':successful,'Failed':failed})
 
   def _getRepIDsForReplica(self,replicaTuples,connection=False):
-    connection = self._getConnection(connection)
     queryTuples = []
     for fileID,seID in replicaTuples:
       queryTuples.append("(%d,%d)" % (fileID,seID))
@@ -515,7 +504,6 @@ class FileManager( FileManagerBase ):
   #
 
   def _deleteReplicas( self, lfns, connection = False ):
-    connection = self._getConnection( connection )
     failed = {}
     successful = {}
     res = self._findFiles( lfns.keys(), ['DirID', 'FileID', 'Size'], connection = connection )
@@ -566,7 +554,6 @@ class FileManager( FileManagerBase ):
     return S_OK( {"Successful":successful, "Failed":failed} )
 
   def __deleteReplicas( self, repIDs, connection = False ):
-    connection = self._getConnection(connection)
     if type(repIDs) not in [ ListType, TupleType]:
       repIDs = [repIDs]
     if not repIDs:
@@ -592,7 +579,6 @@ class FileManager( FileManagerBase ):
   def _setReplicaStatus( self, fileID, se, status, connection = False ):
     if not status in self.db.validReplicaStatus:
       return S_ERROR( 'Invalid replica status %s' % status )
-    connection = self._getConnection(connection)
     res = self._getStatusInt(status,connection=connection)
     if not res['OK']:
       return res
@@ -609,7 +595,6 @@ class FileManager( FileManagerBase ):
     return self.db._update(req,connection)
 
   def _setReplicaHost( self, fileID, se, newSE, connection = False ):
-    connection = self._getConnection( connection )
     res = self.db.seManager.findSE( newSE )
     if not res['OK']:
       return res
@@ -624,7 +609,6 @@ class FileManager( FileManagerBase ):
     return self.db._update(req,connection)
 
   def _setReplicaParameter( self, fileID, se, paramName, paramValue, connection = False ):
-    connection = self._getConnection(connection)
     res = self.__getRepIDForReplica(fileID,se,connection=connection)
     if not res['OK']:
       return res
@@ -635,7 +619,6 @@ class FileManager( FileManagerBase ):
     return self.db._update(req,connection)
 
   def _setFileParameter( self, fileID, paramName, paramValue, connection = False ):
-    connection = self._getConnection(connection)
 
     result = getIDSelectString( fileID )
     if not result['OK']:
@@ -670,7 +653,6 @@ class FileManager( FileManagerBase ):
     return self.db._update( req, connection )
 
   def __getRepIDForReplica( self, fileID, seID, connection = False ):
-    connection = self._getConnection(connection)
     if type(seID) in StringTypes:
       res = self.db.seManager.findSE(seID)
       if not res['OK']:
@@ -697,7 +679,6 @@ class FileManager( FileManagerBase ):
     """ Get replicas for the given list of files specified by their fileIDs
     """
     fields = list(fields_input)
-    connection = self._getConnection(connection)
     res = self.__getFileIDReplicas( fileIDs, allStatus = allStatus, connection = connection )
     if not res['OK']:
       return res
@@ -748,7 +729,6 @@ class FileManager( FileManagerBase ):
     return S_OK(replicas)
 
   def __getFileIDReplicas(self,fileIDs,allStatus=False,connection=False):
-    connection = self._getConnection(connection)
     if not fileIDs:
       return S_ERROR("No such file or directory")
     req = "SELECT FileID,SEID,RepID,Status FROM FC_Replicas WHERE FileID IN (%s)" % (intListToString(fileIDs))
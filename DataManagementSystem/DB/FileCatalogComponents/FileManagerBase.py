@@ -21,22 +21,12 @@ class FileManagerBase(object):
     self.db = database
     self.statusDict = {}
 
-  def _getConnection(self, connection):
-    if connection:
-      return connection
-    res = self.db._getConnection()
-    if res['OK']:
-      return res['Value']
-    gLogger.warn("Failed to get MySQL connection", res['Message'])
-    return connection
-
   def setDatabase(self, database):
     self.db = database
 
   def getFileCounters(self, connection=False):
     """ Get a number of counters to verify the sanity of the Files in the catalog
     """
-    connection = self._getConnection(connection)
 
     resultDict = {}
     req = "SELECT COUNT(*) FROM FC_Files;"
@@ -84,7 +74,6 @@ class FileManagerBase(object):
     """ Get a number of counters to verify the sanity of the Replicas in the catalog
     """
 
-    connection = self._getConnection(connection)
     req = "SELECT COUNT(*) FROM FC_Replicas;"
     res = self.db._query(req, connection)
     if not res['OK']:
@@ -219,7 +208,6 @@ class FileManagerBase(object):
 
 
      """
-    connection = self._getConnection(connection)
     successful = {}
     failed = {}
     for lfn, info in lfns.items():
@@ -239,7 +227,6 @@ class FileManagerBase(object):
   def _addFiles(self, lfns, credDict, connection=False):
     """ Main file adding method
     """
-    connection = self._getConnection(connection)
     successful = {}
     result = self.db.ugManager.getUserAndGroupID(credDict)
     if not result['OK']:
@@ -382,7 +369,6 @@ class FileManagerBase(object):
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def _updateDirectoryUsage(self, directorySEDict, change, connection=False):
-    connection = self._getConnection(connection)
     for directoryID in directorySEDict.keys():
       result = self.db.dtree.getPathIDsByID(directoryID)
       if not result['OK']:
@@ -407,7 +393,6 @@ class FileManagerBase(object):
     return S_OK()
 
   def _populateFileAncestors(self, lfns, connection=False):
-    connection = self._getConnection(connection)
     successful = {}
     failed = {}
     for lfn, lfnDict in lfns.items():
@@ -450,7 +435,6 @@ class FileManagerBase(object):
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def _insertFileAncestors(self, fileID, ancestorDict, connection=False):
-    connection = self._getConnection(connection)
     ancestorTuples = []
     for ancestorID, depth in ancestorDict.items():
       ancestorTuples.append("(%d,%d,%d)" % (fileID, ancestorID, depth))
@@ -461,7 +445,6 @@ class FileManagerBase(object):
     return self.db._update(req, connection)
 
   def _getFileAncestors(self, fileIDs, depths=[], connection=False):
-    connection = self._getConnection(connection)
     req = "SELECT FileID, AncestorID, AncestorDepth FROM FC_FileAncestors WHERE FileID IN (%s)" \
         % intListToString(fileIDs)
     if depths:
@@ -477,7 +460,6 @@ class FileManagerBase(object):
     return S_OK(fileIDAncestors)
 
   def _getFileDescendents(self, fileIDs, depths, connection=False):
-    connection = self._getConnection(connection)
     req = "SELECT AncestorID, FileID, AncestorDepth FROM FC_FileAncestors WHERE AncestorID IN (%s)" \
         % intListToString(fileIDs)
     if depths:
@@ -494,7 +476,6 @@ class FileManagerBase(object):
 
   def addFileAncestors(self, lfns, connection=False):
     """ Add file ancestors to the catalog """
-    connection = self._getConnection(connection)
     failed = {}
     successful = {}
     result = self._findFiles(lfns.keys(), connection=connection)
@@ -518,7 +499,6 @@ class FileManagerBase(object):
     return S_OK({'Successful': successful, 'Failed': failed})
 
   def _getFileRelatives(self, lfns, depths, relation, connection=False):
-    connection = self._getConnection(connection)
     failed = {}
     successful = {}
     result = self._findFiles(lfns.keys(), connection=connection)
@@ -573,7 +553,6 @@ class FileManagerBase(object):
     return self._getFileRelatives(lfns, depths, 'descendent', connection)
 
   def _getExistingMetadata(self, lfns, connection=False):
-    connection = self._getConnection(connection)
     # Check whether the files already exist before adding
     res = self._findFiles(lfns, ['FileID', 'Size', 'Checksum', 'GUID'], connection=connection)
     if not res['OK']:
@@ -623,7 +602,6 @@ class FileManagerBase(object):
     return successful, failed
 
   def _checkUniqueGUID(self, lfns, connection=False):
-    connection = self._getConnection(connection)
     guidLFNs = {}
     failed = {}
     for lfn, fileDict in lfns.items():
@@ -637,7 +615,6 @@ class FileManagerBase(object):
     return failed
 
   def removeFile(self, lfns, connection=False):
-    connection = self._getConnection(connection)
     """ Remove file from the catalog """
     successful = {}
     failed = {}
@@ -701,7 +678,6 @@ class FileManagerBase(object):
 
   def setFileStatus(self, lfns, connection=False):
     """ Get set the group for the supplied files """
-    connection = self._getConnection(connection)
     res = self._findFiles(lfns, ['FileID', 'UID'], connection=connection)
     if not res['OK']:
       return res
@@ -733,7 +709,6 @@ class FileManagerBase(object):
 
   def addReplica(self, lfns, connection=False):
     """ Add replica to the catalog """
-    connection = self._getConnection(connection)
     successful = {}
     failed = {}
     for lfn, info in lfns.items():
@@ -752,7 +727,6 @@ class FileManagerBase(object):
 
   def _addReplicas(self, lfns, connection=False):
 
-    connection = self._getConnection(connection)
     successful = {}
     res = self._findFiles(lfns.keys(), ['DirID', 'FileID', 'Size'], connection=connection)
     if not res['OK']:
@@ -774,7 +748,6 @@ class FileManagerBase(object):
 
   def removeReplica(self, lfns, connection=False):
     """ Remove replica from catalog """
-    connection = self._getConnection(connection)
     successful = {}
     failed = {}
     for lfn, info in lfns.items():
@@ -793,7 +766,6 @@ class FileManagerBase(object):
 
   def setReplicaStatus(self, lfns, connection=False):
     """ Set replica status in the catalog """
-    connection = self._getConnection(connection)
     successful = {}
     failed = {}
     for lfn, info in lfns.items():
@@ -817,7 +789,6 @@ class FileManagerBase(object):
 
   def setReplicaHost(self, lfns, connection=False):
     """ Set replica host in the catalog """
-    connection = self._getConnection(connection)
     successful = {}
     failed = {}
     for lfn, info in lfns.items():
@@ -846,7 +817,6 @@ class FileManagerBase(object):
 
   def exists(self, lfns, connection=False):
     """ Determine whether a file exists in the catalog """
-    connection = self._getConnection(connection)
     res = self._findFiles(lfns, allStatus=True, connection=connection)
     if not res['OK']:
       return res
@@ -899,13 +869,11 @@ class FileManagerBase(object):
 
   def isFile(self, lfns, connection=False):
     """ Determine whether a path is a file in the catalog """
-    connection = self._getConnection(connection)
     # TO DO, should check whether it is a directory if it fails
     return self.exists(lfns, connection=connection)
 
   def getFileSize(self, lfns, connection=False):
     """ Get file size from the catalog """
-    connection = self._getConnection(connection)
     # TO DO, should check whether it is a directory if it fails
     res = self._findFiles(lfns, ['Size'], connection=connection)
     if not res['OK']:
@@ -922,7 +890,6 @@ class FileManagerBase(object):
 
   def getFileMetadata(self, lfns, connection=False):
     """ Get file metadata from the catalog """
-    connection = self._getConnection(connection)
     # TO DO, should check whether it is a directory if it fails
     return self._findFiles(lfns, ['Size', 'Checksum',
                                   'ChecksumType', 'UID',
@@ -932,7 +899,6 @@ class FileManagerBase(object):
 
   def getPathPermissions(self, paths, credDict, connection=False):
     """ Get the permissions for the supplied paths """
-    connection = self._getConnection(connection)
     res = self.db.ugManager.getUserAndGroupID(credDict)
     if not res['OK']:
       return res
@@ -993,7 +959,6 @@ class FileManagerBase(object):
 
   def getReplicas(self, lfns, allStatus, connection=False):
     """ Get file replicas from the catalog """
-    connection = self._getConnection(connection)
 
     # Get FileID <-> LFN correspondence first
     res = self._findFileIDs(lfns, connection=connection)
@@ -1022,7 +987,6 @@ class FileManagerBase(object):
 
   def getReplicasByMetadata(self, metaDict, path, allStatus, credDict, connection=False):
     """ Get file replicas for files corresponding to the given metadata """
-    connection = self._getConnection(connection)
 
     # Get FileID <-> LFN correspondence first
     failed = {}
@@ -1059,7 +1023,6 @@ class FileManagerBase(object):
 
   def getReplicaStatus(self, lfns, connection=False):
     """ Get replica status from the catalog """
-    connection = self._getConnection(connection)
     res = self._findFiles(lfns, connection=connection)
     if not res['OK']:
       return res
@@ -1090,7 +1053,6 @@ class FileManagerBase(object):
   #
 
   def _getStatusInt(self, status, connection=False):
-    connection = self._getConnection(connection)
     req = "SELECT StatusID FROM FC_Statuses WHERE Status = '%s';" % status
     res = self.db._query(req, connection)
     if not res['OK']:
@@ -1106,7 +1068,6 @@ class FileManagerBase(object):
   def _getIntStatus(self, statusID, connection=False):
     if statusID in self.statusDict:
       return S_OK(self.statusDict[statusID])
-    connection = self._getConnection(connection)
     req = "SELECT StatusID,Status FROM FC_Statuses"
     res = self.db._query(req, connection)
     if not res['OK']:
@@ -1130,7 +1091,6 @@ class FileManagerBase(object):
     return self._getDirectoryFileIDs(dirID, requestString=requestString)
 
   def getFilesInDirectory(self, dirID, verbose=False, connection=False):
-    connection = self._getConnection(connection)
     files = {}
     res = self._getDirectoryFiles(dirID, [], ['FileID', 'Size', 'GUID',
                                               'Checksum', 'ChecksumType',
@@ -1166,7 +1126,6 @@ class FileManagerBase(object):
         :param bool allStatus: whether all replicas and file status are considered
                             If False, take the visibleFileStatus and visibleReplicaStatus values from the configuration
     """
-    connection = self._getConnection(connection)
     result = self._getDirectoryReplicas(dirID, allStatus, connection)
     if not result['OK']:
       return result
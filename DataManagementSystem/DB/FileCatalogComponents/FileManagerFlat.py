@@ -18,7 +18,6 @@ class FileManagerFlat( FileManagerBase ):
   #
 
   def _findFiles( self, lfns, metadata = ['FileID'], connection = False ):
-    connection = self._getConnection( connection )
     """ Find file ID if it exists for the given list of LFNs """
     dirDict = self._getFileDirectories( lfns )
     failed = {}
@@ -45,7 +44,6 @@ class FileManagerFlat( FileManagerBase ):
     return S_OK( {"Successful":successful, "Failed":failed} )
 
   def _getDirectoryFiles( self, dirID, fileNames, metadata, allStatus = False, connection = False ):
-    connection = self._getConnection( connection )
     # metadata can be any of ['FileID','Size','UID','GID','Checksum','ChecksumType','Type','CreationDate','ModificationDate','Mode','Status']
     req = "SELECT FileName,%s FROM FC_Files WHERE DirID=%d" % ( intListToString( metadata ), dirID )
     if not allStatus:
@@ -72,7 +70,6 @@ class FileManagerFlat( FileManagerBase ):
   #
 
   def _insertFiles( self, lfns, uid, gid, connection = False ):
-    connection = self._getConnection( connection )
     # Add the files
     failed = {}
     directoryFiles = {}
@@ -111,7 +108,6 @@ class FileManagerFlat( FileManagerBase ):
     return S_OK( {'Successful':lfns, 'Failed':failed} )
 
   def _getFileIDFromGUID( self, guid, connection = False ):
-    connection = self._getConnection( connection )
     if not guid:
       return S_OK( {} )
     if not isinstance( guid, ( list, tuple ) ):
@@ -131,7 +127,6 @@ class FileManagerFlat( FileManagerBase ):
   #
 
   def _deleteFiles( self, fileIDs, connection = False ):
-    connection = self._getConnection( connection )
     replicaPurge = self.__deleteFileReplicas( fileIDs )
     filePurge = self.__deleteFiles( fileIDs, connection = connection )
     if not replicaPurge['OK']:
@@ -141,14 +136,12 @@ class FileManagerFlat( FileManagerBase ):
     return S_OK()
 
   def __deleteFileReplicas( self, fileIDs, connection = False ):
-    connection = self._getConnection( connection )
     if not fileIDs:
       return S_OK()
     req = "DELETE FROM FC_Replicas WHERE FileID in (%s)" % ( intListToString( fileIDs ) )
     return self.db._update( req, connection )
 
   def __deleteFiles( self, fileIDs, connection = False ):
-    connection = self._getConnection( connection )
     if not fileIDs:
       return S_OK()
     req = "DELETE FROM FC_Files WHERE FileID in (%s)" % ( intListToString( fileIDs ) )
@@ -160,7 +153,6 @@ class FileManagerFlat( FileManagerBase ):
   #
 
   def _insertReplicas( self, lfns, master = False, connection = False ):
-    connection = self._getConnection( connection )
     res = self._getStatusInt( 'AprioriGood', connection = connection )
     statusID = 0
     if res['OK']:
@@ -215,7 +207,6 @@ class FileManagerFlat( FileManagerBase ):
 
   def __existsReplica( self, fileID, seID, connection = False ):
     # TODO: This is in efficient. Should perform bulk operation
-    connection = self._getConnection( connection )
     """ Check if a replica already exists """
     if isinstance( seID, basestring ):
       res = self.db.seManager.findSE( seID )
@@ -236,7 +227,6 @@ class FileManagerFlat( FileManagerBase ):
   #
 
   def _deleteReplicas( self, lfns, connection = False ):
-    connection = self._getConnection( connection )
     successful = {}
     res = self._findFiles( lfns.keys(), ['DirID', 'FileID', 'Size'], connection = connection )
     failed = res['Value']['Failed']
@@ -271,7 +261,6 @@ class FileManagerFlat( FileManagerBase ):
     return S_OK( {'Successful':successful, 'Failed':failed} )
 
   def __deleteReplicas( self, replicaTuples, connection = False ):
-    connection = self._getConnection( connection )
     deleteTuples = []
     for fileID, seID in replicaTuples:
       if isinstance( seID, basestring ):
@@ -290,7 +279,6 @@ class FileManagerFlat( FileManagerBase ):
   #
 
   def _setReplicaStatus( self, fileID, se, status, connection = False ):
-    connection = self._getConnection( connection )
     res = self._getStatusInt( status, connection = connection )
     if not res['OK']:
       return res
@@ -298,7 +286,6 @@ class FileManagerFlat( FileManagerBase ):
     return self._setReplicaParameter( fileID, se, 'Status', statusID, connection = connection )
 
   def _setReplicaHost( self, fileID, se, newSE, connection = False ):
-    connection = self._getConnection( connection )
     res = self.db.seManager.findSE( newSE )
     if not res['OK']:
       return res
@@ -306,7 +293,6 @@ class FileManagerFlat( FileManagerBase ):
     return self._setReplicaParameter( fileID, se, 'SEID', newSE, connection = connection )
 
   def _setReplicaParameter( self, fileID, seID, paramName, paramValue, connection = False ):
-    connection = self._getConnection( connection )
     if isinstance( seID, basestring ):
       res = self.db.seManager.findSE( seID )
       if not res['OK']:
@@ -316,7 +302,6 @@ class FileManagerFlat( FileManagerBase ):
     return self.db._update( req, connection )
 
   def _setFileParameter( self, fileID, paramName, paramValue, connection = False ):
-    connection = self._getConnection( connection )
     if not isinstance( fileID, ( list, tuple ) ):
       fileID = [fileID]
     req = "UPDATE FC_Files SET %s='%s', ModificationDate=UTC_TIMESTAMP() WHERE FileID IN (%s)" % ( paramName, paramValue, intListToString( fileID ) )
@@ -328,7 +313,6 @@ class FileManagerFlat( FileManagerBase ):
   #
 
   def _getFileReplicas( self, fileIDs, fields = ['PFN'], connection = False ):
-    connection = self._getConnection( connection )
     if not fileIDs:
       return S_ERROR( "No such file or directory" )
     req = "SELECT FileID,SEID,Status,%s FROM FC_Replicas WHERE FileID IN (%s);" % ( intListToString( fields ), intListToString( fileIDs ) )
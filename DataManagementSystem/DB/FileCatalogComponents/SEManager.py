@@ -87,7 +87,6 @@ class SEManagerDB(SEManagerBase):
       gLogger.debug("SEManager AddSE lock released. Used %.3f seconds. %s" % (time.time() - waitTime, seName))
       self.lock.release()
       return S_OK(seid)
-    connection = self.db._getConnection()
     res = self.db._insert('FC_StorageElements', ['SEName'], [seName], connection)
     if not res['OK']:
       gLogger.debug("SEManager AddSE lock released. Used %.3f seconds. %s" % (time.time() - waitTime, seName))
@@ -109,7 +108,6 @@ class SEManagerDB(SEManagerBase):
     return S_OK(seid)
 
   def __removeSE(self, seName, connection=False):
-    connection = self.db._getConnection()
     startTime = time.time()
     self.lock.acquire()
     waitTime = time.time()
@@ -4,6 +4,8 @@
 __RCSID__ = "$Id$"
 
 import os
+import time
+import threading
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Security.Properties import FC_MANAGEMENT
 
@@ -19,14 +21,161 @@ _writeMethods = ['changePathOwner', 'changePathGroup', 'changePathMode',
                  'setMetadata', '__removeMetadata']
 
 
+class PermissionCache( object ):
+  """ Permissions of the directories for each user identity, kept for a limited time.
+
+      The entries of a directory and of all its subdirectories are invalidated when it
+      is changed by this process, the other FileCatalog instances only see the change
+      when the entries expire.
+  """
+
+  def __init__( self, cacheTime = 0, maxSize = 100000 ):
+    """ :param int cacheTime: lifetime of the entries in seconds, 0 disables the cache
+        :param int maxSize: maximum number of entries
+    """
+    self.cacheTime = cacheTime
+    self.maxSize = maxSize
+    self.__cache = {}
+    self.__lock = threading.Lock()
+    self.__hits = 0
+    self.__evaluations = 0
+    self.__evaluationTime = 0.
+
+  @staticmethod
+  def __key( path, credDict ):
+    return ( path, credDict.get( 'username' ), credDict.get( 'group' ) )
+
+  def get( self, path, credDict ):
+    """ Returns a copy of the cached permissions of the directory, or None
+    """
+    with self.__lock:
+      entry = self.__cache.get( self.__key( path, credDict ) )
+      if not entry or entry[0] < time.time():
+        return None
+      self.__hits += 1
+      return dict( entry[1] )
+
+  def set( self, path, credDict, permissions ):
+    """ Keeps the permissions of the directory for cacheTime seconds
+    """
+    with self.__lock:
+      now = time.time()
+      if len( self.__cache ) >= self.maxSize:
+        for key in [key for key, entry in self.__cache.iteritems() if entry[0] < now]:
+          del self.__cache[key]
+        if len( self.__cache ) >= self.maxSize:
+          self.__cache.clear()
+      self.__cache[self.__key( path, credDict )] = ( now + self.cacheTime, dict( permissions ) )
+
+  def addEvaluations( self, nbDirectories, evaluationTime ):
+    """ Accounts for the directories which had to be evaluated from the DB
+    """
+    with self.__lock:
+      self.__evaluations += nbDirectories
+      self.__evaluationTime += evaluationTime
+
+  def invalidate( self, paths ):
+    """ Forgets the permissions of the given directories and of their subdirectories
+    """
+    prefixes = tuple( os.path.normpath( path ).rstrip( '/' ) + '/' for path in paths )
+    if not prefixes:
+      return
+    with self.__lock:
+      for key in self.__cache.keys():
+        if key[0].startswith( prefixes ) or key[0] + '/' in prefixes:
+          del self.__cache[key]
+
+  def getStats( self ):
+    """ Hits, directories evaluated from the DB, hit ratio and estimated time saved in seconds
+    """
+    with self.__lock:
+      lookups = self.__hits + self.__evaluations
+      meanTime = self.__evaluationTime / self.__evaluations if self.__evaluations else 0.
+      return { 'Entries' : len( self.__cache ),
+               'Hits' : self.__hits,
+               'Evaluations' : self.__evaluations,
+               'HitRatio' : float( self.__hits ) / lookups if lookups else 0.,
+               'TimeSaved' : self.__hits * meanTime }
+
+
 class SecurityManagerBase( object ):
 
   def __init__( self, database = None ):
     self.db = database
+    # The FileCatalogDB sets the lifetime of the cached permissions, which is disabled otherwise
+    self.permissionCache = PermissionCache( getattr( database, 'permissionCacheTime', 0 ) )
 
   def setDatabase( self, database ):
     self.db = database
 
+  def invalidatePermissions( self, paths ):
+    """ To be called when the permissions of directories change or when they are removed
+    """
+    self.permissionCache.invalidate( paths )
+
+  def getPermissionCacheStats( self ):
+    """ Usage of the cache of the directory permissions
+    """
+    return S_OK( self.permissionCache.getStats() )
+
+  def _getDirectoryPermissions( self, paths, credDict ):
+    """ Same as dtree.getPathPermissions, but each directory is evaluated only once
+        per bulk and the permissions of the directories are cached.
+
+        The paths which are not directories get the permissions of their closest existing
+        parent directory, as dtree.getDirectoryPermissions does.
+    """
+    if not self.permissionCache.cacheTime:
+      return self.db.dtree.getPathPermissions( paths, credDict )
+
+    successful = {}
+    failed = {}
+    # Directories to check : the paths getting their permissions
+    toResolve = {}
+    for path in paths:
+      if not path.startswith( '/' ):
+        failed[path] = "Path is not absolute"
+        continue
+      toResolve.setdefault( os.path.normpath( path ), [] ).append( path )
+    toEvaluate = {}
+    while toResolve:
+      for dirPath in toResolve.keys():
+        permissions = self.permissionCache.get( dirPath, credDict )
+        if permissions is not None:
+          for path in toResolve.pop( dirPath ):
+            successful[path] = dict( permissions )
+      if not toResolve:
+        break
+      res = self.db.dtree.findDirs( toResolve.keys() )
+      if not res['OK']:
+        # Not all the directory trees can look up directories in bulk
+        return self.db.dtree.getPathPermissions( paths, credDict )
+      existingDirs = res['Value']
+      parentDirs = {}
+      for dirPath, resolvedPaths in toResolve.iteritems():
+        # Up to the root, whatever its spelling
+        if dirPath in existingDirs or os.path.dirname( dirPath ) == dirPath:
+          toEvaluate.setdefault( dirPath, [] ).extend( resolvedPaths )
+        else:
+          parentDirs.setdefault( os.path.dirname( dirPath ), [] ).extend( resolvedPaths )
+      toResolve = parentDirs
+
+    if toEvaluate:
+      startTime = time.time()
+      res = self.db.dtree.getPathPermissions( toEvaluate.keys(), credDict )
+      if not res['OK']:
+        return res
+      self.permissionCache.addEvaluations( len( toEvaluate ), time.time() - startTime )
+      for dirPath, permissions in res['Value']['Successful'].iteritems():
+        self.permissionCache.set( dirPath, credDict, permissions )
+        for path in toEvaluate[dirPath]:
+          successful[path] = dict( permissions )
+      for dirPath, error in res['Value']['Failed'].iteritems():
+        for path in toEvaluate[dirPath]:
+          failed[path] = error
+
+    return S_OK( {'Successful':successful, 'Failed':failed} )
+
   def getPathPermissions( self, paths, credDict ):
     """ Get path permissions according to the policy
     """
@@ -113,7 +262,7 @@ class DirectorySecurityManager( SecurityManagerBase ):
     permissions = {}
     failed = {}
     while toGet:
-      res = self.db.dtree.getPathPermissions( toGet.keys(), credDict )
+      res = self._getDirectoryPermissions( toGet.keys(), credDict )
       if not res['OK']:
         return res
       for path, mode in res['Value']['Successful'].items():
@@ -166,7 +315,7 @@ class FullSecurityManager( SecurityManagerBase ):
       toGet.pop( path )
     while toGet:
       paths = toGet.keys()
-      res = self.db.dtree.getPathPermissions( paths, credDict )
+      res = self._getDirectoryPermissions( paths, credDict )
       if not res['OK']:
         return res
       for path, mode in res['Value']['Successful'].items():
@@ -349,6 +498,12 @@ class PolicyBasedSecurityManager( SecurityManagerBase ):
 
   def getPathPermissions( self, paths, credDict ):
     return self.policyObj.getPathPermissions( paths, credDict )
+
+  def invalidatePermissions( self, paths ):
+    return self.policyObj.invalidatePermissions( paths )
+
+  def getPermissionCacheStats( self ):
+    return self.policyObj.getPermissionCacheStats()
   
   
   
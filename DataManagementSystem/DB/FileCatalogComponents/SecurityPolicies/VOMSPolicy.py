@@ -4,7 +4,7 @@ from DIRAC.DataManagementSystem.DB.FileCatalogComponents.SecurityManager import
 from DIRAC.Core.Utilities.ReturnValues import returnSingleResult
 
 import os
-
+import time
 import datetime
 
 
@@ -191,7 +191,12 @@ class VOMSPolicy( SecurityManagerBase ):
     if not path:
       return S_ERROR( 'Empty path' )
 
+    permissions = self.permissionCache.get( path, credDict ) if self.permissionCache.cacheTime else None
+    if permissions is not None:
+      return S_OK( permissions )
+
     # We check what is the group stored in the DB for the given path
+    startTime = time.time()
     res = self.db.dtree.getDirectoryParameters( path )
     if not res['OK']:
       # If the error is not due to the directory not existing, we return
@@ -223,10 +228,15 @@ class VOMSPolicy( SecurityManagerBase ):
 
     # If the two group share the same voms role, we do the query like if we were
     # the group stored in the DB
+    vomsCredDict = credDict
     if self.__shareVomsRole( credDict.get( 'group', 'anon' ), origGrp ):
-      credDict = { 'username' : credDict.get( 'username', 'anon' ), 'group' : origGrp}
+      vomsCredDict = { 'username' : credDict.get( 'username', 'anon' ), 'group' : origGrp}
 
-    return  self.db.dtree.getDirectoryPermissions( path, credDict )
+    res = self.db.dtree.getDirectoryPermissions( path, vomsCredDict )
+    if res['OK'] and self.permissionCache.cacheTime:
+      self.permissionCache.set( path, credDict, res['Value'] )
+      self.permissionCache.addEvaluations( 1, time.time() - startTime )
+    return res
 
 
 
@@ -10,6 +10,7 @@ import stat
 import mock
 from DIRAC import S_OK, S_ERROR
 import DIRAC.DataManagementSystem.DB.FileCatalogComponents.SecurityPolicies.VOMSPolicy
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.SecurityManager import PermissionCache
 
 # This just defines a few groups with their VOMSRole
 diracGrps = {'grp_admin' : None,
@@ -224,6 +225,8 @@ class mock_SecurityManagerBase( object ):
   """
   def __init__( self, database = False ):
     self.db = mock_db()
+    # The permissions are not cached, as with the base class when there is no FileCatalogDB
+    self.permissionCache = PermissionCache()
 
   def hasAdminAccess( self, credDict ):
     """ Returns true only if the group is grp_admin """
@@ -36,7 +36,6 @@ class FileManagerPs(FileManagerBase):
       :return successful/failed convention. successful is a dict < lfn : dict of metadata >
 
     """
-    connection = self._getConnection(connection)
     dirDict = self._getFileDirectories(lfns)
 
     result = self.db.dtree.findDirs(dirDict.keys())
@@ -65,7 +64,6 @@ class FileManagerPs(FileManagerBase):
   def _findFileIDs(self, lfns, connection=False):
     """ Find lfn <-> FileID correspondence
     """
-    connection = self._getConnection(connection)
     failed = {}
     successful = {}
 
@@ -130,7 +128,6 @@ class FileManagerPs(FileManagerBase):
         :returns: S_OK(files), where files is a dictionary indexed on filename, and values are dictionary of metadata
     """
 
-    connection = self._getConnection(connection)
 
     metadata = list(metadata_input)
     if "UID" in metadata:
@@ -244,7 +241,6 @@ class FileManagerPs(FileManagerBase):
 
     """
 
-    connection = self._getConnection(connection)
 
     failed = {}
     successful = {}
@@ -342,7 +338,6 @@ class FileManagerPs(FileManagerBase):
 
     """
 
-    connection = self._getConnection(connection)
     if not guids:
       return S_OK({})
 
@@ -363,7 +358,6 @@ class FileManagerPs(FileManagerBase):
 
   def getLFNForGUID(self, guids, connection=False):
     """ Returns the lfns matching given guids"""
-    connection = self._getConnection(connection)
     if not guids:
       return S_OK({})
 
@@ -394,7 +388,6 @@ class FileManagerPs(FileManagerBase):
        :returns: S_OK() or S_ERROR(msg)
     """
 
-    connection = self._getConnection(connection)
 
     replicaPurge = self.__deleteFileReplicas(fileIDs)
     filePurge = self.__deleteFiles(fileIDs, connection=connection)
@@ -415,7 +408,6 @@ class FileManagerPs(FileManagerBase):
         :returns: S_OK() or S_ERROR(msg)
     """
 
-    connection = self._getConnection(connection)
 
     if not fileIDs:
       return S_OK()
@@ -442,7 +434,6 @@ class FileManagerPs(FileManagerBase):
         :returns: S_OK() or S_ERROR(msg)
     """
 
-    connection = self._getConnection(connection)
 
     formatedFileIds = intListToString(fileIDs)
 
@@ -494,7 +485,6 @@ class FileManagerPs(FileManagerBase):
     """
     chunkSize = 200
 
-    connection = self._getConnection(connection)
 
     # Add the files
     failed = {}
@@ -578,7 +568,6 @@ class FileManagerPs(FileManagerBase):
 
         :returns { fileID : { seID : RepID } }
     """
-    connection = self._getConnection(connection)
 
     replicaDict = {}
 
@@ -609,7 +598,6 @@ class FileManagerPs(FileManagerBase):
 
         :returns: successful/failed convention, with successful[lfn] = True
     """
-    connection = self._getConnection(connection)
     failed = {}
     successful = {}
     # First we get the fileIds from our lfns
@@ -668,7 +656,6 @@ class FileManagerPs(FileManagerBase):
     """
     if status not in self.db.validReplicaStatus:
       return S_ERROR('Invalid replica status %s' % status)
-    connection = self._getConnection(connection)
     res = self._getStatusInt(status, connection=connection)
     if not res['OK']:
       return res
@@ -700,7 +687,6 @@ class FileManagerPs(FileManagerBase):
 
       :returns: S_OK() or S_ERROR(msg)
     """
-    connection = self._getConnection(connection)
 
     # Get the new se id
     res = self.db.seManager.findSE(newSE)
@@ -740,7 +726,6 @@ class FileManagerPs(FileManagerBase):
       :returns: S_OK() or S_ERROR
 
     """
-    connection = self._getConnection(connection)
 
     # The PS associated with a given parameter
     psNames = {'UID': 'ps_set_file_uid',
@@ -784,7 +769,6 @@ class FileManagerPs(FileManagerBase):
         :returns S_OK with a dict { fileID : { SE name : dict of metadata } }
     """
 
-    connection = self._getConnection(connection)
 
     fields = list(fields_input)
 
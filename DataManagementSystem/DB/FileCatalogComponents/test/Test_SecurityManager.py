@@ -0,0 +1,94 @@
+""" Test the cache of the directory permissions of the SecurityManagers
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import os
+
+from mock import MagicMock
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.SecurityManager import DirectorySecurityManager
+
+# Directory : ( owner, mode )
+directories = {'/': ('admin', 0o755),
+               '/vo': ('admin', 0o755),
+               '/vo/user': ('user', 0o700),
+               '/vo/data': ('admin', 0o777)}
+
+userCred = {'username': 'user', 'group': 'user_group', 'properties': []}
+
+
+def directoryPermissions(path, credDict):
+  while path not in directories:
+    path = os.path.dirname(path)
+  owner, mode = directories[path]
+  if credDict['username'] == owner:
+    mode >>= 6
+  return {'Read': bool(mode & 4), 'Write': bool(mode & 2), 'Execute': bool(mode & 1)}
+
+
+def getPathPermissions(paths, credDict):
+  return S_OK({'Successful': dict((path, directoryPermissions(path, credDict)) for path in paths), 'Failed': {}})
+
+
+def getSecurityManager(cacheTime=60):
+  db = MagicMock()
+  db.permissionCacheTime = cacheTime
+  db.globalReadAccess = False
+  db.dtree.findDirs.side_effect = lambda paths: S_OK(dict((path, 1) for path in paths if path in directories))
+  db.dtree.getPathPermissions.side_effect = getPathPermissions
+  return DirectorySecurityManager(db)
+
+
+def test_bulkDedup():
+  securityManager = getSecurityManager()
+  lfns = ['/vo/user/file%s' % i for i in xrange(1000)] + ['/vo/data/run1/file%s' % i for i in xrange(1000)]
+  result = securityManager.hasAccess('addFile', lfns, userCred)
+  assert result['OK']
+  assert all(result['Value']['Successful'][lfn] for lfn in lfns)
+  # Only the two existing parent directories are evaluated
+  assert sorted(securityManager.db.dtree.getPathPermissions.call_args[0][0]) == ['/vo/data', '/vo/user']
+
+  result = securityManager.hasAccess('addFile', ['/vo/file1', '/vo/user/file2'], userCred)
+  assert result['Value']['Successful'] == {'/vo/file1': False, '/vo/user/file2': True}
+  assert securityManager.db.dtree.getPathPermissions.call_args[0][0] == ['/vo']
+  stats = securityManager.getPermissionCacheStats()['Value']
+  assert stats['Hits'] == 1
+  assert stats['Evaluations'] == 3
+
+
+def test_invalidation():
+  securityManager = getSecurityManager()
+  assert securityManager.hasAccess('addFile', ['/vo/data/file'], userCred)['Value']['Successful']['/vo/data/file']
+  directories['/vo/data'] = ('admin', 0o755)
+  try:
+    # Still in the cache
+    assert securityManager.hasAccess('addFile', ['/vo/data/file'], userCred)['Value']['Successful']['/vo/data/file']
+    securityManager.invalidatePermissions(['/vo'])
+    assert not securityManager.hasAccess('addFile', ['/vo/data/file'], userCred)['Value']['Successful']['/vo/data/file']
+  finally:
+    directories['/vo/data'] = ('admin', 0o777)
+  assert securityManager.permissionCache.getStats()['Entries'] == 1
+  securityManager.invalidatePermissions(['/'])
+  assert securityManager.permissionCache.getStats()['Entries'] == 0
+
+
+def test_noCache():
+  lfns = ['/vo/user/file1', '/vo/data']
+  expected = getSecurityManager().getPathPermissions(lfns, userCred)
+  # Cache disabled or directory tree without bulk lookup: every path is evaluated
+  for securityManager in (getSecurityManager(cacheTime=0), getSecurityManager()):
+    securityManager.db.dtree.findDirs.side_effect = lambda paths: S_ERROR('To be implemented on derived class')
+    assert securityManager.getPathPermissions(lfns, userCred) == expected
+    assert sorted(securityManager.db.dtree.getPathPermissions.call_args[0][0]) == sorted(lfns)
+
+
+def test_invalidPaths():
+  securityManager = getSecurityManager()
+  result = securityManager.getPathPermissions(['', 'vo/user/file1', '/vo/user/file1'], userCred)
+  assert result['OK']
+  assert sorted(result['Value']['Failed']) == ['', 'vo/user/file1']
+  assert result['Value']['Successful'] == {'/vo/user/file1': {'Read': True, 'Write': True, 'Execute': True}}
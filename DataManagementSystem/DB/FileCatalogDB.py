@@ -69,6 +69,8 @@ class FileCatalogDB(DB):
     self.validReplicaStatus = databaseConfig['ValidReplicaStatus']
     self.visibleFileStatus = databaseConfig['VisibleFileStatus']
     self.visibleReplicaStatus = databaseConfig['VisibleReplicaStatus']
+    # Lifetime in seconds of the directory permissions cached by the SecurityManager, 0 to disable
+    self.permissionCacheTime = databaseConfig.get('PermissionCacheTime', 0)
 
     try:
       # Obtain the plugins to be used for DB interaction
@@ -384,6 +386,7 @@ class FileCatalogDB(DB):
         fileArgs[path] = paths[path]
     if dirArgs:
       result = change_function_directory(dirArgs, recursive=recursive)
+      self.securityManager.invalidatePermissions(dirArgs.keys())
       if not result['OK']:
         return result
       successful.update(result['Value']['Successful'])
@@ -875,6 +878,7 @@ class FileCatalogDB(DB):
       return res
     failed.update(res['Value']['Failed'])
     successful = res['Value']['Successful']
+    self.securityManager.invalidatePermissions(successful.keys())
     if not successful:
       return S_OK({'Successful': successful, 'Failed': failed})
 
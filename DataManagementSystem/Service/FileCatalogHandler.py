@@ -62,7 +62,8 @@ def initializeFileCatalogHandler(serviceInfo):
                    'ValidFileStatus': ['AprioriGood', 'Trash', 'Removing', 'Probing'],
                    'ValidReplicaStatus': ['AprioriGood', 'Trash', 'Removing', 'Probing'],
                    'VisibleFileStatus': ['AprioriGood'],
-                   'VisibleReplicaStatus': ['AprioriGood']}
+                   'VisibleReplicaStatus': ['AprioriGood'],
+                   'PermissionCacheTime': 0}
   for configKey in sorted(defaultConfig.keys()):
     defaultValue = defaultConfig[configKey]
     configValue = getServiceOption(serviceInfo, configKey, defaultValue)
@@ -437,6 +438,13 @@ class FileCatalogHandler(RequestHandler):
     """ Get the number of registered directories, files and replicas in various tables """
     return gFileCatalogDB.getCatalogCounters(self.getRemoteCredentials())
 
+  types_getPermissionCacheStats = []
+
+  @staticmethod
+  def export_getPermissionCacheStats():
+    """ Get the hit ratio and the time saved by the cache of the directory permissions """
+    return gFileCatalogDB.securityManager.getPermissionCacheStats()
+
   types_rebuildDirectoryUsage = []
 
   @staticmethod
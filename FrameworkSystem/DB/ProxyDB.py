@@ -174,10 +174,6 @@ class ProxyDB(DB):
     """
     Generate a request  and store it for a given proxy Chain
     """
-    retVal = self._getConnection()
-    if not retVal['OK']:
-      return retVal
-    connObj = retVal['Value']
     retVal = proxyChain.generateProxyRequest()
     if not retVal['OK']:
       return retVal
@@ -199,7 +195,7 @@ class ProxyDB(DB):
     cmd += " VALUES ( 0, %s, %s, TIMESTAMPADD( SECOND, %d, UTC_TIMESTAMP() ) )" % (sUserDN,
                                                                                    sAllStr,
                                                                                    int(self.__defaultRequestLifetime))
-    retVal = self._update(cmd, conn=connObj)
+    retVal = self._update(cmd)
     if not retVal['OK']:
       return retVal
     # 99% of the times we will stop here
@@ -735,10 +731,6 @@ class ProxyDB(DB):
     return S_OK((chain, secsLeft))
 
   def __storeVOMSProxy(self, userDN, userGroup, vomsAttr, chain):
-    retVal = self._getConnection()
-    if not retVal['OK']:
-      return retVal
-    connObj = retVal['Value']
     retVal1 = VOMS().getVOMSProxyInfo(chain, 'actimeleft')
     retVal2 = VOMS().getVOMSProxyInfo(chain, 'timeleft')
     if not retVal1['OK']:
@@ -769,7 +761,7 @@ class ProxyDB(DB):
     cmd = "REPLACE INTO `ProxyDB_VOMSProxies` ( UserName, UserDN, UserGroup, VOMSAttr, Pem, ExpirationTime ) VALUES "
     cmd += "( %s, %s, %s, %s, %s, TIMESTAMPADD( SECOND, %d, UTC_TIMESTAMP() ) )" % (sUserName, sUserDN, sUserGroup,
                                                                                     sVomsAttr, sPemData, secsLeft)
-    result = self._update(cmd, conn=connObj)
+    result = self._update(cmd)
     if not result['OK']:
       return result
     return S_OK(secsLeft)
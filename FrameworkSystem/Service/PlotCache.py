@@ -1,47 +1,34 @@
 """ Cache for the Plotting service plots
+
+    The plots are named after the hash of their data and metadata, they are kept on disk until evicted
+    by the PlotFileCache, which persists them across restarts and shares them between service clones.
 """
 
 __RCSID__ = "$Id$"
 
 import os.path
-import time
-import threading
 
-from DIRAC import S_OK, S_ERROR, gLogger
-from DIRAC.Core.Utilities.DictCache import DictCache
 from DIRAC.Core.Utilities.Graphs import graph
+from DIRAC.Core.Utilities.Plotting.PlotFileCache import PlotFileCache
 
 class PlotCache:
 
   def __init__( self, plotsLocation = False ):
     self.plotsLocation = plotsLocation
-    self.alive = True
-    self.__graphCache = DictCache( deleteFunction = _deleteGraph )
-    self.__graphLifeTime = 600
-    self.purgeThread = threading.Thread( target = self.purgeExpired )
-    self.purgeThread.start()
+    self.__fileCache = PlotFileCache( plotsLocation )
 
-  def setPlotsLocation( self, plotsDir ):
+  def setPlotsLocation( self, plotsDir, maxSize = 1024 * 1048576 ):
     self.plotsLocation = plotsDir
-    for plot in os.listdir( self.plotsLocation ):
-      if plot.find( ".png" ) > 0:
-        plotLocation = "%s/%s" % ( self.plotsLocation, plot )
-        gLogger.verbose( "Purging %s" % plotLocation )
-        os.unlink( plotLocation )
-
-  def purgeExpired( self ):
-    while self.alive:
-      time.sleep( self.__graphLifeTime )
-      self.__graphCache.purgeExpired()
+    self.__fileCache.maxSize = maxSize
+    self.__fileCache.setLocation( plotsDir )
 
   def getPlot( self, plotHash, plotData, plotMetadata, subplotMetadata ):
     """
     Get plot from the cache if exists, else generate it
     """
 
-    plotDict = self.__graphCache.get( plotHash )
-    if plotDict is None:
-      basePlotFileName = "%s/%s.png" % ( self.plotsLocation, plotHash )
+    def generatePlot( basePlotFileName ):
+      basePlotFileName = "%s.png" % basePlotFileName
       if subplotMetadata:
         retVal = graph( plotData, basePlotFileName, plotMetadata, metadata = subplotMetadata )
       else:
@@ -51,26 +38,14 @@ class PlotCache:
       plotDict = retVal[ 'Value' ]
       if plotDict[ 'plot' ]:
         plotDict[ 'plot' ] = os.path.basename( basePlotFileName )
-      self.__graphCache.add( plotHash, self.__graphLifeTime, plotDict )
-    return S_OK( plotDict )
+      return retVal
+
+    return self.__fileCache.getPlot( plotHash, generatePlot )
 
   def getPlotData( self, plotFileName ):
-    filename = "%s/%s" % ( self.plotsLocation, plotFileName )
-    try:
-      fd = file( filename, "rb" )
-      data = fd.read()
-      fd.close()
-    except Exception, v:
-      return S_ERROR( "Can't open file %s: %s" % ( plotFileName, str( v ) ) )
-    return S_OK( data )
+    return self.__fileCache.getPlotData( plotFileName )
 
-def _deleteGraph( plotDict ):
-  try:
-    for key in plotDict:
-      value = plotDict[ key ]
-      if value and os.path.isfile( value ):
-        os.unlink( value )
-  except:
-    pass
+  def getStats( self ):
+    return self.__fileCache.getStats()
 
 gPlotCache = PlotCache()
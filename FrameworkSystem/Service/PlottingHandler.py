@@ -36,7 +36,8 @@ def initializePlottingHandler( serviceInfo ):
     gLogger.fatal( "Can't write to %s" % dataPath )
     return S_ERROR( "Data location is not writable" )
 
-  gPlotCache.setPlotsLocation( dataPath )
+  cacheSize = gConfig.getValue( "%s/PlotCacheSize" % plottingSection, 1024 )
+  gPlotCache.setPlotsLocation( dataPath, maxSize = cacheSize * 1048576 )
   gMonitor.registerActivity( "plotsDrawn", "Drawn plot images", "Plotting requests", "plots", gMonitor.OP_SUM )
   return S_OK()
 
@@ -57,6 +58,12 @@ class PlottingHandler( RequestHandler ):
       return result
     return S_OK( result['Value']['plot'] )
 
+  types_getPlotCacheStats = []
+  def export_getPlotCacheStats( self ):
+    """ Get the hits, misses and generation time of the plots cache
+    """
+    return S_OK( gPlotCache.getStats() )
+
   def transfer_toClient( self, fileId, token, fileHelper ):
     """
     Get graphs data
@@ -71,8 +71,9 @@ class SystemAdministratorHandler(RequestHandler):
 
     if dynamicMonitoring:
       global gMonitoringReporter
+      # the records are inserted in the background not to delay the scheduled tasks
       gMonitoringReporter = MonitoringReporter(
-          monitoringType="ComponentMonitoring", failoverQueueName=messageQueue)
+          monitoringType="ComponentMonitoring", failoverQueueName=messageQueue, asynchronous=True)
       gThreadScheduler.addPeriodicTask(120, cls.__storeProfiling)
 
     keepSoftwareVersions = cls.srv_getCSOption('KeepSoftwareVersions', 0)
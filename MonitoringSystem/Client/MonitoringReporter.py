@@ -9,6 +9,9 @@ It provides two failover mechanism:
 
 Note: In order to not send too many rows to the db we use  __maxRecordsInABundle.
 
+In the asynchronous mode, commit only queues the records: they are inserted in the background by an
+IngestionPipeline, the batches that fail being published in the MQ.
+
 """
 
 __RCSID__ = "$Id$"
@@ -21,6 +24,7 @@ from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.Resources.MessageQueue.MQCommunication import createConsumer
 from DIRAC.Resources.MessageQueue.MQCommunication import createProducer
 from DIRAC.MonitoringSystem.Client.ServerUtils import monitoringDB
+from DIRAC.MonitoringSystem.private.IngestionPipeline import IngestionPipeline
 
 
 class MonitoringReporter(object):
@@ -36,15 +40,24 @@ class MonitoringReporter(object):
   :type __documents: python:list
   :param str __monitoringType: type of the records which will be inserted to the db. For example: WMSHistory.
   :param str __failoverQueueName: the name of the messaging queue. For example: /queue/dirac.certification
+  :param bool asynchronous: commit only queues the records, which are inserted by background threads
   """
 
-  def __init__(self, monitoringType='', failoverQueueName='dirac.monitoring'):
+  def __init__(self, monitoringType='', failoverQueueName='dirac.monitoring', asynchronous=False):
 
     self.__maxRecordsInABundle = 5000
     self.__documentLock = threading.RLock()
     self.__documents = []
     self.__monitoringType = monitoringType
     self.__failoverQueueName = failoverQueueName
+    self.__pipeline = None
+    # The records of the MQ are processed after the first insertion, and after the ones that failed over
+    self.__failoverPending = True
+    if asynchronous:
+      self.__pipeline = IngestionPipeline(self.__putRecords, self.__failoverRecords,
+                                          batchSize=self.__maxRecordsInABundle,
+                                          name="MonitoringReporter/%s" % monitoringType)
+      self.__pipeline.start()
 
   def processRecords(self):
     """
@@ -116,6 +129,20 @@ class MonitoringReporter(object):
     It inserts the accumulated data to the db. In case of failure
     it keeps in memory/MQ
     """
+    if self.__pipeline:
+      with self.__documentLock:
+        documents = self.__documents
+        self.__documents = []
+      if not documents or self.__pipeline.addRecords(self.__monitoringType, documents):
+        return S_OK(len(documents))
+      # the queue is full
+      result = self.__failoverRecords(documents, self.__monitoringType)
+      if not result['OK']:
+        with self.__documentLock:
+          self.__documents.extend(documents)
+        return result
+      return S_OK(len(documents))
+
     # before we try to insert the data to the db, we process all the data
     # which are already in the queue
     mqProducer = self.__createProducer()  # we are sure that we can connect to MQ
@@ -147,7 +174,9 @@ class MonitoringReporter(object):
             else:
               return res  # in case of MQ problem
           else:
+            # the records are kept in the memory until the next commit
             gLogger.warn("Failed to insert the records:", retVal['Message'])
+            break
     except Exception as e:  # pylint: disable=broad-except
       gLogger.exception("Error committing", lException=e)
       return S_ERROR("Error committing %s" % repr(e).replace(',)', ')'))
@@ -158,6 +187,46 @@ class MonitoringReporter(object):
       self.__documents.extend(documents)
     return S_OK(recordSent)
 
+  def __putRecords(self, records, monitoringType):
+    """
+    It inserts a batch of the asynchronous mode, then the records waiting in the MQ if needed
+    """
+    retVal = monitoringDB.put(records, monitoringType)
+    if retVal['OK'] and self.__failoverPending:
+      self.__failoverPending = False
+      result = self.processRecords()
+      if not result['OK']:
+        gLogger.warn("Unable to insert the records of the MQ:", result['Message'])
+    return retVal
+
+  def __failoverRecords(self, records, _monitoringType):
+    """
+    It publishes in the MQ a batch of the asynchronous mode that could not be inserted
+    """
+    result = self.publishRecords(records)
+    if result['OK']:
+      self.__failoverPending = True
+    return result
+
+  def flush(self, timeout=None):
+    """
+    In the asynchronous mode, it waits for the insertion of the committed records
+    :param float timeout: maximum number of seconds to wait
+    :return: S_OK(True) if all the records were inserted or failed over
+    """
+    if not self.__pipeline:
+      return S_OK(True)
+    return S_OK(self.__pipeline.flush(timeout))
+
+  def getStats(self):
+    """
+    In the asynchronous mode, it returns the queue depth, the number of records inserted,
+    failed over, lost and dropped, and the batch latencies
+    """
+    if not self.__pipeline:
+      return S_OK({})
+    return S_OK(self.__pipeline.getStats())
+
   def __createProducer(self):
     """
     This method is used to create an MQ producer.
@@ -12,6 +12,7 @@ from DIRAC.Core.Utilities.ElasticSearchDB import generateFullIndexName
 from DIRAC.ConfigurationSystem.Client.Helpers import CSGlobals
 
 from DIRAC.MonitoringSystem.private.TypeLoader import TypeLoader
+from DIRAC.MonitoringSystem.private.IngestionPipeline import IngestionPipeline
 
 
 ########################################################################
@@ -23,6 +24,7 @@ class MonitoringDB(ElasticDB):
     super(MonitoringDB, self).__init__('MonitoringDB', name, CSGlobals.getSetup().lower())
     self.__readonly = readOnly
     self.__documents = {}
+    self.__pipeline = None
     self.__loadIndexes()
 
   def __loadIndexes(self):
@@ -325,6 +327,23 @@ class MonitoringDB(ElasticDB):
 
     return S_OK(result)
 
+  def startAsynchronousPut(self, failoverFunction=None, **pipelineOptions):
+    """
+    From now on, put only queues the records, which are inserted in batches by background threads
+
+    :param failoverFunction: function( records, monitoringType ) called with the batches that can not be inserted
+    :param pipelineOptions: batchSize, flushPeriod, maxQueueSize and workers of the IngestionPipeline
+    """
+    self.__pipeline = IngestionPipeline(self.__bulkIndexRecords, failoverFunction, name='MonitoringDB',
+                                        **pipelineOptions)
+    self.__pipeline.start()
+
+  def getIngestionStats(self):
+    """
+    It returns the statistics of the asynchronous insertions, an empty dictionary if they are not used
+    """
+    return self.__pipeline.getStats() if self.__pipeline else {}
+
   def put(self, records, monitoringType):
     """
     It is used to insert the data to El.
@@ -333,6 +352,19 @@ class MonitoringDB(ElasticDB):
     :param str monitoringType: is the type of the monitoring
     :type records: python:list
     """
+    if self.__pipeline:
+      if monitoringType not in self.__documents:
+        return S_ERROR("Unknown monitoring type %s" % monitoringType)
+      if records and not self.__pipeline.addRecords(monitoringType, records):
+        return S_ERROR("Too many records waiting to be inserted, %d %s records dropped" % (len(records),
+                                                                                           monitoringType))
+      return S_OK(len(records))
+    return self.__bulkIndexRecords(records, monitoringType)
+
+  def __bulkIndexRecords(self, records, monitoringType):
+    """
+    It inserts the records in the index of their monitoring type
+    """
     mapping = self.getMapping(monitoringType)
     gLogger.debug("Mapping used to create an index:", mapping)
     period = self.__documents[monitoringType].get('period')
@@ -4,6 +4,7 @@ It is used to create plots using Elasticsearch
 
 """
 import datetime
+import json
 import os
 
 from DIRAC import gLogger, S_OK, S_ERROR, gConfig
@@ -13,6 +14,7 @@ from DIRAC.Core.Utilities.Plotting import gDataCache
 from DIRAC.Core.Utilities.Plotting.FileCoding import extractRequestFromFileId
 from DIRAC.Core.Utilities.Plotting.Plots import generateErrorMessagePlot
 from DIRAC.Core.Utilities.File import mkDir
+from DIRAC.Resources.MessageQueue.MQCommunication import createProducer
 
 from DIRAC.MonitoringSystem.DB.MonitoringDB import MonitoringDB
 from DIRAC.MonitoringSystem.private.MainReporter import MainReporter
@@ -39,6 +41,8 @@ class MonitoringHandler(RequestHandler):
                          'extraArgs': dict}
 
   __db = None
+  # monitoringType : name of the MQ where the records that can not be inserted are published
+  __failoverQueues = {}
 
   @classmethod
   def initializeHandler(cls, serviceInfo):
@@ -54,10 +58,38 @@ class MonitoringHandler(RequestHandler):
     except IOError as err:
       gLogger.fatal("Can't write to %s" % dataPath, err)
       return S_ERROR("Data location is not writable: %s" % repr(err))
-    gDataCache.setGraphsLocation(dataPath)
+    cacheSize = gConfig.getValue("%s/PlotCacheSize" % reportSection, 1024)
+    gDataCache.setGraphsLocation(dataPath, maxSize=cacheSize * 1048576)
+
+    if gConfig.getValue("%s/AsynchronousPut" % reportSection, False):
+      result = gConfig.getOptionsDict("%s/FailoverQueues" % reportSection)
+      cls.__failoverQueues = result['Value'] if result['OK'] else {}
+      cls.__db.startAsynchronousPut(cls.__failoverRecords,
+                                    batchSize=gConfig.getValue("%s/PutBatchSize" % reportSection, 5000),
+                                    flushPeriod=gConfig.getValue("%s/PutFlushPeriod" % reportSection, 5),
+                                    maxQueueSize=gConfig.getValue("%s/PutMaxQueueSize" % reportSection, 100000),
+                                    workers=gConfig.getValue("%s/PutWorkers" % reportSection, 2))
 
     return S_OK()
 
+  @classmethod
+  def __failoverRecords(cls, records, monitoringType):
+    """
+    It publishes the records that can not be inserted in the failover MQ of their type, from which
+    the MonitoringReporter of the type inserts them again
+    """
+    queueName = cls.__failoverQueues.get(monitoringType)
+    if not queueName:
+      return S_ERROR("No failover queue for %s" % monitoringType)
+    result = createProducer("Monitoring::Queue::%s" % queueName)
+    if not result['OK']:
+      return result
+    mqProducer = result['Value']
+    try:
+      return mqProducer.put(json.dumps(records))
+    finally:
+      mqProducer.close()
+
   types_listUniqueKeyValues = [basestring]
 
   def export_listUniqueKeyValues(self, typeName):
@@ -72,6 +104,23 @@ class MonitoringHandler(RequestHandler):
     # NOTE: we can apply some policies if it will be needed!
     return self.__db.getKeyValues(typeName)
 
+  types_getPlotCacheStats = []
+
+  def export_getPlotCacheStats(self):
+    """
+    Get the hits, misses and generation time of the plots cache
+    """
+    return S_OK(gDataCache.getPlotStats())
+
+  types_getIngestionStats = []
+
+  def export_getIngestionStats(self):
+    """
+    Get the queue depth, the records inserted, failed over, lost and dropped, and the batch latencies
+    of the asynchronous put
+    """
+    return S_OK(self.__db.getIngestionStats())
+
   types_listReports = [basestring]
 
   def export_listReports(self, typeName):
@@ -0,0 +1,215 @@
+""" Asynchronous ingestion of the monitoring records, used by the MonitoringReporter and the MonitoringDB
+
+    The records are added to a bounded queue per monitoring type and the caller returns immediately.
+    Worker threads take batches of records of a type as soon as batchSize records are waiting, or the
+    oldest of them waited flushPeriod seconds, and insert them with the put function. The workers
+    insert several batches in parallel. A batch that can not be inserted is given to the failover
+    function, for example to be published in a message queue, and is lost if there is none or if
+    the failover fails too. The records added while the queue is full are dropped, all the records
+    of a call being queued or dropped together.
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+import time
+from collections import deque
+
+from DIRAC import gLogger
+from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
+
+
+class IngestionPipeline(object):
+  """ Queues the records and inserts them in batches in background threads
+  """
+
+  def __init__(self, putFunction, failoverFunction=None, batchSize=5000, flushPeriod=5,
+               maxQueueSize=100000, workers=2, name="IngestionPipeline"):
+    """ c'tor
+
+        :param putFunction: function( records, monitoringType ) returning S_OK/S_ERROR, inserting a batch
+        :param failoverFunction: function( records, monitoringType ) returning S_OK/S_ERROR, called with the
+                                 batches that could not be inserted
+        :param int batchSize: maximum number of records of a batch
+        :param int flushPeriod: seconds after which the waiting records are inserted even if less than batchSize
+        :param int maxQueueSize: maximum number of waiting records, the records above are dropped
+        :param int workers: number of batches inserted in parallel
+        :param str name: name of the pipeline, used by the logger and the threads
+    """
+    self.__putFunction = putFunction
+    self.__failoverFunction = failoverFunction
+    self.__batchSize = batchSize
+    self.__flushPeriod = flushPeriod
+    self.__maxQueueSize = maxQueueSize
+    self.__nbWorkers = workers
+    self.__name = name
+    self.log = gLogger.getSubLogger(name)
+    # monitoringType : deque( ( addTime, record ) )
+    self.__queues = {}
+    self.__queueSize = 0
+    # Batches taken by the workers and not inserted yet
+    self.__inProgress = 0
+    # Number of flushes in progress
+    self.__flushing = 0
+    self.__stopping = False
+    # Protects the queues and the statistics, notified when records are added or batches inserted
+    self.__condition = threading.Condition()
+    self.__workers = []
+    self.__stats = {'Received': 0, 'Dropped': 0, 'Batches': 0, 'Inserted': 0, 'FailedBatches': 0,
+                    'FailedOver': 0, 'Lost': 0, 'BatchTime': 0., 'MaxBatchTime': 0., 'QueueTime': 0.}
+
+    gMonitor.registerActivity('ingestionQueue', "Monitoring records waiting to be inserted",
+                              'Monitoring', "records", gMonitor.OP_MEAN)
+    gMonitor.registerActivity('ingestionBatchTime', "Monitoring records insertion time",
+                              'Monitoring', "secs", gMonitor.OP_MEAN)
+    gMonitor.registerActivity('ingestionDropped', "Monitoring records dropped",
+                              'Monitoring', "records", gMonitor.OP_SUM)
+
+  def start(self):
+    """ Starts the worker threads
+    """
+    for index in xrange(self.__nbWorkers):
+      worker = threading.Thread(target=self.__workLoop, name="%s-%d" % (self.__name, index))
+      worker.setDaemon(True)
+      worker.start()
+      self.__workers.append(worker)
+
+  def addRecords(self, monitoringType, records):
+    """ Queues records for insertion
+
+        :param str monitoringType: type of the records
+        :param list records: the records
+        :return: number of records queued, 0 if they were dropped because the queue is full
+    """
+    now = time.time()
+    with self.__condition:
+      accepted = len(records) if self.__queueSize + len(records) <= self.__maxQueueSize else 0
+      if accepted:
+        self.__queues.setdefault(monitoringType, deque()).extend((now, record) for record in records)
+        self.__queueSize += accepted
+        self.__condition.notify_all()
+      dropped = len(records) - accepted
+      self.__stats['Received'] += len(records)
+      self.__stats['Dropped'] += dropped
+      queueSize = self.__queueSize
+    if dropped:
+      self.log.warn("Queue full, dropping %s records" % monitoringType, dropped)
+      gMonitor.addMark('ingestionDropped', dropped)
+    gMonitor.addMark('ingestionQueue', queueSize)
+    return accepted
+
+  def __getBatch(self):
+    """ The type and records of the next batch to insert, waiting until there is one, None when stopped
+    """
+    with self.__condition:
+      while True:
+        now = time.time()
+        nextTime = None
+        for monitoringType, queue in self.__queues.items():
+          if not queue:
+            del self.__queues[monitoringType]
+            continue
+          readyTime = queue[0][0] + self.__flushPeriod
+          if len(queue) >= self.__batchSize or readyTime <= now or self.__flushing or self.__stopping:
+            batch = [queue.popleft() for _ in xrange(min(self.__batchSize, len(queue)))]
+            self.__queueSize -= len(batch)
+            self.__inProgress += 1
+            self.__stats['QueueTime'] += sum(now - addTime for addTime, _record in batch)
+            return monitoringType, [record for _addTime, record in batch]
+          nextTime = readyTime if nextTime is None else min(nextTime, readyTime)
+        if self.__stopping:
+          return None
+        self.__condition.wait(nextTime - now if nextTime is not None else None)
+
+  def __workLoop(self):
+    while True:
+      batch = self.__getBatch()
+      if batch is None:
+        return
+      try:
+        self.__insert(*batch)
+      except Exception as x:  # pylint: disable=broad-except
+        self.log.exception("Failed to insert the records", lException=x)
+      finally:
+        with self.__condition:
+          self.__inProgress -= 1
+          self.__condition.notify_all()
+
+  def __insert(self, monitoringType, records):
+    """ Inserts a batch, or gives it to the failover
+    """
+    startTime = time.time()
+    result = self.__putFunction(records, monitoringType)
+    batchTime = time.time() - startTime
+    failedOver = lost = 0
+    if not result['OK']:
+      self.log.warn("Failed to insert %d %s records" % (len(records), monitoringType), result['Message'])
+      result = self.__failoverFunction(records, monitoringType) if self.__failoverFunction else None
+      if result and result['OK']:
+        failedOver = len(records)
+      else:
+        lost = len(records)
+        self.log.error("Lost %d %s records" % (len(records), monitoringType),
+                       result['Message'] if result else "no failover")
+    with self.__condition:
+      self.__stats['Batches'] += 1
+      self.__stats['BatchTime'] += batchTime
+      self.__stats['MaxBatchTime'] = max(self.__stats['MaxBatchTime'], batchTime)
+      if failedOver or lost:
+        self.__stats['FailedBatches'] += 1
+      else:
+        self.__stats['Inserted'] += len(records)
+      self.__stats['FailedOver'] += failedOver
+      self.__stats['Lost'] += lost
+    gMonitor.addMark('ingestionBatchTime', batchTime)
+
+  def flush(self, timeout=None):
+    """ Inserts all the queued records without waiting for the batches to be full
+
+        :param float timeout: maximum number of seconds to wait
+        :return: True if all the records were inserted
+    """
+    endTime = time.time() + timeout if timeout is not None else None
+    with self.__condition:
+      self.__flushing += 1
+      self.__condition.notify_all()
+      try:
+        while self.__queueSize or self.__inProgress:
+          if not self.__workers:
+            return False
+          if endTime is None:
+            self.__condition.wait()
+            continue
+          remaining = endTime - time.time()
+          if remaining <= 0:
+            return False
+          self.__condition.wait(remaining)
+        return True
+      finally:
+        self.__flushing -= 1
+
+  def stop(self, timeout=None):
+    """ Inserts the queued records and stops the workers
+
+        :param float timeout: maximum number of seconds to wait for the workers
+    """
+    with self.__condition:
+      self.__stopping = True
+      self.__condition.notify_all()
+    for worker in self.__workers:
+      worker.join(timeout)
+    self.__workers = [worker for worker in self.__workers if worker.isAlive()]
+
+  def getStats(self):
+    """ Records received, dropped, queued, inserted, failed over and lost, batches and their duration
+
+        :return: dict
+    """
+    with self.__condition:
+      stats = dict(self.__stats)
+      stats['QueueSize'] = self.__queueSize
+      stats['BatchesInProgress'] = self.__inProgress
+    stats['MeanBatchTime'] = stats['BatchTime'] / stats['Batches'] if stats['Batches'] else 0.
+    taken = stats['Received'] - stats['Dropped'] - stats['QueueSize']
+    stats['MeanQueueTime'] = stats['QueueTime'] / taken if taken else 0.
+    return stats
@@ -0,0 +1,145 @@
+""" Unit tests of the asynchronous ingestion of the monitoring records, the DB is replaced by a mock
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import threading
+import time
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.MonitoringSystem.private.IngestionPipeline import IngestionPipeline
+from DIRAC.MonitoringSystem.Client import MonitoringReporter as reporterModule
+from DIRAC.MonitoringSystem.Client.MonitoringReporter import MonitoringReporter
+
+
+class FakeDB(object):
+  """ Records the batches inserted, failing for the types in failingTypes """
+
+  def __init__(self, delay=0., failingTypes=()):
+    self.delay = delay
+    self.failingTypes = failingTypes
+    self.batches = []
+    self.inProgress = 0
+    self.maxInProgress = 0
+    self.lock = threading.Lock()
+
+  def put(self, records, monitoringType):
+    with self.lock:
+      self.inProgress += 1
+      self.maxInProgress = max(self.maxInProgress, self.inProgress)
+    time.sleep(self.delay)
+    with self.lock:
+      self.inProgress -= 1
+      if monitoringType in self.failingTypes:
+        return S_ERROR('DB down')
+      self.batches.append((monitoringType, list(records)))
+    return S_OK(len(records))
+
+
+@patch('DIRAC.MonitoringSystem.private.IngestionPipeline.gMonitor')
+def test_batching(_mockMonitor):
+  db = FakeDB(delay=0.1)
+  pipeline = IngestionPipeline(db.put, batchSize=10, flushPeriod=0.5, workers=3)
+  pipeline.start()
+  assert pipeline.addRecords('WMSHistory', range(35)) == 35
+  pipeline.addRecords('RMSMonitoring', ['a'])
+  # The full batches are inserted in parallel without waiting for the period
+  time.sleep(0.3)
+  assert sorted(len(records) for _type, records in db.batches) == [10, 10, 10]
+  assert db.maxInProgress == 3
+  # The others when they waited long enough
+  time.sleep(0.6)
+  assert sorted((monitoringType, len(records)) for monitoringType, records in db.batches) == \
+      [('RMSMonitoring', 1), ('WMSHistory', 5), ('WMSHistory', 10), ('WMSHistory', 10), ('WMSHistory', 10)]
+  assert sorted(sum((records for monitoringType, records in db.batches if monitoringType == 'WMSHistory'), [])) == \
+      range(35)
+  stats = pipeline.getStats()
+  assert (stats['Received'], stats['Inserted'], stats['Batches'], stats['QueueSize']) == (36, 36, 5, 0)
+  assert stats['MeanBatchTime'] >= 0.1
+  assert stats['MeanQueueTime'] > 0
+
+  # flush does not wait for the period
+  pipeline.addRecords('WMSHistory', range(3))
+  assert pipeline.flush(timeout=5)
+  assert db.batches[-1] == ('WMSHistory', [0, 1, 2])
+  # The records still queued are inserted when stopping
+  pipeline.addRecords('WMSHistory', range(2))
+  pipeline.stop(timeout=5)
+  assert db.batches[-1] == ('WMSHistory', [0, 1])
+  assert pipeline.getStats()['BatchesInProgress'] == 0
+
+
+@patch('DIRAC.MonitoringSystem.private.IngestionPipeline.gMonitor')
+def test_failures(mockMonitor):
+  db = FakeDB(failingTypes=('WMSHistory',))
+  failover = MagicMock(return_value=S_OK())
+  pipeline = IngestionPipeline(db.put, failover, batchSize=10, maxQueueSize=20, workers=1)
+  # Nothing is inserted before the start, the queue is bounded
+  assert pipeline.addRecords('WMSHistory', range(15)) == 15
+  assert pipeline.addRecords('RMSMonitoring', range(10)) == 0
+  assert pipeline.addRecords('RMSMonitoring', range(5)) == 5
+  mockMonitor.addMark.assert_any_call('ingestionDropped', 10)
+
+  pipeline.start()
+  assert pipeline.flush(timeout=5)
+  assert db.batches == [('RMSMonitoring', range(5))]
+  assert [call[0] for call in failover.call_args_list] == [(range(10), 'WMSHistory'), (range(10, 15), 'WMSHistory')]
+  stats = pipeline.getStats()
+  assert (stats['Dropped'], stats['FailedBatches'], stats['FailedOver'], stats['Lost']) == (10, 2, 15, 0)
+
+  # Without failover the records are lost
+  failover.return_value = S_ERROR('MQ down')
+  pipeline.addRecords('WMSHistory', range(3))
+  assert pipeline.flush(timeout=5)
+  assert pipeline.getStats()['Lost'] == 3
+
+
+@patch('DIRAC.MonitoringSystem.private.IngestionPipeline.gMonitor')
+def test_asynchronousReporter(_mockMonitor):
+  db = FakeDB(delay=0.2)
+  with patch.object(reporterModule, 'monitoringDB', db), \
+          patch.object(MonitoringReporter, 'processRecords', return_value=S_OK()) as processRecords, \
+          patch.object(MonitoringReporter, 'publishRecords', return_value=S_OK()) as publishRecords:
+    reporter = MonitoringReporter(monitoringType='WMSHistory', asynchronous=True)
+    for index in range(3):
+      reporter.addRecord({'index': index})
+    startTime = time.time()
+    assert reporter.commit()['Value'] == 3
+    # commit does not wait for the DB
+    assert time.time() - startTime < 0.1
+    assert not db.batches
+    assert reporter.flush(timeout=5)['Value']
+    assert db.batches == [('WMSHistory', [{'index': 0}, {'index': 1}, {'index': 2}])]
+    # The MQ is processed after the first insertion
+    assert processRecords.call_count == 1
+
+    # The failed batches go to the MQ, which is processed again after the next insertion
+    db.failingTypes = ('WMSHistory',)
+    reporter.addRecord({'index': 3})
+    reporter.commit()
+    assert reporter.flush(timeout=5)['Value']
+    publishRecords.assert_called_once_with([{'index': 3}])
+    db.failingTypes = ()
+    reporter.addRecord({'index': 4})
+    reporter.commit()
+    assert reporter.flush(timeout=5)['Value']
+    assert processRecords.call_count == 2
+    stats = reporter.getStats()['Value']
+    assert (stats['Inserted'], stats['FailedOver']) == (4, 1)
+
+
+def test_synchronousReporter():
+  # The records are kept in memory when neither the DB nor the MQ are available
+  db = FakeDB(failingTypes=('WMSHistory',))
+  with patch.object(reporterModule, 'monitoringDB', db), \
+          patch.object(reporterModule, 'createProducer', return_value=S_ERROR('No MQ')):
+    reporter = MonitoringReporter(monitoringType='WMSHistory')
+    reporter.addRecord({'index': 0})
+    assert reporter.commit()['Value'] == 0
+    db.failingTypes = ()
+    assert reporter.commit()['Value'] == 1
+    assert db.batches == [('WMSHistory', [{'index': 0}])]
@@ -29,6 +29,7 @@ __RCSID__ = '$Id$'
 import sys
 import time
 import errno
+from collections import deque
 
 # # from DIRAC
 from DIRAC import S_OK, S_ERROR, gConfig
@@ -66,6 +67,8 @@ class RequestExecutingAgent( AgentModule ):
   __processPool = None
   # # request cache
   __requestCache = {}
+  # # requests claimed from the RequestDB, waiting for a free slot in the ProcessPool
+  __prefetchQueue = None
   # # requests/cycle
   __requestsPerCycle = 100
   # # minimal nb of subprocess running
@@ -84,6 +87,8 @@ class RequestExecutingAgent( AgentModule ):
   __poolTimeout = 900
   # # ProcessPool sleep time
   __poolSleep = 5
+  # # number of tasks taken at once by the ProcessPool workers
+  __poolBatchSize = 1
   # # placeholder for RequestClient instance
   __requestClient = None
   # # Size of the bulk if use of getRequests. If 0, use getRequest
@@ -106,6 +111,8 @@ class RequestExecutingAgent( AgentModule ):
     self.log.info( "ProcessPool timeout = %d seconds" % self.__poolTimeout )
     self.__poolSleep = int( self.am_getOption( "ProcessPoolSleep", self.__poolSleep ) )
     self.log.info( "ProcessPool sleep time = %d seconds" % self.__poolSleep )
+    self.__poolBatchSize = int( self.am_getOption( "ProcessPoolBatchSize", self.__poolBatchSize ) )
+    self.log.info( "ProcessPool batch size = %d" % self.__poolBatchSize )
     self.__bulkRequest = self.am_getOption( "BulkRequest", 0 )
     self.log.info( "Bulk request size = %d" % self.__bulkRequest )
 
@@ -157,8 +164,11 @@ class RequestExecutingAgent( AgentModule ):
                                "RequestExecutingAgent", "Requests/min", gMonitor.OP_SUM )
     gMonitor.registerActivity( "Done", "Request Completed",
                                "RequestExecutingAgent", "Requests/min", gMonitor.OP_SUM )
+    gMonitor.registerActivity( "ClaimTime", "Time to get requests from the RMS",
+                               "RequestExecutingAgent", "seconds", gMonitor.OP_MEAN )
     # # create request dict
     self.__requestCache = dict()
+    self.__prefetchQueue = deque()
 
     # ?? Probably should be removed
     self.FTSMode = self.am_getOption( "FTSMode", False )
@@ -178,7 +188,8 @@ class RequestExecutingAgent( AgentModule ):
                                         maxProcess,
                                         queueSize,
                                         poolCallback = self.resultCallback,
-                                        poolExceptionCallback = self.exceptionCallback )
+                                        poolExceptionCallback = self.exceptionCallback,
+                                        batchSize = self.__poolBatchSize )
       self.__processPool.daemonize()
     return self.__processPool
 
@@ -238,7 +249,14 @@ class RequestExecutingAgent( AgentModule ):
 
     :param self: self reference
     """
-    self.log.info( "putAllRequests: will put %s back requests" % len( self.__requestCache ) )
+    self.log.info( "putAllRequests: will put %s back requests" % ( len( self.__requestCache ) +
+                                                                   len( self.__prefetchQueue ) ) )
+    # # the prefetched requests have not been executed at all
+    while self.__prefetchQueue:
+      request = self.__prefetchQueue.popleft()
+      reset = self.requestClient().putRequest( request, useFailoverProxy = False, retryMainService = 2 )
+      if not reset["OK"]:
+        self.log.error( 'Failed to put request', reset["Message"] )
     for requestID in self.__requestCache.keys():
       reset = self.putRequest( requestID )
       if not reset["OK"]:
@@ -252,6 +270,32 @@ class RequestExecutingAgent( AgentModule ):
     """
     return S_OK()
 
+  def prefetchRequests( self, numberOfRequest ):
+    """ claim requests from the RMS and put them in the prefetch queue
+
+    :param int numberOfRequest: number of requests to ask for, only used with BulkRequest
+    """
+    claimStart = time.time()
+    if not self.__bulkRequest:
+      self.log.info( "execute: ask for a single request" )
+      getRequest = self.requestClient().getRequest()
+      if not getRequest["OK"]:
+        return getRequest
+      if getRequest["Value"]:
+        self.__prefetchQueue.append( getRequest["Value"] )
+    else:
+      numberOfRequest = min( self.__bulkRequest, numberOfRequest )
+      self.log.info( "execute: ask for %s requests" % numberOfRequest )
+      getRequests = self.requestClient().getBulkRequests( numberOfRequest )
+      if not getRequests["OK"]:
+        return getRequests
+      if getRequests["Value"]:
+        for rId in getRequests["Value"]["Failed"]:
+          self.log.error( "execute: %s" % getRequests["Value"]["Failed"][rId] )
+        self.__prefetchQueue.extend( getRequests["Value"]["Successful"].values() )
+    gMonitor.addMark( "ClaimTime", time.time() - claimStart )
+    return S_OK( len( self.__prefetchQueue ) )
+
   def execute( self ):
     """ read requests from RequestClient and enqueue them into ProcessPool """
     gMonitor.addMark( "Iteration", 1 )
@@ -260,90 +304,72 @@ class RequestExecutingAgent( AgentModule ):
     while taskCounter < self.__requestsPerCycle:
       self.log.debug( "execute: executing %d request in this cycle" % taskCounter )
 
-      requestsToExecute = []
-
-      if not self.__bulkRequest:
-        self.log.info( "execute: ask for a single request" )
-        getRequest = self.requestClient().getRequest()
-        if not getRequest["OK"]:
-          self.log.error( "execute: %s" % getRequest["Message"] )
+      if not self.__prefetchQueue:
+        prefetch = self.prefetchRequests( self.__requestsPerCycle - taskCounter )
+        if not prefetch["OK"]:
+          self.log.error( "execute: %s" % prefetch["Message"] )
           break
-        if not getRequest["Value"]:
+        if not prefetch["Value"]:
           self.log.info( "execute: no more 'Waiting' requests to process" )
           break
-        requestsToExecute = [getRequest["Value"] ]
-      else:
-        numberOfRequest = min( self.__bulkRequest, self.__requestsPerCycle - taskCounter )
-        self.log.info( "execute: ask for %s requests" % numberOfRequest )
-        getRequests = self.requestClient().getBulkRequests( numberOfRequest )
-        if not getRequests["OK"]:
-          self.log.error( "execute: %s" % getRequests["Message"] )
-          break
-        if not getRequests["Value"]:
-          self.log.info( "execute: no more 'Waiting' requests to process" )
-          break
-        for rId in getRequests["Value"]["Failed"]:
-          self.log.error( "execute: %s" % getRequests["Value"]["Failed"][rId] )
-
-        requestsToExecute = getRequests["Value"]["Successful"].values()
-
-      self.log.info( "execute: will execute %s requests " % len( requestsToExecute ) )
-
-      for request in requestsToExecute:
-        # # set task id
-        taskID = request.RequestID
-
-        self.log.info( "processPool tasks idle = %s working = %s" % ( self.processPool().getNumIdleProcesses(),
-                                                                      self.processPool().getNumWorkingProcesses() ) )
-
-        looping = 0
-        while True:
-          if not self.processPool().getFreeSlots():
-            if not looping:
-              self.log.info( "No free slots available in processPool, will wait %d seconds to proceed" % self.__poolSleep )
-            time.sleep( self.__poolSleep )
-            looping += 1
-          else:
-            if looping:
-              self.log.info( "Free slot found after %d seconds" % looping * self.__poolSleep )
-            looping = 0
-            # # save current request in cache
-            res = self.cacheRequest( request )
-            if not res['OK']:
-              if cmpError( res, errno.EALREADY ):
-                # The request is already in the cache, skip it. break out of the while loop to get next request
-                break
-              # There are too many requests in the cache, commit suicide
-              self.log.error( res['Message'], '(%d requests): put back all requests and exit cycle' % len( self.__requestCache ) )
-              self.putAllRequests()
-              return res
-            # # serialize to JSON
-            result = request.toJSON()
-            if not result['OK']:
-              continue
-            requestJSON = result['Value']
-            self.log.info( "spawning task for request '%s/%s'" % ( request.RequestID, request.RequestName ) )
-            timeOut = self.getTimeout( request )
-            enqueue = self.processPool().createAndQueueTask( RequestTask,
-                                                             kwargs = { "requestJSON" : requestJSON,
-                                                                        "handlersDict" : self.handlersDict,
-                                                                        "csPath" : self.__configPath,
-                                                                        "agentName": self.agentName },
-                                                             taskID = taskID,
-                                                             blocking = True,
-                                                             usePoolCallbacks = True,
-                                                             timeOut = timeOut )
-            if not enqueue["OK"]:
-              self.log.error( enqueue["Message"] )
-            else:
-              self.log.debug( "successfully enqueued task '%s'" % taskID )
-              # # update monitor
-              gMonitor.addMark( "Processed", 1 )
-              # # update request counter
-              taskCounter += 1
-              # # task created, a little time kick to proceed
-              time.sleep( 0.1 )
+        self.log.info( "execute: will execute %s requests " % prefetch["Value"] )
+
+      # # the next claimed request goes straight to the ProcessPool
+      request = self.__prefetchQueue.popleft()
+      # # set task id
+      taskID = request.RequestID
+
+      self.log.info( "processPool tasks idle = %s working = %s" % ( self.processPool().getNumIdleProcesses(),
+                                                                    self.processPool().getNumWorkingProcesses() ) )
+
+      looping = 0
+      while True:
+        if not self.processPool().getFreeSlots():
+          if not looping:
+            self.log.info( "No free slots available in processPool, will wait %d seconds to proceed" % self.__poolSleep )
+          time.sleep( self.__poolSleep )
+          looping += 1
+        else:
+          if looping:
+            self.log.info( "Free slot found after %d seconds" % looping * self.__poolSleep )
+          looping = 0
+          # # save current request in cache
+          res = self.cacheRequest( request )
+          if not res['OK']:
+            if cmpError( res, errno.EALREADY ):
+              # The request is already in the cache, skip it. break out of the while loop to get next request
               break
+            # There are too many requests in the cache, commit suicide
+            self.log.error( res['Message'], '(%d requests): put back all requests and exit cycle' % len( self.__requestCache ) )
+            self.putAllRequests()
+            return res
+          # # serialize to JSON
+          result = request.toJSON()
+          if not result['OK']:
+            continue
+          requestJSON = result['Value']
+          self.log.info( "spawning task for request '%s/%s'" % ( request.RequestID, request.RequestName ) )
+          timeOut = self.getTimeout( request )
+          enqueue = self.processPool().createAndQueueTask( RequestTask,
+                                                           kwargs = { "requestJSON" : requestJSON,
+                                                                      "handlersDict" : self.handlersDict,
+                                                                      "csPath" : self.__configPath,
+                                                                      "agentName": self.agentName },
+                                                           taskID = taskID,
+                                                           blocking = True,
+                                                           usePoolCallbacks = True,
+                                                           timeOut = timeOut )
+          if not enqueue["OK"]:
+            self.log.error( enqueue["Message"] )
+          else:
+            self.log.debug( "successfully enqueued task '%s'" % taskID )
+            # # update monitor
+            gMonitor.addMark( "Processed", 1 )
+            # # update request counter
+            taskCounter += 1
+            # # task created, a little time kick to proceed
+            time.sleep( 0.1 )
+            break
 
     self.log.info( 'Flushing callbacks (%d requests still in cache)' % len( self.__requestCache ) )
     processed = self.processPool().processResults()
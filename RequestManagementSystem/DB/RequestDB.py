@@ -17,6 +17,7 @@
     db holding Request, Operation and File
 """
 import random
+import time
 
 import datetime
 
@@ -28,6 +29,7 @@ from sqlalchemy import create_engine, func, Table, Column, MetaData, ForeignKey,
 
 # # from DIRAC
 from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.RequestManagementSystem.Client.File import File
@@ -189,6 +191,13 @@ class RequestDB( object ):
 
     self.DBSession = sessionmaker( bind = self.engine )
 
+    gMonitor.registerActivity( "RequestsClaimed", "Requests claimed",
+                               "RequestDB", "Requests/min", gMonitor.OP_SUM )
+    gMonitor.registerActivity( "ClaimCollisions", "Requests claimed by somebody else in between",
+                               "RequestDB", "Requests/min", gMonitor.OP_SUM )
+    gMonitor.registerActivity( "ClaimTime", "Time to claim a bulk of requests",
+                               "RequestDB", "seconds", gMonitor.OP_MEAN )
+
 
   def createTables( self ):
     """ create tables """
@@ -389,6 +398,12 @@ class RequestDB( object ):
   def getBulkRequests( self, numberOfRequest = 10, assigned = True ):
     """ read as many requests as requested for execution
 
+    The candidates are taken among the oldest Waiting requests and, if assigned is set,
+    each of them is only claimed if it is still Waiting: concurrent callers never get the
+    same request. They try the candidates in a random order to limit the collisions, and
+    each claim is committed on its own so that they never hold a lock while waiting for
+    another one. The requests claimed by somebody else in between are skipped.
+
     :param int numberOfRequest: Number of Request we want (default 10)
     :param bool assigned: if True, the status of the selected requests are set to assign
 
@@ -401,41 +416,56 @@ class RequestDB( object ):
     log = self.log.getSubLogger( 'getBulkRequest' if assigned else 'peekBulkRequest' )
 
     requestDict = {}
+    startTime = time.time()
+    collisions = 0
 
     try:
-      # If we are here, the request MUST exist, so no try catch
-      # the joinedload_all is to force the non-lazy loading of all the attributes, especially _parent
-      try:
-        now = datetime.datetime.utcnow().replace( microsecond = 0 )
-        requestIDs = session.query( Request.RequestID )\
-                          .with_for_update()\
-                          .filter( Request._Status == 'Waiting' )\
-                          .filter( Request._NotBefore < now )\
-                          .order_by( Request._LastUpdate )\
-                          .limit( numberOfRequest )\
-                          .all()
+      now = datetime.datetime.utcnow().replace( microsecond = 0 )
+      # Take more candidates than needed to make up for the ones claimed by the others
+      candidateIDs = session.query( Request.RequestID )\
+                            .filter( Request._Status == 'Waiting' )\
+                            .filter( Request._NotBefore < now )\
+                            .order_by( Request._LastUpdate )\
+                            .limit( 3 * numberOfRequest if assigned else numberOfRequest )\
+                            .all()
+      candidateIDs = [ridTuple[0] for ridTuple in candidateIDs]
 
-        requestIDs = [ridTuple[0] for ridTuple in requestIDs]
-        log.debug( "Got request ids %s" % requestIDs )
+      if assigned:
+        random.shuffle( candidateIDs )
+        requestIDs = []
+        for requestID in candidateIDs:
+          if len( requestIDs ) >= numberOfRequest:
+            break
+          try:
+            updateRet = session.execute( update( Request )\
+                                         .where( Request.RequestID == requestID )\
+                                         .where( Request._Status == 'Waiting' )\
+                                         .values( {Request._Status : 'Assigned',
+                                                   Request._LastUpdate : now} ) )
+            session.commit()
+          except Exception as e:
+            # The requests already claimed have to be returned
+            if not requestIDs:
+              raise
+            session.rollback()
+            log.warn( "Could not claim more requests", repr( e ) )
+            break
+          if updateRet.rowcount:
+            requestIDs.append( requestID )
+          else:
+            collisions += 1
+      else:
+        requestIDs = candidateIDs
+      log.debug( "Got request ids %s" % requestIDs )
 
+      if requestIDs:
+        # the joinedload_all is to force the non-lazy loading of all the attributes, especially _parent
         requests = session.query( Request )\
                           .options( joinedload_all( '__operations__.__files__' ) )\
                           .filter( Request.RequestID.in_( requestIDs ) )\
                           .all()
         log.debug( "Got %s Request objects " % len( requests ) )
         requestDict = dict( ( req.RequestID, req ) for req in requests )
-      # No Waiting requests
-      except NoResultFound, e:
-        pass
-
-      if assigned and requestDict:
-        session.execute( update( Request )\
-                         .where( Request.RequestID.in_( requestDict.keys() ) )\
-                         .values( {Request._Status : 'Assigned',
-                                   Request._LastUpdate : datetime.datetime.utcnow()\
-                                                        .strftime( Request._datetimeFormat )} )
-                       )
-      session.commit()
 
       session.expunge_all()
 
@@ -446,6 +476,13 @@ class RequestDB( object ):
     finally:
       session.close()
 
+    if assigned:
+      if collisions:
+        log.verbose( "%d requests were claimed by somebody else" % collisions )
+      gMonitor.addMark( "RequestsClaimed", len( requestDict ) )
+      gMonitor.addMark( "ClaimCollisions", collisions )
+      gMonitor.addMark( "ClaimTime", time.time() - startTime )
+
     return S_OK( requestDict )
 
 
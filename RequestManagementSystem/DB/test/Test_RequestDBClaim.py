@@ -0,0 +1,120 @@
+""" Test the claim of bulks of requests by the RequestExecutingAgents, the ReqDB is an in-memory sqlite db
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import datetime
+
+from mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql import update
+
+from DIRAC import gLogger
+from DIRAC.RequestManagementSystem.Client.Request import Request
+from DIRAC.RequestManagementSystem.Client.Operation import Operation
+from DIRAC.RequestManagementSystem.Client.File import File
+from DIRAC.RequestManagementSystem.DB import RequestDB as moduleTested
+
+
+def getRequestDB(nbRequests):
+  requestDB = moduleTested.RequestDB.__new__(moduleTested.RequestDB)
+  requestDB.log = gLogger.getSubLogger('RequestDB')
+  requestDB.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+  moduleTested.metadata.create_all(requestDB.engine)
+  requestDB.DBSession = sessionmaker(bind=requestDB.engine)
+  for reqID in xrange(nbRequests):
+    request = Request()
+    request.RequestName = 'request%s' % reqID
+    request.NotBefore = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    operation = Operation()
+    operation.Type = 'RemoveFile'
+    rmsFile = File()
+    rmsFile.LFN = '/vo/file%s' % reqID
+    operation.addFile(rmsFile)
+    request.addOperation(operation)
+    assert requestDB.putRequest(request)['OK']
+  return requestDB
+
+
+def getStatus(requestDB):
+  session = requestDB.DBSession()
+  try:
+    return dict(session.query(Request.RequestID, Request._Status).all())
+  finally:
+    session.close()
+
+
+@patch('DIRAC.RequestManagementSystem.DB.RequestDB.gMonitor')
+def test_bulkClaim(mockMonitor):
+  requestDB = getRequestDB(5)
+
+  result = requestDB.getBulkRequests(3)
+  assert result['OK']
+  firstIDs = set(result['Value'])
+  assert len(firstIDs) == 3
+  assert all(request.Status == 'Waiting' for request in result['Value'].itervalues())
+  assert all(len(request[0]) == 1 for request in result['Value'].itervalues())
+  assert sorted(getStatus(requestDB).values()) == ['Assigned'] * 3 + ['Waiting'] * 2
+
+  # Peeking does not claim
+  result = requestDB.getBulkRequests(3, assigned=False)
+  assert len(result['Value']) == 2
+  assert sorted(getStatus(requestDB).values()) == ['Assigned'] * 3 + ['Waiting'] * 2
+
+  result = requestDB.getBulkRequests(3)
+  assert set(result['Value']) == set(getStatus(requestDB)) - firstIDs
+  assert requestDB.getBulkRequests(3)['Value'] == {}
+  mockMonitor.addMark.assert_any_call('RequestsClaimed', 3)
+  mockMonitor.addMark.assert_any_call('RequestsClaimed', 2)
+
+
+@patch('DIRAC.RequestManagementSystem.DB.RequestDB.gMonitor')
+def test_collision(mockMonitor):
+  requestDB = getRequestDB(4)
+  takenByOthers = []
+
+  def otherAgent(candidateIDs):
+    """ Another agent claims the first candidates after they were selected """
+    candidateIDs.sort()
+    takenByOthers.extend(candidateIDs[:2])
+    requestDB.engine.execute(update(Request).where(Request.RequestID.in_(takenByOthers))
+                             .values({Request._Status: 'Assigned'}))
+
+  with patch('DIRAC.RequestManagementSystem.DB.RequestDB.random.shuffle', side_effect=otherAgent):
+    result = requestDB.getBulkRequests(3)
+  assert result['OK']
+  assert set(result['Value']) == set(getStatus(requestDB)) - set(takenByOthers)
+  mockMonitor.addMark.assert_any_call('ClaimCollisions', 2)
+
+
+@patch('DIRAC.RequestManagementSystem.DB.RequestDB.gMonitor')
+def test_claimFailure(_mockMonitor):
+  requestDB = getRequestDB(4)
+  # Each claim is committed on its own, the claims done before a failure are returned
+  realSession = requestDB.DBSession
+
+  def failingSession(**kwargs):
+    session = realSession(**kwargs)
+    realExecute = session.execute
+    claims = []
+
+    def execute(statement, *args, **kwargs):
+      if statement.__visit_name__ == 'update':
+        claims.append(statement)
+        if len(claims) == 3:
+          raise RuntimeError('Deadlock found when trying to get lock')
+      return realExecute(statement, *args, **kwargs)
+    session.execute = execute
+    return session
+  requestDB.DBSession = failingSession
+
+  result = requestDB.getBulkRequests(3)
+  assert result['OK']
+  assert len(result['Value']) == 2
+  status = getStatus(requestDB)
+  assert sorted(status.values()) == ['Assigned'] * 2 + ['Waiting'] * 2
+  assert all(status[requestID] == 'Assigned' for requestID in result['Value'])
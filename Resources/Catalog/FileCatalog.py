@@ -42,18 +42,69 @@
     For the actual methods that can be called vie the File Catalog object, see
     the documentation of the respective FileCatalog plug-ins ( client classes )
 
+    If /Operations/<vo/setup>/Services/Catalogs/ParallelCalls is set, the catalogs which
+    do not depend on each other are called concurrently: the Master plug-in is still called
+    first and alone, then all the other plug-ins are called at once from a pool of
+    MaxThreads threads shared by the FileCatalog objects of the process. The results are
+    merged exactly as they are in sequence.
+
 """
 
+import os
 import re
+import time
+import threading
+from multiprocessing.pool import ThreadPool
 
 from DIRAC                                               import gLogger, gConfig, S_OK, S_ERROR
 from DIRAC.Core.Utilities                                import DErrno
+from DIRAC.Core.DISET.ThreadConfig                       import ThreadConfig
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.Security.ProxyInfo                       import getVOfromProxyGroup
 from DIRAC.Resources.Catalog.Utilities                   import checkArgumentFormat
 from DIRAC.Resources.Catalog.FileCatalogFactory          import FileCatalogFactory
 from DIRAC.Resources.Catalog.FCConditionParser           import FCConditionParser
 
+# Upper bounds in seconds of the bins of the catalog call latency histograms
+LATENCY_BINS = ( 0.01, 0.1, 1., 10., 100. )
+
+# Pools of threads per size, and the process they belong to
+gCatalogsPools = {}
+gCatalogsPoolsPid = None
+gCatalogsPoolLock = threading.Lock()
+gCatalogLatencies = {}
+gCatalogLatenciesLock = threading.Lock()
+
+def getCatalogsPool( maxThreads ):
+  """ The pool of maxThreads threads shared by the FileCatalog objects of the process
+  """
+  global gCatalogsPoolsPid
+  with gCatalogsPoolLock:
+    if gCatalogsPoolsPid != os.getpid():
+      # The pools of the parent process have no threads in a forked child, they are
+      # just dropped: terminating them would wait for these threads forever
+      gCatalogsPools.clear()
+      gCatalogsPoolsPid = os.getpid()
+    if maxThreads not in gCatalogsPools:
+      gCatalogsPools[maxThreads] = ThreadPool( maxThreads )
+    return gCatalogsPools[maxThreads]
+
+def getCatalogLatencies():
+  """ Histograms of the duration of the calls done to each catalog
+
+      :return: { catalogName : [ number of calls in each bin of LATENCY_BINS, number of longer calls ] }
+  """
+  with gCatalogLatenciesLock:
+    return dict( ( catalogName, list( histogram ) ) for catalogName, histogram in gCatalogLatencies.items() )
+
+def _recordLatency( catalogName, duration ):
+  """ Add a call duration to the histogram of the catalog
+  """
+  binIndex = len( [upperBound for upperBound in LATENCY_BINS if duration > upperBound] )
+  with gCatalogLatenciesLock:
+    histogram = gCatalogLatencies.setdefault( catalogName, [0] * ( len( LATENCY_BINS ) + 1 ) )
+    histogram[binIndex] += 1
+
 
 class FileCatalog( object ):
 
@@ -75,6 +126,8 @@ class FileCatalog( object ):
     self.log = gLogger.getSubLogger( "FileCatalog" )
 
     self.opHelper = Operations( vo = self.vo )
+    self.parallelCalls = self.opHelper.getValue( '/Services/Catalogs/ParallelCalls', False )
+    self.maxThreads = self.opHelper.getValue( '/Services/Catalogs/MaxThreads', 4 )
 
     catalogList = []
     if isinstance( catalogs, basestring ):
@@ -204,78 +257,88 @@ class FileCatalog( object ):
       allLfns = fileInfo.keys()
       parms1 = parms[1:]
 
-    for catalogName, oCatalog, master in self.writeCatalogs:
+    # The master catalog is called alone first since its failures decide what is done on the others,
+    # which do not depend on each other
+    masterCatalogs = [catalog for catalog in self.writeCatalogs if catalog[2]]
+    otherCatalogs = [catalog for catalog in self.writeCatalogs if not catalog[2]]
+    for catalogs in ( masterCatalogs, otherCatalogs ):
 
-      # Skip if the method is not implemented in this catalog
-      # NOTE: it is impossible for the master since the write method list is populated
-      # only from the master catalog, and if the method is not there, __getattr__
-      # would raise an exception
-      if not oCatalog.hasCatalogMethod( self.call ):
-        continue
+      calls = []
+      for catalogName, oCatalog, master in catalogs:
 
-      method = getattr( oCatalog, self.call )
+        # Skip if the method is not implemented in this catalog
+        # NOTE: it is impossible for the master since the write method list is populated
+        # only from the master catalog, and if the method is not there, __getattr__
+        # would raise an exception
+        if not oCatalog.hasCatalogMethod( self.call ):
+          continue
 
-      if self.call in self.no_lfn_methods:
-        result = method( *parms, **kws )
-      else:
-        if isinstance( specialConditions, dict ):
-          condition = specialConditions.get( catalogName )
-        else:
-          condition = specialConditions
-        # Check whether this catalog should be used for this method
-        res = self.condParser( catalogName, self.call, fileInfo, condition = condition )
-        # condParser never returns S_ERROR
-        condEvals = res['Value']['Successful']
-        # For a master catalog, ALL the lfns should be valid
-        if master:
-          if any([not valid for valid in condEvals.values()]):
-            gLogger.error( "The master catalog is not valid for some LFNS", condEvals )
-            return S_ERROR( "The master catalog is not valid for some LFNS %s" % condEvals )
+        method = getattr( oCatalog, self.call )
 
-        validLFNs = dict( ( lfn, fileInfo[lfn] ) for lfn in condEvals if condEvals[lfn] )
+        if self.call in self.no_lfn_methods:
+          calls.append( ( catalogName, master, method, parms ) )
+        else:
+          if isinstance( specialConditions, dict ):
+            condition = specialConditions.get( catalogName )
+          else:
+            condition = specialConditions
+          # Check whether this catalog should be used for this method
+          res = self.condParser( catalogName, self.call, fileInfo, condition = condition )
+          # condParser never returns S_ERROR
+          condEvals = res['Value']['Successful']
+          # For a master catalog, ALL the lfns should be valid
+          if master:
+            if any([not valid for valid in condEvals.values()]):
+              gLogger.error( "The master catalog is not valid for some LFNS", condEvals )
+              return S_ERROR( "The master catalog is not valid for some LFNS %s" % condEvals )
 
-        # We can skip the execution without worry,
-        # since at this level it is for sure not a master catalog
-        if not validLFNs:
-          gLogger.debug( "No valid LFN, skipping the call" )
-          continue
+          validLFNs = dict( ( lfn, fileInfo[lfn] ) for lfn in condEvals if condEvals[lfn] )
 
-        invalidLFNs = [lfn for lfn in condEvals if not condEvals[lfn]]
+          # We can skip the execution without worry,
+          # since at this level it is for sure not a master catalog
+          if not validLFNs:
+            gLogger.debug( "No valid LFN, skipping the call" )
+            continue
 
-        if invalidLFNs:
-          gLogger.debug( "Some LFNs are not valid for operation '%s' on catalog '%s' : %s" % ( self.call, catalogName,
-                                                                                               invalidLFNs ) )
+          invalidLFNs = [lfn for lfn in condEvals if not condEvals[lfn]]
 
+          if invalidLFNs:
+            gLogger.debug( "Some LFNs are not valid for operation '%s' on catalog '%s' : %s" % ( self.call, catalogName,
+                                                                                                 invalidLFNs ) )
 
-        result = method( validLFNs, *parms1, **kws )
+          calls.append( ( catalogName, master, method, ( validLFNs, ) + tuple( parms1 ) ) )
 
+      results = self._executeCalls( [( catalogName, method, args ) for catalogName, _master, method, args in calls],
+                                    kws )
 
-      if master:
-        masterResult = result
+      for ( catalogName, master, _method, _args ), result in zip( calls, results ):
 
-      if not result['OK']:
         if master:
-          # If this is the master catalog and it fails we don't want to continue with the other catalogs
-          self.log.error( "Failed to execute call on master catalog",
-                          "%s on %s: %s" % ( self.call, catalogName, result['Message'] ) )
-          return result
+          masterResult = result
+
+        if not result['OK']:
+          if master:
+            # If this is the master catalog and it fails we don't want to continue with the other catalogs
+            self.log.error( "Failed to execute call on master catalog",
+                            "%s on %s: %s" % ( self.call, catalogName, result['Message'] ) )
+            return result
+          else:
+            # Otherwise we keep the failed catalogs so we can update their state later
+            failedCatalogs[catalogName] = result['Message']
         else:
-          # Otherwise we keep the failed catalogs so we can update their state later
-          failedCatalogs[catalogName] = result['Message']
-      else:
-        successfulCatalogs[catalogName] = result['Value']
-
-      if allLfns:
-        if result['OK']:
-          for lfn, message in result['Value']['Failed'].items():
-            # Save the error message for the failed operations
-            failed.setdefault( lfn, {} )[catalogName] = message
-            if master:
-              # If this is the master catalog then we should not attempt the operation on other catalogs
-              fileInfo.pop( lfn, None )
-          for lfn, result in result['Value']['Successful'].items():
-            # Save the result return for each file for the successful operations
-            successful.setdefault( lfn, {} )[catalogName] = result
+          successfulCatalogs[catalogName] = result['Value']
+
+        if allLfns:
+          if result['OK']:
+            for lfn, message in result['Value']['Failed'].items():
+              # Save the error message for the failed operations
+              failed.setdefault( lfn, {} )[catalogName] = message
+              if master:
+                # If this is the master catalog then we should not attempt the operation on other catalogs
+                fileInfo.pop( lfn, None )
+            for lfn, result in result['Value']['Successful'].items():
+              # Save the result return for each file for the successful operations
+              successful.setdefault( lfn, {} )[catalogName] = result
 
     if allLfns:
       # This recovers the states of the files that completely failed i.e. when S_ERROR is returned by a catalog
@@ -301,14 +364,16 @@ class FileCatalog( object ):
     """
     successful = {}
     failed = {}
-    for _catalogName, oCatalog, _master in self.readCatalogs:
+    calls = []
+    for catalogName, oCatalog, _master in self.readCatalogs:
 
       # Skip if the method is not implemented in this catalog
       if not oCatalog.hasCatalogMethod( self.call ):
         continue
 
-      method = getattr( oCatalog, self.call )
-      res = method( *parms, **kws )
+      calls.append( ( catalogName, getattr( oCatalog, self.call ), parms ) )
+
+    for res in self._executeCalls( calls, kws ):
       if res['OK']:
         if 'Successful' in res['Value']:
           for key, item in res['Value']['Successful'].items():
@@ -323,6 +388,35 @@ class FileCatalog( object ):
       return S_ERROR( DErrno.EFCERR, "Failed to perform %s from any catalog" % self.call )
     return S_OK( {'Failed':failed, 'Successful':successful} )
 
+  def _executeCalls( self, calls, kws ):
+    """ Call the catalog methods, concurrently if ParallelCalls is set
+
+        :param calls: list of ( catalogName, method, args )
+        :param kws: keyword arguments given to all the methods
+        :return: the results, in the same order as the calls. In sequence, a method is only
+                 called when its result is read, so that the caller can stop at any result
+    """
+    if not self.parallelCalls or len( calls ) < 2:
+      return ( self._timedCall( catalogName, method, args, kws, None ) for catalogName, method, args in calls )
+
+    # The identity of the caller has to follow the call in the threads of the pool
+    threadConfig = ThreadConfig().dump()
+    pool = getCatalogsPool( self.maxThreads )
+    return pool.map( lambda call: self._timedCall( call[0], call[1], call[2], kws, threadConfig ), calls )
+
+  def _timedCall( self, catalogName, method, args, kws, threadConfig ):
+    """ Execute one catalog method, keeping track of its duration
+    """
+    if threadConfig:
+      ThreadConfig().load( threadConfig )
+    startTime = time.time()
+    try:
+      return method( *args, **kws )
+    finally:
+      duration = time.time() - startTime
+      _recordLatency( catalogName, duration )
+      self.log.verbose( "Catalog call", "%s on %s: %.3f s" % ( self.call, catalogName, duration ) )
+
   ###########################################################################################
   #
   # Below is the method for obtaining the objects instantiated for a provided catalogue configuration
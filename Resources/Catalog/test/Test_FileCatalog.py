@@ -2,12 +2,15 @@
    Testing the FileCatalog logic
 """
 
+import os
 import sys
+import time
+import signal
 import unittest
 import mock
 
 import DIRAC
-from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
+from DIRAC.Resources.Catalog.FileCatalog import FileCatalog, getCatalogLatencies, getCatalogsPool
 
 from DIRAC import S_OK, S_ERROR
 
@@ -409,9 +412,108 @@ class TestRead( unittest.TestCase ):
     self.assertEqual( ['c1'], res['Value']['Successful'][lfn].keys() )
     self.assertEqual( ['c2'], res['Value']['Failed'][lfn].keys() )
 
+
+
+def mock_operations_getValue( option, default = None ):
+  """ Enables the ParallelCalls option """
+  if option.endswith( 'ParallelCalls' ):
+    return True
+  return default
+
+
+class ParallelMixin( object ):
+  """ Runs the tests with the catalogs called concurrently """
+
+  def setUp( self ):
+    patcher = mock.patch( 'DIRAC.Resources.Catalog.FileCatalog.Operations' )
+    mk_operations = patcher.start()
+    mk_operations.return_value.getValue.side_effect = mock_operations_getValue
+    self.addCleanup( patcher.stop )
+
+
+class TestWriteParallel( ParallelMixin, TestWrite ):
+  """ Same tests of the w_execute method, calling the catalogs concurrently """
+
+  @mock.patch.object( DIRAC.Resources.Catalog.FileCatalog.FileCatalog, '_getSelectedCatalogs',
+                      side_effect = mock_fc_getSelectedCatalogs, autospec = True )  # autospec is for the binding of the method...
+  @mock.patch.object( DIRAC.Resources.Catalog.FileCatalog.FileCatalog, '_getEligibleCatalogs',
+                      side_effect = mock_fc_getEligibleCatalogs, autospec = True )  # autospec is for the binding of the method...
+  def test_04_latencies( self, mk_getSelectedCatalogs, mk_getEligibleCatalogs ):
+    """ Test that the parallel mode is used and the calls are counted """
+
+    fc = FileCatalog( catalogs = ['c1_True_True_True_2_0_2_0', 'c2_False_True_True_3_0_1_0',
+                                  'c3_False_True_True_3_0_1_0'] )
+    self.assertTrue( fc.parallelCalls )
+
+    before = getCatalogLatencies()
+    res = fc.write1( ['/lhcb/lfn1', '/lhcb/c3/Failed'] )
+    self.assertTrue( res['OK'] )
+    self.assertEqual( sorted( res['Value']['Successful']['/lhcb/lfn1'] ), ['c1', 'c2', 'c3'] )
+    self.assertEqual( res['Value']['Failed']['/lhcb/c3/Failed'].keys(), ['c3'] )
+    after = getCatalogLatencies()
+    for catalogName in ( 'c1', 'c2', 'c3' ):
+      self.assertEqual( sum( after[catalogName] ) - sum( before.get( catalogName, [] ) ), 1 )
+
+
+class TestReadParallel( ParallelMixin, TestRead ):
+  """ Same tests of the r_execute method, calling the catalogs concurrently """
+
+
+class TestCalls( unittest.TestCase ):
+  """ Tests of the execution of the calls """
+
+  @mock.patch.object( DIRAC.Resources.Catalog.FileCatalog.FileCatalog, '_getSelectedCatalogs',
+                      side_effect = mock_fc_getSelectedCatalogs, autospec = True )  # autospec is for the binding of the method...
+  @mock.patch.object( DIRAC.Resources.Catalog.FileCatalog.FileCatalog, '_getEligibleCatalogs',
+                      side_effect = mock_fc_getEligibleCatalogs, autospec = True )  # autospec is for the binding of the method...
+  def test_01_sequentialStop( self, mk_getSelectedCatalogs, mk_getEligibleCatalogs ):
+    """ In sequence, a catalog is not called when the caller stopped at the previous result """
+
+    fc = FileCatalog( catalogs = ['c1_False_True_True_2_0_2_0', 'c2_False_True_True_2_0_2_0'] )
+    self.assertFalse( fc.parallelCalls )
+    fc.call = 'read1'
+    first = mock.Mock( return_value = S_OK() )
+    second = mock.Mock( return_value = S_OK() )
+    results = fc._executeCalls( [( 'c1', first, () ), ( 'c2', second, () )], {} )
+    self.assertTrue( next( results )['OK'] )
+    first.assert_called_once_with()
+    second.assert_not_called()
+
+  def test_02_poolSize( self ):
+    """ FileCatalogs with different MaxThreads get their own pool """
+
+    self.assertTrue( getCatalogsPool( 2 ) is getCatalogsPool( 2 ) )
+    self.assertTrue( getCatalogsPool( 3 ) is not getCatalogsPool( 2 ) )
+    self.assertEqual( getCatalogsPool( 3 )._processes, 3 )
+
+  def test_03_fork( self ):
+    """ A forked process gets a new pool instead of the one of its parent, which has no threads there """
+
+    self.assertEqual( getCatalogsPool( 2 ).map( abs, [-1, -2] ), [1, 2] )
+    pid = os.fork()
+    if not pid:
+      try:
+        os._exit( 0 if getCatalogsPool( 2 ).map( abs, [-1, -2] ) == [1, 2] else 1 )
+      finally:
+        os._exit( 2 )
+    for _ in range( 100 ):
+      donePid, status = os.waitpid( pid, os.WNOHANG )
+      if donePid:
+        break
+      time.sleep( 0.1 )
+    else:
+      os.kill( pid, signal.SIGKILL )
+      os.waitpid( pid, 0 )
+      self.fail( "The pool of the parent process was used in the child" )
+    self.assertEqual( status, 0 )
+
+
 if __name__ == '__main__':
   suite = unittest.defaultTestLoader.loadTestsFromTestCase( TestInitialization )
   suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( TestWrite ) )
   suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( TestRead ) )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( TestWriteParallel ) )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( TestReadParallel ) )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( TestCalls ) )
 
   unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -71,15 +71,6 @@ class StorageManagementDB(DB):
         'PinExpiryTime']
     self.STATES = ['Failed', 'New', 'Waiting', 'Offline', 'StageSubmitted', 'Staged']
 
-  def __getConnection(self, connection):
-    if connection:
-      return connection
-    res = self._getConnection()
-    if res['OK']:
-      return res['Value']
-    gLogger.warn("Failed to get MySQL connection", res['Message'])
-    return connection
-
   def _caller(self):
     return inspect.stack()[2][3]
   ################################################################
@@ -91,7 +82,6 @@ class StorageManagementDB(DB):
     return self.__updateTaskStatus(taskIDs, newTaskStatus, connection=connection)
 
   def __updateTaskStatus(self, taskIDs, newTaskStatus, force=False, connection=False):
-    connection = self.__getConnection(connection)
     if not taskIDs:
       return S_OK(taskIDs)
     if force:
@@ -140,7 +130,6 @@ class StorageManagementDB(DB):
     return S_OK(toUpdate)
 
   def _checkTaskUpdate(self, taskIDs, newTaskState, connection=False):
-    connection = self.__getConnection(connection)
     if not taskIDs:
       return S_OK(taskIDs)
     # * -> Failed
@@ -174,7 +163,6 @@ class StorageManagementDB(DB):
     return S_OK(toUpdate)
 
   def updateReplicaStatus(self, replicaIDs, newReplicaStatus, connection=False):
-    connection = self.__getConnection(connection)
     if not replicaIDs:
       return S_OK(replicaIDs)
     res = self._checkReplicaUpdate(replicaIDs, newReplicaStatus)
@@ -284,7 +272,6 @@ class StorageManagementDB(DB):
     return self.getCacheReplicas({'TaskID': taskIDs})
 
   def _checkReplicaUpdate(self, replicaIDs, newReplicaState, connection=False):
-    connection = self.__getConnection(connection)
     if not replicaIDs:
       return S_OK(replicaIDs)
     # * -> Failed
@@ -319,7 +306,6 @@ class StorageManagementDB(DB):
     return replicaState
 
   def updateStageRequestStatus(self, replicaIDs, newStageStatus, connection=False):
-    connection = self.__getConnection(connection)
     if not replicaIDs:
       return S_OK(replicaIDs)
     res = self._checkStageUpdate(replicaIDs, newStageStatus, connection=connection)
@@ -368,7 +354,6 @@ class StorageManagementDB(DB):
     return S_OK(toUpdate)
 
   def _checkStageUpdate(self, replicaIDs, newStageState, connection=False):
-    connection = self.__getConnection(connection)
     if not replicaIDs:
       return S_OK(replicaIDs)
     # * -> Failed
@@ -404,7 +389,6 @@ class StorageManagementDB(DB):
   #
   def getTaskStatus(self, taskID, connection=False):
     """ Obtain the task status from the Tasks table. """
-    connection = self.__getConnection(connection)
     res = self.getTaskInfo(taskID, connection=connection)
     if not res['OK']:
       return res
@@ -413,7 +397,6 @@ class StorageManagementDB(DB):
 
   def getTaskInfo(self, taskID, connection=False):
     """ Obtain all the information from the Tasks table for a supplied task. """
-    connection = self.__getConnection(connection)
     req = "SELECT TaskID,Status,Source,SubmitTime,CompleteTime,CallBackMethod,SourceTaskID from Tasks WHERE TaskID IN (%s);" % intListToString(
         taskID)
     res = self._query(req, connection)
@@ -439,7 +422,6 @@ class StorageManagementDB(DB):
 
   def _getTaskIDForJob(self, jobID, connection=False):
     # Stager taskID is retrieved from the source DIRAC jobID
-    connection = self.__getConnection(connection)
     req = "SELECT TaskID from Tasks WHERE SourceTaskID=%s;" % int(jobID)
     res = self._query(req)
     if not res['OK']:
@@ -451,7 +433,6 @@ class StorageManagementDB(DB):
 
   def getTaskSummary(self, jobID, connection=False):
     """ Obtain the task summary from the database. """
-    connection = self.__getConnection(connection)
     res = self._getTaskIDForJob(jobID, connection=connection)
     if not res['OK']:
       return res
@@ -488,7 +469,6 @@ class StorageManagementDB(DB):
           limit=None,
           connection=False):
     """ Get stage requests for the supplied selection with support for web standard structure """
-    connection = self.__getConnection(connection)
     req = "SELECT %s FROM Tasks" % (intListToString(self.TASKPARAMS))
     if condDict or older or newer:
       if 'ReplicaID' in condDict:
@@ -529,7 +509,6 @@ class StorageManagementDB(DB):
           limit=None,
           connection=False):
     """ Get cache replicas for the supplied selection with support for the web standard structure """
-    connection = self.__getConnection(connection)
     req = "SELECT %s FROM CacheReplicas" % (intListToString(self.REPLICAPARAMS))
     if condDict or older or newer:
       if 'TaskID' in condDict:
@@ -575,7 +554,6 @@ class StorageManagementDB(DB):
           limit=None,
           connection=False):
     """ Get stage requests for the supplied selection with support for web standard structure """
-    connection = self.__getConnection(connection)
     req = "SELECT %s FROM StageRequests" % (intListToString(self.STAGEPARAMS))
     if condDict or older or newer:
       if 'TaskID' in condDict:
@@ -644,7 +622,6 @@ class StorageManagementDB(DB):
 
   def setRequest(self, lfnDict, source, callbackMethod, sourceTaskID, connection=False):
     """ This method populates the StorageManagementDB Tasks table with the requested files. """
-    connection = self.__getConnection(connection)
     if not lfnDict:
       return S_ERROR("No files supplied in request")
     # The first step is to create the task in the Tasks table
@@ -700,13 +677,11 @@ class StorageManagementDB(DB):
 
   def _cleanTask(self, taskID, connection=False):
     """ Remove a task and any related information """
-    connection = self.__getConnection(connection)
     self.removeTasks([taskID], connection=connection)
     self.removeUnlinkedReplicas(connection=connection)
 
   def _createTask(self, source, callbackMethod, sourceTaskID, connection=False):
     """ Enter the task details into the Tasks table """
-    connection = self.__getConnection(connection)
     req = "INSERT INTO Tasks (Source,SubmitTime,CallBackMethod,SourceTaskID) VALUES ('%s',UTC_TIMESTAMP(),'%s','%s');" % (
         source, callbackMethod, sourceTaskID)
     res = self._update(req, connection)
@@ -729,7 +704,6 @@ class StorageManagementDB(DB):
 
   def _getExistingReplicas(self, storageElement, lfns, connection=False):
     """ Obtains the ReplicasIDs for the replicas already entered in the CacheReplicas table """
-    connection = self.__getConnection(connection)
     req = "SELECT ReplicaID,LFN,Status FROM CacheReplicas WHERE SE = '%s' AND LFN IN (%s);" % (
         storageElement, stringListToString(lfns))
     res = self._query(req, connection)
@@ -745,7 +719,6 @@ class StorageManagementDB(DB):
 
   def _insertReplicaInformation(self, lfn, storageElement, rType, connection=False):
     """ Enter the replica into the CacheReplicas table """
-    connection = self.__getConnection(connection)
     req = "INSERT INTO CacheReplicas (Type,SE,LFN,PFN,Size,FileChecksum,GUID,SubmitTime,LastUpdate) VALUES ('%s','%s','%s','',0,'','',UTC_TIMESTAMP(),UTC_TIMESTAMP());" % (
         rType, storageElement, lfn)
     res = self._update(req, connection)
@@ -770,7 +743,6 @@ class StorageManagementDB(DB):
 
   def _insertTaskReplicaInformation(self, taskID, replicaIDs, connection=False):
     """ Enter the replicas into TaskReplicas table """
-    connection = self.__getConnection(connection)
     req = "INSERT INTO TaskReplicas (TaskID,ReplicaID) VALUES "
     for replicaID, _status in replicaIDs:
       replicaString = "(%s,%s)," % (taskID, replicaID)
@@ -796,7 +768,6 @@ class StorageManagementDB(DB):
   ####################################################################
 
   def getStagedReplicas(self, connection=False):
-    connection = self.__getConnection(connection)
     req = "SELECT TR.TaskID, R.Status, COUNT(*) from TaskReplicas as TR, CacheReplicas as R where TR.ReplicaID=R.ReplicaID GROUP BY TR.TaskID,R.Status;"
     res = self._query(req, connection)
     if not res['OK']:
@@ -813,7 +784,6 @@ class StorageManagementDB(DB):
     return self.getCacheReplicas({'Status': 'Staged', 'TaskID': goodTasks}, connection=connection)
 
   def getWaitingReplicas(self, connection=False):
-    connection = self.__getConnection(connection)
     req = "SELECT TR.TaskID, R.Status, COUNT(*) from TaskReplicas as TR, CacheReplicas as R where TR.ReplicaID=R.ReplicaID GROUP BY TR.TaskID,R.Status;"
     res = self._query(req, connection)
     if not res['OK']:
@@ -835,7 +805,6 @@ class StorageManagementDB(DB):
   ####################################################################
 
   def getOfflineReplicas(self, connection=False):
-    connection = self.__getConnection(connection)
     req = "SELECT TR.TaskID, R.Status, COUNT(*) from TaskReplicas as TR, CacheReplicas as R where TR.ReplicaID=R.ReplicaID GROUP BY TR.TaskID,R.Status;"
     res = self._query(req, connection)
     if not res['OK']:
@@ -1170,7 +1139,6 @@ class StorageManagementDB(DB):
     """ Given SourceTaskIDs (jobs), this will cancel further staging of files for the corresponding tasks.
     The "cancel" is actually removing all stager DB records for these jobs.
     Care must be taken to NOT cancel staging of files that are requested also by other tasks. """
-    connection = self.__getConnection(connection)
 
     # get the TaskIDs
     req = "SELECT TaskID from Tasks WHERE SourceTaskID IN (%s);" % intListToString(sourceTaskIDs)
@@ -1209,7 +1177,6 @@ class StorageManagementDB(DB):
     return res
 
   def removeStageRequests(self, replicaIDs, connection=False):
-    connection = self.__getConnection(connection)
     req = "DELETE FROM StageRequests WHERE ReplicaID in (%s);" % intListToString(replicaIDs)
     res = self._update(req, connection)
     if not res['OK']:
@@ -1220,7 +1187,6 @@ class StorageManagementDB(DB):
 
   def removeTasks(self, taskIDs, connection=False):
     """ This will delete the entries from the TaskReplicas for the provided taskIDs. """
-    connection = self.__getConnection(connection)
     req = "DELETE FROM TaskReplicas WHERE TaskID IN (%s);" % intListToString(taskIDs)
     res = self._update(req, connection)
     if not res['OK']:
@@ -1261,7 +1227,6 @@ class StorageManagementDB(DB):
     """
     Reports breakdown of file number/size in different staging states across storage elements
     """
-    connection = self.__getConnection(connection)
     req = "SELECT DISTINCT(Status),SE,COUNT(*),sum(size)/(1024*1024*1024) FROM CacheReplicas GROUP BY Status,SE;"
     res = self._query(req, connection)
     if not res['OK']:
@@ -1284,7 +1249,6 @@ class StorageManagementDB(DB):
         If the Replica has been Staged,
         wait until StageRequest.PinExpiryTime and remove the StageRequest and CacheReplicas entries
     """
-    connection = self.__getConnection(connection)
     # First, check if there is a StageRequest and PinExpiryTime has arrived
     req = "select SR.ReplicaID from CacheReplicas CR,StageRequests SR WHERE CR.Links = 0 and CR.ReplicaID=SR.ReplicaID group by SR.ReplicaID HAVING max(SR.PinExpiryTime) < UTC_TIMESTAMP();"
     # req = "SELECT ReplicaID from CacheReplicas WHERE Links = 0;"
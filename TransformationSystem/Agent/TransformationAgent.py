@@ -15,6 +15,7 @@ from DIRAC.Core.Utilities.List import breakListIntoChunks, randomize
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.TransformationSystem.Client.TransformationClient import TransformationClient
 from DIRAC.TransformationSystem.Agent.TransformationAgentsUtilities import TransformationAgentsUtilities
+from DIRAC.TransformationSystem.Utilities.ReplicaCache import ReplicaCache
 from DIRAC.DataManagementSystem.Client.DataManager import DataManager
 
 __RCSID__ = "$Id$"
@@ -55,8 +56,6 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     # Validity of the cache
     self.replicaCache = None
     self.replicaCacheValidity = None
-    self.writingCache = False
-    self.removedFromCache = 0
 
     self.noUnusedDelay = 0
     self.unusedFiles = {}
@@ -87,7 +86,7 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     # clients
     self.transfClient = TransformationClient()
 
-    # for caching using a pickle file
+    # for caching the replicas in files, that other agents may share
     self.workDirectory = self.am_getWorkDirectory()
     self.cacheFile = os.path.join(self.workDirectory, 'ReplicaCache.pkl')
     self.controlDirectory = self.am_getControlDirectory()
@@ -96,8 +95,11 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     self.lastFileOffset = {}
 
     # Validity of the cache
-    self.replicaCache = {}
     self.replicaCacheValidity = self.am_getOption('ReplicaCacheValidity', 2)
+    cacheDirectory = self.am_getOption('ReplicaCacheDirectory', '') or self.workDirectory
+    if not os.path.exists(cacheDirectory):
+      os.makedirs(cacheDirectory)
+    self.replicaCache = ReplicaCache(cacheDirectory, validity=self.replicaCacheValidity * 86400)
 
     self.noUnusedDelay = self.am_getOption('NoUnusedDelay', 6)
 
@@ -126,7 +128,7 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
       while self.transInThread:
         time.sleep(2)
       self._logInfo("Threads are empty, terminating the agent...", method=method)
-    self.__writeCache()
+    self.replicaCache.compact()
     return S_OK()
 
   def execute(self):
@@ -241,8 +243,8 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     if not transFiles['Value']:
       return S_OK()
 
-    if transID not in self.replicaCache:
-      self.__readCache(transID)
+    # Get what was cached meanwhile by other agents
+    self.__readCache(transID)
     transFiles = transFiles['Value']
     unusedLfns = [f['LFN'] for f in transFiles]
     unusedFiles = len(unusedLfns)
@@ -445,21 +447,11 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     else:
       # If the cache needs to be cleaned
       self.__cleanCache(transID)
-    startTime = time.time()
-    dataReplicas = {}
     nLfns = len(lfns)
     self._logVerbose("Getting replicas for %d files" % nLfns, method=method, transID=transID)
-    cachedReplicaSets = self.replicaCache.get(transID, {})
-    cachedReplicas = {}
-    # Merge all sets of replicas
-    for replicas in cachedReplicaSets.itervalues():
-      cachedReplicas.update(replicas)
-    self._logInfo("Number of cached replicas: %d" % len(cachedReplicas), method=method, transID=transID)
-    setCached = set(cachedReplicas)
-    setLfns = set(lfns)
-    for lfn in setLfns & setCached:
-      dataReplicas[lfn] = cachedReplicas[lfn]
-    newLFNs = setLfns - setCached
+    self._logInfo("Number of cached replicas: %d" % self.__filesInCache(transID), method=method, transID=transID)
+    dataReplicas = self.replicaCache.getReplicas(transID, lfns)
+    newLFNs = set(lfns) - set(dataReplicas)
     self._logInfo("ReplicaCache hit for %d out of %d LFNs" % (len(dataReplicas), nLfns),
                   method=method, transID=transID)
     if newLFNs:
@@ -482,7 +474,6 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
                     method=method, transID=transID)
       dataReplicas.update(newReplicas)
       noReplicas = newLFNs - set(dataReplicas)
-      self.__writeCache(transID)
       if noReplicas:
         self._logWarn("Found %d files without replicas (or only in Failover)" % len(noReplicas),
                       method=method, transID=transID)
@@ -551,22 +542,17 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
   def __updateCache(self, transID, newReplicas):
     """ Add replicas to the cache
     """
-    self.replicaCache.setdefault(transID, {})[datetime.datetime.utcnow()] = newReplicas
-#    if len( newReplicas ) > 5000:
-#      self.__writeCache( transID )
+    self.replicaCache.addReplicas(transID, newReplicas)
 
   def __clearCacheForTrans(self, transID):
     """ Remove all replicas for a transformation
     """
-    self.replicaCache.pop(transID, None)
+    self.replicaCache.clear(transID)
 
   def __cleanReplicas(self, transID, lfns):
     """ Remove cached replicas that are not in a list
     """
-    cachedReplicas = set()
-    for replicas in self.replicaCache.get(transID, {}).itervalues():
-      cachedReplicas.update(replicas)
-    toRemove = cachedReplicas - set(lfns)
+    toRemove = set(self.replicaCache.getLFNs(transID)) - set(lfns)
     if toRemove:
       self._logInfo("Remove %d files from cache" % len(toRemove), method='__cleanReplicas', transID=transID)
       self.__removeFromCache(transID, toRemove)
@@ -575,18 +561,9 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     """ Cleans the cache
     """
     try:
-      if transID in self.replicaCache:
-        timeLimit = datetime.datetime.utcnow() - datetime.timedelta(days=self.replicaCacheValidity)
-        for updateTime in set(self.replicaCache[transID]):
-          nCache = len(self.replicaCache[transID][updateTime])
-          if updateTime < timeLimit or not nCache:
-            self._logInfo("Clear %s replicas for transformation %s, time %s" %
-                          ('%d cached' % nCache if nCache else 'empty cache', str(transID), str(updateTime)),
-                          transID=transID, method='__cleanCache')
-            del self.replicaCache[transID][updateTime]
-        # Remove empty transformations
-        if not self.replicaCache[transID]:
-          del self.replicaCache[transID]
+      nCache = self.replicaCache.expire(transID)
+      if nCache:
+        self._logInfo("Cleared %d expired cached replicas" % nCache, transID=transID, method='__cleanCache')
     except Exception as x:
       self._logException("Exception when cleaning replica cache:", lException=x)
 
@@ -594,75 +571,42 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     removed = self.__removeFromCache(transID, lfns)
     if removed:
       self._logInfo("Removed %d replicas from cache" % removed, method='__removeFilesFromCache', transID=transID)
-      self.__writeCache(transID)
 
   def __removeFromCache(self, transID, lfns):
-    if transID not in self.replicaCache:
-      return
-    removed = 0
-    if self.replicaCache[transID] and lfns:
-      for lfn in lfns:
-        for timeKey in self.replicaCache[transID]:
-          if self.replicaCache[transID][timeKey].pop(lfn, None):
-            removed += 1
-    return removed
+    if transID not in self.replicaCache or not lfns:
+      return 0
+    return self.replicaCache.removeReplicas(transID, lfns)
 
   def __cacheFile(self, transID):
     return self.cacheFile.replace('.pkl', '_%s.pkl' % str(transID))
 
   @gSynchro
   def __readCache(self, transID):
-    """ Reads from the cache
+    """ Reads from the cache what was added since the last read, converting the cache file
+        of the former format if any
     """
-    if transID in self.replicaCache:
-      return
+    method = '__readCache'
+    fileName = self.__cacheFile(transID)
     try:
-      method = '__readCache'
-      fileName = self.__cacheFile(transID)
-      if not os.path.exists(fileName):
-        self.replicaCache[transID] = {}
-      else:
+      if transID not in self.replicaCache and os.path.exists(fileName):
         with open(fileName, 'r') as cacheFile:
-          self.replicaCache[transID] = pickle.load(cacheFile)
-        self._logInfo("Successfully loaded replica cache from file %s (%d files)" %
-                      (fileName, self.__filesInCache(transID)),
-                      method=method, transID=transID)
+          oldCache = pickle.load(cacheFile)
+        # Replicas of that pickle file were cached at the time of their key
+        for updateTime, replicas in sorted(oldCache.iteritems()):
+          expiry = time.time() - (datetime.datetime.utcnow() - updateTime).total_seconds() + \
+              self.replicaCache.validity
+          if replicas and expiry > time.time():
+            self.replicaCache.addReplicas(transID, replicas, expiry=expiry)
+        os.remove(fileName)
+        self._logInfo("Converted replica cache file %s" % fileName, method=method, transID=transID)
     except Exception as x:
-      self._logException("Failed to load replica cache from file %s" % fileName, lException=x,
+      self._logException("Failed to convert replica cache file %s" % fileName, lException=x,
                          method=method, transID=transID)
-      self.replicaCache[transID] = {}
+    self.replicaCache.load(transID)
+    self._logVerbose("Replica cache of %d files" % self.__filesInCache(transID), method=method, transID=transID)
 
   def __filesInCache(self, transID):
-    cache = self.replicaCache.get(transID, {})
-    return sum(len(lfns) for lfns in cache.itervalues())
-
-  @gSynchro
-  def __writeCache(self, transID=None):
-    """ Writes the cache
-    """
-    method = '__writeCache'
-    try:
-      startTime = time.time()
-      transList = [transID] if transID else set(self.replicaCache)
-      filesInCache = 0
-      nCache = 0
-      for t_id in transList:
-        # Protect the copy of the cache
-        filesInCache += self.__filesInCache(t_id)
-        # write to a temporary file in order to avoid corrupted files
-        cacheFile = self.__cacheFile(t_id)
-        tmpFile = cacheFile + '.tmp'
-        with open(tmpFile, 'w') as fd:
-          pickle.dump(self.replicaCache.get(t_id, {}), fd)
-        # Now rename the file as it shold
-        os.rename(tmpFile, cacheFile)
-        nCache += 1
-      self._logInfo("Successfully wrote %d replica cache file(s) (%d files) in %.1f seconds"
-                    % (nCache, filesInCache, time.time() - startTime),
-                    method=method, transID=transID if transID else None)
-    except Exception as x:
-      self._logException("Could not write replica cache file %s" % cacheFile, lException=x,
-                         method=method, transID=t_id)
+    return self.replicaCache.filesInCache(transID)
 
   def __generatePluginObject(self, plugin, clients):
     """ This simply instantiates the TransformationPlugin class with the relevant plugin name
@@ -691,7 +635,6 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
       try:
         if transID in self.replicaCache:
           self._logInfo("Removed cached replicas for transformation", method='pluginCallBack', transID=transID)
-          self.replicaCache.pop(transID)
-          self.__writeCache(transID)
+          self.replicaCache.clear(transID)
       except:
         pass
@@ -19,7 +19,7 @@ from DIRAC.Core.Utilities.List import stringListToString, intListToString, break
 from DIRAC.Core.Utilities.Shifter import setupShifterProxyInEnv
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.Utilities.Subprocess import pythonCall
-from DIRAC.DataManagementSystem.Client.MetaQuery import MetaQuery
+from DIRAC.DataManagementSystem.Client.MetaQueryIndex import MetaQueryIndex
 
 __RCSID__ = "$Id$"
 
@@ -47,6 +47,8 @@ class TransformationDB(DB):
 
     self.lock = threading.Lock()
     self.filters = []
+    # Compiled self.filters, with the metadata types it was compiled for
+    self.filterIndex = None
     res = self.__updateFilters()
     if not res['OK']:
       gLogger.fatal("Failed to create filters")
@@ -143,7 +145,6 @@ class TransformationDB(DB):
                         connection=False):
     """ Add new transformation definition including its input streams
     """
-    connection = self.__getConnection(connection)
     res = self._getTransformationID(transName, connection=connection)
     if res['OK']:
       return S_ERROR("Transformation with name %s already exists with TransformationID = %d" % (transName,
@@ -176,6 +177,7 @@ class TransformationDB(DB):
     # If the transformation has an input data specification
     if fileMask:
       self.filters.append((transID, json.loads(fileMask)))
+      self.filterIndex = None
 
     if inheritedFrom:
       res = self._getTransformationID(inheritedFrom, connection=connection)
@@ -217,7 +219,6 @@ class TransformationDB(DB):
       filesToAdd = res['Value']
       gLogger.notice('filesToAdd', filesToAdd)
       if filesToAdd:
-        connection = self.__getConnection(connection)
         res = self.__addDataFiles(filesToAdd, connection=connection)
         if not res['OK']:
           return res
@@ -238,7 +239,6 @@ class TransformationDB(DB):
   def getTransformations(self, condDict=None, older=None, newer=None, timeStamp='LastUpdate',
                          orderAttribute=None, limit=None, extraParams=False, offset=None, connection=False):
     """ Get parameters of all the Transformations with support for the web standard structure """
-    connection = self.__getConnection(connection)
     req = "SELECT %s FROM Transformations %s" % (intListToString(self.TRANSPARAMS),
                                                  self.buildCondition(condDict, older, newer, timeStamp,
                                                                      orderAttribute, limit, offset=offset))
@@ -319,7 +319,6 @@ class TransformationDB(DB):
 
   def __getTableDistinctAttributeValues(self, table, possible, attributes, selectDict, older, newer,
                                         timeStamp, connection=False):
-    connection = self.__getConnection(connection)
     attributeValues = {}
     for attribute in attributes:
       if possible and (attribute not in possible):
@@ -383,6 +382,7 @@ class TransformationDB(DB):
       if mask:
         resultList.append((transID, json.loads(mask)))
     self.filters = resultList
+    self.filterIndex = None
     return S_OK(resultList)
 
   def __filterFile(self, lfn, filters=None):
@@ -525,7 +525,6 @@ class TransformationDB(DB):
   def getTransformationFiles(self, condDict=None, older=None, newer=None, timeStamp='LastUpdate',
                              orderAttribute=None, limit=None, offset=None, connection=False):
     """ Get files for the supplied transformations with support for the web standard structure """
-    connection = self.__getConnection(connection)
     req = "SELECT %s FROM TransformationFiles" % (intListToString(self.TRANSFILEPARAMS))
     originalFileIDs = {}
     if condDict is None:
@@ -579,7 +578,6 @@ class TransformationDB(DB):
 
   def getFileSummary(self, lfns, connection=False):
     """ Get file status summary in all the transformations """
-    connection = self.__getConnection(connection)
     condDict = {'LFN': lfns}
     res = self.getTransformationFiles(condDict=condDict, connection=connection)
     if not res['OK']:
@@ -783,7 +781,6 @@ class TransformationDB(DB):
   def getTransformationTasks(self, condDict=None, older=None, newer=None, timeStamp='CreationTime',
                              orderAttribute=None, limit=None, inputVector=False,
                              offset=None, connection=False):
-    connection = self.__getConnection(connection)
     req = "SELECT %s FROM TransformationTasks %s" % (intListToString(self.TASKSPARAMS),
                                                      self.buildCondition(condDict, older, newer, timeStamp,
                                                                          orderAttribute, limit, offset=offset))
@@ -924,7 +921,6 @@ class TransformationDB(DB):
   def getTransformationTaskStats(self, transName='', connection=False):
     """ Returns dictionary with number of jobs per status for the given production.
     """
-    connection = self.__getConnection(connection)
     if transName:
       res = self._getTransformationID(transName, connection=connection)
       if not res['OK']:
@@ -1248,6 +1244,10 @@ class TransformationDB(DB):
         return S_ERROR("Not all supplied files available in the transformation database")
 
     # Insert the task into the jobs table and retrieve the taskID
+    # The ID is read back on the connection of the insert, which is kept for the two queries
+    res = self._getConnection()
+    if not res['OK']:
+      return res
     self.lock.acquire()
     req = "INSERT INTO TransformationTasks(TransformationID, ExternalStatus, ExternalID, TargetSE,"
     req = req + " CreationTime, LastUpdateTime)"
@@ -1255,6 +1255,7 @@ class TransformationDB(DB):
     res = self._update(req, connection)
     if not res['OK']:
       self.lock.release()
+      self._releaseConnection()
       gLogger.error("Failed to publish task for transformation", res['Message'])
       return res
 
@@ -1267,6 +1268,7 @@ class TransformationDB(DB):
       res = self._query("SELECT LAST_INSERT_ID();", connection)
 
     self.lock.release()
+    self._releaseConnection()
     if not res['OK']:
       return res
     taskID = int(res['Value'][0][0])
@@ -1286,7 +1288,6 @@ class TransformationDB(DB):
   def extendTransformation(self, transName, nTasks, author='', connection=False):
     """ Extend SIMULATION type transformation by nTasks number of tasks
     """
-    connection = self.__getConnection(connection)
     res = self.getTransformation(transName, connection=connection)
     if not res['OK']:
       gLogger.error("Failed to get transformation details", res['Message'])
@@ -1374,17 +1375,7 @@ class TransformationDB(DB):
       req = "%s %s" % (req, self.buildCondition(selectDict))
     return self._update(req, connection)
 
-  def __getConnection(self, connection):
-    if connection:
-      return connection
-    res = self._getConnection()
-    if res['OK']:
-      return res['Value']
-    gLogger.warn("Failed to get MySQL connection", res['Message'])
-    return connection
-
   def _getConnectionTransID(self, connection, transName):
-    connection = self.__getConnection(connection)
     res = self._getTransformationID(transName, connection=connection)
     if not res['OK']:
       gLogger.error("Failed to get ID for transformation", res['Message'])
@@ -1468,7 +1459,6 @@ class TransformationDB(DB):
     gLogger.info("TransformationDB.removeFile: Attempting to remove %s files." % len(lfns))
     failed = {}
     successful = {}
-    connection = self.__getConnection(connection)
     if not lfns:
       return S_ERROR("No LFNs supplied")
     res = self.__getFileIDsForLfns(lfns, connection=connection)
@@ -1586,7 +1576,6 @@ class TransformationDB(DB):
 
   def _filterFileByMetadata(self, metadatadict):
     """Pass the input metadatadict through those currently active"""
-    transIDs = []
     queries = self.filters
     catalog = FileCatalog()
     gLogger.info('Filter file by queries', queries)
@@ -1601,17 +1590,21 @@ class TransformationDB(DB):
     typeDict = res['Value']['FileMetaFields']
     typeDict.update(res['Value']['DirectoryMetaFields'])
 
-    for transID, query in queries:
-      mq = MetaQuery(query, typeDict)
-      gLogger.info("Apply query %s to metadata %s" % (mq.getMetaQuery(), metadatadict))
-      res = mq.applyQuery(metadatadict)
-      if not res['OK']:
-        gLogger.error("Error in applying query: %s" % res['Message'])
-        return res
-      elif res['Value']:
-        gLogger.info("Apply query result is True")
-        transIDs.append(transID)
-      else:
-        gLogger.info("Apply query result is False")
+    # The filters are compiled once, and again only when they or the metadata types change
+    filterIndex = self.filterIndex
+    if filterIndex is None or filterIndex[0] != typeDict:
+      filterIndex = (typeDict,
+                     MetaQueryIndex([(queryNb, query) for queryNb, (_transID, query) in enumerate(queries)],
+                                    typeDict),
+                     queries)
+      self.filterIndex = filterIndex
+    _typeDict, index, queries = filterIndex
+
+    res = index.match(metadatadict)
+    if not res['OK']:
+      gLogger.error("Error in applying query: %s" % res['Message'])
+      return res
+    transIDs = [queries[queryNb][0] for queryNb in sorted(res['Value'])]
+    gLogger.info("Queries matching metadata %s: %s" % (metadatadict, transIDs))
 
     return transIDs
@@ -0,0 +1,32 @@
+""" Test the filtering of the new files by the input filters of the transformations, without database
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+from mock import patch
+
+from DIRAC import S_OK
+from DIRAC.TransformationSystem.DB.TransformationDB import TransformationDB
+
+metadataFields = S_OK({'FileMetaFields': {'NumberOfEvents': 'int'},
+                       'DirectoryMetaFields': {'DataType': 'VARCHAR(128)', 'Energy': 'float'}})
+
+
+@patch('DIRAC.TransformationSystem.DB.TransformationDB.FileCatalog')
+def test_filterFileByMetadata(mockFileCatalog):
+  mockFileCatalog.return_value.getMetadataFields.return_value = metadataFields
+  transDB = TransformationDB.__new__(TransformationDB)
+  transDB.filters = [(12, {'DataType': 'RAW'}),
+                     (5, {'DataType': {'in': ['RAW', 'DST']}, 'Energy': {'>': 1.}}),
+                     (7, {'NumberOfEvents': {'<': 10}})]
+  transDB.filterIndex = None
+  assert transDB._filterFileByMetadata({'DataType': 'RAW', 'Energy': 2.}) == [12, 5]
+  assert transDB._filterFileByMetadata({'DataType': 'DST', 'Energy': 0.5, 'NumberOfEvents': 2}) == [7]
+  assert transDB._filterFileByMetadata({'DataType': 'MDST'}) == []
+
+  # The filters are compiled again when they change
+  transDB.filters = [(3, {'DataType': 'MDST'})]
+  transDB.filterIndex = None
+  assert transDB._filterFileByMetadata({'DataType': 'MDST'}) == [3]
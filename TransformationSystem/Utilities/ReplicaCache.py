@@ -0,0 +1,238 @@
+""" Cache of the replicas of the input files of the transformations, shared by the agents of a host
+
+    The cache of each transformation is kept in memory as { lfn : ( expiry, ses ) }, the LFNs being
+    interned and the tuples of SEs shared between all the files having the same replicas, which is the
+    case of most files. It is persisted in an append-only log per transformation in a directory that
+    several agents can share:
+
+    * each change is appended in one write, under a lock ( flock ) of the transformation,
+    * each agent reads only what was appended since its last read, up to the last complete line,
+    * when the log contains too many dead records, it is compacted: rewritten in a temporary file
+      renamed over the log, which the other agents detect by a change of inode and reload.
+
+    A log line is "+<TAB>expiry<TAB>se1,se2<TAB>lfn" to add replicas, "-<TAB>lfn" to remove a file
+    and "*" to clear the cache of the transformation.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import errno
+import fcntl
+import threading
+
+from DIRAC import gLogger
+
+# Compact the log when it has more than this many records, and twice as many as live entries
+COMPACTION_THRESHOLD = 10000
+
+
+class TransformationReplicas(object):
+  """ Replicas of the files of one transformation, and the state of its log """
+
+  def __init__(self):
+    self.entries = {}
+    self.records = 0
+    self.inode = None
+    self.offset = 0
+
+
+class ReplicaCache(object):
+  """ The replica cache of all the transformations, persisted in a directory
+  """
+
+  def __init__(self, directory, validity=2 * 86400, prefix='ReplicaCache'):
+    """ c'tor
+
+    :param str directory: directory of the log files, can be shared with other agents
+    :param int validity: time in seconds during which cached replicas are valid
+    :param str prefix: prefix of the log files
+    """
+    self.directory = directory
+    self.validity = validity
+    self.prefix = prefix
+    self.log = gLogger.getSubLogger('ReplicaCache')
+    self.lock = threading.RLock()
+    self.transformations = {}
+    # All the distinct tuples of SEs
+    self.seSets = {}
+
+  def __contains__(self, transID):
+    return transID in self.transformations
+
+  def logFile(self, transID):
+    return os.path.join(self.directory, '%s_%s.log' % (self.prefix, str(transID)))
+
+  def __getSEs(self, ses):
+    """ The shared tuple for this set of SEs """
+    ses = tuple(intern(str(se)) for se in ses)
+    return self.seSets.setdefault(ses, ses)
+
+  def __apply(self, cache, line, now):
+    """ Applies a record of the log to the in-memory cache """
+    cache.records += 1
+    if line[0] == '+':
+      _op, expiry, ses, lfn = line.split('\t', 3)
+      expiry = int(expiry)
+      if expiry > now:
+        cache.entries[intern(lfn)] = (expiry, self.__getSEs(ses.split(',') if ses else []))
+    elif line[0] == '-':
+      cache.entries.pop(line.split('\t', 1)[1], None)
+    elif line[0] == '*':
+      cache.entries.clear()
+
+  def load(self, transID):
+    """ Reads what was appended to the log of a transformation since the last load, or the whole
+        log if it was compacted or never read
+    """
+    with self.lock:
+      cache = self.transformations.setdefault(transID, TransformationReplicas())
+      fileName = self.logFile(transID)
+      try:
+        with open(fileName, 'r') as fd:
+          stat = os.fstat(fd.fileno())
+          inode = stat.st_ino
+          if inode != cache.inode or stat.st_size < cache.offset:
+            cache.entries.clear()
+            cache.records = 0
+            cache.inode = inode
+            cache.offset = 0
+          fd.seek(cache.offset)
+          data = fd.read()
+      except IOError as e:
+        if e.errno != errno.ENOENT:
+          self.log.exception("Failed to read replica cache file", fileName, lException=e)
+        return
+      # A record may be being appended by another agent
+      end = data.rfind('\n') + 1
+      now = int(time.time())
+      for line in data[:end].splitlines():
+        if line:
+          self.__apply(cache, line, now)
+      cache.offset += end
+
+  def __append(self, transID, lines):
+    """ Appends records to the log and applies them to the cache, other agents' records first """
+    fileName = self.logFile(transID)
+    try:
+      with self.__fileLock(transID):
+        self.load(transID)
+        with open(fileName, 'a') as fd:
+          fd.write(''.join(line + '\n' for line in lines))
+    except (IOError, OSError) as e:
+      self.log.exception("Failed to write replica cache file", fileName, lException=e)
+    self.load(transID)
+
+  def __fileLock(self, transID):
+    return _FileLock(self.logFile(transID) + '.lock')
+
+  def getReplicas(self, transID, lfns):
+    """ Cached replicas of the LFNs that have some and did not expire
+
+    :return: dict { lfn : list of SEs }
+    """
+    with self.lock:
+      entries = self.transformations.get(transID, TransformationReplicas()).entries
+      now = time.time()
+      replicas = {}
+      for lfn in lfns:
+        entry = entries.get(lfn)
+        if entry and entry[0] > now:
+          replicas[lfn] = list(entry[1])
+      return replicas
+
+  def filesInCache(self, transID):
+    with self.lock:
+      return len(self.transformations.get(transID, TransformationReplicas()).entries)
+
+  def getLFNs(self, transID):
+    """ All the files of a transformation in the cache """
+    with self.lock:
+      return list(self.transformations.get(transID, TransformationReplicas()).entries)
+
+  def addReplicas(self, transID, replicas, expiry=None):
+    """ Caches the replicas { lfn : list of SEs } of files
+
+    :param float expiry: time of expiry of these replicas, by default in validity seconds
+    """
+    if not replicas:
+      return
+    expiry = int(expiry if expiry is not None else time.time() + self.validity)
+    self.__append(transID, ['+\t%d\t%s\t%s' % (expiry, ','.join(ses), lfn) for lfn, ses in replicas.iteritems()])
+
+  def removeReplicas(self, transID, lfns):
+    """ Removes files from the cache
+
+    :return: number of files removed
+    """
+    self.load(transID)
+    with self.lock:
+      entries = self.transformations.get(transID, TransformationReplicas()).entries
+      toRemove = [lfn for lfn in lfns if lfn in entries]
+    if toRemove:
+      self.__append(transID, ['-\t%s' % lfn for lfn in toRemove])
+    return len(toRemove)
+
+  def clear(self, transID):
+    """ Removes all the files of a transformation """
+    self.__append(transID, ['*'])
+    self.compact(transID)
+
+  def expire(self, transID):
+    """ Drops the expired files of a transformation from memory, and compacts its log if worth it
+
+    :return: number of files dropped
+    """
+    with self.lock:
+      cache = self.transformations.get(transID)
+      if not cache:
+        return 0
+      now = time.time()
+      expired = [lfn for lfn, entry in cache.entries.iteritems() if entry[0] <= now]
+      for lfn in expired:
+        del cache.entries[lfn]
+      toCompact = cache.records > max(COMPACTION_THRESHOLD, 2 * len(cache.entries))
+    if toCompact:
+      self.compact(transID)
+    return len(expired)
+
+  def compact(self, transID=None):
+    """ Rewrites the log of a transformation, or of all of them, with only the live entries """
+    transList = [transID] if transID is not None else list(self.transformations)
+    for t_id in transList:
+      fileName = self.logFile(t_id)
+      tmpFile = fileName + '.tmp'
+      try:
+        with self.__fileLock(t_id):
+          self.load(t_id)
+          with self.lock:
+            cache = self.transformations[t_id]
+            now = time.time()
+            lines = ['+\t%d\t%s\t%s\n' % (expiry, ','.join(ses), lfn)
+                     for lfn, (expiry, ses) in cache.entries.iteritems() if expiry > now]
+            with open(tmpFile, 'w') as fd:
+              fd.write(''.join(lines))
+            os.rename(tmpFile, fileName)
+            cache.inode = os.stat(fileName).st_ino
+            cache.offset = os.path.getsize(fileName)
+            cache.records = len(lines)
+      except (IOError, OSError) as e:
+        self.log.exception("Failed to compact replica cache file", fileName, lException=e)
+
+
+class _FileLock(object):
+  """ Exclusive lock on a file, shared between processes """
+
+  def __init__(self, fileName):
+    self.fileName = fileName
+    self.fd = None
+
+  def __enter__(self):
+    self.fd = open(self.fileName, 'a')
+    fcntl.flock(self.fd, fcntl.LOCK_EX)
+    return self
+
+  def __exit__(self, *args):
+    fcntl.flock(self.fd, fcntl.LOCK_UN)
+    self.fd.close()
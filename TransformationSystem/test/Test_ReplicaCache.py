@@ -0,0 +1,91 @@
+""" Test the replica cache of the TransformationAgent, shared through its log files
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import shutil
+import tempfile
+
+import pytest
+
+from DIRAC.TransformationSystem.Utilities import ReplicaCache as moduleTested
+from DIRAC.TransformationSystem.Utilities.ReplicaCache import ReplicaCache
+
+
+@pytest.fixture
+def cacheDir():
+  directory = tempfile.mkdtemp()
+  yield directory
+  shutil.rmtree(directory)
+
+
+def test_addRemove(cacheDir):
+  cache = ReplicaCache(cacheDir)
+  cache.addReplicas(1, {'/vo/f1': ['SE1', 'SE2'], '/vo/f2': ['SE1', 'SE2'], '/vo/f3': ['SE3']})
+  assert cache.getReplicas(1, ['/vo/f1', '/vo/f3', '/vo/f4']) == {'/vo/f1': ['SE1', 'SE2'], '/vo/f3': ['SE3']}
+  assert cache.getReplicas(2, ['/vo/f1']) == {}
+  # Files with the same replicas share them
+  assert cache.transformations[1].entries['/vo/f1'][1] is cache.transformations[1].entries['/vo/f2'][1]
+  assert cache.removeReplicas(1, ['/vo/f1', '/vo/f4']) == 1
+  assert sorted(cache.getLFNs(1)) == ['/vo/f2', '/vo/f3']
+
+  # A new agent reads it all
+  newCache = ReplicaCache(cacheDir)
+  newCache.load(1)
+  assert newCache.getReplicas(1, ['/vo/f1', '/vo/f2', '/vo/f3']) == {'/vo/f2': ['SE1', 'SE2'], '/vo/f3': ['SE3']}
+  cache.clear(1)
+  newCache.load(1)
+  assert newCache.filesInCache(1) == 0
+
+
+def test_sharing(cacheDir):
+  cache1 = ReplicaCache(cacheDir)
+  cache2 = ReplicaCache(cacheDir)
+  cache1.addReplicas(1, {'/vo/f1': ['SE1']})
+  cache2.load(1)
+  offset = cache2.transformations[1].offset
+  cache2.addReplicas(1, {'/vo/f2': ['SE2']})
+  # Only the new record was read
+  assert cache2.transformations[1].offset > offset
+  cache1.load(1)
+  assert cache1.getReplicas(1, ['/vo/f1', '/vo/f2']) == {'/vo/f1': ['SE1'], '/vo/f2': ['SE2']}
+
+  # An incomplete record is not read before it is complete
+  with open(cache1.logFile(1), 'a') as fd:
+    fd.write('+\t%d\tSE3\t/vo/f3' % (time.time() + 100))
+  cache1.load(1)
+  assert cache1.filesInCache(1) == 2
+  with open(cache1.logFile(1), 'a') as fd:
+    fd.write('\n')
+  cache1.load(1)
+  assert cache1.getReplicas(1, ['/vo/f3']) == {'/vo/f3': ['SE3']}
+
+  # The other agent reloads the compacted log
+  cache2.removeReplicas(1, ['/vo/f1'])
+  cache2.compact(1)
+  cache1.load(1)
+  assert sorted(cache1.getLFNs(1)) == ['/vo/f2', '/vo/f3']
+  assert cache1.transformations[1].records == 2
+
+
+def test_expiry(cacheDir, mocker):
+  cache = ReplicaCache(cacheDir, validity=100)
+  cache.addReplicas(1, {'/vo/f1': ['SE1']})
+  cache.addReplicas(1, {'/vo/f2': ['SE1']}, expiry=time.time() + 10)
+  cache.addReplicas(1, {'/vo/f3': ['SE2']})
+  cache.removeReplicas(1, ['/vo/f3'])
+  mocker.patch.object(moduleTested, 'COMPACTION_THRESHOLD', 1)
+  mocker.patch.object(moduleTested.time, 'time', return_value=time.time() + 50)
+  assert cache.getReplicas(1, ['/vo/f1', '/vo/f2']) == {'/vo/f1': ['SE1']}
+  assert cache.expire(1) == 1
+  # Compacted as most of the records are dead
+  with open(cache.logFile(1)) as fd:
+    assert fd.read().count('\n') == 1
+  assert os.path.exists(cache.logFile(1))
+  newCache = ReplicaCache(cacheDir)
+  newCache.load(1)
+  assert newCache.getLFNs(1) == ['/vo/f1']
@@ -88,7 +88,7 @@ class PilotStatusAgent(AgentModule):
     # longer available) and declare them Deleted.
     result = self.handleOldPilots(connection)
 
-    connection.close()
+    self.pilotDB._releaseConnection()
 
     result = self.WMSAdministrator.clearPilots(self.clearPilotsDelay, self.clearAbortedDelay)
     if not result['OK']:
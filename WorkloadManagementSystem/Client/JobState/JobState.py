@@ -77,7 +77,7 @@ class JobState(object):
             JobState.__db.reset()
             break
           else:
-            result['Value'].close()
+            dbInstance._releaseConnection()
         except RuntimeError:
           JobState.__db.reset()
           break
@@ -27,8 +27,10 @@ class Matcher(object):
   """ Logic for matching
   """
 
-  def __init__(self, pilotAgentsDB=None, jobDB=None, tqDB=None, jlDB=None, opsHelper=None):
+  def __init__(self, pilotAgentsDB=None, jobDB=None, tqDB=None, jlDB=None, opsHelper=None, tqIndex=None):
     """ c'tor
+
+        :param tqIndex: optional TaskQueueIndex, used instead of TaskQueueDB to find the matching job
     """
     if pilotAgentsDB:
       self.pilotAgentsDB = pilotAgentsDB
@@ -46,6 +48,7 @@ class Matcher(object):
       self.jlDB = jlDB
     else:
       self.jlDB = JobLoggingDB()
+    self.tqIndex = tqIndex
 
     if opsHelper:
       self.opsHelper = opsHelper
@@ -82,7 +85,11 @@ class Matcher(object):
     gLogger.info('Resource description for matching', printDict(toPrintDict))
 
     negativeCond = self.limiter.getNegativeCondForSite(resourceDict['Site'])
-    result = self.tqDB.matchAndGetJob(resourceDict, negativeCond=negativeCond)
+    # A specific JobID can only be requested to the DB
+    if self.tqIndex and self.tqIndex.isLoaded() and 'JobID' not in resourceDict:
+      result = self.tqIndex.matchAndGetJob(resourceDict, negativeCond=negativeCond)
+    else:
+      result = self.tqDB.matchAndGetJob(resourceDict, negativeCond=negativeCond)
 
     if not result['OK']:
       raise RuntimeError(result['Message'])
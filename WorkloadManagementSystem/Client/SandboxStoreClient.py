@@ -44,7 +44,7 @@ class SandboxStoreClient(object):
         if not result['OK']:
           SandboxStoreClient.__smdb = False
         else:
-          result['Value'].close()
+          SandboxStoreClient.__smdb._releaseConnection()  # pylint: disable=protected-access
       except (ImportError, RuntimeError, AttributeError):
         SandboxStoreClient.__smdb = False
 
@@ -48,6 +48,7 @@ from DIRAC.Core.Utilities import DErrno
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.Core.Utilities import Time
+from DIRAC.Core.Utilities.List import breakListIntoChunks, intListToString
 from DIRAC.Core.Utilities.DErrno import EWMSSUBM
 from DIRAC.Core.Utilities.ObjectLoader import ObjectLoader
 from DIRAC.ConfigurationSystem.Client.Config import gConfig
@@ -689,6 +690,52 @@ class JobDB(DB):
     result = self._transaction([cmd])
     return result
 
+#############################################################################
+  def setJobsStatusUpdates(self, updates):
+    """ Apply the status updates of many jobs in a single transaction: the attributes, refreshing
+        the LastUpdateTime, and the start and end of the execution if not yet set.
+        Jobs with the same new attribute values are updated by the same statement.
+
+        :param dict updates: { jobID : ( attrNames, attrValues, startDate, endDate ) }
+
+        :return : S_OK/S_ERROR
+    """
+    jobsByAttributes = {}
+    jobsByStart = {}
+    jobsByEnd = {}
+    for jobID, (attrNames, attrValues, startDate, endDate) in sorted(updates.iteritems()):
+      if len(attrNames) != len(attrValues):
+        return S_ERROR('JobDB.setJobsStatusUpdates: incompatible Argument length')
+      for attrName in attrNames:
+        if attrName not in self.jobAttributeNames:
+          return S_ERROR(EWMSSUBM, 'Request to set non-existing job attribute')
+      jobsByAttributes.setdefault(tuple(zip(attrNames, attrValues)), []).append(int(jobID))
+      if startDate:
+        jobsByStart.setdefault(startDate, []).append(int(jobID))
+      if endDate:
+        jobsByEnd.setdefault(endDate, []).append(int(jobID))
+
+    cmdList = []
+    for attributes, jobIDs in jobsByAttributes.iteritems():
+      attr = []
+      for name, value in attributes:
+        ret = self._escapeString(value)
+        if not ret['OK']:
+          return ret
+        attr.append("%s=%s" % (name, ret['Value']))
+      attr.append("LastUpdateTime=UTC_TIMESTAMP()")
+      cmdList.append('UPDATE Jobs SET %s WHERE JobID in ( %s )' % (', '.join(attr), intListToString(jobIDs)))
+    for timeName, jobsByDate in (('StartExecTime', jobsByStart), ('EndExecTime', jobsByEnd)):
+      for date, jobIDs in jobsByDate.iteritems():
+        ret = self._escapeString(date)
+        if not ret['OK']:
+          return ret
+        cmdList.append("UPDATE Jobs SET %s=%s WHERE JobID in ( %s ) AND %s IS NULL" %
+                       (timeName, ret['Value'], intListToString(jobIDs), timeName))
+    if not cmdList:
+      return S_OK()
+    return self._transaction(cmdList)
+
 #############################################################################
   def setJobStatus(self, jobID, status='', minor='', application='', appCounter=None):
     """ Set status of the job specified by its jobID
@@ -1994,6 +2041,64 @@ class JobDB(DB):
       return S_OK()
     return S_ERROR('Failed to store some or all the parameters')
 
+#####################################################################################
+  def setHeartBeatDataBulk(self, heartBeats, chunkSize=1000):
+    """ Add the heart beat data of many jobs with one statement per table and chunk of jobs
+
+        :param dict heartBeats: { jobID : ( heartBeatTime, staticDataDict, [ ( heartBeatTime, dynamicDataDict ) ] ) }
+    """
+    ok = True
+    for jobIDs in breakListIntoChunks(sorted(heartBeats), chunkSize):
+      timeCases = []
+      parameterList = []
+      valueList = []
+      for jobID in jobIDs:
+        heartBeatTime, staticDataDict, dynamicDataList = heartBeats[jobID]
+        jobID = int(jobID)
+        timeCases.append("WHEN %d THEN '%s'" % (jobID, heartBeatTime.strftime('%Y-%m-%d %H:%M:%S')))
+        for key, value in staticDataDict.items():
+          ret = self._escapeValues([key, value])
+          if not ret['OK']:
+            self.log.warn('Failed to escape parameter %s of job %d' % (key, jobID))
+            continue
+          parameterList.append('(%d,%s)' % (jobID, ','.join(ret['Value'])))
+        for dynamicTime, dynamicDataDict in dynamicDataList:
+          for key, value in dynamicDataDict.items():
+            ret = self._escapeValues([key, value])
+            if not ret['OK']:
+              self.log.warn('Failed to escape heart beat data %s of job %d' % (key, jobID))
+              continue
+            valueList.append("(%d,%s,'%s')" % (jobID, ','.join(ret['Value']),
+                                               dynamicTime.strftime('%Y-%m-%d %H:%M:%S')))
+
+      # The jobs may have reached another status since their heart beat was buffered
+      req = "UPDATE Jobs SET HeartBeatTime=CASE JobID %s END, Status='Running' WHERE JobID IN (%s)" % \
+          (' '.join(timeCases), ','.join(str(int(jobID)) for jobID in jobIDs))
+      req += " AND Status IN ('Running','Stalled','Matched')"
+      result = self._update(req)
+      if not result['OK']:
+        return S_ERROR('Failed to set the heart beat time: ' + result['Message'])
+
+      # FIXME: It is rather not optimal to use parameters to store the heartbeat info, must find a proper solution
+      if parameterList:
+        result = self._update('REPLACE JobParameters (JobID,Name,Value) VALUES %s' % ','.join(parameterList))
+        if not result['OK']:
+          ok = False
+          self.log.warn(result['Message'])
+
+      # Heart beats of a job received in the same second have the same key
+      if valueList:
+        req = "INSERT IGNORE INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES %s" % \
+            ','.join(valueList)
+        result = self._update(req)
+        if not result['OK']:
+          ok = False
+          self.log.warn(result['Message'])
+
+    if ok:
+      return S_OK()
+    return S_ERROR('Failed to store some or all the parameters')
+
 #####################################################################################
   def getHeartBeatData(self, jobID):
     """ Retrieve the job's heart beat data
@@ -2097,6 +2202,49 @@ class JobDB(DB):
     result = self._update(req)
     return result
 
+#####################################################################################
+  def getJobCommandsBulk(self, status='Received'):
+    """ Get the commands of all the jobs with a given status
+
+        :return: S_OK( { jobID : { command : arguments } } )
+    """
+    ret = self._escapeString(status)
+    if not ret['OK']:
+      return ret
+    status = ret['Value']
+
+    result = self._query("SELECT JobID, Command, Arguments FROM JobCommands WHERE Status=%s" % status)
+    if not result['OK']:
+      return result
+
+    resultDict = {}
+    for jobID, command, arguments in result['Value']:
+      resultDict.setdefault(int(jobID), {})[command] = arguments
+    return S_OK(resultDict)
+
+#####################################################################################
+  def setJobCommandsStatus(self, jobCommands, status):
+    """ Set the status of many job commands
+
+        :param list jobCommands: list of ( jobID, command )
+    """
+    ret = self._escapeString(status)
+    if not ret['OK']:
+      return ret
+    status = ret['Value']
+
+    conditions = []
+    for jobID, command in jobCommands:
+      ret = self._escapeString(command)
+      if not ret['OK']:
+        return ret
+      conditions.append('(%d,%s)' % (int(jobID), ret['Value']))
+    if not conditions:
+      return S_OK(0)
+
+    req = "UPDATE JobCommands SET Status=%s WHERE (JobID,Command) IN (%s)" % (status, ','.join(conditions))
+    return self._update(req)
+
 #####################################################################################
   def getSummarySnapshot(self, requestedFields=False):
     """ Get the summary snapshot for a given combination
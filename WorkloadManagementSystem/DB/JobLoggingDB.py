@@ -2,9 +2,11 @@
     The following methods are provided
 
     addLoggingRecord()
+    addLoggingRecords()
     getJobLoggingInfo()
     deleteJob()
     getWMSTimeStamps()
+    getWMSTimeStampsBulk()
 """
 
 __RCSID__ = "$Id$"
@@ -53,6 +55,20 @@ class JobLoggingDB(DB):
     event = 'status/minor/app=%s/%s/%s' % (status, minor, application)
     self.gLogger.info("Adding record for job " + str(jobID) + ": '" + event + "' from " + source)
 
+    _date, time_order = self.__getStatusTime(date)
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
+        (int(jobID), status, minor, application[:255],
+         str(_date), time_order, source)
+
+    return self._update(cmd)
+
+#############################################################################
+  def __getStatusTime(self, date):
+    """ The time stamp of a status and its float version for ordering, from a string
+        or a datetime, the current UTC time by default
+    """
     if not date:
       # Make the UTC datetime string and float
       _date = Time.dateTime()
@@ -80,12 +96,31 @@ class JobLoggingDB(DB):
         _date = Time.dateTime()
         epoc = time.mktime(_date.timetuple()) - MAGIC_EPOC_NUMBER
         time_order = round(epoc, 3)
+    return _date, time_order
 
-    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
-          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
-        (int(jobID), status, minor, application[:255],
-         str(_date), time_order, source)
+#############################################################################
+  def addLoggingRecords(self, records):
+    """ Add many entries to the JobLoggingDB table with a single statement
+
+        :param list records: ( jobID, status, minor, application, date, source ) tuples,
+                             with the same meaning as the addLoggingRecord arguments
+    """
+    if not records:
+      return S_OK()
+    self.gLogger.info("Adding %d records for %d jobs" % (len(records), len(set(record[0] for record in records))))
+
+    valueList = []
+    for jobID, status, minor, application, date, source in records:
+      _date, time_order = self.__getStatusTime(date)
+      result = self._escapeValues([status, minor, application[:255], str(_date), source])
+      if not result['OK']:
+        return result
+      e_status, e_minor, e_application, e_date, e_source = result['Value']
+      valueList.append("(%d,%s,%s,%s,%s,%f,%s)" % (int(jobID), e_status, e_minor, e_application,
+                                                  e_date, time_order, e_source))
 
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES %s" % ','.join(valueList)
     return self._update(cmd)
 
 #############################################################################
@@ -165,3 +200,33 @@ class JobLoggingDB(DB):
       result['LastTime'] = "Unknown"
 
     return S_OK(result)
+
+#############################################################################
+  def getWMSTimeStampsBulk(self, jobIDs):
+    """ Get TimeStamps for job MajorState transitions of many jobs with two queries
+        return a { jobID : {State:timestamp} } dictionary, without the jobs that have no logging info
+    """
+    if not jobIDs:
+      return S_OK({})
+    jobString = ','.join(str(int(jobID)) for jobID in jobIDs)
+
+    result = {}
+    cmd = 'SELECT JobID,Status,StatusTimeOrder FROM LoggingInfo WHERE JobID IN (%s)' % jobString
+    resCmd = self._query(cmd)
+    if not resCmd['OK']:
+      return resCmd
+    for jobID, event, etime in resCmd['Value']:
+      result.setdefault(int(jobID), {})[event] = str(etime + MAGIC_EPOC_NUMBER)
+
+    # Get last date and time
+    cmd = 'SELECT JobID,MAX(StatusTime) FROM LoggingInfo WHERE JobID IN (%s) GROUP BY JobID' % jobString
+    resCmd = self._query(cmd)
+    if not resCmd['OK']:
+      return resCmd
+    for jobID, lastTime in resCmd['Value']:
+      if int(jobID) in result:
+        result[int(jobID)]['LastTime'] = str(lastTime)
+    for timeStamps in result.itervalues():
+      timeStamps.setdefault('LastTime', "Unknown")
+
+    return S_OK(result)
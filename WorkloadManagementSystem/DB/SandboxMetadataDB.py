@@ -46,6 +46,7 @@ class SandboxMetadataDB( DB ):
                                                          'RegistrationTime' : 'DATETIME NOT NULL',
                                                          'LastAccessTime' : 'DATETIME NOT NULL',
                                                          'Assigned' : 'TINYINT NOT NULL DEFAULT 0',
+                                                         'InContentStore' : 'TINYINT NOT NULL DEFAULT 0',
                                                         },
                                             'PrimaryKey' : 'SBId',
                                             'Indexes': { 'SBOwner': [ 'OwnerId' ],
@@ -65,10 +66,29 @@ class SandboxMetadataDB( DB ):
                                               'UniqueIndexes' : { 'Mapping' : [ 'SBId', 'EntitySetup', 'EntityId', 'Type' ] }
                                            }
 
+    # Files of the sandboxes stored once per content, referenced by the sandboxes of all the owners
+    self.__tablesDesc[ 'sb_Contents' ] = { 'Fields' : { 'ContentId' : 'VARCHAR(128) NOT NULL',
+                                                        'SEName' : 'VARCHAR(64) NOT NULL',
+                                                        'Bytes' : 'BIGINT(20) NOT NULL DEFAULT 0',
+                                                        'RefCount' : 'INTEGER(10) NOT NULL DEFAULT 0',
+                                                        'RegistrationTime' : 'DATETIME NOT NULL',
+                                                      },
+                                           'PrimaryKey' : [ 'SEName', 'ContentId' ],
+                                         }
+
     for tableName in self.__tablesDesc:
       if not tableName in tablesInDB:
         tablesToCreate[ tableName ] = self.__tablesDesc[ tableName ]
 
+    if 'sb_SandBoxes' in tablesInDB:
+      result = self._query( "SHOW COLUMNS FROM `sb_SandBoxes` LIKE 'InContentStore'" )
+      if not result[ 'OK' ]:
+        return result
+      if not result[ 'Value' ]:
+        result = self._update( "ALTER TABLE `sb_SandBoxes` ADD COLUMN InContentStore TINYINT NOT NULL DEFAULT 0" )
+        if not result[ 'OK' ]:
+          return result
+
     return self._createTables( tablesToCreate )
 
   def registerAndGetOwnerId( self, owner, ownerDN, ownerGroup ):
@@ -298,7 +318,7 @@ class SandboxMetadataDB( DB ):
     """
     sqlCond = [ "Assigned AND SBId NOT IN ( SELECT SBId FROM `sb_EntityMapping` ) AND TIMESTAMPDIFF( DAY, LastAccessTime, UTC_TIMESTAMP() ) >= %d" % self.__assignedSBGraceDays,
                 "! Assigned AND TIMESTAMPDIFF( DAY, LastAccessTime, UTC_TIMESTAMP() ) >= %s" % self.__unassignedSBGraceDays]
-    sqlCmd = "SELECT SBId, SEName, SEPFN FROM `sb_SandBoxes` WHERE ( %s )" % " ) OR ( ".join( sqlCond )
+    sqlCmd = "SELECT SBId, SEName, SEPFN, InContentStore FROM `sb_SandBoxes` WHERE ( %s )" % " ) OR ( ".join( sqlCond )
     return self._query( sqlCmd )
 
   def deleteSandboxes( self, SBIdList ):
@@ -313,6 +333,77 @@ class SandboxMetadataDB( DB ):
         return result
     return S_OK()
 
+  def addContentReference( self, SEName, contentId, size, sbId ):
+    """
+    Add a reference of a sandbox to a stored content, registering the content if it's not there
+    Returns the number of references to the content
+    """
+    escSEName = self._escapeString( SEName )[ 'Value' ]
+    escContentId = self._escapeString( contentId )[ 'Value' ]
+    sqlCmd = "INSERT INTO `sb_Contents` ( ContentId, SEName, Bytes, RefCount, RegistrationTime )"
+    sqlCmd = "%s VALUES ( %s, %s, %d, 1, UTC_TIMESTAMP() ) ON DUPLICATE KEY UPDATE RefCount = RefCount + 1" % ( sqlCmd,
+                                                                                                          escContentId,
+                                                                                                          escSEName,
+                                                                                                          size )
+    result = self._update( sqlCmd )
+    if not result[ 'OK' ]:
+      return result
+    # Marked once counted: the purge only removes the references of the marked sandboxes
+    result = self._update( "UPDATE `sb_SandBoxes` SET InContentStore = 1 WHERE SBId = %d" % sbId )
+    if not result[ 'OK' ]:
+      return result
+    return self.__getContentRefCount( escSEName, escContentId )
+
+  def removeContentReference( self, SEName, contentId ):
+    """
+    Remove a reference to a stored content, and the content once it is not referenced any more
+    Returns the number of references left, None if the content is not registered
+    """
+    escSEName = self._escapeString( SEName )[ 'Value' ]
+    escContentId = self._escapeString( contentId )[ 'Value' ]
+    sqlCond = "SEName = %s AND ContentId = %s" % ( escSEName, escContentId )
+    result = self._update( "UPDATE `sb_Contents` SET RefCount = RefCount - 1 WHERE %s" % sqlCond )
+    if not result[ 'OK' ]:
+      return result
+    result = self.__getContentRefCount( escSEName, escContentId )
+    if not result[ 'OK' ] or result[ 'Value' ] is None or result[ 'Value' ] > 0:
+      return result
+    # A new reference may have been added in between
+    result = self._update( "DELETE FROM `sb_Contents` WHERE %s AND RefCount <= 0" % sqlCond )
+    if not result[ 'OK' ]:
+      return result
+    if not result[ 'Value' ]:
+      return self.__getContentRefCount( escSEName, escContentId )
+    return S_OK( 0 )
+
+  def __getContentRefCount( self, escSEName, escContentId ):
+    sqlCmd = "SELECT RefCount FROM `sb_Contents` WHERE SEName = %s AND ContentId = %s" % ( escSEName, escContentId )
+    result = self._query( sqlCmd )
+    if not result[ 'OK' ]:
+      return result
+    if not result[ 'Value' ]:
+      return S_OK( None )
+    return S_OK( result[ 'Value' ][0][0] )
+
+  def getContentStats( self, SEName ):
+    """
+    Get the deduplication statistics of the contents stored in a SE
+    Returns a dict with the number of contents and references, the bytes stored,
+    the bytes of all the sandboxes referencing them, the bytes saved and the dedup ratio
+    """
+    sqlCmd = "SELECT COUNT(*), SUM( RefCount ), SUM( Bytes ), SUM( Bytes * RefCount ) FROM `sb_Contents`"
+    sqlCmd = "%s WHERE SEName = %s" % ( sqlCmd, self._escapeString( SEName )[ 'Value' ] )
+    result = self._query( sqlCmd )
+    if not result[ 'OK' ]:
+      return result
+    contents, references, storedBytes, logicalBytes = [ int( value or 0 ) for value in result[ 'Value' ][0] ]
+    return S_OK( { 'Contents' : contents,
+                   'References' : references,
+                   'StoredBytes' : storedBytes,
+                   'LogicalBytes' : logicalBytes,
+                   'SavedBytes' : logicalBytes - storedBytes,
+                   'DedupRatio' : float( logicalBytes ) / storedBytes if storedBytes else 1. } )
+
   def getSandboxId( self, SEName, SEPFN, requesterName, requesterGroup ):
     """
     Get the sandboxId if it exists
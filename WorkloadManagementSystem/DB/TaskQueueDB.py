@@ -196,9 +196,9 @@ class TaskQueueDB(DB):
 
     return S_OK(tqDefDict)
 
-  def _checkMatchDefinition(self, tqMatchDict):
+  def _checkMatchDefinition(self, tqMatchDict, escapeValues=True):
     """
-    Check a task queue match dict is valid
+    Check a task queue match dict is valid, escaping its string values for the queries unless escapeValues is False
     """
     def travelAndCheckType(value, validTypes, escapeValues=True):
       if isinstance(value, (list, tuple)):
@@ -224,7 +224,7 @@ class TaskQueueDB(DB):
       if field in ["CPUTime"]:
         result = travelAndCheckType(fieldValue, (int, long), escapeValues=False)
       else:
-        result = travelAndCheckType(fieldValue, basestring)
+        result = travelAndCheckType(fieldValue, basestring, escapeValues=escapeValues)
       if not result['OK']:
         return S_ERROR("Match definition field %s failed : %s" % (field, result['Message']))
       tqMatchDict[field] = result['Value']
@@ -233,7 +233,7 @@ class TaskQueueDB(DB):
       for field in (multiField, "Banned%s" % multiField, "Required%s" % multiField):
         if field in tqMatchDict:
           fieldValue = tqMatchDict[field]
-          result = travelAndCheckType(fieldValue, basestring)
+          result = travelAndCheckType(fieldValue, basestring, escapeValues=escapeValues)
           if not result['OK']:
             return S_ERROR("Match definition field %s failed : %s" % (field, result['Message']))
           tqMatchDict[field] = result['Value']
@@ -249,7 +249,10 @@ class TaskQueueDB(DB):
       result = self._getConnection()
       if not result['OK']:
         return S_ERROR("Can't create task queue: %s" % result['Message'])
-      connObj = result['Value']
+      try:
+        return self.__createTaskQueue(tqDefDict, priority, connObj=result['Value'])
+      finally:
+        self._releaseConnection()
     tqDefDict['CPUTime'] = self.fitCPUTimeToSegments(tqDefDict['CPUTime'])
     sqlSingleFields = ['TQId', 'Priority']
     sqlValues = ["0", str(priority)]
@@ -355,40 +358,43 @@ class TaskQueueDB(DB):
     if not retVal['OK']:
       return S_ERROR("Can't insert job: %s" % retVal['Message'])
     connObj = retVal['Value']
-    if not skipTQDefCheck:
-      tqDefDict = dict(tqDefDict)
-      retVal = self._checkTaskQueueDefinition(tqDefDict)
-      if not retVal['OK']:
-        self.log.error("TQ definition check failed", retVal['Message'])
-        return retVal
-      tqDefDict = retVal['Value']
-    tqDefDict['CPUTime'] = self.fitCPUTimeToSegments(tqDefDict['CPUTime'])
-    self.log.info("Inserting job %s with requirements: %s" % (jobId, printDict(tqDefDict)))
-    retVal = self.__findAndDisableTaskQueue(tqDefDict, skipDefinitionCheck=True, connObj=connObj)
-    if not retVal['OK']:
-      return retVal
-    tqInfo = retVal['Value']
-    newTQ = False
-    if not tqInfo['found']:
-      self.log.info("Creating a TQ for job %s" % jobId)
-      retVal = self.__createTaskQueue(tqDefDict, 1, connObj=connObj)
+    try:
+      if not skipTQDefCheck:
+        tqDefDict = dict(tqDefDict)
+        retVal = self._checkTaskQueueDefinition(tqDefDict)
+        if not retVal['OK']:
+          self.log.error("TQ definition check failed", retVal['Message'])
+          return retVal
+        tqDefDict = retVal['Value']
+      tqDefDict['CPUTime'] = self.fitCPUTimeToSegments(tqDefDict['CPUTime'])
+      self.log.info("Inserting job %s with requirements: %s" % (jobId, printDict(tqDefDict)))
+      retVal = self.__findAndDisableTaskQueue(tqDefDict, skipDefinitionCheck=True, connObj=connObj)
       if not retVal['OK']:
         return retVal
-      tqId = retVal['Value']
-      newTQ = True
-    else:
-      tqId = tqInfo['tqId']
-      self.log.info("Found TQ %s for job %s requirements" % (tqId, jobId))
-    try:
-      result = self.__insertJobInTaskQueue(jobId, tqId, int(jobPriority), checkTQExists=False, connObj=connObj)
-      if not result['OK']:
-        self.log.error("Error inserting job in TQ", "Job %s TQ %s: %s" % (jobId, tqId, result['Message']))
-        return result
-      if newTQ:
-        self.recalculateTQSharesForEntity(tqDefDict['OwnerDN'], tqDefDict['OwnerGroup'], connObj=connObj)
+      tqInfo = retVal['Value']
+      newTQ = False
+      if not tqInfo['found']:
+        self.log.info("Creating a TQ for job %s" % jobId)
+        retVal = self.__createTaskQueue(tqDefDict, 1, connObj=connObj)
+        if not retVal['OK']:
+          return retVal
+        tqId = retVal['Value']
+        newTQ = True
+      else:
+        tqId = tqInfo['tqId']
+        self.log.info("Found TQ %s for job %s requirements" % (tqId, jobId))
+      try:
+        result = self.__insertJobInTaskQueue(jobId, tqId, int(jobPriority), checkTQExists=False, connObj=connObj)
+        if not result['OK']:
+          self.log.error("Error inserting job in TQ", "Job %s TQ %s: %s" % (jobId, tqId, result['Message']))
+          return result
+        if newTQ:
+          self.recalculateTQSharesForEntity(tqDefDict['OwnerDN'], tqDefDict['OwnerGroup'], connObj=connObj)
+      finally:
+        self.__setTaskQueueEnabled(tqId, True)
+      return S_OK()
     finally:
-      self.__setTaskQueueEnabled(tqId, True)
-    return S_OK()
+      self._releaseConnection()
 
   def __insertJobInTaskQueue(self, jobId, tqId, jobPriority, checkTQExists=True, connObj=False):
     """ Insert a job in a given task queue
@@ -404,7 +410,10 @@ class TaskQueueDB(DB):
       result = self._getConnection()
       if not result['OK']:
         return S_ERROR("Can't insert job: %s" % result['Message'])
-      connObj = result['Value']
+      try:
+        return self.__insertJobInTaskQueue(jobId, tqId, jobPriority, checkTQExists, connObj=result['Value'])
+      finally:
+        self._releaseConnection()
     if checkTQExists:
       result = self._query("SELECT tqId FROM `tq_TaskQueues` WHERE TQId = %s" % tqId, conn=connObj)
       if not result['OK'] or not result['Value']:
@@ -517,66 +526,69 @@ ORDER BY COUNT( `tq_Jobs`.JobID ) ASC" % (sqlCmd, result['Value'])
     if not retVal['OK']:
       return S_ERROR("Can't connect to DB: %s" % retVal['Message'])
     connObj = retVal['Value']
-    preJobSQL = "SELECT `tq_Jobs`.JobId, `tq_Jobs`.TQId \
+    try:
+      preJobSQL = "SELECT `tq_Jobs`.JobId, `tq_Jobs`.TQId \
 FROM `tq_Jobs` WHERE `tq_Jobs`.TQId = %s AND `tq_Jobs`.Priority = %s"
-    prioSQL = "SELECT `tq_Jobs`.Priority FROM `tq_Jobs` \
+      prioSQL = "SELECT `tq_Jobs`.Priority FROM `tq_Jobs` \
 WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
-    postJobSQL = " ORDER BY `tq_Jobs`.JobId ASC LIMIT %s" % numJobsPerTry
-    for _ in xrange(self.__maxMatchRetry):
-      noJobsFound = False
-      if 'JobID' in tqMatchDict:
-        # A certain JobID is required by the resource, so all TQ are to be considered
-        retVal = self.matchAndGetTaskQueue(tqMatchDict,
-                                           numQueuesToGet=0,
-                                           skipMatchDictDef=True,
-                                           connObj=connObj)
-        preJobSQL = "%s AND `tq_Jobs`.JobId = %s " % (preJobSQL, tqMatchDict['JobID'])
-      else:
-        retVal = self.matchAndGetTaskQueue(tqMatchDict,
-                                           numQueuesToGet=numQueuesPerTry,
-                                           skipMatchDictDef=True,
-                                           negativeCond=negativeCond,
-                                           connObj=connObj)
-      if not retVal['OK']:
-        return retVal
-      tqList = retVal['Value']
-      if not tqList:
-        self.log.info("No TQ matches requirements")
-        return S_OK({'matchFound': False, 'tqMatch': tqMatchDict})
-      for tqId, tqOwnerDN, tqOwnerGroup in tqList:
-        self.log.info("Trying to extract jobs from TQ %s" % tqId)
-        retVal = self._query(prioSQL % tqId, conn=connObj)
-        if not retVal['OK']:
-          return S_ERROR("Can't retrieve winning priority for matching job: %s" % retVal['Message'])
-        if not retVal['Value']:
-          noJobsFound = True
-          continue
-        prio = retVal['Value'][0][0]
-        retVal = self._query("%s %s" % (preJobSQL % (tqId, prio), postJobSQL), conn=connObj)
+      postJobSQL = " ORDER BY `tq_Jobs`.JobId ASC LIMIT %s" % numJobsPerTry
+      for _ in xrange(self.__maxMatchRetry):
+        noJobsFound = False
+        if 'JobID' in tqMatchDict:
+          # A certain JobID is required by the resource, so all TQ are to be considered
+          retVal = self.matchAndGetTaskQueue(tqMatchDict,
+                                             numQueuesToGet=0,
+                                             skipMatchDictDef=True,
+                                             connObj=connObj)
+          preJobSQL = "%s AND `tq_Jobs`.JobId = %s " % (preJobSQL, tqMatchDict['JobID'])
+        else:
+          retVal = self.matchAndGetTaskQueue(tqMatchDict,
+                                             numQueuesToGet=numQueuesPerTry,
+                                             skipMatchDictDef=True,
+                                             negativeCond=negativeCond,
+                                             connObj=connObj)
         if not retVal['OK']:
-          return S_ERROR("Can't begin transaction for matching job: %s" % retVal['Message'])
-        jobTQList = [(row[0], row[1]) for row in retVal['Value']]
-        if not jobTQList:
-          self.log.info("Task queue %s seems to be empty, triggering a cleaning" % tqId)
-          self.__deleteTQWithDelay.add(tqId, 300, (tqId, tqOwnerDN, tqOwnerGroup))
-        while jobTQList:
-          jobId, tqId = jobTQList.pop(random.randint(0, len(jobTQList) - 1))
-          self.log.info("Trying to extract job %s from TQ %s" % (jobId, tqId))
-          retVal = self.deleteJob(jobId, connObj=connObj)
+          return retVal
+        tqList = retVal['Value']
+        if not tqList:
+          self.log.info("No TQ matches requirements")
+          return S_OK({'matchFound': False, 'tqMatch': tqMatchDict})
+        for tqId, tqOwnerDN, tqOwnerGroup in tqList:
+          self.log.info("Trying to extract jobs from TQ %s" % tqId)
+          retVal = self._query(prioSQL % tqId, conn=connObj)
+          if not retVal['OK']:
+            return S_ERROR("Can't retrieve winning priority for matching job: %s" % retVal['Message'])
+          if not retVal['Value']:
+            noJobsFound = True
+            continue
+          prio = retVal['Value'][0][0]
+          retVal = self._query("%s %s" % (preJobSQL % (tqId, prio), postJobSQL), conn=connObj)
           if not retVal['OK']:
-            msgFix = "Could not take job"
-            msgVar = " %s out from the TQ %s: %s" % (jobId, tqId, retVal['Message'])
-            self.log.error(msgFix, msgVar)
-            return S_ERROR(msgFix + msgVar)
-          if retVal['Value']:
-            self.log.info("Extracted job %s with prio %s from TQ %s" % (jobId, prio, tqId))
-            return S_OK({'matchFound': True, 'jobId': jobId, 'taskQueueId': tqId, 'tqMatch': tqMatchDict})
-        self.log.info("No jobs could be extracted from TQ %s" % tqId)
-    if noJobsFound:
-      return S_OK({'matchFound': False, 'tqMatch': tqMatchDict})
-
-    self.log.info("Could not find a match after %s match retries" % self.__maxMatchRetry)
-    return S_ERROR("Could not find a match after %s match retries" % self.__maxMatchRetry)
+            return S_ERROR("Can't begin transaction for matching job: %s" % retVal['Message'])
+          jobTQList = [(row[0], row[1]) for row in retVal['Value']]
+          if not jobTQList:
+            self.log.info("Task queue %s seems to be empty, triggering a cleaning" % tqId)
+            self.__deleteTQWithDelay.add(tqId, 300, (tqId, tqOwnerDN, tqOwnerGroup))
+          while jobTQList:
+            jobId, tqId = jobTQList.pop(random.randint(0, len(jobTQList) - 1))
+            self.log.info("Trying to extract job %s from TQ %s" % (jobId, tqId))
+            retVal = self.deleteJob(jobId, connObj=connObj)
+            if not retVal['OK']:
+              msgFix = "Could not take job"
+              msgVar = " %s out from the TQ %s: %s" % (jobId, tqId, retVal['Message'])
+              self.log.error(msgFix, msgVar)
+              return S_ERROR(msgFix + msgVar)
+            if retVal['Value']:
+              self.log.info("Extracted job %s with prio %s from TQ %s" % (jobId, prio, tqId))
+              return S_OK({'matchFound': True, 'jobId': jobId, 'taskQueueId': tqId, 'tqMatch': tqMatchDict})
+          self.log.info("No jobs could be extracted from TQ %s" % tqId)
+      if noJobsFound:
+        return S_OK({'matchFound': False, 'tqMatch': tqMatchDict})
+
+      self.log.info("Could not find a match after %s match retries" % self.__maxMatchRetry)
+      return S_ERROR("Could not find a match after %s match retries" % self.__maxMatchRetry)
+    finally:
+      self._releaseConnection()
 
   def matchAndGetTaskQueue(self, tqMatchDict, numQueuesToGet=1, skipMatchDictDef=False,
                            negativeCond=None, connObj=False):
@@ -869,7 +881,10 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
       retVal = self._getConnection()
       if not retVal['OK']:
         return S_ERROR("Can't delete job: %s" % retVal['Message'])
-      connObj = retVal['Value']
+      try:
+        return self.deleteJob(jobId, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
     retVal = self._query(
         "SELECT t.TQId, t.OwnerDN, t.OwnerGroup \
 FROM `tq_TaskQueues` t, `tq_Jobs` j \
@@ -892,6 +907,83 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
     self.__deleteTQWithDelay.add(tqId, 300, (tqId, tqOwnerDN, tqOwnerGroup))
     return S_OK(True)
 
+  def claimJob(self, jobId, tqId, tqOwnerDN, tqOwnerGroup):
+    """
+    Atomically take a job out of its task queue, the caller already knows the TQ of the job
+    Return S_OK( True/False ) / S_ERROR, False if somebody else took the job first
+    """
+    retVal = self._update("DELETE FROM `tq_Jobs` WHERE JobId = %s AND TQId = %s" % (int(jobId), int(tqId)))
+    if not retVal['OK']:
+      return S_ERROR("Could not delete job from task queue %s: %s" % (jobId, retVal['Message']))
+    if retVal['Value'] == 0:
+      return S_OK(False)
+    self.log.info("Claimed job %s from TQ %s" % (jobId, tqId))
+    self.__deleteTQWithDelay.add(tqId, 300, (tqId, tqOwnerDN, tqOwnerGroup))
+    return S_OK(True)
+
+  def getTaskQueuesSummary(self):
+    """
+    Get the priority of all the task queues and a checksum of their jobs, used to
+    reconcile an in-memory copy of the task queues. The checksum changes whenever
+    a job is added, removed or gets a new priority
+    Return S_OK( { tqId : ( priority, checksum ) } ) / S_ERROR
+    """
+    retVal = self._query("SELECT TQId, Priority FROM `tq_TaskQueues`")
+    if not retVal['OK']:
+      return S_ERROR("Can't retrieve task queues priorities: %s" % retVal['Message'])
+    tqData = dict((row[0], [row[1], None]) for row in retVal['Value'])
+    retVal = self._query("SELECT TQId, COUNT( JobId ), \
+BIT_XOR( CRC32( CONCAT_WS( ':', JobId, Priority, RealPriority ) ) ) FROM `tq_Jobs` GROUP BY TQId")
+    if not retVal['OK']:
+      return S_ERROR("Can't retrieve task queues checksums: %s" % retVal['Message'])
+    for tqId, numJobs, checksum in retVal['Value']:
+      if tqId in tqData:
+        tqData[tqId][1] = (numJobs, checksum)
+    return S_OK(dict((tqId, tuple(data)) for tqId, data in tqData.iteritems()))
+
+  def getTaskQueueDefinitions(self, tqIdList):
+    """
+    Get the full definition of the given task queues
+    Return S_OK( { tqId : tqDefDict } ) / S_ERROR
+    """
+    if not tqIdList:
+      return S_OK({})
+    tqCond = ", ".join([str(int(tqId)) for tqId in tqIdList])
+    sqlCmd = "SELECT TQId, Priority, %s FROM `tq_TaskQueues` WHERE TQId in ( %s )" % (", ".join(singleValueDefFields),
+                                                                                     tqCond)
+    retVal = self._query(sqlCmd)
+    if not retVal['OK']:
+      return S_ERROR("Can't retrieve task queues definitions: %s" % retVal['Message'])
+    tqData = {}
+    for record in retVal['Value']:
+      tqDef = {'Priority': record[1]}
+      for iP, field in enumerate(singleValueDefFields):
+        tqDef[field] = record[iP + 2]
+      for field in multiValueDefFields:
+        tqDef[field] = []
+      tqData[record[0]] = tqDef
+    for field in multiValueDefFields:
+      retVal = self._query("SELECT TQId, Value FROM `tq_TQTo%s` WHERE TQId in ( %s )" % (field, tqCond))
+      if not retVal['OK']:
+        return S_ERROR("Can't retrieve task queues field %s info: %s" % (field, retVal['Message']))
+      for tqId, value in retVal['Value']:
+        if tqId in tqData:
+          tqData[tqId][field].append(value)
+    return S_OK(tqData)
+
+  def getJobsInTaskQueues(self, tqIdList):
+    """
+    Get the jobs of the given task queues with their priorities
+    Return S_OK( [ ( tqId, jobId, priority, realPriority ) ] ) / S_ERROR
+    """
+    if not tqIdList:
+      return S_OK([])
+    retVal = self._query("SELECT TQId, JobId, Priority, RealPriority FROM `tq_Jobs` WHERE TQId in ( %s )" %
+                         ", ".join([str(int(tqId)) for tqId in tqIdList]))
+    if not retVal['OK']:
+      return S_ERROR("Can't retrieve jobs in task queues: %s" % retVal['Message'])
+    return S_OK(list(retVal['Value']))
+
   def getTaskQueueForJob(self, jobId, connObj=False):
     """
     Return TaskQueue for a given Job
@@ -901,7 +993,10 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       retVal = self._getConnection()
       if not retVal['OK']:
         return S_ERROR("Can't get TQ for job: %s" % retVal['Message'])
-      connObj = retVal['Value']
+      try:
+        return self.getTaskQueueForJob(jobId, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
 
     retVal = self._query('SELECT TQId FROM `tq_Jobs` WHERE JobId = %s ' % jobId, conn=connObj)
 
@@ -921,7 +1016,10 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       retVal = self._getConnection()
       if not retVal['OK']:
         return S_ERROR("Can't get TQs for a job list: %s" % retVal['Message'])
-      connObj = retVal['Value']
+      try:
+        return self.getTaskQueueForJobs(jobIDs, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
 
     jobString = ','.join([str(x) for x in jobIDs])
     retVal = self._query('SELECT JobId,TQId FROM `tq_Jobs` WHERE JobId in (%s) ' % jobString, conn=connObj)
@@ -966,7 +1064,10 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       if not retVal['OK']:
         self.log.error("Can't insert job: %s" % retVal['Message'])
         return retVal
-      connObj = retVal['Value']
+      try:
+        return self.deleteTaskQueueIfEmpty(tqId, tqOwnerDN, tqOwnerGroup, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
     if not tqOwnerDN or not tqOwnerGroup:
       retVal = self.__getOwnerForTaskQueue(tqId, connObj=connObj)
       if not retVal['OK']:
@@ -1006,7 +1107,10 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
       retVal = self._getConnection()
       if not retVal['OK']:
         return S_ERROR("Can't insert job: %s" % retVal['Message'])
-      connObj = retVal['Value']
+      try:
+        return self.deleteTaskQueue(tqId, tqOwnerDN, tqOwnerGroup, connObj=retVal['Value'])
+      finally:
+        self._releaseConnection()
     if not tqOwnerDN or not tqOwnerGroup:
       retVal = self.__getOwnerForTaskQueue(tqId, connObj=connObj)
       if not retVal['OK']:
@@ -1139,12 +1243,15 @@ WHERE j.JobId = %s AND t.TQId = j.TQId" %
     retVal = self._getConnection()
     if not retVal['OK']:
       return S_ERROR("Can't insert job: %s" % retVal['Message'])
-    result = self._query("SELECT DISTINCT( OwnerGroup ) FROM `tq_TaskQueues`")
-    if not result['OK']:
-      return result
-    for group in [r[0] for r in result['Value']]:
-      self.recalculateTQSharesForEntity("all", group)
-    return S_OK()
+    try:
+      result = self._query("SELECT DISTINCT( OwnerGroup ) FROM `tq_TaskQueues`")
+      if not result['OK']:
+        return result
+      for group in [r[0] for r in result['Value']]:
+        self.recalculateTQSharesForEntity("all", group)
+      return S_OK()
+    finally:
+      self._releaseConnection()
 
   def recalculateTQSharesForEntity(self, userDN, userGroup, connObj=False):
     """
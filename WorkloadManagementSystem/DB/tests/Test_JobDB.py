@@ -2,6 +2,7 @@
 
 #pylint: disable=protected-access, missing-docstring
 
+import sqlite3
 import unittest
 from mock import MagicMock, patch
 
@@ -34,3 +35,24 @@ class JobDBTest( unittest.TestCase ):
     print result
     self.assertTrue( result['OK'] )
     self.assertEqual( result['Value'], [ '/vo/user/lfn1', '/vo/user/lfn2' ] )
+
+  @patch( "DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer.gMonitor" )
+  def test_setHeartBeatDataBulk( self, _mockMonitor ):
+    from DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer import HeartBeatBuffer
+    conn = sqlite3.connect( ':memory:' )
+    conn.execute( "CREATE TABLE Jobs ( JobID INTEGER PRIMARY KEY, Status VARCHAR(32), HeartBeatTime DATETIME )" )
+    conn.executemany( "INSERT INTO Jobs VALUES ( ?, ?, '2000-01-01 00:00:00' )",
+                      [ ( 1, 'Running' ), ( 2, 'Matched' ), ( 3, 'Running' ) ] )
+    self.jobDB._update = lambda req: S_OK( conn.execute( req ).rowcount )
+    self.jobDB.getJobCommandsBulk = MagicMock( return_value = S_OK( {} ) )
+    heartBeatBuffer = HeartBeatBuffer( self.jobDB )
+    for jobID in ( 1, 2, 3 ):
+      heartBeatBuffer.addHeartBeat( jobID, {}, {} )
+    # The job is done before its heart beat is written
+    conn.execute( "UPDATE Jobs SET Status = 'Done' WHERE JobID = 3" )
+    heartBeatBuffer.flush()
+    self.assertEqual( heartBeatBuffer.getStats()['Failures'], 0 )
+    jobs = dict( ( row[0], row[1:] ) for row in conn.execute( "SELECT JobID, Status, HeartBeatTime FROM Jobs" ) )
+    self.assertEqual( [ jobs[jobID][0] for jobID in ( 1, 2, 3 ) ], [ 'Running', 'Running', 'Done' ] )
+    self.assertNotEqual( jobs[1][1], '2000-01-01 00:00:00' )
+    self.assertEqual( jobs[3][1], '2000-01-01 00:00:00' )
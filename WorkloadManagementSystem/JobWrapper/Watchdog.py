@@ -74,6 +74,7 @@ class Watchdog(object):
     self.testCPULimit = 0
     self.testMemoryLimit = 0
     self.testTimeLeft = 1
+    self.processSampling = 1
     self.pollingTime = 10  # 10 seconds
     self.checkingTime = 30 * 60  # 30 minute period
     self.minCheckingTime = 20 * 60  # 20 mins
@@ -126,6 +127,8 @@ class Watchdog(object):
     self.testCPULimit = gConfig.getValue(self.section + '/CheckCPULimitFlag', 0)
     self.testMemoryLimit = gConfig.getValue(self.section + '/CheckMemoryLimitFlag', 0)
     self.testTimeLeft = gConfig.getValue(self.section + '/CheckTimeLeftFlag', 1)
+    # Sample the job processes at each polling, and not only at each check
+    self.processSampling = gConfig.getValue(self.section + '/ProcessSamplingFlag', 1)
     # Other parameters
     self.pollingTime = gConfig.getValue(self.section + '/PollingTime', 10)  # 10 seconds
     self.checkingTime = gConfig.getValue(self.section + '/CheckingTime', 30 * 60)  # 30 minute period
@@ -192,6 +195,9 @@ class Watchdog(object):
       self.log.info('Process to monitor has completed, Watchdog will exit.')
       return S_OK("Ended")
 
+    if self.processSampling:
+      self.__sampleProcesses()
+
     # WallClock checks every self.wallClockCheckSeconds, but only if StopSigRegex is defined in JDL
     if not self.stopSigSent and self.stopSigRegex is not None and (
             time.time() - self.initialValues['StartTime']) > self.wallClockCheckSeconds * self.wallClockCheckCount:
@@ -297,10 +303,11 @@ class Watchdog(object):
         self.parameters['MemoryUsed'] = []
       self.parameters['MemoryUsed'].append(memoryUsed)
 
-    result = self.processMonitor.getMemoryConsumed(self.wrapperPID)
+    result = self.processMonitor.getResourceConsumed(self.wrapperPID)
     if result['OK']:
-      vsize = result['Value']['Vsize'] / 1024.
-      rss = result['Value']['RSS'] / 1024.
+      resources = result['Value']
+      vsize = resources['Vsize'] / 1024.
+      rss = resources['RSS'] / 1024.
       heartBeatDict['Vsize'] = vsize
       heartBeatDict['RSS'] = rss
       self.parameters.setdefault('Vsize', [])
@@ -309,6 +316,23 @@ class Watchdog(object):
       self.parameters['RSS'].append(rss)
       msg += "Job Vsize: %.1f kb " % vsize
       msg += "Job RSS: %.1f kb " % rss
+      # PSS shares the pages of the processes between them, 0 if the kernel does not provide it
+      if resources['PSS']:
+        pss = resources['PSS'] / 1024.
+        heartBeatDict['PSS'] = pss
+        self.parameters.setdefault('PSS', []).append(pss)
+        msg += "Job PSS: %.1f kb " % pss
+      ioRead = resources['ReadBytes'] / 1048576.
+      ioWrite = resources['WriteBytes'] / 1048576.
+      heartBeatDict['IORead'] = ioRead
+      heartBeatDict['IOWrite'] = ioWrite
+      heartBeatDict['IOWait'] = resources['IOWait']
+      heartBeatDict['Processes'] = resources['Processes']
+      self.parameters.setdefault('IORead', []).append(ioRead)
+      self.parameters.setdefault('IOWrite', []).append(ioWrite)
+      msg += "Job IO: %.1f MB read %.1f MB written " % (ioRead, ioWrite)
+      msg += "Processes: %d " % resources['Processes']
+      self.__logProcesses()
     result = self.getDiskSpace()
     if not result['OK']:
       self.log.warn("Could not establish DiskSpace", result['Message'])
@@ -419,6 +443,36 @@ class Watchdog(object):
       self.log.exception(e)
       return S_ERROR("Could not determine CPU time consumed with exception")
 
+  #############################################################################
+  def __sampleProcesses(self):
+    """ Samples the processes of the job between the checks, the samples giving the time series
+        of the processes
+    """
+    result = self.processMonitor.getResourceConsumed(self.wrapperPID)
+    if not result['OK']:
+      self.log.warn('Stopping the sampling of the job processes', result['Message'])
+      self.processSampling = 0
+    return result
+
+  #############################################################################
+  def __logProcesses(self):
+    """ Logs the CPU rate and memory of each job process over its last samples
+    """
+    processSeries = self.processMonitor.getSampler(self.wrapperPID).getProcessSeries()
+    for pid, process in sorted(processSeries.items()):
+      samples = process['Samples']
+      if not samples:
+        continue
+      first, last = samples[0], samples[-1]
+      cpuRate = 0.
+      if last['Time'] > first['Time']:
+        cpuRate = (last['CPU'] - first['CPU']) / (last['Time'] - first['Time'])
+      self.log.verbose('Process %s (%s, parent %s): CPU %.1f s (%.2f cores over %.0f s), RSS %.1f kb, '
+                       'PSS %.1f kb, IO %.1f MB read %.1f MB written' %
+                       (pid, process['Command'], process['PPID'], last['CPU'], cpuRate,
+                        last['Time'] - first['Time'], last['RSS'] / 1024., last['PSS'] / 1024.,
+                        last['ReadBytes'] / 1048576., last['WriteBytes'] / 1048576.))
+
   #############################################################################
   def __getCPUHMS(self, cpuTime):
     mins, secs = divmod(cpuTime, 60)
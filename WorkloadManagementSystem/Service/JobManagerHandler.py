@@ -15,6 +15,7 @@ __RCSID__ = "$Id$"
 from DIRAC import gConfig, gLogger, S_OK, S_ERROR
 from DIRAC.Core.DISET.RequestHandler import RequestHandler
 from DIRAC.Core.DISET.MessageClient import MessageClient
+from DIRAC.Core.Utilities.ExecutorDispatcher import getTaskShard
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.Core.Utilities.DErrno import EWMSJDL, EWMSSUBM
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
@@ -67,17 +68,20 @@ class JobManagerHandler(RequestHandler):
 
   @classmethod
   def initializeHandler(cls, serviceInfoDict):
-    cls.msgClient = MessageClient("WorkloadManagement/OptimizationMind")
+    # The i-th mind handles the shard i of the jobs
+    minds = cls.srv_getCSOption("OptimizationMinds", ["WorkloadManagement/OptimizationMind"])
+    cls.msgClients = [MessageClient(mind) for mind in minds]
     cls.__connectToOptMind()
     gThreadScheduler.addPeriodicTask(60, cls.__connectToOptMind)
     return S_OK()
 
   @classmethod
   def __connectToOptMind(cls):
-    if not cls.msgClient.connected:
-      result = cls.msgClient.connect(JobManager=True)
-      if not result['OK']:
-        cls.log.warn("Cannot connect to OptimizationMind!", result['Message'])
+    for msgClient in cls.msgClients:
+      if not msgClient.connected:
+        result = msgClient.connect(JobManager=True)
+        if not result['OK']:
+          cls.log.warn("Cannot connect to OptimizationMind!", result['Message'])
 
   def initialize(self):
     credDict = self.getRemoteCredentials()
@@ -93,19 +97,24 @@ class JobManagerHandler(RequestHandler):
     return S_OK()
 
   def __sendJobsToOptimizationMind(self, jids):
-    if not self.msgClient.connected:
-      return
-    result = self.msgClient.createMessage("OptimizeJobs")
-    if not result['OK']:
-      self.log.error("Cannot create Optimize message: %s" % result['Message'])
-      return
-    msgObj = result['Value']
-    msgObj.jids = list(sorted(jids))
-    result = self.msgClient.sendMessage(msgObj)
-    if not result['OK']:
-      self.log.error("Cannot send Optimize message: %s" % result['Message'])
-      return
-    self.log.info("Optimize msg sent for %s jobs" % len(jids))
+    shardJids = {}
+    for jid in jids:
+      shardJids.setdefault(getTaskShard(int(jid), len(self.msgClients)), []).append(jid)
+    for shard, jidList in shardJids.iteritems():
+      msgClient = self.msgClients[shard]
+      if not msgClient.connected:
+        continue
+      result = msgClient.createMessage("OptimizeJobs")
+      if not result['OK']:
+        self.log.error("Cannot create Optimize message: %s" % result['Message'])
+        continue
+      msgObj = result['Value']
+      msgObj.jids = list(sorted(jidList))
+      result = msgClient.sendMessage(msgObj)
+      if not result['OK']:
+        self.log.error("Cannot send Optimize message: %s" % result['Message'])
+        continue
+      self.log.info("Optimize msg sent for %s jobs" % len(jidList))
 
   ###########################################################################
   types_getMaxParametricJobs = []
@@ -17,7 +17,8 @@ class JobStateSyncHandler(RequestHandler):
     result = cls.jobDB._getConnection()
     if not result['OK']:
       cls.log.warn("Could not connect to JobDB (%s). Resorting to RPC" % result['Message'])
-    result['Value'].close()
+    else:
+      cls.jobDB._releaseConnection()
     # Try to do magic
     myStuff = dir(cls)
     jobStateStuff = dir(JobState)
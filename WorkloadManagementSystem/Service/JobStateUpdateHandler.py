@@ -9,17 +9,20 @@
 
 # from types import *
 import time
-from DIRAC.Core.DISET.RequestHandler import RequestHandler
+from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 from DIRAC.Core.Utilities import Time
 from DIRAC import gLogger, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
+from DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer import HeartBeatBuffer
 
 __RCSID__ = "$Id$"
 
 # This is a global instance of the JobDB class
 jobDB = False
 logDB = False
+# Buffer of the heart beats, if they are not written synchronously
+heartBeatBuffer = None
 
 JOB_FINAL_STATES = ['Done', 'Completed', 'Failed']
 
@@ -27,10 +30,68 @@ def initializeJobStateUpdateHandler( serviceInfo ):
 
   global jobDB
   global logDB
+  global heartBeatBuffer
   jobDB = JobDB()
   logDB = JobLoggingDB()
+
+  flushPeriod = getServiceOption( serviceInfo, 'HeartBeatFlushPeriod', 10 )
+  if flushPeriod > 0:
+    heartBeatBuffer = HeartBeatBuffer( jobDB, flushPeriod = flushPeriod,
+                                       maxJobs = getServiceOption( serviceInfo, 'HeartBeatMaxPendingJobs', 10000 ) )
+    heartBeatBuffer.start()
   return S_OK()
 
+def getStatusUpdate( statusDict, currentStatus, lastTime ):
+  """ The new attributes of a job and the start and end of its execution, from the status updates
+      statusDict { date : status dict } more recent than lastTime
+
+      :return: ( attrNames, attrValues, startDate, endDate )
+  """
+  status = ""
+  minor = ""
+  application = ""
+  appCounter = ""
+  endDate = ''
+  startDate = ''
+  startFlag = ''
+
+  if currentStatus == "Stalled":
+    status = 'Running'
+
+  # We should only update the status if its time stamp is more recent than the last update
+  for date in [date for date in sorted( statusDict ) if date >= lastTime]:
+    sDict = statusDict[date]
+    if sDict['Status']:
+      status = sDict['Status']
+      if status in JOB_FINAL_STATES:
+        endDate = date
+      if status == "Running":
+        startFlag = 'Running'
+    if sDict['MinorStatus']:
+      minor = sDict['MinorStatus']
+      if minor == "Application" and startFlag == 'Running':
+        startDate = date
+    if sDict['ApplicationStatus']:
+      application = sDict['ApplicationStatus']
+    counter = sDict.get( 'ApplicationCounter' )
+    if counter:
+      appCounter = counter
+  attrNames = []
+  attrValues = []
+  if status:
+    attrNames.append( 'Status' )
+    attrValues.append( status )
+  if minor:
+    attrNames.append( 'MinorStatus' )
+    attrValues.append( minor )
+  if application:
+    attrNames.append( 'ApplicationStatus' )
+    attrValues.append( application )
+  if appCounter:
+    attrNames.append( 'ApplicationCounter' )
+    attrValues.append( appCounter )
+  return attrNames, attrValues, startDate, endDate
+
 class JobStateUpdateHandler( RequestHandler ):
 
   ###########################################################################
@@ -126,96 +187,74 @@ class JobStateUpdateHandler( RequestHandler ):
         logging information in the JobLoggingDB. The statusDict has datetime
         as a key and status information dictionary as values
     """
-
-    status = ""
-    minor = ""
-    application = ""
-    appCounter = ""
-    endDate = ''
-    startDate = ''
-    startFlag = ''
     jobID = int( jobID )
-
-    result = jobDB.getJobAttributes( jobID, ['Status'] )
+    result = self.__setJobsStatusBulk( {jobID : statusDict} )
     if not result['OK']:
       return result
+    if jobID in result['Value']['Failed']:
+      return S_ERROR( result['Value']['Failed'][jobID] )
+    return S_OK()
 
-    if not result['Value']:
+  ###########################################################################
+  types_setJobsStatusBulk = [dict]
+  def export_setJobsStatusBulk( self, jobsStatusDict ):
+    """ setJobStatusBulk for many jobs: jobsStatusDict is { jobID : statusDict }.
+        The current statuses and time stamps of all the jobs are read with single queries,
+        then all the JobDB attributes are set in one transaction and all the JobLoggingDB
+        records added with one statement.
+
+        :return: S_OK( { 'Successful' : [ jobIDs ], 'Failed' : { jobID : error } } )
+    """
+    try:
+      jobsStatusDict = dict( ( int( jobID ), statusDict ) for jobID, statusDict in jobsStatusDict.items() )
+    except ValueError as x:
+      return S_ERROR( 'Invalid job ID: %s' % str( x ) )
+    return self.__setJobsStatusBulk( jobsStatusDict )
+
+  @staticmethod
+  def __setJobsStatusBulk( jobsStatusDict ):
+    """ Set the status of many jobs, jobsStatusDict is { jobID : statusDict }
+    """
+    failed = {}
+    jobIDs = sorted( jobsStatusDict )
+    result = jobDB.getAttributesForJobList( jobIDs, ['Status'] )
+    if not result['OK']:
+      return result
+    currentStatus = dict( ( jobID, attributes['Status'] ) for jobID, attributes in result['Value'].items() )
+    for jobID in set( jobIDs ) - set( currentStatus ):
       # if there is no matching Job it returns an empty dictionary
-      return S_ERROR( 'No Matching Job' )
-
-    new_status = result['Value']['Status']
-    if new_status == "Stalled":
-      status = 'Running'
+      failed[jobID] = 'No Matching Job'
 
     # Get the latest WN time stamps of status updates
-    result = logDB.getWMSTimeStamps( int( jobID ) )
+    result = logDB.getWMSTimeStampsBulk( sorted( currentStatus ) )
     if not result['OK']:
       return result
-    lastTime = max( [float( t ) for s, t in result['Value'].items() if s != 'LastTime'] )
-    lastTime = Time.toString( Time.fromEpoch( lastTime ) )
-
-    # Get the last status values
-    dates = sorted( statusDict )
-    # We should only update the status if its time stamp is more recent than the last update
-    for date in [date for date in dates if date >= lastTime]:
-      sDict = statusDict[date]
-      if sDict['Status']:
-        status = sDict['Status']
-        if status in JOB_FINAL_STATES:
-          endDate = date
-        if status == "Running":
-          startFlag = 'Running'
-      if sDict['MinorStatus']:
-        minor = sDict['MinorStatus']
-        if minor == "Application" and startFlag == 'Running':
-          startDate = date
-      if sDict['ApplicationStatus']:
-        application = sDict['ApplicationStatus']
-      counter = sDict.get( 'ApplicationCounter' )
-      if counter:
-        appCounter = counter
-    attrNames = []
-    attrValues = []
-    if status:
-      attrNames.append( 'Status' )
-      attrValues.append( status )
-    if minor:
-      attrNames.append( 'MinorStatus' )
-      attrValues.append( minor )
-    if application:
-      attrNames.append( 'ApplicationStatus' )
-      attrValues.append( application )
-    if appCounter:
-      attrNames.append( 'ApplicationCounter' )
-      attrValues.append( appCounter )
-    result = jobDB.setJobAttributes( jobID, attrNames, attrValues, update = True )
+    wmsTimeStamps = result['Value']
+
+    updates = {}
+    records = []
+    for jobID in sorted( currentStatus ):
+      if jobID not in wmsTimeStamps:
+        failed[jobID] = 'No Logging Info for job %d' % jobID
+        continue
+      lastTime = max( [float( t ) for s, t in wmsTimeStamps[jobID].items() if s != 'LastTime'] )
+      lastTime = Time.toString( Time.fromEpoch( lastTime ) )
+      statusDict = jobsStatusDict[jobID]
+      updates[jobID] = getStatusUpdate( statusDict, currentStatus[jobID], lastTime )
+
+      # The JobLoggingDB records
+      for date in sorted( statusDict ):
+        sDict = statusDict[date]
+        records.append( ( jobID, sDict['Status'] or 'idem', sDict['MinorStatus'] or 'idem',
+                          sDict['ApplicationStatus'] or 'idem', date, sDict['Source'] ) )
+
+    result = jobDB.setJobsStatusUpdates( updates )
     if not result['OK']:
       return result
-
-    if endDate:
-      result = jobDB.setEndExecTime( jobID, endDate )
-    if startDate:
-      result = jobDB.setStartExecTime( jobID, startDate )
-
-    # Update the JobLoggingDB records
-    for date in dates:
-      sDict = statusDict[date]
-      status = sDict['Status']
-      if not status:
-        status = 'idem'
-      minor = sDict['MinorStatus']
-      if not minor:
-        minor = 'idem'
-      application = sDict['ApplicationStatus']
-      if not application:
-        application = 'idem'
-      source = sDict['Source']
-      result = logDB.addLoggingRecord( jobID, status, minor, application, date, source )
-      if not result['OK']:
-        return result
-
-    return S_OK()
+    result = logDB.addLoggingRecords( records )
+    if not result['OK']:
+      return result
+    return S_OK( {'Successful' : sorted( updates ), 'Failed' : failed} )
 
   ###########################################################################
   types_setJobSite = [[basestring, int, long], basestring]
@@ -308,6 +347,10 @@ class JobStateUpdateHandler( RequestHandler ):
     """ Send a heart beat sign of life for a job jobID
     """
 
+    if heartBeatBuffer:
+      # Written with the heart beats of the other jobs at the next flush
+      return S_OK( heartBeatBuffer.addHeartBeat( int( jobID ), staticData, dynamicData ) )
+
     result = jobDB.setHeartBeatData( int( jobID ), staticData, dynamicData )
     if not result['OK']:
       gLogger.warn( 'Failed to set the heart beat data for job %d ' % int( jobID ) )
@@ -336,3 +379,12 @@ class JobStateUpdateHandler( RequestHandler ):
         result = jobDB.setJobCommandStatus( int( jobID ), key, 'Sent' )
 
     return S_OK( jobMessageDict )
+
+  ###########################################################################
+  types_getHeartBeatStats = []
+  def export_getHeartBeatStats( self ):
+    """ Statistics of the heart beats buffer: heart beats received, flushes, their duration and size
+    """
+    if not heartBeatBuffer:
+      return S_ERROR( 'Heart beats are not buffered' )
+    return S_OK( heartBeatBuffer.getStats() )
@@ -10,7 +10,7 @@ from DIRAC import gLogger, S_OK, S_ERROR
 
 from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.Core.Utilities.Decorators import deprecated
-from DIRAC.Core.DISET.RequestHandler import RequestHandler
+from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 
@@ -21,10 +21,12 @@ from DIRAC.WorkloadManagementSystem.DB.PilotAgentsDB import PilotAgentsDB
 
 from DIRAC.WorkloadManagementSystem.Client.Matcher import Matcher
 from DIRAC.WorkloadManagementSystem.Client.Limiter import Limiter
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 
 gJobDB = False
 gTaskQueueDB = False
+gTaskQueueIndex = None
 
 
 def initializeMatcherHandler(serviceInfo):
@@ -33,6 +35,7 @@ def initializeMatcherHandler(serviceInfo):
 
   global gJobDB
   global gTaskQueueDB
+  global gTaskQueueIndex
   global jlDB
   global pilotAgentsDB
 
@@ -56,6 +59,16 @@ def initializeMatcherHandler(serviceInfo):
 
   sendNumTaskQueues()
 
+  # Optionally match the jobs in memory, reconciling periodically with the TaskQueueDB
+  if getServiceOption(serviceInfo, 'UseTaskQueueIndex', False):
+    gTaskQueueIndex = TaskQueueIndex(gTaskQueueDB)
+    result = gTaskQueueIndex.refresh()
+    if not result['OK']:
+      gLogger.error("Cannot load the task queue index, matching with the TaskQueueDB until it is",
+                    result['Message'])
+    gThreadScheduler.addPeriodicTask(getServiceOption(serviceInfo, 'TaskQueueIndexRefreshPeriod', 10),
+                                     gTaskQueueIndex.refresh)
+
   return S_OK()
 
 
@@ -89,7 +102,8 @@ class MatcherHandler(RequestHandler):
                         jobDB=gJobDB,
                         tqDB=gTaskQueueDB,
                         jlDB=jlDB,
-                        opsHelper=opsHelper)
+                        opsHelper=opsHelper,
+                        tqIndex=gTaskQueueIndex)
       result = matcher.selectJob(resourceDescription, credDict)
     except RuntimeError as rte:
       self.log.error("Error requesting job: ", rte)
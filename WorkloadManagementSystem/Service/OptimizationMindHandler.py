@@ -24,6 +24,9 @@ class OptimizationMindHandler( ExecutorMindHandler ):
       except ValueError:
         self.log.error( "Job ID %s has to be an integer" % jid )
         continue
+      if not self.ownsTask( jid ):
+        self.log.verbose( "Job %s belongs to another shard" % jid )
+        continue
       #Forget and add task to ensure state is reset
       self.forgetTask( jid )
       result = self.executeTask( jid, CachedJobState( jid ) )
@@ -62,10 +65,12 @@ class OptimizationMindHandler( ExecutorMindHandler ):
       jobTypeCondition = cls.srv_getCSOption( "JobTypeRestriction", [] )
       if jobTypeCondition:
         jobCond[ 'JobType' ] = jobTypeCondition
-      result = cls.__jobDB.selectJobs( jobCond, limit = cls.srv_getCSOption( "JobQueryLimit", 10000 ) )
+      # Each shard keeps only its jobs
+      limit = cls.srv_getCSOption( "JobQueryLimit", 10000 ) * cls.getShards()
+      result = cls.__jobDB.selectJobs( jobCond, limit = limit )
       if not result[ 'OK' ]:
         return result
-      jidList = result[ 'Value' ]
+      jidList = [ jid for jid in result[ 'Value' ] if cls.ownsTask( long( jid ) ) ]
       knownJids = cls.getTaskIds()
       added = 0
       for jid in jidList:
@@ -1,11 +1,17 @@
 """ SandboxHandler is the implementation of the Sandbox service
     in the DISET framework
+
+    With the local backend the files are stored once per content, under BasePath/Contents sharded by the
+    prefix of their hash, and referenced by the sandboxes of all the owners. The number of references
+    of each content is kept in the SandboxMetadataDB, the file is deleted with its last sandbox.
 """
 
 __RCSID__ = "$Id$"
 
 import os
+import re
 import time
+import fcntl
 import threading
 import tempfile
 
@@ -24,6 +30,17 @@ from DIRAC.Resources.Storage.StorageElement import StorageElement
 
 sandboxDB = False
 
+# Name of a sandbox file: hash of its content and extension
+contentIdRE = re.compile(r"^[0-9a-fA-F]{32}(\.\w+)*$")
+
+
+class _NullSink(object):
+  """ Data sink discarding what it receives, to check the hash of already stored contents
+  """
+
+  def write(self, _data):
+    pass
+
 
 def initializeSandboxStoreHandler(serviceInfo):
   global sandboxDB
@@ -36,6 +53,8 @@ class SandboxStoreHandler(RequestHandler):
   __purgeCount = -1
   __purgeLock = threading.Lock()
   __purgeWorking = False
+  # Uploads of already stored contents since the start of the service
+  __dedupStats = {'DedupUploads': 0, 'DedupUploadedBytes': 0}
 
   def initialize(self):
     self.__backend = self.getCSOption("Backend", "local")
@@ -116,23 +135,28 @@ class SandboxStoreHandler(RequestHandler):
       return S_OK(sbURL)
 
     if self.__useLocalStorage:
-      hdPath = self.__sbToHDPath(sbPath)
+      contentId = self.__getContentId(sbPath)
+      if not contentId:
+        fileHelper.markAsTransferred()
+        return S_ERROR("Invalid sandbox name %s" % fileId)
+      result = self.__networkToContent(fileHelper, contentId, aHash)
+      if not result['OK']:
+        return result
+      tmpPath = result['Value']
     else:
-      hdPath = False
-    # Write to local file
-    result = self.__networkToFile(fileHelper, hdPath)
-    if not result['OK']:
-      gLogger.error("Error while receiving sandbox file", "%s" % result['Message'])
-      return result
-    hdPath = result['Value']
-    gLogger.info("Wrote sandbox to file %s" % hdPath)
-    # Check hash!
-    if fileHelper.getHash() != aHash:
-      self.__secureUnlinkFile(hdPath)
-      gLogger.error("Hashes don't match! Client defined hash is different with received data hash!")
-      return S_ERROR("Hashes don't match!")
-    # If using remote storage, copy there!
-    if not self.__useLocalStorage:
+      # Write to local file
+      result = self.__networkToFile(fileHelper)
+      if not result['OK']:
+        gLogger.error("Error while receiving sandbox file", "%s" % result['Message'])
+        return result
+      hdPath = result['Value']
+      gLogger.info("Wrote sandbox to file %s" % hdPath)
+      # Check hash!
+      if fileHelper.getHash() != aHash:
+        self.__secureUnlinkFile(hdPath)
+        gLogger.error("Hashes don't match! Client defined hash is different with received data hash!")
+        return S_ERROR("Hashes don't match!")
+      # If using remote storage, copy there!
       gLogger.info("Uploading sandbox to external storage")
       result = self.__copyToExternalSE(hdPath, sbPath)
       self.__secureUnlinkFile(hdPath)
@@ -144,8 +168,18 @@ class SandboxStoreHandler(RequestHandler):
     result = sandboxDB.registerAndGetSandbox(credDict['username'], credDict['DN'], credDict['group'],
                                              self.__seNameToUse, sbPath, fileHelper.getTransferedBytes())
     if not result['OK']:
-      self.__secureUnlinkFile(hdPath)
+      if self.__useLocalStorage and tmpPath:
+        self.__secureUnlinkFile(tmpPath)
       return result
+    if self.__useLocalStorage:
+      sbId, newSandbox = result['Value']
+      if newSandbox:
+        result = self.__addContentReference(sbId, contentId, fileHelper.getTransferedBytes(), tmpPath)
+        if not result['OK']:
+          sandboxDB.deleteSandboxes([sbId])
+          return result
+      elif tmpPath:
+        self.__secureUnlinkFile(tmpPath)
 
     sbURL = "SB:%s|%s" % (self.__seNameToUse, sbPath)
     assignTo = dict([(key, [(sbURL, assignTo[key])]) for key in assignTo])
@@ -161,7 +195,7 @@ class SandboxStoreHandler(RequestHandler):
     result = self.__networkToFile(fileHelper)
     if not result['OK']:
       return result
-    tmpFilePath = result['OK']
+    tmpFilePath = result['Value']
     gLogger.info("Got Sandbox to local storage", tmpFilePath)
 
     extension = fileId[fileId.find(".tar") + 1:]
@@ -183,9 +217,20 @@ class SandboxStoreHandler(RequestHandler):
     if not result['OK']:
       self.__secureUnlinkFile(tmpFilePath)
       return result
-    sbid, _newSandbox = result['Value']
+    sbid, newSandbox = result['Value']
     gLogger.info("Registered in DB", "with SBId %s" % sbid)
 
+    contentId = self.__getContentId(sbPath) if self.__useLocalStorage else None
+    if contentId:
+      if not newSandbox:
+        self.__secureUnlinkFile(tmpFilePath)
+        return S_OK("SB:%s|%s" % (seName, sePFN))
+      result = self.__addContentReference(sbid, contentId, fileHelper.getTransferedBytes(), tmpFilePath)
+      if not result['OK']:
+        sandboxDB.deleteSandboxes([sbid])
+        return result
+      return S_OK("SB:%s|%s" % (seName, sePFN))
+
     result = self.__moveToFinalLocation(tmpFilePath, sbPath)
     self.__secureUnlinkFile(tmpFilePath)
     if not result['OK']:
@@ -219,21 +264,139 @@ class SandboxStoreHandler(RequestHandler):
     destPfn = result['Value']['Successful'][sbPath]
     return S_OK((self.__externalSEName, destPfn))
 
+  def __getLocalPath(self, sbPath):
+    """
+    Local path of a sandbox: the path of its content if it is stored, else its own path
+    """
+    contentId = self.__getContentId(sbPath)
+    if contentId:
+      hdPath = self.__contentToHDPath(contentId)
+      if os.path.isfile(hdPath):
+        return hdPath
+    return self.__sbToHDPath(sbPath)
+
   def __sbToHDPath(self, sbPath):
     while sbPath and sbPath[0] == "/":
       sbPath = sbPath[1:]
     basePath = self.getCSOption("BasePath", "/opt/dirac/storage/sandboxes")
     return os.path.join(basePath, sbPath)
 
-  def __networkToFile(self, fileHelper, destFileName=False):
+  @staticmethod
+  def __getContentId(sbPath):
+    """
+    The content id of a sandbox is its file name: hash of the content and extension
+    """
+    contentId = os.path.basename(sbPath)
+    if contentIdRE.match(contentId):
+      return contentId
+    return None
+
+  def __contentToHDPath(self, contentId):
+    """
+    Local path of a content, sharded by the prefix of its hash
+    """
+    basePath = self.getCSOption("BasePath", "/opt/dirac/storage/sandboxes")
+    return os.path.join(basePath, "Contents", contentId[0:3], contentId[3:6], contentId)
+
+  def __lockContent(self, contentId):
+    """
+    Take the lock serializing the new references to a content with its deletion. It is a lock file next to the
+    directory of the content, so that it holds for all the threads and processes sharing the BasePath.
+    The lock is released by closing the returned file
+    """
+    contentDir = os.path.dirname(self.__contentToHDPath(contentId))
+    mkDir(os.path.dirname(contentDir))
+    lockFD = open("%s.lock" % contentDir, 'a')
+    try:
+      fcntl.flock(lockFD, fcntl.LOCK_EX)
+    except IOError:
+      lockFD.close()
+      raise
+    return lockFD
+
+  def __networkToContent(self, fileHelper, contentId, aHash):
     """
-    Dump incoming network data to temporal file
+    Receive a sandbox for the local content store. The hash is computed while receiving: if the content
+    is already stored the data is only checked, else it is written to a temporal file next to its final path.
+    Returns the path of the temporal file, None if the content is already stored
+    """
+    hdPath = self.__contentToHDPath(contentId)
+    if os.path.isfile(hdPath):
+      gLogger.info("Sandbox content already stored, not writing it", contentId)
+      try:
+        result = fileHelper.networkToDataSink(_NullSink(), maxFileSize=self.__maxUploadBytes)
+      except Exception as e:
+        gLogger.error("Error while receiving sandbox file", repr(e).replace(',)', ')'))
+        return S_ERROR("Error while receiving sandbox file")
+      if not result['OK']:
+        gLogger.error("Error while receiving sandbox file", "%s" % result['Message'])
+        return result
+      if fileHelper.getHash() != aHash:
+        gLogger.error("Hashes don't match! Client defined hash is different with received data hash!")
+        return S_ERROR("Hashes don't match!")
+      SandboxStoreHandler.__dedupStats['DedupUploads'] += 1
+      SandboxStoreHandler.__dedupStats['DedupUploadedBytes'] += fileHelper.getTransferedBytes()
+      return S_OK(None)
+
+    result = self.__networkToFile(fileHelper, tmpDir=os.path.dirname(hdPath))
+    if not result['OK']:
+      gLogger.error("Error while receiving sandbox file", "%s" % result['Message'])
+      return result
+    tmpPath = result['Value']
+    if fileHelper.getHash() != aHash:
+      self.__secureUnlinkFile(tmpPath)
+      gLogger.error("Hashes don't match! Client defined hash is different with received data hash!")
+      return S_ERROR("Hashes don't match!")
+    return S_OK(tmpPath)
+
+  def __addContentReference(self, sbId, contentId, size, tmpPath=None):
+    """
+    Count a new sandbox referencing a content of the local store, moving the received content into place
+    if it is not there. The purge drops the references and deletes the contents under the same content lock,
+    so a content found here is only deleted after the new reference has been counted.
+    The temporal file is removed in any case
+    """
+    hdPath = self.__contentToHDPath(contentId)
+    try:
+      lockFD = self.__lockContent(contentId)
+    except (IOError, OSError) as e:
+      if tmpPath:
+        self.__secureUnlinkFile(tmpPath)
+      gLogger.error("Cannot lock the sandbox content", "%s: %s" % (contentId, repr(e).replace(',)', ')')))
+      return S_ERROR("Cannot lock the sandbox content")
+    try:
+      if not os.path.isfile(hdPath):
+        if not tmpPath:
+          gLogger.error("Sandbox content deleted while it was uploaded", contentId)
+          return S_ERROR("Sandbox content deleted while it was uploaded, try again")
+        mkDir(os.path.dirname(hdPath))
+        try:
+          os.rename(tmpPath, hdPath)
+        except OSError as e:
+          errMsg = "Cannot move temporal file to final path"
+          gLogger.error(errMsg, repr(e).replace(',)', ')'))
+          return S_ERROR(errMsg)
+        tmpPath = None
+        gLogger.info("Wrote sandbox to file %s" % hdPath)
+      result = sandboxDB.addContentReference(self.__localSEName, contentId, size, sbId)
+    finally:
+      lockFD.close()
+      if tmpPath:
+        self.__secureUnlinkFile(tmpPath)
+    if not result['OK']:
+      gLogger.error("Cannot add a reference to the sandbox content", "%s: %s" % (contentId, result['Message']))
+    return result
+
+  def __networkToFile(self, fileHelper, destFileName=False, tmpDir=None):
+    """
+    Dump incoming network data to temporal file, created in tmpDir if no file name is given
     """
-    tfd = None
     if not destFileName:
       try:
-        tfd, destFileName = tempfile.mkstemp(prefix="DSB.")
-        tfd.close()
+        if tmpDir:
+          mkDir(tmpDir)
+        tfd, destFileName = tempfile.mkstemp(prefix="DSB.", dir=tmpDir)
+        os.close(tfd)
       except Exception as e:
         gLogger.error("%s" % repr(e).replace(',)', ')'))
         return S_ERROR("Cannot create temporary file")
@@ -242,16 +405,15 @@ class SandboxStoreHandler(RequestHandler):
     mkDir(os.path.dirname(destFileName))
 
     try:
-      if tfd is not None:
-        fd = tfd
-      else:
-        fd = open(destFileName, "wb")
+      fd = open(destFileName, "wb")
       result = fileHelper.networkToDataSink(fd, maxFileSize=self.__maxUploadBytes)
       fd.close()
     except Exception as e:
       gLogger.error("Cannot open to write destination file", "%s: %s" % (destFileName, repr(e).replace(',)', ')')))
+      self.__secureUnlinkFile(destFileName)
       return S_ERROR("Cannot open to write destination file")
     if not result['OK']:
+      self.__secureUnlinkFile(destFileName)
       return result
     return S_OK(destFileName)
 
@@ -377,6 +539,19 @@ class SandboxStoreHandler(RequestHandler):
     """
     return getDiskSpace(self.getCSOption("BasePath", "/opt/dirac/storage/sandboxes"), total=True)
 
+  types_getStorageStats = []
+
+  def export_getStorageStats(self):
+    """ Get the deduplication statistics of the local storage: contents stored and sandboxes referencing
+        them, bytes stored and saved, dedup ratio, and the uploads not written since the service started
+    """
+    result = sandboxDB.getContentStats(self.__localSEName)
+    if not result['OK']:
+      return result
+    stats = result['Value']
+    stats.update(SandboxStoreHandler.__dedupStats)
+    return S_OK(stats)
+
   ##################
   # Download sandboxes
 
@@ -394,7 +569,7 @@ class SandboxStoreHandler(RequestHandler):
     sbId = result['Value']
     sandboxDB.accessedSandboxById(sbId)
     # If it's a local file
-    hdPath = self.__sbToHDPath(filePath)
+    hdPath = self.__getLocalPath(filePath)
     if not os.path.isfile(hdPath):
       return S_ERROR("Sandbox does not exist")
     result = fileHelper.getFileDescriptor(hdPath, 'rb')
@@ -428,14 +603,14 @@ class SandboxStoreHandler(RequestHandler):
       return result
     sbList = result['Value']
     gLogger.info("Got %s sandboxes to purge" % len(sbList))
-    for sbId, SEName, SEPFN in sbList:  # pylint: disable=invalid-name
-      self.__purgeSandbox(sbId, SEName, SEPFN)
+    for sbId, SEName, SEPFN, inContentStore in sbList:  # pylint: disable=invalid-name
+      self.__purgeSandbox(sbId, SEName, SEPFN, inContentStore)
 
     SandboxStoreHandler.__purgeWorking = False
     return S_OK()
 
-  def __purgeSandbox(self, sbId, SEName, SEPFN):
-    result = self.__deleteSandboxFromBackend(SEName, SEPFN)
+  def __purgeSandbox(self, sbId, SEName, SEPFN, inContentStore=False):
+    result = self.__deleteSandboxFromBackend(SEName, SEPFN, inContentStore)
     if not result['OK']:
       gLogger.error("Cannot delete sandbox from backend", result['Message'])
       return
@@ -443,10 +618,27 @@ class SandboxStoreHandler(RequestHandler):
     if not result['OK']:
       gLogger.error("Cannot delete sandbox from DB", result['Message'])
 
-  def __deleteSandboxFromBackend(self, SEName, SEPFN):
+  def __deleteSandboxFromBackend(self, SEName, SEPFN, inContentStore=False):
     gLogger.info("Purging sandbox" "SB:%s|%s" % (SEName, SEPFN))
     if SEName != self.__localSEName:
       return self.__deleteSandboxFromExternalBackend(SEName, SEPFN)
+    elif inContentStore:
+      contentId = self.__getContentId(SEPFN)
+      try:
+        lockFD = self.__lockContent(contentId)
+      except (IOError, OSError) as e:
+        gLogger.error("Cannot lock the sandbox content", "%s: %s" % (contentId, repr(e).replace(',)', ')')))
+        return S_ERROR("Cannot lock the sandbox content")
+      try:
+        result = sandboxDB.removeContentReference(SEName, contentId)
+        # The directories of the contents and their lock files are kept, their number is bounded
+        if result['OK'] and result['Value'] is not None and result['Value'] <= 0:
+          self.__secureUnlinkFile(self.__contentToHDPath(contentId))
+      finally:
+        lockFD.close()
+      if not result['OK']:
+        return result
+      return S_OK()
     else:
       hdPath = self.__sbToHDPath(SEPFN)
       try:
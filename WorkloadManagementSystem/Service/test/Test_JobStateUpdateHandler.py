@@ -0,0 +1,92 @@
+""" Unit tests of the bulk status updates of the JobStateUpdate service, the DBs are replaced by mocks
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK
+from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
+from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import MAGIC_EPOC_NUMBER
+from DIRAC.WorkloadManagementSystem.Service import JobStateUpdateHandler as moduleTested
+from DIRAC.WorkloadManagementSystem.Service.JobStateUpdateHandler import JobStateUpdateHandler, getStatusUpdate
+
+# 2018-01-01 12:00:00 UTC in the JobLoggingDB time order
+LAST_TIME = 1514808000 - MAGIC_EPOC_NUMBER
+
+
+def statusEntry(status='', minor='', application='', source='JobWrapper'):
+  return {'Status': status, 'MinorStatus': minor, 'ApplicationStatus': application, 'Source': source}
+
+
+def test_getStatusUpdate():
+  statusDict = {'2018-01-01 11:00:00': statusEntry('Failed'),
+                '2018-01-01 12:00:01': statusEntry('Running', 'Application'),
+                '2018-01-01 12:00:02': statusEntry(application='Step 1'),
+                '2018-01-01 12:00:03': statusEntry('Done', 'Execution Complete')}
+  attrNames, attrValues, startDate, endDate = getStatusUpdate(statusDict, 'Matched', '2018-01-01 12:00:00')
+  assert dict(zip(attrNames, attrValues)) == {'Status': 'Done', 'MinorStatus': 'Execution Complete',
+                                              'ApplicationStatus': 'Step 1'}
+  assert startDate == '2018-01-01 12:00:01'
+  assert endDate == '2018-01-01 12:00:03'
+  # Nothing recent, a stalled job is running again
+  assert getStatusUpdate({'2018-01-01 11:00:00': statusEntry('Failed')}, 'Stalled', '2018-01-01 12:00:00') == \
+      (['Status'], ['Running'], '', '')
+
+
+@patch.object(moduleTested, 'logDB')
+@patch.object(moduleTested, 'jobDB')
+def test_bulk(jobDB, logDB):
+  jobDB.getAttributesForJobList.return_value = S_OK({1: {'Status': 'Running'}, 2: {'Status': 'Stalled'},
+                                                     3: {'Status': 'Running'}})
+  logDB.getWMSTimeStampsBulk.return_value = S_OK({1: {'Running': str(LAST_TIME), 'LastTime': '2018-01-01'},
+                                                  2: {'Running': str(LAST_TIME)}})
+  jobDB.setJobsStatusUpdates.return_value = S_OK()
+  logDB.addLoggingRecords.return_value = S_OK()
+
+  jobsStatusDict = {'1': {'2018-01-01 13:00:00': statusEntry('Done', 'Execution Complete')},
+                    2: {'2018-01-01 13:00:00': statusEntry(application='Step 2')},
+                    3: {'2018-01-01 13:00:00': statusEntry('Done')},
+                    4: {'2018-01-01 13:00:00': statusEntry('Done')}}
+  with patch.object(moduleTested.Time, 'toString', return_value='2018-01-01 12:00:00'):
+    result = JobStateUpdateHandler.__new__(JobStateUpdateHandler).export_setJobsStatusBulk(jobsStatusDict)
+  assert result['OK']
+  assert result['Value'] == {'Successful': [1, 2],
+                             'Failed': {3: 'No Logging Info for job 3', 4: 'No Matching Job'}}
+
+  # Single queries and statements for all the jobs
+  assert jobDB.getAttributesForJobList.call_args[0][0] == [1, 2, 3, 4]
+  assert logDB.getWMSTimeStampsBulk.call_args[0][0] == [1, 2, 3]
+  updates = jobDB.setJobsStatusUpdates.call_args[0][0]
+  assert updates == {1: (['Status', 'MinorStatus'], ['Done', 'Execution Complete'], '', '2018-01-01 13:00:00'),
+                     2: (['Status', 'ApplicationStatus'], ['Running', 'Step 2'], '', '')}
+  assert logDB.addLoggingRecords.call_args[0][0] == [
+      (1, 'Done', 'Execution Complete', 'idem', '2018-01-01 13:00:00', 'JobWrapper'),
+      (2, 'idem', 'idem', 'Step 2', '2018-01-01 13:00:00', 'JobWrapper')]
+
+  # The single job call goes through the same path
+  jobDB.getAttributesForJobList.return_value = S_OK({})
+  result = JobStateUpdateHandler.__new__(JobStateUpdateHandler).export_setJobStatusBulk(4, jobsStatusDict[4])
+  assert not result['OK']
+  assert result['Message'] == 'No Matching Job'
+
+
+def test_setJobsStatusUpdates():
+  jobDB = JobDB.__new__(JobDB)
+  jobDB.jobAttributeNames = ['Status', 'MinorStatus']
+  jobDB._escapeString = lambda value: S_OK("'%s'" % value)
+  jobDB._transaction = MagicMock(return_value=S_OK())
+  updates = {1: (['Status'], ['Done'], '', '2018-01-01 13:00:00'),
+             2: (['Status'], ['Done'], '', '2018-01-01 13:00:00'),
+             3: (['Status', 'MinorStatus'], ['Running', 'Application'], '2018-01-01 13:00:00', '')}
+  assert jobDB.setJobsStatusUpdates(updates)['OK']
+  cmdList = sorted(jobDB._transaction.call_args[0][0])
+  assert cmdList == [
+      "UPDATE Jobs SET EndExecTime='2018-01-01 13:00:00' WHERE JobID in ( 1,2 ) AND EndExecTime IS NULL",
+      "UPDATE Jobs SET StartExecTime='2018-01-01 13:00:00' WHERE JobID in ( 3 ) AND StartExecTime IS NULL",
+      "UPDATE Jobs SET Status='Done', LastUpdateTime=UTC_TIMESTAMP() WHERE JobID in ( 1,2 )",
+      "UPDATE Jobs SET Status='Running', MinorStatus='Application', LastUpdateTime=UTC_TIMESTAMP() "
+      "WHERE JobID in ( 3 )"]
+  assert not jobDB.setJobsStatusUpdates({1: (['Site'], ['aSite'], '', '')})['OK']
@@ -0,0 +1,241 @@
+""" Unit tests of the content-addressed storage of the SandboxStore service, SandboxMetadataDB is replaced by a mock
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import pytest
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.Service import SandboxStoreHandler as moduleTested
+from DIRAC.WorkloadManagementSystem.Service.SandboxStoreHandler import SandboxStoreHandler
+
+DATA = 'sandbox data' * 100
+DATA_HASH = hashlib.md5(DATA).hexdigest()
+
+
+class FakeFileHelper(object):
+  """ Receives DATA, hashing it as FileHelper does """
+
+  def __init__(self, data=DATA, onReceive=None):
+    self.data = data
+    self.onReceive = onReceive
+    self.written = 0
+    self.oMD5 = hashlib.md5()
+
+  def networkToDataSink(self, dataSink, maxFileSize=0):
+    for i in xrange(0, len(self.data), 100):
+      chunk = self.data[i:i + 100]
+      self.oMD5.update(chunk)
+      dataSink.write(chunk)
+    if self.onReceive:
+      self.onReceive()
+    if not isinstance(dataSink, moduleTested._NullSink):
+      self.written += len(self.data)
+    return S_OK()
+
+  def getHash(self):
+    return self.oMD5.hexdigest()
+
+  def getTransferedBytes(self):
+    return len(self.data)
+
+  def markAsTransferred(self):
+    pass
+
+
+class FakeSandboxDB(object):
+  """ Registers the sandboxes and counts the references to the contents """
+
+  def __init__(self):
+    self.sandboxes = {}
+    self.inContentStore = set()
+    self.refCounts = {}
+
+  def getSandboxId(self, seName, sePFN, owner, group):
+    if (seName, sePFN) in self.sandboxes:
+      return S_OK(self.sandboxes[(seName, sePFN)])
+    return S_ERROR("No sandbox matches the requirements")
+
+  def registerAndGetSandbox(self, owner, ownerDN, group, seName, sePFN, size):
+    if (seName, sePFN) in self.sandboxes:
+      return S_OK((self.sandboxes[(seName, sePFN)], False))
+    self.sandboxes[(seName, sePFN)] = len(self.sandboxes) + 1
+    return S_OK((self.sandboxes[(seName, sePFN)], True))
+
+  def assignSandboxesToEntities(self, *_args):
+    return S_OK()
+
+  def deleteSandboxes(self, sbIds):
+    for location, sbId in self.sandboxes.items():
+      if sbId in sbIds:
+        del self.sandboxes[location]
+    return S_OK()
+
+  def addContentReference(self, seName, contentId, size, sbId):
+    self.refCounts[contentId] = self.refCounts.get(contentId, 0) + 1
+    self.inContentStore.add(sbId)
+    return S_OK(self.refCounts[contentId])
+
+  def removeContentReference(self, seName, contentId):
+    if contentId not in self.refCounts:
+      return S_OK(None)
+    self.refCounts[contentId] -= 1
+    if not self.refCounts[contentId]:
+      del self.refCounts[contentId]
+      return S_OK(0)
+    return S_OK(self.refCounts[contentId])
+
+
+@pytest.fixture
+def basePath():
+  directory = tempfile.mkdtemp()
+  yield directory
+  shutil.rmtree(directory, ignore_errors=True)
+
+
+def getHandler(basePath, username):
+  handler = SandboxStoreHandler.__new__(SandboxStoreHandler)
+  options = {'BasePath': basePath}
+  handler.getCSOption = lambda option, default=None: options.get(option, default)
+  handler.getRemoteCredentials = lambda: {'username': username, 'group': 'user', 'DN': '/DN=%s' % username,
+                                          'properties': []}
+  handler.serviceInfoDict = {'clientSetup': 'Setup'}
+  handler._SandboxStoreHandler__useLocalStorage = True
+  handler._SandboxStoreHandler__localSEName = 'SandboxSE'
+  handler._SandboxStoreHandler__seNameToUse = 'SandboxSE'
+  handler._SandboxStoreHandler__maxUploadBytes = 0
+  return handler
+
+
+def test_dedup(basePath):
+  sandboxDB = FakeSandboxDB()
+  with patch.object(moduleTested, 'sandboxDB', sandboxDB):
+    fileId = '%s.tar.bz2' % DATA_HASH
+    helpers = [FakeFileHelper() for _ in range(3)]
+    sbURLs = [getHandler(basePath, user).transfer_fromClient(fileId, '', len(DATA), helper)['Value']
+              for user, helper in zip(('user1', 'user2', 'user2'), helpers)]
+    # Each owner has its own sandbox, the content is written once
+    assert len(set(sbURLs)) == 2
+    assert [helper.written for helper in helpers] == [len(DATA), 0, 0]
+    assert sandboxDB.refCounts == {fileId: 2}
+    contentPath = os.path.join(basePath, 'Contents', DATA_HASH[0:3], DATA_HASH[3:6], fileId)
+    with open(contentPath) as fd:
+      assert fd.read() == DATA
+    assert os.listdir(os.path.dirname(contentPath)) == [fileId]
+
+    # The content is deleted with its last sandbox
+    handler = getHandler(basePath, 'user1')
+    for sbURL in set(sbURLs):
+      assert os.path.isfile(contentPath)
+      seName, sePFN = sbURL[3:].split('|')
+      assert handler._SandboxStoreHandler__getLocalPath(sePFN) == contentPath
+      assert sandboxDB.sandboxes[(seName, sePFN)] in sandboxDB.inContentStore
+      assert handler._SandboxStoreHandler__deleteSandboxFromBackend(seName, sePFN, True)['OK']
+    assert not os.path.exists(contentPath)
+    assert not sandboxDB.refCounts
+
+
+def test_wrongHash(basePath):
+  sandboxDB = FakeSandboxDB()
+  with patch.object(moduleTested, 'sandboxDB', sandboxDB):
+    fileId = '%s.tar.bz2' % DATA_HASH
+    result = getHandler(basePath, 'user1').transfer_fromClient(fileId, '', len(DATA), FakeFileHelper('other data'))
+    assert not result['OK']
+    # Nothing is left in the store
+    contentDir = os.path.join(basePath, 'Contents', DATA_HASH[0:3], DATA_HASH[3:6])
+    assert os.listdir(contentDir) == []
+    assert not sandboxDB.sandboxes
+
+    # Nor accepted for an already stored content
+    assert getHandler(basePath, 'user1').transfer_fromClient(fileId, '', len(DATA), FakeFileHelper())['OK']
+    result = getHandler(basePath, 'user2').transfer_fromClient(fileId, '', len(DATA), FakeFileHelper('other data'))
+    assert not result['OK']
+    assert sandboxDB.refCounts == {fileId: 1}
+
+    # Names that are not a hash are refused
+    result = getHandler(basePath, 'user1').transfer_fromClient('../../etc.tar', '', len(DATA), FakeFileHelper())
+    assert not result['OK']
+
+
+def test_contentDeletedWhileUploading(basePath):
+  sandboxDB = FakeSandboxDB()
+  with patch.object(moduleTested, 'sandboxDB', sandboxDB):
+    fileId = '%s.tar.bz2' % DATA_HASH
+    sbURL = getHandler(basePath, 'user1').transfer_fromClient(fileId, '', len(DATA), FakeFileHelper())['Value']
+    seName, sePFN = sbURL[3:].split('|')
+
+    # The only sandbox of the content is purged while the same content is uploaded again
+    def purge():
+      assert getHandler(basePath, 'user1')._SandboxStoreHandler__deleteSandboxFromBackend(seName, sePFN, True)['OK']
+      sandboxDB.deleteSandboxes([sandboxDB.sandboxes[(seName, sePFN)]])
+    result = getHandler(basePath, 'user2').transfer_fromClient(fileId, '', len(DATA), FakeFileHelper(onReceive=purge))
+    assert not result['OK']
+    # No sandbox is left without its content
+    assert not sandboxDB.sandboxes
+    assert not sandboxDB.refCounts
+
+
+def test_contentLockedByAnotherProcess(basePath):
+  sandboxDB = FakeSandboxDB()
+  with patch.object(moduleTested, 'sandboxDB', sandboxDB):
+    fileId = '%s.tar.bz2' % DATA_HASH
+    sbURL = getHandler(basePath, 'user1').transfer_fromClient(fileId, '', len(DATA), FakeFileHelper())['Value']
+    seName, sePFN = sbURL[3:].split('|')
+    contentPath = os.path.join(basePath, 'Contents', DATA_HASH[0:3], DATA_HASH[3:6], fileId)
+
+    # Another process sharing the BasePath holds the lock of the content, the purge waits for it
+    lockFD = open('%s.lock' % os.path.dirname(contentPath), 'a')
+    fcntl.flock(lockFD, fcntl.LOCK_EX)
+    results = []
+    purge = threading.Thread(target=lambda: results.append(
+        getHandler(basePath, 'user1')._SandboxStoreHandler__deleteSandboxFromBackend(seName, sePFN, True)))
+    purge.start()
+    time.sleep(0.2)
+    assert not results
+    assert sandboxDB.refCounts == {fileId: 1}
+    lockFD.close()
+    purge.join()
+    assert results[0]['OK']
+    assert not os.path.exists(contentPath)
+
+
+def test_referenceFailure(basePath):
+  sandboxDB = FakeSandboxDB()
+  sandboxDB.addContentReference = MagicMock(return_value=S_ERROR("DB down"))
+  with patch.object(moduleTested, 'sandboxDB', sandboxDB):
+    fileId = '%s.tar.bz2' % DATA_HASH
+    result = getHandler(basePath, 'user1').transfer_fromClient(fileId, '', len(DATA), FakeFileHelper())
+    assert not result['OK']
+    assert not sandboxDB.sandboxes
+
+
+def test_legacySandbox(basePath):
+  sandboxDB = MagicMock()
+  with patch.object(moduleTested, 'sandboxDB', sandboxDB):
+    handler = getHandler(basePath, 'user1')
+    # A content with the same hash stored since, for other sandboxes
+    contentPath = os.path.join(basePath, 'Contents', DATA_HASH[0:3], DATA_HASH[3:6], '%s.tar.bz2' % DATA_HASH)
+    os.makedirs(os.path.dirname(contentPath))
+    with open(contentPath, 'w') as fd:
+      fd.write(DATA)
+    sePFN = '/SandBox/u/user1.user/%s/%s/%s.tar.bz2' % (DATA_HASH[0:3], DATA_HASH[3:6], DATA_HASH)
+    hdPath = os.path.join(basePath, sePFN[1:])
+    os.makedirs(os.path.dirname(hdPath))
+    with open(hdPath, 'w') as fd:
+      fd.write(DATA)
+    # Sandboxes stored before the contents are deleted from their own path, without touching the content
+    assert handler._SandboxStoreHandler__deleteSandboxFromBackend('SandboxSE', sePFN)['OK']
+    assert not os.path.exists(hdPath)
+    assert os.path.isfile(contentPath)
+    assert not sandboxDB.removeContentReference.called
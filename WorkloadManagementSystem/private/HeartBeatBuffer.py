@@ -0,0 +1,158 @@
+""" In-memory buffer of the job heart beats, used by the JobStateUpdate service
+
+    Storing a heart beat with JobDB.setHeartBeatData costs an update of the Jobs table, a replace of the
+    static data in JobParameters and an insert in HeartBeatLoggingInfo, followed by the query of the
+    job commands. The HeartBeatBuffer acknowledges the heart beats immediately and keeps them per job:
+    the last heart beat time and static data of each job, and all its dynamic data. They are written
+    periodically by a thread in a few bulk statements for all the jobs.
+
+    The commands for the jobs are loaded in memory at each flush and given with the next heart beat of
+    the job, they are then set Sent in the DB at the following flush.
+"""
+
+__RCSID__ = "$Id$"
+
+import datetime
+import threading
+import time
+
+from DIRAC import gLogger
+from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
+
+
+class HeartBeatBuffer(object):
+  """ Coalesces the heart beats of the jobs before writing them to JobDB
+  """
+
+  def __init__(self, jobDB, flushPeriod=10, maxJobs=10000):
+    """ c'tor
+
+        :param jobDB: JobDB instance
+        :param int flushPeriod: seconds between two flushes of the heart beats
+        :param int maxJobs: number of jobs with pending heart beats triggering a flush before the period
+    """
+    self.__jobDB = jobDB
+    self.__flushPeriod = flushPeriod
+    self.__maxJobs = maxJobs
+    self.log = gLogger.getSubLogger("HeartBeatBuffer")
+    # Protects the pending heart beats and the commands
+    self.__lock = threading.Lock()
+    # jobID : [ heartBeatTime, staticDataDict, [ ( heartBeatTime, dynamicDataDict ) ] ]
+    self.__heartBeats = {}
+    # jobID : { command : arguments } for commands still to be given to the jobs
+    self.__commands = {}
+    # ( jobID, command ) given to the jobs, to be set Sent at the next flush
+    self.__sentCommands = []
+    # Serializes the flushes
+    self.__flushLock = threading.Lock()
+    self.__flushNeeded = threading.Event()
+    self.__stats = {'HeartBeats': 0, 'Flushes': 0, 'LastFlushTime': 0., 'LastBatchSize': 0,
+                    'MaxBatchSize': 0, 'TotalFlushTime': 0., 'Failures': 0}
+    self.__thread = None
+
+    gMonitor.registerActivity('heartBeats', "Heart beats received",
+                              'JobStateUpdate', "heart beats", gMonitor.OP_SUM)
+    gMonitor.registerActivity('heartBeatFlushTime', "Heart beats flush time",
+                              'JobStateUpdate', "secs", gMonitor.OP_MEAN)
+    gMonitor.registerActivity('heartBeatBatchSize', "Jobs per heart beats flush",
+                              'JobStateUpdate', "jobs", gMonitor.OP_MEAN)
+
+  def start(self):
+    """ Starts the flushing thread, after loading the pending commands
+    """
+    self.__loadCommands()
+    self.__thread = threading.Thread(target=self.__flushLoop, name="HeartBeatBuffer")
+    self.__thread.setDaemon(True)
+    self.__thread.start()
+
+  def __flushLoop(self):
+    while True:
+      self.__flushNeeded.wait(self.__flushPeriod)
+      self.__flushNeeded.clear()
+      try:
+        self.flush()
+      except Exception as x:  # pylint: disable=broad-except
+        self.log.exception("Failed to flush the heart beats", lException=x)
+
+  def addHeartBeat(self, jobID, staticData, dynamicData):
+    """ Keeps the heart beat of a job for the next flush
+
+        :return: dict { command : arguments } of the commands for the job
+    """
+    now = datetime.datetime.utcnow()
+    with self.__lock:
+      heartBeat = self.__heartBeats.get(jobID)
+      if heartBeat is None:
+        heartBeat = self.__heartBeats[jobID] = [now, {}, []]
+      heartBeat[0] = now
+      heartBeat[1].update(staticData)
+      if dynamicData:
+        heartBeat[2].append((now, dynamicData))
+      commands = self.__commands.pop(jobID, {})
+      self.__sentCommands.extend((jobID, command) for command in commands)
+      self.__stats['HeartBeats'] += 1
+      nbJobs = len(self.__heartBeats)
+    gMonitor.addMark('heartBeats', 1)
+    if nbJobs >= self.__maxJobs:
+      self.__flushNeeded.set()
+    return commands
+
+  def flush(self):
+    """ Writes the pending heart beats and command statuses, and reloads the commands
+    """
+    with self.__flushLock:
+      with self.__lock:
+        heartBeats = self.__heartBeats
+        sentCommands = self.__sentCommands
+        self.__heartBeats = {}
+        self.__sentCommands = []
+      startTime = time.time()
+      failed = False
+      if heartBeats:
+        result = self.__jobDB.setHeartBeatDataBulk(heartBeats)
+        if not result['OK']:
+          failed = True
+          self.log.warn("Failed to set the heart beat data of %d jobs" % len(heartBeats), result['Message'])
+      if sentCommands:
+        result = self.__jobDB.setJobCommandsStatus(sentCommands, 'Sent')
+        if not result['OK']:
+          failed = True
+          self.log.warn("Failed to set %d commands Sent" % len(sentCommands), result['Message'])
+      self.__loadCommands()
+      flushTime = time.time() - startTime
+
+      with self.__lock:
+        self.__stats['Flushes'] += 1
+        self.__stats['Failures'] += failed
+        self.__stats['LastFlushTime'] = flushTime
+        self.__stats['TotalFlushTime'] += flushTime
+        self.__stats['LastBatchSize'] = len(heartBeats)
+        self.__stats['MaxBatchSize'] = max(self.__stats['MaxBatchSize'], len(heartBeats))
+      gMonitor.addMark('heartBeatFlushTime', flushTime)
+      gMonitor.addMark('heartBeatBatchSize', len(heartBeats))
+
+  def __loadCommands(self):
+    """ Replaces the commands in memory by the ones still Received in the DB
+    """
+    result = self.__jobDB.getJobCommandsBulk(status='Received')
+    if not result['OK']:
+      self.log.warn("Failed to get the job commands", result['Message'])
+      return
+    commands = result['Value']
+    with self.__lock:
+      # Commands given to the jobs since the flush are not set Sent yet
+      for jobID, command in self.__sentCommands:
+        commands.get(jobID, {}).pop(command, None)
+      self.__commands = dict((jobID, jobCommands) for jobID, jobCommands in commands.iteritems() if jobCommands)
+
+  def getStats(self):
+    """ Heart beats received, flushes, their duration and size
+
+        :return: dict
+    """
+    with self.__lock:
+      stats = dict(self.__stats)
+      stats['PendingJobs'] = len(self.__heartBeats)
+      stats['PendingCommands'] = sum(len(commands) for commands in self.__commands.itervalues())
+    stats['MeanFlushTime'] = stats['TotalFlushTime'] / stats['Flushes'] if stats['Flushes'] else 0.
+    return stats
@@ -0,0 +1,390 @@
+""" In-memory index of the task queues, used by the Matcher service
+
+    Matching a resource with TaskQueueDB.matchAndGetJob runs the big task queue matching
+    query, then a priority query per candidate task queue, then tries to delete jobs one by one.
+    The TaskQueueIndex keeps the task queue definitions and their jobs in memory and resolves
+    the match there: the DB is only used to atomically claim the selected job.
+
+    The index is reconciled periodically with TaskQueueDB: the definitions are only loaded for new
+    task queues and the jobs are only reloaded for the task queues whose content changed.
+
+    The selection follows the one of TaskQueueDB.matchAndGetJob:
+      - task queues are tried in a random order weighted by their priority
+      - in a task queue, a job priority is chosen randomly, weighted by the real priority of its jobs
+      - one of the oldest numJobsPerTry jobs with that priority is then chosen randomly
+"""
+
+__RCSID__ = "$Id$"
+
+import bisect
+import random
+import string
+import threading
+import time
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Security import Properties, CS
+from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
+from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import singleValueDefFields, multiValueDefFields, \
+    multiValueMatchFields, bannedJobMatchFields, mandatoryMatchFields, TQ_MIN_SHARE
+
+
+def _isAny(value):
+  """ Same as the 'any' check of the TaskQueueDB match query
+  """
+  return isinstance(value, basestring) and \
+      "".join([c for c in value.lower() if c not in string.punctuation]) == 'any'
+
+
+def _toList(value):
+  """ Match values can be a single value or a list of them
+  """
+  if isinstance(value, (list, tuple, set)):
+    return list(value)
+  return [value]
+
+
+class TaskQueueIndex(object):
+  """ In-memory copy of TaskQueueDB able to match resources
+  """
+
+  def __init__(self, tqDB, maxClaims=10):
+    """ c'tor
+
+        :param tqDB: TaskQueueDB instance
+        :param int maxClaims: maximum number of jobs to try to claim for a single match request
+    """
+    self.__tqDB = tqDB
+    self.__maxClaims = maxClaims
+    self.log = gLogger.getSubLogger("TaskQueueIndex")
+    # Protects the index content
+    self.__lock = threading.Lock()
+    # Only one reconciliation at a time
+    self.__refreshLock = threading.Lock()
+    self.__loaded = False
+    # tqId -> definition, multi value fields are frozensets
+    self.__tqDefs = {}
+    # tqId -> jobs checksum the jobs were loaded with
+    self.__tqChecksums = {}
+    # tqId -> { priority : sorted list of jobIds }
+    self.__tqJobs = {}
+    # tqId -> { priority : sum of the real priority of the jobs }
+    self.__tqWeights = {}
+    # jobId -> ( tqId, priority, realPriority )
+    self.__jobs = {}
+    self.__stats = {'Matches': 0, 'Found': 0, 'Claims': 0, 'Conflicts': 0, 'Refreshes': 0, 'ReloadedTQs': 0}
+
+    gMonitor.registerActivity('tqIndexMatchTime', "Job matching time in the task queue index",
+                              'Matching', "ms", gMonitor.OP_MEAN, 300)
+    gMonitor.registerActivity('tqIndexMatches', "Jobs matched by the task queue index",
+                              'Matching', "matches", gMonitor.OP_RATE, 300)
+    gMonitor.registerActivity('tqIndexConflicts', "Jobs already taken when claimed",
+                              'Matching', "jobs", gMonitor.OP_RATE, 300)
+    gMonitor.registerActivity('tqIndexRefreshTime', "Task queue index reconciliation time",
+                              'Matching', "secs", gMonitor.OP_MEAN, 300)
+
+  def isLoaded(self):
+    """ The index has been loaded at least once
+    """
+    return self.__loaded
+
+  def getStats(self):
+    """ Get the index counters and sizes
+    """
+    with self.__lock:
+      stats = dict(self.__stats)
+      stats['TaskQueues'] = len(self.__tqDefs)
+      stats['Jobs'] = len(self.__jobs)
+    return stats
+
+  def refresh(self):
+    """ Reconcile the index with TaskQueueDB
+    """
+    with self.__refreshLock:
+      startTime = time.time()
+      result = self.__tqDB.getTaskQueuesSummary()
+      if not result['OK']:
+        self.log.error("Cannot get the task queues summary", result['Message'])
+        return result
+      summary = result['Value']
+
+      with self.__lock:
+        newTQs = [tqId for tqId in summary if tqId not in self.__tqDefs]
+        changedTQs = [tqId for tqId in summary
+                      if tqId not in self.__tqChecksums or self.__tqChecksums[tqId] != summary[tqId][1]]
+
+      result = self.__tqDB.getTaskQueueDefinitions(newTQs)
+      if not result['OK']:
+        self.log.error("Cannot get the task queues definitions", result['Message'])
+        return result
+      newDefs = result['Value']
+      for tqDef in newDefs.itervalues():
+        for field in multiValueDefFields:
+          tqDef[field] = frozenset(tqDef[field])
+
+      result = self.__tqDB.getJobsInTaskQueues([tqId for tqId in changedTQs if summary[tqId][1]])
+      if not result['OK']:
+        self.log.error("Cannot get the jobs in the task queues", result['Message'])
+        return result
+      tqJobs = {}
+      for tqId, jobId, priority, realPriority in result['Value']:
+        tqJobs.setdefault(tqId, []).append((jobId, priority, realPriority))
+
+      with self.__lock:
+        for tqId in [tqId for tqId in self.__tqDefs if tqId not in summary]:
+          self.__setJobs(tqId, [])
+          self.__tqDefs.pop(tqId)
+          self.__tqChecksums.pop(tqId, None)
+        self.__tqDefs.update(newDefs)
+        for tqId, (priority, _checksum) in summary.iteritems():
+          if tqId in self.__tqDefs:
+            self.__tqDefs[tqId]['Priority'] = priority
+        for tqId in changedTQs:
+          if tqId in self.__tqDefs:
+            self.__setJobs(tqId, tqJobs.get(tqId, []))
+            self.__tqChecksums[tqId] = summary[tqId][1]
+        self.__loaded = True
+        self.__stats['Refreshes'] += 1
+        self.__stats['ReloadedTQs'] += len(changedTQs)
+        numTQs = len(self.__tqDefs)
+        numJobs = len(self.__jobs)
+
+    refreshTime = time.time() - startTime
+    gMonitor.addMark('tqIndexRefreshTime', refreshTime)
+    self.log.verbose("Task queue index reconciled in %.3f secs: %s new and %s changed TQs, %s TQs and %s jobs" %
+                     (refreshTime, len(newTQs), len(changedTQs), numTQs, numJobs))
+    return S_OK()
+
+  def __setJobs(self, tqId, jobs):
+    """ Replace the jobs of a task queue. Must be called with the lock held
+    """
+    for jobIds in self.__tqJobs.pop(tqId, {}).itervalues():
+      for jobId in jobIds:
+        self.__jobs.pop(jobId, None)
+    self.__tqWeights.pop(tqId, None)
+    if not jobs:
+      return
+    levels = {}
+    weights = {}
+    for jobId, priority, realPriority in jobs:
+      if jobId in self.__jobs:
+        # Rescheduled job that moved to this TQ, the other one is not reconciled yet
+        self.__removeJob(jobId)
+      levels.setdefault(priority, []).append(jobId)
+      weights[priority] = weights.get(priority, 0.0) + realPriority
+      self.__jobs[jobId] = (tqId, priority, realPriority)
+    for jobIds in levels.itervalues():
+      jobIds.sort()
+    self.__tqJobs[tqId] = levels
+    self.__tqWeights[tqId] = weights
+
+  def __removeJob(self, jobId):
+    """ Remove a job from the index. Must be called with the lock held
+    """
+    tqId, priority, realPriority = self.__jobs.pop(jobId)
+    levels = self.__tqJobs[tqId]
+    jobIds = levels[priority]
+    del jobIds[bisect.bisect_left(jobIds, jobId)]
+    if jobIds:
+      self.__tqWeights[tqId][priority] -= realPriority
+    else:
+      del levels[priority]
+      del self.__tqWeights[tqId][priority]
+    if not levels:
+      del self.__tqJobs[tqId]
+      del self.__tqWeights[tqId]
+    # The jobs of this TQ have to be checked again at the next reconciliation
+    self.__tqChecksums.pop(tqId, None)
+
+  def __pickJob(self, tqId, numJobsPerTry):
+    """ Choose a job in a task queue and take it out of the index. Must be called with the lock held
+    """
+    levels = self.__tqJobs.get(tqId)
+    if not levels:
+      return None
+    weights = self.__tqWeights[tqId]
+    # Equivalent of ORDER BY RAND() / RealPriority
+    priority = min(levels, key=lambda prio: random.random() / max(weights[prio], TQ_MIN_SHARE))
+    jobIds = levels[priority]
+    jobId = jobIds[random.randint(0, min(len(jobIds), numJobsPerTry) - 1)]
+    self.__removeJob(jobId)
+    return jobId
+
+  def removeJobs(self, jobIdList):
+    """ Take jobs out of the index, for instance because they are not Waiting any more
+    """
+    with self.__lock:
+      for jobId in jobIdList:
+        if jobId in self.__jobs:
+          self.__removeJob(jobId)
+
+  def matchAndGetJob(self, tqMatchDict, numJobsPerTry=50, negativeCond=None):
+    """ Match a job based on requirements, same interface as TaskQueueDB.matchAndGetJob
+
+        :param dict tqMatchDict: resource description
+        :param int numJobsPerTry: the job is chosen among the oldest numJobsPerTry ones
+        :param negativeCond: negative conditions from the Limiter
+        :returns: S_OK( { 'matchFound' : bool, 'jobId' : jobId, 'taskQueueId' : tqId } ) / S_ERROR
+    """
+    if not self.__loaded:
+      return S_ERROR("Task queue index is not loaded yet")
+    startTime = time.time()
+    # Same validation as the TaskQueueDB match, the values are compared as they are, not escaped
+    result = self.__tqDB._checkMatchDefinition(dict(tqMatchDict), escapeValues=False)
+    if not result['OK']:
+      self.log.error("TQ match request check failed", result['Message'])
+      return result
+    result = self.__getMatchConditions(tqMatchDict, negativeCond)
+    if not result['OK']:
+      return result
+    conditions = result['Value']
+
+    with self.__lock:
+      self.__stats['Matches'] += 1
+      tqList = [(random.random() / max(tqDef['Priority'], TQ_MIN_SHARE), tqId)
+                for tqId, tqDef in self.__tqDefs.iteritems()
+                if tqId in self.__tqJobs and all(condition(tqDef) for condition in conditions)]
+    # Equivalent of ORDER BY RAND() / Priority
+    tqList.sort()
+
+    claims = 0
+    for _key, tqId in tqList:
+      while claims < self.__maxClaims:
+        with self.__lock:
+          jobId = self.__pickJob(tqId, numJobsPerTry)
+          tqDef = self.__tqDefs.get(tqId)
+        if jobId is None or tqDef is None:
+          break
+        claims += 1
+        result = self.__tqDB.claimJob(jobId, tqId, tqDef['OwnerDN'], tqDef['OwnerGroup'])
+        if not result['OK']:
+          self.log.error("Could not claim job", "%s from TQ %s: %s" % (jobId, tqId, result['Message']))
+          return result
+        if result['Value']:
+          matchTime = time.time() - startTime
+          with self.__lock:
+            self.__stats['Claims'] += claims
+            self.__stats['Found'] += 1
+          gMonitor.addMark('tqIndexMatches', 1)
+          gMonitor.addMark('tqIndexMatchTime', matchTime * 1000.)
+          self.log.info("Extracted job %s from TQ %s in %.1f ms" % (jobId, tqId, matchTime * 1000.))
+          return S_OK({'matchFound': True, 'jobId': jobId, 'taskQueueId': tqId, 'tqMatch': tqMatchDict})
+        # Somebody else (another Matcher or a rescheduling) took the job first
+        gMonitor.addMark('tqIndexConflicts', 1)
+        with self.__lock:
+          self.__stats['Conflicts'] += 1
+      if claims >= self.__maxClaims:
+        self.log.info("Could not claim a job after %s tries" % claims)
+        break
+
+    with self.__lock:
+      self.__stats['Claims'] += claims
+    gMonitor.addMark('tqIndexMatchTime', (time.time() - startTime) * 1000.)
+    self.log.info("No TQ matches requirements")
+    return S_OK({'matchFound': False, 'tqMatch': tqMatchDict})
+
+  def __getMatchConditions(self, tqMatchDict, negativeCond):
+    """ Translate the resource description into a list of conditions on the task queue definitions,
+        following the rules of the TaskQueueDB match query
+    """
+    for field in mandatoryMatchFields:
+      if field not in tqMatchDict:
+        return S_ERROR("Missing mandatory field '%s' in match request definition" % field)
+    conditions = []
+
+    # Owner conditions
+    if 'OwnerDN' in tqMatchDict and 'OwnerGroup' in tqMatchDict:
+      dns = _toList(tqMatchDict['OwnerDN'])
+      sharingGroups = set()
+      owners = set()
+      for group in _toList(tqMatchDict['OwnerGroup']):
+        if Properties.JOB_SHARING in CS.getPropertiesForGroup(group):
+          sharingGroups.add(group)
+        else:
+          owners.update([(dn, group) for dn in dns])
+      conditions.append(lambda tq: tq['OwnerGroup'] in sharingGroups or (tq['OwnerDN'], tq['OwnerGroup']) in owners)
+    else:
+      for field in ('OwnerGroup', 'OwnerDN'):
+        if field in tqMatchDict:
+          values = set(_toList(tqMatchDict[field]))
+          conditions.append(lambda tq, field=field, values=values: tq[field] in values)
+
+    maxCPUTime = max(_toList(tqMatchDict['CPUTime']))
+    conditions.append(lambda tq: tq['CPUTime'] <= maxCPUTime)
+    setups = set(_toList(tqMatchDict['Setup']))
+    conditions.append(lambda tq: tq['Setup'] in setups)
+
+    # Multi value conditions
+    tags = []
+    if 'Tag' not in tqMatchDict and 'RequiredTag' not in tqMatchDict:
+      tqMatchDict = dict(tqMatchDict, Tag=[])
+    for field in multiValueMatchFields:
+      if field not in tqMatchDict:
+        continue
+      tqField = "%ss" % field
+      if field == 'Tag':
+        tags = _toList(tqMatchDict['Tag'])
+        if any(_isAny(tag) for tag in tags):
+          continue
+        # All the tags of the TQ have to be provided by the resource
+        tagSet = frozenset(tags) if tags else frozenset([''])
+        conditions.append(lambda tq: tq['Tags'] <= tagSet)
+      else:
+        values = tqMatchDict[field]
+        if not values:
+          continue
+        values = frozenset(_toList(values))
+        if any(_isAny(value) for value in values):
+          continue
+        conditions.append(lambda tq, tqField=tqField, values=values: not tq[tqField] or tq[tqField] & values)
+      if field in bannedJobMatchFields:
+        values = _toList(tqMatchDict[field])
+        bannedField = "Banned%s" % tqField
+        conditions.append(lambda tq, bannedField=bannedField, values=values:
+                          any(value not in tq[bannedField] for value in values))
+
+    # Required tags
+    requiredTags = _toList(tqMatchDict.get('RequiredTag', []))
+    if requiredTags and not any(_isAny(tag) for tag in requiredTags):
+      requiredTags = frozenset(requiredTags)
+      if not requiredTags.issubset(tags):
+        return S_ERROR('Wrong conditions')
+      conditions.append(lambda tq: requiredTags <= tq['Tags'])
+
+    # Resource banning conditions
+    for field in multiValueMatchFields:
+      values = tqMatchDict.get("Banned%s" % field)
+      if not values:
+        continue
+      values = _toList(values)
+      if any(_isAny(value) for value in values):
+        continue
+      tqField = "%ss" % field
+      conditions.append(lambda tq, tqField=tqField, values=values:
+                        any(value not in tq[tqField] for value in values))
+
+    # Negative conditions from the Limiter
+    if negativeCond:
+      if isinstance(negativeCond, dict):
+        negativeCond = [negativeCond]
+      negConditions = [self.__getNegativeCondition(cond) for cond in negativeCond]
+      conditions.append(lambda tq: any(negCondition(tq) for negCondition in negConditions))
+
+    return S_OK(conditions)
+
+  @staticmethod
+  def __getNegativeCondition(negativeCond):
+    """ not ( cond1 and cond2 ) = ( not cond1 or not cond 2 ), see TaskQueueDB.__generateNotDictSQL
+    """
+    condList = []
+    for field, values in negativeCond.iteritems():
+      values = _toList(values)
+      if field in multiValueMatchFields:
+        tqField = "%ss" % field
+        condList.append(lambda tq, tqField=tqField, values=values:
+                        all(value not in tq[tqField] for value in values))
+      elif field in singleValueDefFields:
+        condList.extend([lambda tq, field=field, value=value: tq[field] != value for value in values])
+    if not condList:
+      return lambda tq: True
+    return lambda tq: any(condition(tq) for condition in condList)
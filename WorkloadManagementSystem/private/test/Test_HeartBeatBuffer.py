@@ -0,0 +1,83 @@
+""" Unit tests of the buffer of the job heart beats, JobDB is replaced by a mock
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer import HeartBeatBuffer
+
+
+def getJobDB(commands=None):
+  jobDB = MagicMock()
+  jobDB.setHeartBeatDataBulk.return_value = S_OK()
+  jobDB.setJobCommandsStatus.return_value = S_OK()
+  jobDB.getJobCommandsBulk.side_effect = lambda status: S_OK(dict((jobID, dict(jobCommands))
+                                                                  for jobID, jobCommands in (commands or {}).items()))
+  return jobDB
+
+
+@patch('DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer.gMonitor')
+def test_coalescing(mockMonitor):
+  jobDB = getJobDB()
+  buf = HeartBeatBuffer(jobDB)
+  assert buf.addHeartBeat(1, {'CPUNormalizationFactor': '10'}, {'LoadAverage': '1.0'}) == {}
+  buf.addHeartBeat(2, {}, {'LoadAverage': '2.0'})
+  buf.addHeartBeat(1, {'MemoryUsed': '100'}, {'LoadAverage': '1.5'})
+  assert not jobDB.setHeartBeatDataBulk.called
+
+  buf.flush()
+  heartBeats = jobDB.setHeartBeatDataBulk.call_args[0][0]
+  assert sorted(heartBeats) == [1, 2]
+  lastTime, staticData, dynamicData = heartBeats[1]
+  assert staticData == {'CPUNormalizationFactor': '10', 'MemoryUsed': '100'}
+  assert [data for _time, data in dynamicData] == [{'LoadAverage': '1.0'}, {'LoadAverage': '1.5'}]
+  assert lastTime == dynamicData[-1][0]
+
+  # Nothing pending any more
+  jobDB.setHeartBeatDataBulk.reset_mock()
+  buf.flush()
+  assert not jobDB.setHeartBeatDataBulk.called
+  stats = buf.getStats()
+  assert stats['HeartBeats'] == 3
+  assert stats['Flushes'] == 2
+  assert stats['MaxBatchSize'] == 2
+  assert stats['LastBatchSize'] == 0
+  mockMonitor.addMark.assert_any_call('heartBeatBatchSize', 2)
+
+
+@patch('DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer.gMonitor')
+def test_commands(_mockMonitor):
+  commands = {1: {'Kill': ''}, 2: {'Kill': ''}}
+  jobDB = getJobDB(commands)
+  buf = HeartBeatBuffer(jobDB)
+  buf.start()
+  assert buf.addHeartBeat(1, {}, {}) == {'Kill': ''}
+  # Only given once
+  assert buf.addHeartBeat(1, {}, {}) == {}
+  assert buf.getStats()['PendingCommands'] == 1
+
+  # Not Sent yet in the DB when reloaded
+  buf._HeartBeatBuffer__loadCommands()
+  assert buf.addHeartBeat(1, {}, {}) == {}
+
+  del commands[1]
+  buf.flush()
+  jobDB.setJobCommandsStatus.assert_called_once_with([(1, 'Kill')], 'Sent')
+  assert buf.addHeartBeat(2, {}, {}) == {'Kill': ''}
+
+
+@patch('DIRAC.WorkloadManagementSystem.private.HeartBeatBuffer.gMonitor')
+def test_failures(_mockMonitor):
+  jobDB = getJobDB()
+  jobDB.setHeartBeatDataBulk.return_value = S_ERROR('DB down')
+  buf = HeartBeatBuffer(jobDB, maxJobs=2)
+  buf.addHeartBeat(1, {}, {})
+  assert not buf._HeartBeatBuffer__flushNeeded.is_set()
+  buf.addHeartBeat(2, {}, {})
+  assert buf._HeartBeatBuffer__flushNeeded.is_set()
+  buf.flush()
+  assert buf.getStats()['Failures'] == 1
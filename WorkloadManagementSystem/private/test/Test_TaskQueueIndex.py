@@ -0,0 +1,179 @@
+""" Unit tests of the in-memory task queue index, TaskQueueDB is replaced by a mock
+"""
+
+# pylint: disable=protected-access, missing-docstring, invalid-name
+
+__RCSID__ = "$Id$"
+
+from mock import MagicMock, patch
+
+from DIRAC import S_OK
+from DIRAC.WorkloadManagementSystem.DB.TaskQueueDB import TaskQueueDB, multiValueDefFields
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
+
+
+def tqDefinition(**kwargs):
+  tqDef = {'OwnerDN': '/DN/user', 'OwnerGroup': 'user_group', 'Setup': 'aSetup', 'CPUTime': 3600, 'Priority': 1.0}
+  for field in multiValueDefFields:
+    tqDef[field] = []
+  tqDef.update(kwargs)
+  return tqDef
+
+
+class TQDBMock(object):
+  """ Minimal TaskQueueDB holding the task queues in dicts
+  """
+
+  def __init__(self, tqDefs, jobs):
+    self.tqDefs = tqDefs
+    # jobId -> ( tqId, priority, realPriority )
+    self.jobs = jobs
+    self.getTaskQueueDefinitions = MagicMock(side_effect=self._getTaskQueueDefinitions)
+    self.getJobsInTaskQueues = MagicMock(side_effect=self._getJobsInTaskQueues)
+
+  def getTaskQueuesSummary(self):
+    summary = dict((tqId, (tqDef['Priority'], None)) for tqId, tqDef in self.tqDefs.iteritems())
+    for tqId in summary:
+      tqJobs = sorted((jobId, job[1], job[2]) for jobId, job in self.jobs.iteritems() if job[0] == tqId)
+      if tqJobs:
+        summary[tqId] = (self.tqDefs[tqId]['Priority'], (len(tqJobs), hash(tuple(tqJobs))))
+    return S_OK(summary)
+
+  def _getTaskQueueDefinitions(self, tqIdList):
+    return S_OK(dict((tqId, dict(self.tqDefs[tqId])) for tqId in tqIdList))
+
+  def _getJobsInTaskQueues(self, tqIdList):
+    return S_OK([(job[0], jobId, job[1], job[2]) for jobId, job in self.jobs.iteritems() if job[0] in tqIdList])
+
+  def _checkMatchDefinition(self, tqMatchDict, escapeValues=True):
+    return TaskQueueDB._checkMatchDefinition.im_func(self, tqMatchDict, escapeValues=escapeValues)
+
+  def claimJob(self, jobId, tqId, _ownerDN, _ownerGroup):
+    if self.jobs.get(jobId, (None, ))[0] != tqId:
+      return S_OK(False)
+    self.jobs.pop(jobId)
+    return S_OK(True)
+
+
+resource = {'Setup': 'aSetup', 'CPUTime': 7200, 'Site': 'Site1', 'OwnerGroup': ['user_group', 'prod_group']}
+
+
+def getIndex(tqDefs, jobs):
+  tqDB = TQDBMock(tqDefs, jobs)
+  tqIndex = TaskQueueIndex(tqDB)
+  assert tqIndex.refresh()['OK']
+  return tqDB, tqIndex
+
+
+@patch('DIRAC.WorkloadManagementSystem.private.TaskQueueIndex.CS.getPropertiesForGroup',
+       side_effect=lambda group: ['JobSharing'])
+def test_match(_mockProps):
+  tqDefs = {1: tqDefinition(Sites=['Site2']),
+            2: tqDefinition(CPUTime=86400),
+            3: tqDefinition(BannedSites=['Site1']),
+            4: tqDefinition(Tags=['MultiProcessor']),
+            5: tqDefinition(Sites=['Site1', 'Site2'], OwnerGroup='prod_group'),
+            6: tqDefinition(OwnerGroup='other_group')}
+  jobs = dict((tqId * 10, (tqId, 1, 1.0)) for tqId in tqDefs)
+  tqDB, tqIndex = getIndex(tqDefs, jobs)
+
+  # Negative conditions from the Limiter
+  result = tqIndex.matchAndGetJob(resource, negativeCond={'Site': 'Site1'})
+  assert result['OK']
+  assert not result['Value']['matchFound']
+
+  result = tqIndex.matchAndGetJob(resource)
+  assert result['OK']
+  assert result['Value']['matchFound']
+  assert result['Value']['jobId'] == 50
+  assert result['Value']['taskQueueId'] == 5
+
+  # Only TQ 5 was matching, and its job is gone
+  result = tqIndex.matchAndGetJob(resource)
+  assert result['OK']
+  assert not result['Value']['matchFound']
+
+  # Tags of the TQ have to be provided by the resource
+  result = tqIndex.matchAndGetJob(dict(resource, Site='Site2', Tag=['MultiProcessor']))
+  assert result['Value']['jobId'] in (10, 30, 40)
+
+  # Matching does not reload anything from the DB
+  assert tqDB.getJobsInTaskQueues.call_count == 1
+
+
+@patch('DIRAC.WorkloadManagementSystem.private.TaskQueueIndex.CS.getPropertiesForGroup',
+       side_effect=lambda group: [])
+def test_requiredTags(_mockProps):
+  tqDefs = {1: tqDefinition(), 2: tqDefinition(Tags=['GPU'])}
+  jobs = {1: (1, 1, 1.0), 2: (2, 1, 1.0)}
+  _tqDB, tqIndex = getIndex(tqDefs, jobs)
+
+  result = tqIndex.matchAndGetJob(dict(resource, OwnerDN='/DN/user', RequiredTag=['GPU']))
+  assert not result['OK']
+  result = tqIndex.matchAndGetJob(dict(resource, OwnerDN='/DN/user', Tag=['GPU'], RequiredTag=['GPU']))
+  assert result['Value']['jobId'] == 2
+  result = tqIndex.matchAndGetJob(dict(resource, OwnerDN='/DN/other'))
+  assert not result['Value']['matchFound']
+
+
+@patch('DIRAC.WorkloadManagementSystem.private.TaskQueueIndex.CS.getPropertiesForGroup',
+       side_effect=lambda group: ['JobSharing'])
+def test_invalidMatch(_mockProps):
+  tqDefs = {1: tqDefinition()}
+  jobs = {1: (1, 1, 1.0)}
+  tqDB, tqIndex = getIndex(tqDefs, jobs)
+
+  # Refused as by the TaskQueueDB match, a string CPUTime would compare as always bigger
+  result = tqIndex.matchAndGetJob(dict(resource, CPUTime='100'))
+  assert not result['OK']
+  result = tqIndex.matchAndGetJob(dict(resource, Site=['Site1', 1]))
+  assert not result['OK']
+  assert 1 in tqDB.jobs
+  # The values are not escaped for the index
+  tqDB._escapeString = MagicMock()
+  result = tqIndex.matchAndGetJob(resource)
+  assert result['Value']['jobId'] == 1
+  tqDB._escapeString.assert_not_called()
+
+
+@patch('DIRAC.WorkloadManagementSystem.private.TaskQueueIndex.CS.getPropertiesForGroup',
+       side_effect=lambda group: ['JobSharing'])
+def test_reconcile(_mockProps):
+  tqDefs = {1: tqDefinition(), 2: tqDefinition()}
+  jobs = {1: (1, 1, 1.0), 2: (2, 1, 1.0)}
+  tqDB, tqIndex = getIndex(tqDefs, jobs)
+  assert tqIndex.getStats()['Jobs'] == 2
+
+  # New jobs in TQ 2 and a new TQ: TQ 1 is not reloaded
+  jobs[3] = (2, 1, 1.0)
+  tqDefs[3] = tqDefinition()
+  jobs[4] = (3, 1, 1.0)
+  assert tqIndex.refresh()['OK']
+  tqDB.getTaskQueueDefinitions.assert_called_with([3])
+  assert sorted(tqDB.getJobsInTaskQueues.call_args[0][0]) == [2, 3]
+  assert tqIndex.getStats()['Jobs'] == 4
+
+  # Job taken by somebody else: the claim fails and another one is tried
+  jobs.pop(1)
+  jobs.pop(3)
+  tqDefs.pop(3)
+  jobs.pop(4)
+  result = tqIndex.matchAndGetJob(resource)
+  assert result['Value']['jobId'] == 2
+  stats = tqIndex.getStats()
+  assert stats['Conflicts'] == stats['Claims'] - 1
+  assert tqIndex.refresh()['OK']
+  assert tqIndex.getStats()['TaskQueues'] == 2
+  assert tqIndex.getStats()['Jobs'] == 0
+
+
+@patch('DIRAC.WorkloadManagementSystem.private.TaskQueueIndex.CS.getPropertiesForGroup',
+       side_effect=lambda group: ['JobSharing'])
+def test_priorities(_mockProps):
+  tqDefs = {1: tqDefinition(Priority=1.0), 2: tqDefinition(Priority=100.0)}
+  jobs = dict((jobId, (1 + jobId % 2, 1, 1.0)) for jobId in xrange(1000))
+  _tqDB, tqIndex = getIndex(tqDefs, jobs)
+  tqHits = {1: 0, 2: 0}
+  for _ in xrange(100):
+    tqHits[tqIndex.matchAndGetJob(resource)['Value']['taskQueueId']] += 1
+  assert tqHits[2] > tqHits[1]
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+""" Benchmark of the vectorized re-binning of the accounting buckets against the original loops.
+
+    The data mimic what ReportGenerator gets from retrieveBucketedData for a plot:
+    one list of ( startTime, bucketLength, values... ) per grouping, with buckets of
+    15 minutes for the last days, then hours, days and weeks, as set by the default
+    AccountingDB bucket lengths. The scenarios are:
+      * yearBySite: one year of data per site summed to weeks
+      * monthByUser: one month of data per user summed to days
+      * weekAverage: one week of data per site averaged to hours
+      * yearCumulative: one year per site summed, filled with zeros and accumulated
+
+    Usage::
+
+      python benchmarkDBUtils.py [nbRepetitions]
+
+    It does not need any DIRAC installation nor configuration, only the DIRAC python path.
+"""
+
+import sys
+import time
+import random
+import timeit
+
+from DIRAC.AccountingSystem.private.DBUtils import DBUtils
+
+# Default AccountingDB bucket lengths: ( age, bucket length )
+BUCKETS_LENGTH = ((86400 * 3, 900), (86400 * 8, 3600), (15552000, 86400), (31104000, 604800))
+NOW = 1514764800 - 1514764800 % 604800
+
+
+class LoopDBUtils(DBUtils):
+  """ The re-binning methods as they were implemented before being vectorized """
+
+  def _spanToGranularity(self, granularity, bucketsData):
+    normData = {}
+
+    def addToNormData(bucketDate, data, proportion=1.0):
+      if bucketDate in normData:
+        for iP in range(len(data)):
+          val = data[iP]
+          if val is None:
+            val = 0
+          normData[bucketDate][iP] += float(val) * proportion
+        normData[bucketDate][-1] += proportion
+      else:
+        normData[bucketDate] = []
+        for fD in data:
+          if fD is None:
+            fD = 0
+          normData[bucketDate].append(float(fD) * proportion)
+        normData[bucketDate].append(proportion)
+
+    for bucketData in bucketsData:
+      bucketDate = bucketData[0]
+      originalBucketLength = bucketData[1]
+      bucketValues = bucketData[2:]
+      if originalBucketLength == granularity:
+        addToNormData(bucketDate, bucketValues)
+      else:
+        startEpoch = bucketDate
+        endEpoch = bucketDate + originalBucketLength
+        newBucketEpoch = startEpoch - startEpoch % granularity
+        if startEpoch == endEpoch:
+          addToNormData(newBucketEpoch, bucketValues)
+        else:
+          while newBucketEpoch < endEpoch:
+            start = max(newBucketEpoch, startEpoch)
+            end = min(newBucketEpoch + granularity, endEpoch)
+            proportion = float(end - start) / originalBucketLength
+            addToNormData(newBucketEpoch, bucketValues, proportion)
+            newBucketEpoch += granularity
+    return normData
+
+  def _sumToGranularity(self, granularity, bucketsData):
+    normData = self._spanToGranularity(granularity, bucketsData)
+    for bDate in normData:
+      del normData[bDate][-1]
+    return normData
+
+  def _averageToGranularity(self, granularity, bucketsData):
+    normData = self._spanToGranularity(granularity, bucketsData)
+    for bDate in normData:
+      for iP in range(len(normData[bDate])):
+        normData[bDate][iP] = float(normData[bDate][iP]) / normData[bDate][-1]
+      del normData[bDate][-1]
+    return normData
+
+  def _groupsToGranularity(self, granularity, dataDict, average=False):
+    function = self._averageToGranularity if average else self._sumToGranularity
+    return dict((key, function(granularity, buckets)) for key, buckets in dataDict.iteritems())
+
+  def _fillWithZero(self, granularity, startEpoch, endEpoch, dataDict):
+    startBucketEpoch = startEpoch - startEpoch % granularity
+    for key in dataDict:
+      currentDict = dataDict[key]
+      for timeEpoch in range(int(startBucketEpoch), int(endEpoch), granularity):
+        if timeEpoch not in currentDict:
+          currentDict[timeEpoch] = 0
+    return dataDict
+
+  def _accumulate(self, granularity, startEpoch, endEpoch, dataDict):
+    startBucketEpoch = startEpoch - startEpoch % granularity
+    for key in dataDict:
+      currentDict = dataDict[key]
+      lastValue = 0
+      for timeEpoch in range(startBucketEpoch, endEpoch, granularity):
+        if timeEpoch in currentDict:
+          lastValue += currentDict[timeEpoch]
+        currentDict[timeEpoch] = lastValue
+    return dataDict
+
+
+def bucketLength(epoch):
+  """ Bucket length used by AccountingDB for data of that age """
+  for age, length in BUCKETS_LENGTH:
+    if NOW - epoch <= age:
+      return length
+  return 604800
+
+
+def bucketedData(nbKeys, timeSpan, nbValues=3, density=0.7):
+  """ { key : [ [ startTime, bucketLength, value1, ... ], ... ] } as given by _groupByField """
+  rand = random.Random(nbKeys * timeSpan)
+  dataDict = {}
+  for key in xrange(nbKeys):
+    buckets = []
+    epoch = NOW - timeSpan
+    epoch -= epoch % bucketLength(epoch)
+    while epoch < NOW:
+      length = bucketLength(epoch)
+      if rand.random() < density:
+        values = [rand.random() * 1000 for _ in xrange(nbValues)]
+        if rand.random() < 0.05:
+          values[-1] = None
+        buckets.append([epoch, length] + values)
+      epoch += length
+    dataDict['Key%s' % key] = buckets
+  return dataDict
+
+
+def rebin(utils, average, granularity, dataDict):
+  """ What BaseReporter._getTimedData does with the groupings """
+  return utils._groupsToGranularity(granularity, dataDict, average)
+
+
+def cumulative(utils, granularity, timeSpan, dataDict):
+  """ Summed, zero filled and accumulated, as done for the cumulative plots """
+  plotData = rebin(utils, False, granularity, dataDict)
+  plotData = dict((key, dict((epoch, values[0]) for epoch, values in keyData.iteritems()))
+                  for key, keyData in plotData.iteritems())
+  plotData = utils._fillWithZero(granularity, NOW - timeSpan, NOW, plotData)
+  return utils._accumulate(granularity, NOW - timeSpan, NOW, plotData)
+
+
+SCENARIOS = (('yearBySite', 200, 86400 * 365, 604800, 'sum'),
+             ('monthByUser', 500, 86400 * 30, 86400, 'sum'),
+             ('weekAverage', 200, 86400 * 7, 3600, 'average'),
+             ('yearCumulative', 200, 86400 * 365, 604800, 'cumulative'))
+
+
+def sameData(data1, data2):
+  """ Equality of the plot data up to the float rounding """
+  if isinstance(data1, dict):
+    return isinstance(data2, dict) and sorted(data1) == sorted(data2) and \
+        all(sameData(data1[key], data2[key]) for key in data1)
+  if isinstance(data1, list):
+    return isinstance(data2, list) and len(data1) == len(data2) and \
+        all(sameData(val1, val2) for val1, val2 in zip(data1, data2))
+  return abs(data1 - data2) <= 1e-9 * max(1., abs(data1), abs(data2))
+
+
+def main(repetitions=5):
+  """ Run all the scenarios through both implementations and print the comparison """
+  loopUtils = LoopDBUtils(None, 'aSetup')
+  arrayUtils = DBUtils(None, 'aSetup')
+  print "%-15s %8s | %10s %10s %7s" % ('scenario', 'buckets', 'loops', 'arrays', 'gain')
+  for name, nbKeys, timeSpan, granularity, conversion in SCENARIOS:
+    dataDict = bucketedData(nbKeys, timeSpan)
+    if conversion != 'cumulative':
+      def run(utils, dataDict=dataDict, granularity=granularity, average=(conversion == 'average')):
+        return rebin(utils, average, granularity, dataDict)
+    else:
+      def run(utils, dataDict=dataDict, granularity=granularity, timeSpan=timeSpan):
+        return cumulative(utils, granularity, timeSpan, dataDict)
+    if not sameData(run(loopUtils), run(arrayUtils)):
+      print "ERROR: %s: re-binned data differ" % name
+      return 1
+    loopTime = min(timeit.repeat(lambda: run(loopUtils), number=1, repeat=repetitions))
+    arrayTime = min(timeit.repeat(lambda: run(arrayUtils), number=1, repeat=repetitions))
+    print "%-15s %8s | %9.1fms %9.1fms %6.2fx" % (name, sum(len(buckets) for buckets in dataDict.itervalues()),
+                                                  loopTime * 1000, arrayTime * 1000, loopTime / arrayTime)
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+""" Benchmark of the DEncode fast path against the original per-type implementation.
+
+    The payloads mimic what actually goes through DISET:
+      * jdlDicts: job attribute dictionaries as returned by JobMonitoring
+      * statusBulk: the argument of JobStateUpdate.setJobStatusBulk
+      * replicaMap: the result of a FileCatalog getReplicas call
+      * mixed: S_OK structure with lists of tuples, floats and datetimes
+
+    Usage::
+
+      python benchmarkDEncode.py [nbRepetitions]
+
+    It does not need any DIRAC installation nor configuration, only the DIRAC python path.
+"""
+
+import sys
+import time
+import datetime
+import timeit
+
+from DIRAC.Core.Utilities import DEncode
+
+
+def jdlDicts(nbJobs=2000):
+  """ Job attributes, as returned by getJobsSummary """
+  jobs = {}
+  for jobID in xrange(nbJobs):
+    jobs[jobID] = {'JobID': jobID,
+                   'JobName': 'MC_Simulation_%s' % jobID,
+                   'Status': 'Running',
+                   'MinorStatus': 'Application',
+                   'ApplicationStatus': 'Gauss step 2',
+                   'Site': 'LCG.CERN.ch',
+                   'Owner': 'someuser',
+                   'OwnerDN': '/DC=ch/DC=cern/OU=Users/CN=someuser',
+                   'OwnerGroup': 'lhcb_mc',
+                   'UserPriority': 3,
+                   'RescheduleCounter': 0,
+                   'CPUTime': 12345.5,
+                   'VerifiedFlag': True,
+                   'HeartBeatTime': datetime.datetime(2018, 1, 1, 12, 0, jobID % 60),
+                   'SubmissionTime': datetime.datetime(2018, 1, 1, 10, 0, jobID % 60),
+                   'InputData': ['/lhcb/data/2017/RAW/FULL/%08d.raw' % (jobID * 10 + k) for k in xrange(5)],
+                   'DeletedFlag': False}
+  return {'OK': True, 'Value': jobs}
+
+
+def statusBulk(nbUpdates=5000):
+  """ setJobStatusBulk argument: date -> status dict """
+  start = datetime.datetime(2018, 1, 1)
+  updates = {}
+  for i in xrange(nbUpdates):
+    date = str(start + datetime.timedelta(seconds=i))
+    updates[date] = {'Status': 'Running',
+                     'MinorStatus': 'Application',
+                     'ApplicationStatus': 'Event %s processed' % i,
+                     'Source': 'JobWrapper'}
+  return updates
+
+
+def replicaMap(nbFiles=10000):
+  """ getReplicas result """
+  successful = {}
+  for i in xrange(nbFiles):
+    lfn = '/lhcb/MC/2017/ALLSTREAMS.DST/00061234/0000/00061234_%08d_1.allstreams.dst' % i
+    successful[lfn] = dict(('SE-%s-DST' % se, 'srm://srm.se%s.org:8443/srm/managerv2?SFN=/castor%s' % (se, lfn))
+                           for se in xrange(3))
+  failed = dict(('/lhcb/missing/%s' % i, 'No such file or directory') for i in xrange(100))
+  return {'OK': True, 'Value': {'Successful': successful, 'Failed': failed}}
+
+
+def mixed(nbRecords=5000):
+  """ Accounting-like records: lists of tuples with floats and datetimes """
+  now = datetime.datetime(2018, 1, 1, 12, 0, 0)
+  records = [('DataOperation', now, now + datetime.timedelta(seconds=60),
+              ('lhcb_user', 'someuser', 'putAndRegister', 'LCG.CERN.ch', 'CERN-USER', True),
+              [1, 12345678901234L, 1.25, None])
+             for _ in xrange(nbRecords)]
+  return {'OK': True, 'Value': records}
+
+
+PAYLOADS = (('jdlDicts', jdlDicts), ('statusBulk', statusBulk), ('replicaMap', replicaMap), ('mixed', mixed))
+
+
+def bestOf(func, arg, repetitions):
+  """ Best wall time of a single call over the repetitions """
+  return min(timeit.repeat(lambda: func(arg), number=1, repeat=repetitions))
+
+
+def main(repetitions=5):
+  """ Run all the payloads through both engines and print the comparison """
+  print "%-12s %10s | %10s %10s %7s | %10s %10s %7s" % ('payload', 'size', 'enc legacy', 'enc fast', 'gain',
+                                                       'dec legacy', 'dec fast', 'gain')
+  for name, generator in PAYLOADS:
+    payload = generator()
+    encoded = DEncode.legacyEncode(payload)
+    if DEncode.encode(payload) != encoded:
+      print "ERROR: %s: encoded data differ" % name
+      return 1
+    if DEncode.decode(encoded) != DEncode.legacyDecode(encoded):
+      print "ERROR: %s: decoded data differ" % name
+      return 1
+    encLegacy = bestOf(DEncode.legacyEncode, payload, repetitions)
+    encFast = bestOf(DEncode.encode, payload, repetitions)
+    decLegacy = bestOf(DEncode.legacyDecode, encoded, repetitions)
+    decFast = bestOf(DEncode.decode, encoded, repetitions)
+    print "%-12s %10s | %9.1fms %9.1fms %6.2fx | %9.1fms %9.1fms %6.2fx" % (name, len(encoded),
+                                                                          encLegacy * 1000, encFast * 1000,
+                                                                          encLegacy / encFast,
+                                                                          decLegacy * 1000, decFast * 1000,
+                                                                          decLegacy / decFast)
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)
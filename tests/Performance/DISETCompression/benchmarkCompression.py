@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+""" Benchmark of the compression of the DISET messages, against the uncompressed messages.
+
+    The messages are the results of bulk calls: replica maps, job parameters and accounting records, of about
+    1 and 10 MB once encoded. Each one goes through a pair of connected sockets, the sending transport
+    compressing it above the default threshold and the receiving one decompressing it. The times are the
+    CPU times of compressing and decompressing, and the estimated transfer times of the raw and compressed
+    messages over a WAN link of the given bandwidth.
+
+    Usage::
+
+      python benchmarkCompression.py [nbRepetitions] [bandwidthMBps]
+
+    It does not need any DIRAC installation nor configuration, only the DIRAC python path.
+"""
+
+import sys
+import time
+import socket
+import threading
+
+from DIRAC import gLogger, S_OK
+from DIRAC.Core.DISET.private.Compression import DEFAULT_COMPRESSION_THRESHOLD
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+
+def getReplicas(size):
+  """ A replica map of about size bytes once encoded """
+  return S_OK(dict(('/lhcb/MC/2017/ALLSTREAMS.DST/%08d/%08d_1.allstreams.dst' % (index // 1000, index),
+                    {'CERN-DST-EOS': 'root://eoslhcb.cern.ch//eos/%08d' % index}) for index in xrange(size // 110)))
+
+
+def getJobParameters(size):
+  """ Parameters of jobs, of about size bytes once encoded """
+  return S_OK(dict((12000000 + index, {'CPUNormalizationFactor': '%.1f' % (10 + index % 7),
+                                       'HostName': 'wn%04d.pic.es' % (index % 2000),
+                                       'LocalJobID': '%d.ce07.pic.es' % (3400000 + index),
+                                       'TotalCPUTime(s)': str(index * 37 % 86400)})
+                   for index in xrange(size // 210)))
+
+
+def getAccountingRecords(size):
+  """ Accounting records of jobs, of about size bytes once encoded """
+  return S_OK([('lhcb_user', 'lhcb', 'MCSimulation', 'LCG.PIC.es', 'Done', 1513000000 + index * 60,
+                1513000000 + index * 60 + 3600, index % 3600, 3600, 1.5 * index, 2048, 4096, 0, 1)
+               for index in xrange(size // 120)])
+
+
+def getTransports():
+  transports = []
+  for oSocket in socket.socketpair():
+    transport = PlainTransport(None)
+    transport.setClientSocket(oSocket)
+    transport.setCompression('zlib', DEFAULT_COMPRESSION_THRESHOLD)
+    transports.append(transport)
+  return transports
+
+
+def measure(message, repetitions):
+  """ Best compression and decompression times, and the raw and compressed sizes """
+  sender, receiver = getTransports()
+  sendTimes = []
+  receiveTimes = []
+  for _ in xrange(repetitions):
+    thread = threading.Thread(target=sender.sendData, args=(message,))
+    thread.start()
+    if receiver.receiveData() != message:
+      return None
+    thread.join()
+    sendStats = sender.getCompressionStats()
+    receiveStats = receiver.getCompressionStats()
+    sendTimes.append(sendStats['Time'])
+    receiveTimes.append(receiveStats['Time'])
+  return min(sendTimes), min(receiveTimes), sendStats['RawBytes'], sendStats['CompressedBytes']
+
+
+def main(repetitions=5, bandwidth=10.):
+  """ Send the messages compressed and print the ratios, CPU costs and transfer times """
+  gLogger.setLevel('ERROR')
+  print "%-23s | %8s %8s %6s | %9s %9s | %9s %9s" % ('message', 'raw', 'zlib', 'ratio', 'compress', 'decomp.',
+                                                      'raw xfer', 'zlib xfer')
+  for name, function in (('replica map', getReplicas), ('job parameters', getJobParameters),
+                         ('accounting records', getAccountingRecords)):
+    for size in (1, 10):
+      result = measure(function(size * 1048576), repetitions)
+      if not result:
+        print "ERROR: the %s of %sMB was not received correctly" % (name, size)
+        return 1
+      compressTime, decompressTime, rawBytes, compressedBytes = result
+      rawTransfer = rawBytes / (bandwidth * 1048576)
+      compressedTransfer = compressedBytes / (bandwidth * 1048576) + compressTime + decompressTime
+      print "%-23s | %6.1fMB %6.2fMB %5.1fx | %7.1fms %7.1fms | %8.2fs %8.2fs" % ('%s %sMB' % (name, size),
+                                                                               rawBytes / 1048576.,
+                                                                               compressedBytes / 1048576.,
+                                                                               float(rawBytes) / compressedBytes,
+                                                                               compressTime * 1000,
+                                                                               decompressTime * 1000,
+                                                                               rawTransfer, compressedTransfer)
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(int(sys.argv[1]) if len(sys.argv) > 1 else 5, float(sys.argv[2]) if len(sys.argv) > 2 else 10.)
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)
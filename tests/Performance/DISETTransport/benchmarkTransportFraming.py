@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+""" Benchmark of the sending and the reception of large DISET messages, against the former framing.
+
+    The former BaseTransport.sendData built the length header and the data in a new string and sliced it
+    for each packet, receiveData accumulated the packets in a StringIO before copying them out. The new
+    framing writes the data from a memoryview and receives it in a buffer of the message size.
+    The messages are replica maps of 1, 10 and 50 MB once encoded, going through a pair of connected
+    sockets. Each side is measured in its own process, the other side being a thread reading or writing
+    the raw stream on a plain socket. The CPU time is the one of the process, the peak memory is the growth
+    of its maximum resident size.
+
+    Usage::
+
+      python benchmarkTransportFraming.py [nbRepetitions]
+
+    It does not need any DIRAC installation nor configuration, only the DIRAC python path.
+"""
+
+import os
+import sys
+import time
+import socket
+import resource
+import threading
+import cStringIO
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Utilities import DEncode
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+
+class FormerTransport(PlainTransport):
+  """ PlainTransport with the former sendData and receiveData, without the keep alives """
+
+  def sendData(self, uData, prefix=False):
+    sCodedData = DEncode.encode(uData)
+    if prefix:
+      dataToSend = "%s%s:%s" % (prefix, len(sCodedData), sCodedData)
+    else:
+      dataToSend = "%s:%s" % (len(sCodedData), sCodedData)
+    for index in range(0, len(dataToSend), self.packetSize):
+      bytesToSend = min(self.packetSize, len(dataToSend) - index)
+      packSentBytes = 0
+      while packSentBytes < bytesToSend:
+        try:
+          result = self._write(dataToSend[index + packSentBytes: index + bytesToSend])
+          if not result['OK']:
+            return result
+          sentBytes = result['Value']
+        except Exception as e:
+          return S_ERROR("Exception while sending data: %s" % e)
+        if sentBytes == 0:
+          return S_ERROR("Connection closed by peer")
+        packSentBytes += sentBytes
+    del sCodedData
+    sCodedData = None
+    return S_OK()
+
+  def receiveData(self, maxBufferSize=0, blockAfterKeepAlive=True, idleReceive=False):
+    iSeparatorPosition = self.byteStream.find(":", 0, 10)
+    while iSeparatorPosition == -1:
+      retVal = self._read(16384)
+      if not retVal['OK']:
+        return retVal
+      if not retVal['Value']:
+        return S_ERROR("Peer closed connection")
+      self.byteStream += retVal['Value']
+      iSeparatorPosition = self.byteStream.find(":", 0, 10)
+    pkgSize = int(self.byteStream[:iSeparatorPosition])
+    pkgData = self.byteStream[iSeparatorPosition + 1:]
+    readSize = len(pkgData)
+    if readSize >= pkgSize:
+      data = pkgData[:pkgSize]
+      self.byteStream = pkgData[pkgSize:]
+    else:
+      pkgMem = cStringIO.StringIO()
+      pkgMem.write(pkgData)
+      while readSize < pkgSize:
+        retVal = self._read(pkgSize - readSize, skipReadyCheck=True)
+        if not retVal['OK']:
+          return retVal
+        if not retVal['Value']:
+          return S_ERROR("Peer closed connection")
+        rcvData = retVal['Value']
+        readSize += len(rcvData)
+        pkgMem.write(rcvData)
+      if readSize == pkgSize:
+        data = pkgMem.getvalue()
+        self.byteStream = ""
+      else:
+        pkgMem.seek(0, 0)
+        data = pkgMem.read(pkgSize)
+        self.byteStream = pkgMem.read()
+    return DEncode.decode(data)[0]
+
+
+def getReplicas(size):
+  """ A replica map of about size bytes once encoded """
+  return S_OK(dict(('/lhcb/MC/2017/ALLSTREAMS.DST/%08d/%08d_1.allstreams.dst' % (index // 1000, index),
+                    {'CERN-DST-EOS': 'root://eoslhcb.cern.ch//eos/%08d' % index}) for index in xrange(size // 110)))
+
+
+def getTransports(transportClass):
+  sockets = socket.socketpair()
+  transport = transportClass(None)
+  transport.setClientSocket(sockets[0])
+  return transport, sockets[1]
+
+
+def drain(oSocket, size):
+  buf = bytearray(1048576)
+  while size > 0:
+    size -= oSocket.recv_into(buf)
+
+
+def getCPUTime():
+  usage = resource.getrusage(resource.RUSAGE_SELF)
+  return usage.ru_utime + usage.ru_stime
+
+
+def measureSend(transportClass, message, stream, repetitions):
+  """ CPU time and memory of the sending side, the peer drains the socket """
+  transport, peer = getTransports(transportClass)
+  times = []
+  startRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  for _ in xrange(repetitions):
+    thread = threading.Thread(target=drain, args=(peer, len(stream)))
+    thread.start()
+    startTime = getCPUTime()
+    if not transport.sendData(message)['OK']:
+      return None
+    thread.join()
+    times.append(getCPUTime() - startTime)
+  return min(times), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - startRSS
+
+
+def measureReceive(transportClass, message, stream, repetitions):
+  """ CPU time and memory of the receiving side, the peer writes the encoded stream """
+  transport, peer = getTransports(transportClass)
+  times = []
+  startRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  for _ in xrange(repetitions):
+    thread = threading.Thread(target=peer.sendall, args=(stream,))
+    thread.start()
+    startTime = getCPUTime()
+    result = transport.receiveData()
+    thread.join()
+    times.append(getCPUTime() - startTime)
+    if result != message:
+      return None
+    del result
+  return min(times), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - startRSS
+
+
+def runInChild(function, *args):
+  """ Runs the measure in a child process, for its maximum resident size to be its own """
+  readFD, writeFD = os.pipe()
+  pid = os.fork()
+  if not pid:
+    os.close(readFD)
+    os.write(writeFD, repr(function(*args)))
+    os._exit(0)
+  os.close(writeFD)
+  output = ''
+  while True:
+    data = os.read(readFD, 1024)
+    if not data:
+      break
+    output += data
+  os.close(readFD)
+  os.waitpid(pid, 0)
+  return eval(output)
+
+
+def main(repetitions=5):
+  """ Send and receive the messages with both framings and print the comparison """
+  gLogger.setLevel('ERROR')
+  print "%-18s %7s | %10s %10s %6s | %10s %10s" % ('message', 'side', 'former CPU', 'new CPU', 'gain',
+                                                   'former mem', 'new mem')
+  messages = [('CS dump %sMB' % size, S_OK('x' * size * 1048576)) for size in (1, 10, 100)]
+  messages.append(('replica map 10MB', getReplicas(10 * 1048576)))
+  for name, message in messages:
+    codedData = DEncode.encode(message)
+    stream = "%s:%s" % (len(codedData), codedData)
+    del codedData
+    for side, measure in (('send', measureSend), ('receive', measureReceive)):
+      former = runInChild(measure, FormerTransport, message, stream, repetitions)
+      new = runInChild(measure, PlainTransport, message, stream, repetitions)
+      if not former or not new:
+        print "ERROR: the %s of %s failed" % (side, name)
+        return 1
+      print "%-18s %7s | %8.1fms %8.1fms %5.1fx | %8.1fMB %8.1fMB" % (name, side, former[0] * 1000, new[0] * 1000,
+                                                                    former[0] / max(new[0], 0.0001),
+                                                                    former[1] / 1024., new[1] / 1024.)
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)
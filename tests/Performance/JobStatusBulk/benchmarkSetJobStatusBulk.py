@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+""" Benchmark of the multi-job status updates of the JobStateUpdate service against the per-job path.
+
+    JobDB and JobLoggingDB run their real statements on an in-memory sqlite database, with
+    a fixed latency added to each statement to account for the round trip to the MySQL server.
+    The per-job path is the former setJobStatusBulk implementation, called once per job: it reads
+    the status and the time stamps, sets the attributes and inserts one logging record per status.
+    The bulk path is setJobsStatusBulk for all the jobs. The scenarios are:
+      * pilotReports: 200 jobs reporting 3 statuses each, as the job wrappers do
+      * stalledSweep: 2000 jobs with a single status update, as the StalledJobAgent does
+      * largeBatch: 5000 jobs with 5 statuses each
+
+    Usage::
+
+      python benchmarkSetJobStatusBulk.py [nbRepetitions] [latencyInMs]
+
+    It does not need any DIRAC installation nor configuration, only the DIRAC python path.
+"""
+
+import sys
+import time
+import sqlite3
+
+from mock import patch
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Utilities import Time
+from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
+from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB import JobLoggingDB
+from DIRAC.WorkloadManagementSystem.Service import JobStateUpdateHandler as handlerModule
+from DIRAC.WorkloadManagementSystem.Service.JobStateUpdateHandler import JobStateUpdateHandler, JOB_FINAL_STATES
+
+TABLES = ("CREATE TABLE Jobs (JobID INTEGER PRIMARY KEY, Status VARCHAR(32), MinorStatus VARCHAR(128), "
+          "ApplicationStatus VARCHAR(255), ApplicationCounter INTEGER, LastUpdateTime DATETIME, "
+          "StartExecTime DATETIME, EndExecTime DATETIME)",
+          "CREATE TABLE LoggingInfo (SeqNum INTEGER PRIMARY KEY, JobID INTEGER, Status VARCHAR(32), "
+          "MinorStatus VARCHAR(128), ApplicationStatus VARCHAR(255), StatusTime DATETIME, "
+          "StatusTimeOrder DOUBLE, StatusSource VARCHAR(32))",
+          "CREATE INDEX JobIDIndex ON LoggingInfo (JobID)")
+
+
+class SQLiteDB(object):
+  """ The DB methods used by JobDB and JobLoggingDB, on sqlite with a latency per statement """
+
+  def __init__(self, connection, latency):
+    self.connection = connection
+    self.latency = latency
+    self.statements = 0
+
+  def _execute(self, cmdList):
+    cursor = self.connection.cursor()
+    try:
+      for cmd in cmdList:
+        self.statements += 1
+        time.sleep(self.latency)
+        cursor.execute(cmd)
+      self.connection.commit()
+      return S_OK(cursor.fetchall())
+    except sqlite3.Error as e:
+      self.connection.rollback()
+      return S_ERROR(str(e))
+
+  def _query(self, cmd, conn=None):
+    return self._execute([cmd])
+
+  def _update(self, cmd, conn=None):
+    return self._execute([cmd])
+
+  def _transaction(self, cmdList, conn=None):
+    return self._execute(cmdList)
+
+  @staticmethod
+  def _escapeString(value):
+    return S_OK("'%s'" % str(value).replace("'", "''"))
+
+  def _escapeValues(self, inValues=None):
+    return S_OK([self._escapeString(value)['Value'] for value in inValues or []])
+
+
+class SQLiteJobDB(SQLiteDB, JobDB):
+
+  def __init__(self, connection, latency):
+    SQLiteDB.__init__(self, connection, latency)
+    self.jobAttributeNames = ['JobID', 'Status', 'MinorStatus', 'ApplicationStatus', 'ApplicationCounter',
+                              'LastUpdateTime', 'StartExecTime', 'EndExecTime']
+    self.log = handlerModule.gLogger
+
+
+class SQLiteJobLoggingDB(SQLiteDB, JobLoggingDB):
+
+  def __init__(self, connection, latency):
+    SQLiteDB.__init__(self, connection, latency)
+    self.gLogger = handlerModule.gLogger.getSubLogger('JobLoggingDB')
+    self.gLogger.setLevel('ERROR')
+
+
+def perJobSetJobStatusBulk(jobDB, logDB, jobID, statusDict):
+  """ setJobStatusBulk as it was implemented before the bulk version, for a single job """
+  status = ""
+  minor = ""
+  application = ""
+  appCounter = ""
+  endDate = ''
+  startDate = ''
+  startFlag = ''
+  jobID = int(jobID)
+
+  result = jobDB.getJobAttributes(jobID, ['Status'])
+  if not result['OK']:
+    return result
+
+  if not result['Value']:
+    # if there is no matching Job it returns an empty dictionary
+    return S_ERROR('No Matching Job')
+
+  new_status = result['Value']['Status']
+  if new_status == "Stalled":
+    status = 'Running'
+
+  # Get the latest WN time stamps of status updates
+  result = logDB.getWMSTimeStamps(int(jobID))
+  if not result['OK']:
+    return result
+  lastTime = max([float(t) for s, t in result['Value'].items() if s != 'LastTime'])
+  lastTime = Time.toString(Time.fromEpoch(lastTime))
+
+  # Get the last status values
+  dates = sorted(statusDict)
+  # We should only update the status if its time stamp is more recent than the last update
+  for date in [date for date in dates if date >= lastTime]:
+    sDict = statusDict[date]
+    if sDict['Status']:
+      status = sDict['Status']
+      if status in JOB_FINAL_STATES:
+        endDate = date
+      if status == "Running":
+        startFlag = 'Running'
+    if sDict['MinorStatus']:
+      minor = sDict['MinorStatus']
+      if minor == "Application" and startFlag == 'Running':
+        startDate = date
+    if sDict['ApplicationStatus']:
+      application = sDict['ApplicationStatus']
+    counter = sDict.get('ApplicationCounter')
+    if counter:
+      appCounter = counter
+  attrNames = []
+  attrValues = []
+  if status:
+    attrNames.append('Status')
+    attrValues.append(status)
+  if minor:
+    attrNames.append('MinorStatus')
+    attrValues.append(minor)
+  if application:
+    attrNames.append('ApplicationStatus')
+    attrValues.append(application)
+  if appCounter:
+    attrNames.append('ApplicationCounter')
+    attrValues.append(appCounter)
+  result = jobDB.setJobAttributes(jobID, attrNames, attrValues, update=True)
+  if not result['OK']:
+    return result
+
+  if endDate:
+    result = jobDB.setEndExecTime(jobID, endDate)
+  if startDate:
+    result = jobDB.setStartExecTime(jobID, startDate)
+
+  # Update the JobLoggingDB records
+  for date in dates:
+    sDict = statusDict[date]
+    status = sDict['Status']
+    if not status:
+      status = 'idem'
+    minor = sDict['MinorStatus']
+    if not minor:
+      minor = 'idem'
+    application = sDict['ApplicationStatus']
+    if not application:
+      application = 'idem'
+    source = sDict['Source']
+    result = logDB.addLoggingRecord(jobID, status, minor, application, date, source)
+    if not result['OK']:
+      return result
+
+  return S_OK()
+
+
+def getDBs(nbJobs, latency):
+  """ JobDB and JobLoggingDB with nbJobs Matched jobs """
+  connection = sqlite3.connect(':memory:')
+  connection.create_function('UTC_TIMESTAMP', 0, lambda: Time.toString(Time.dateTime()))
+  for table in TABLES:
+    connection.execute(table)
+  jobDB = SQLiteJobDB(connection, latency)
+  logDB = SQLiteJobLoggingDB(connection, latency)
+  connection.executemany("INSERT INTO Jobs (JobID, Status, MinorStatus) VALUES (?, 'Matched', 'Assigned')",
+                         [(jobID,) for jobID in xrange(1, nbJobs + 1)])
+  logDB.addLoggingRecords([(jobID, 'Matched', 'Assigned', 'Unknown', '2018-01-01 00:00:00', 'Matcher')
+                           for jobID in xrange(1, nbJobs + 1)])
+  connection.commit()
+  return jobDB, logDB
+
+
+def jobsStatusUpdates(nbJobs, nbStatuses):
+  """ { jobID : statusDict } as sent by the JobReport of the job wrappers """
+  statuses = [('Running', 'Application', ''), ('', '', 'Step 1'), ('', '', 'Step 2'),
+              ('Running', 'Uploading Output', ''), ('Done', 'Execution Complete', '')]
+  jobsStatusDict = {}
+  for jobID in xrange(1, nbJobs + 1):
+    statusDict = {}
+    for index, (status, minor, application) in enumerate(statuses[:nbStatuses]):
+      date = '2018-01-01 01:%02d:%02d' % (jobID % 60, index)
+      statusDict[date] = {'Status': status, 'MinorStatus': minor, 'ApplicationStatus': application,
+                          'Source': 'JobWrapper'}
+    jobsStatusDict[jobID] = statusDict
+  return jobsStatusDict
+
+
+def dbContent(jobDB):
+  """ The jobs and their logging records """
+  cursor = jobDB.connection.cursor()
+  cursor.execute("SELECT JobID, Status, MinorStatus, ApplicationStatus, StartExecTime, EndExecTime FROM Jobs")
+  jobs = sorted(cursor.fetchall())
+  cursor.execute("SELECT JobID, Status, MinorStatus, ApplicationStatus, StatusTime, StatusSource FROM LoggingInfo")
+  return jobs, sorted(cursor.fetchall())
+
+
+SCENARIOS = (('pilotReports', 200, 3),
+             ('stalledSweep', 2000, 1),
+             ('largeBatch', 5000, 5))
+
+
+def main(repetitions=3, latency=0.2):
+  """ Run all the scenarios through both implementations and print the comparison """
+  print "%-14s %6s %8s | %10s %10s | %9s %9s %7s" % ('scenario', 'jobs', 'statuses', 'stmts loop', 'stmts bulk',
+                                                    'loop', 'bulk', 'gain')
+  handler = JobStateUpdateHandler.__new__(JobStateUpdateHandler)
+  for name, nbJobs, nbStatuses in SCENARIOS:
+    jobsStatusDict = jobsStatusUpdates(nbJobs, nbStatuses)
+
+    def runLoop():
+      jobDB, logDB = getDBs(nbJobs, latency / 1000.)
+      jobDB.statements = 0
+      startTime = time.time()
+      for jobID, statusDict in jobsStatusDict.iteritems():
+        result = perJobSetJobStatusBulk(jobDB, logDB, jobID, statusDict)
+        if not result['OK']:
+          raise RuntimeError(result['Message'])
+      return time.time() - startTime, jobDB.statements + logDB.statements, dbContent(jobDB)
+
+    def runBulk():
+      jobDB, logDB = getDBs(nbJobs, latency / 1000.)
+      jobDB.statements = 0
+      startTime = time.time()
+      with patch.object(handlerModule, 'jobDB', jobDB), patch.object(handlerModule, 'logDB', logDB):
+        result = handler.export_setJobsStatusBulk(jobsStatusDict)
+      if not result['OK'] or result['Value']['Failed']:
+        raise RuntimeError(str(result))
+      return time.time() - startTime, jobDB.statements + logDB.statements, dbContent(jobDB)
+
+    loopRuns = [runLoop() for _ in xrange(repetitions)]
+    bulkRuns = [runBulk() for _ in xrange(repetitions)]
+    # LastUpdateTime is not compared, it is the time of the update
+    if loopRuns[0][2] != bulkRuns[0][2]:
+      print "ERROR: %s: the DB content differs" % name
+      return 1
+    loopTime = min(run[0] for run in loopRuns)
+    bulkTime = min(run[0] for run in bulkRuns)
+    print "%-14s %6s %8s | %10s %10s | %8.0fms %8.0fms %6.1fx" % (name, nbJobs, nbStatuses, loopRuns[0][1],
+                                                                 bulkRuns[0][1], loopTime * 1000, bulkTime * 1000,
+                                                                 loopTime / bulkTime)
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(int(sys.argv[1]) if len(sys.argv) > 1 else 3, float(sys.argv[2]) if len(sys.argv) > 2 else 0.2)
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+""" Benchmark of the ProcessSampler used by the Watchdog against the former walk of the process tree.
+
+    The processes are in a synthetic /proc directory, with the stat and statm files of a job tree
+    (a wrapper, its payloads and their children) and of the other processes of the node.
+    The former walk is the ProcessMonitor implementation before the sampler, reading the process
+    group from /proc instead of calling ps, which can not look at a synthetic directory: it lists
+    the processes with ls, reads all of them and walks the tree recursively at each call.
+    The sampler keeps the tree and its open files between the calls. The scenarios are:
+      * singleCore: a job of 10 processes on a node with 500 processes
+      * multiCore: a job of 200 processes on a node with 2000 processes
+      * largeTree: a job of 2000 processes on a node with 5000 processes
+    Each scenario is also run with 10% of the job processes replaced between the samples.
+
+    Usage::
+
+      python benchmarkProcessSampler.py [nbRepetitions]
+
+    It does not need any DIRAC installation nor configuration, only the DIRAC python path.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Utilities.Subprocess import shellCall
+from DIRAC.Core.Utilities.ProcessSampler import ProcessSampler
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGESIZE')
+ROOT_PID = 1000
+
+
+class TreeWalk(object):
+  """ The former ProcessMonitor.getResourceConsumedLinux, on a given /proc directory """
+
+  def __init__(self, procPath):
+    self.procPath = procPath
+    self.log = gLogger.getSubLogger('TreeWalk')
+
+  def getResourceConsumedLinux(self, pid):
+    pid = str(pid)
+    masterProcPath = '%s/%s/stat' % (self.procPath, pid)
+    if not os.path.exists(masterProcPath):
+      return S_ERROR('Process %s does not exist' % (pid))
+    pidListResult = self.__getProcListLinux()
+    if not pidListResult['OK']:
+      return pidListResult
+    pidList = pidListResult['Value']
+    return self.__getChildResourceConsumedLinux(pid, pidList)
+
+  def __getProcListLinux(self):
+    result = shellCall(10, 'ls -d %s/[0-9]*' % self.procPath)
+    if not result['OK']:
+      if 'Value' not in result:
+        return result
+    procList = result['Value'][1].replace('%s/' % self.procPath, '').split('\n')
+    return S_OK(procList)
+
+  def __getChildResourceConsumedLinux(self, pid, pidList, infoDict=None):
+    childCPU = 0
+    vsize = 0
+    rss = 0
+    pageSize = os.sysconf('SC_PAGESIZE')
+    if not infoDict:
+      infoDict = {}
+      for pidCheck in pidList:
+        info = self.__getProcInfoLinux(pidCheck)
+        if info['OK']:
+          infoDict[pidCheck] = info['Value']
+
+    procGroup = self.__getProcGroupLinux(pid)
+    if not procGroup['OK']:
+      return procGroup
+    procGroup = procGroup['Value'].strip()
+
+    for pidCheck, info in infoDict.items():
+      if pidCheck in infoDict and info[3] == pid:
+        contribution = float(info[13]) / CLOCK_TICKS + float(info[14]) / CLOCK_TICKS + \
+            float(info[15]) / CLOCK_TICKS + float(info[16]) / CLOCK_TICKS
+        childCPU += contribution
+        vsize += float(info[22])
+        rss += float(info[23]) * pageSize
+        del infoDict[pidCheck]
+        result = self.__getChildResourceConsumedLinux(pidCheck, pidList, infoDict)
+        if result['OK']:
+          childCPU += result['Value']['CPU']
+          vsize += result['Value']['Vsize']
+          rss += result['Value']['RSS']
+
+    for pidCheck, info in infoDict.items():
+      if pidCheck in infoDict and info[3] == 1 and info[4] == procGroup:
+        contribution = float(info[13]) / CLOCK_TICKS + float(info[14]) / CLOCK_TICKS + \
+            float(info[15]) / CLOCK_TICKS + float(info[16]) / CLOCK_TICKS
+        childCPU += contribution
+        vsize += float(info[22])
+        rss += float(info[23]) * pageSize
+        del infoDict[pidCheck]
+
+    if pid in infoDict:
+      info = infoDict[pid]
+      contribution = float(info[13]) / CLOCK_TICKS + float(info[14]) / CLOCK_TICKS + \
+          float(info[15]) / CLOCK_TICKS + float(info[16]) / CLOCK_TICKS
+      childCPU += contribution
+      vsize += float(info[22])
+      rss += float(info[23]) * pageSize
+      del infoDict[pid]
+
+    return S_OK({"CPU": childCPU, "Vsize": vsize, "RSS": rss})
+
+  def __getProcInfoLinux(self, pid):
+    procPath = '%s/%s/stat' % (self.procPath, pid)
+    try:
+      with open(procPath, 'r') as fopen:
+        procStat = fopen.readline()
+    except BaseException:
+      return S_ERROR('Not able to check %s' % pid)
+    return S_OK(procStat.split(' '))
+
+  def __getProcGroupLinux(self, pid):
+    """ Read from /proc instead of ps --no-headers -o pgrp -p pid """
+    info = self.__getProcInfoLinux(pid)
+    if not info['OK']:
+      return info
+    return S_OK(info['Value'][4])
+
+
+class SyntheticProc(object):
+  """ A /proc directory with a job tree of nbJob processes and nbOthers other processes """
+
+  def __init__(self, nbJob, nbOthers):
+    self.path = tempfile.mkdtemp()
+    self.nextPID = ROOT_PID
+    self.jobPIDs = []
+    self.addProcess(1, 1)
+    for _ in xrange(nbJob):
+      # Each payload process has up to 4 children
+      ppid = self.jobPIDs[(len(self.jobPIDs) - 1) // 4] if self.jobPIDs else 1
+      self.jobPIDs.append(self.addProcess(ppid, ROOT_PID))
+    for index in xrange(nbOthers):
+      self.addProcess(1, 100000 + index)
+
+  def addProcess(self, ppid, pgrp):
+    pid = self.nextPID if ppid != 1 or pgrp == ROOT_PID else pgrp
+    self.nextPID += ppid != 1 or pgrp == ROOT_PID
+    procDir = os.path.join(self.path, str(pid))
+    os.mkdir(procDir)
+    fields = ['0'] * 52
+    fields[1:6] = [str(pid), '(payload)', 'S', str(ppid), str(pgrp)]
+    fields[14:18] = [str(pid % 1000), str(pid % 100), '0', '0']
+    fields[23:25] = [str(1000 * PAGE_SIZE), str(pid % 500)]
+    with open(os.path.join(procDir, 'stat'), 'w') as fd:
+      fd.write(' '.join(fields[1:]) + '\n')
+    with open(os.path.join(procDir, 'statm'), 'w') as fd:
+      fd.write('1000 %d 10 1 0 100 0\n' % (pid % 500))
+    return pid
+
+  def replaceProcesses(self, fraction):
+    """ Ends the last job processes and starts new ones, children of the root """
+    nbReplaced = int(len(self.jobPIDs) * fraction)
+    for pid in self.jobPIDs[-nbReplaced:]:
+      procDir = os.path.join(self.path, str(pid))
+      for name in os.listdir(procDir):
+        open(os.path.join(procDir, name), 'w').close()
+      shutil.rmtree(procDir)
+    self.jobPIDs = self.jobPIDs[:-nbReplaced] + [self.addProcess(ROOT_PID, ROOT_PID) for _ in xrange(nbReplaced)]
+
+  def close(self):
+    shutil.rmtree(self.path)
+
+
+SCENARIOS = (('singleCore', 10, 500),
+             ('multiCore', 200, 2000),
+             ('largeTree', 2000, 5000))
+
+
+def main(repetitions=5):
+  """ Run all the scenarios through both implementations and print the comparison """
+  gLogger.setLevel('ERROR')
+  print "%-11s %5s %6s %6s | %9s %9s %9s %7s" % ('scenario', 'job', 'others', 'churn', 'walk', 'first', 'sample',
+                                                 'gain')
+  for name, nbJob, nbOthers in SCENARIOS:
+    for churn in (0., 0.1):
+      proc = SyntheticProc(nbJob, nbOthers)
+      try:
+        walk = TreeWalk(proc.path)
+        sampler = ProcessSampler(ROOT_PID, procPath=proc.path, readPSS=False)
+        startTime = time.time()
+        result = sampler.sample()
+        firstTime = time.time() - startTime
+        walkTimes = []
+        sampleTimes = []
+        for _ in xrange(repetitions):
+          if churn:
+            proc.replaceProcesses(churn)
+          startTime = time.time()
+          walkResult = walk.getResourceConsumedLinux(ROOT_PID)
+          walkTimes.append(time.time() - startTime)
+          startTime = time.time()
+          result = sampler.sample()
+          sampleTimes.append(time.time() - startTime)
+          if not walkResult['OK'] or not result['OK']:
+            print "ERROR: %s: %s %s" % (name, walkResult, result)
+            return 1
+          # The processes that ended keep their CPU in the sampler
+          if not churn and [round(walkResult['Value'][key], 2) for key in ('CPU', 'Vsize', 'RSS')] != \
+                  [round(result['Value'][key], 2) for key in ('CPU', 'Vsize', 'RSS')]:
+            print "ERROR: %s: the resources differ: %s %s" % (name, walkResult['Value'], result['Value'])
+            return 1
+          if result['Value']['Processes'] != nbJob:
+            print "ERROR: %s: %s processes sampled instead of %s" % (name, result['Value']['Processes'], nbJob)
+            return 1
+      finally:
+        sampler.close()
+        proc.close()
+      print "%-11s %5s %6s %5.0f%% | %7.1fms %7.1fms %7.1fms %6.1fx" % (name, nbJob, nbOthers, churn * 100,
+                                                                       min(walkTimes) * 1000, firstTime * 1000,
+                                                                       min(sampleTimes) * 1000,
+                                                                       min(walkTimes) / min(sampleTimes))
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)
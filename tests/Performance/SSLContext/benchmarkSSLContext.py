@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+""" Benchmark of the creation of the SSL contexts of the DISET connections, with and without the context cache.
+
+    A synthetic CAs directory holds nbCAs CA certificates, the client uses a self signed certificate and key
+    as proxy. For each connection the former SocketInfo created a new context, filled a new CA store with all
+    the CAs and read the proxy from disk; the cached SocketInfo takes the context prepared for the same options
+    and credentials. The times are:
+      * former: the former context creation, with the CAs already loaded
+      * first: the first cached context creation, loading the CAs
+      * cached: the next cached context creations
+      * renewed: the context creation after the proxy file was written again
+
+    Usage::
+
+      python benchmarkSSLContext.py [nbRepetitions]
+
+    It needs the DIRAC python path and GSI, but no DIRAC installation nor configuration.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import GSI
+
+from DIRAC import gLogger
+from DIRAC.Core.DISET.private.Transports.SSL.SocketInfo import SocketInfo, DEFAULT_SSL_CIPHERS
+
+
+def generateCertificate(key, commonName):
+  """ Self signed certificate of commonName for key """
+  cert = GSI.crypto.X509()
+  cert.set_serial_number(abs(hash(commonName)))
+  cert.get_subject().insert_entry("CN", commonName)
+  cert.set_issuer(cert.get_subject())
+  cert.set_pubkey(key)
+  cert.gmtime_adj_notBefore(-900)
+  cert.gmtime_adj_notAfter(86400)
+  cert.sign(key, 'sha256')
+  return GSI.crypto.dump_certificate(GSI.crypto.FILETYPE_PEM, cert)
+
+
+class Credentials(object):
+  """ A CAs directory with nbCAs CAs and a proxy file """
+
+  def __init__(self, nbCAs):
+    self.path = tempfile.mkdtemp()
+    self.casPath = os.path.join(self.path, 'certificates')
+    os.mkdir(self.casPath)
+    key = GSI.crypto.PKey()
+    key.generate_key(GSI.crypto.TYPE_RSA, 2048)
+    for index in xrange(nbCAs):
+      with open(os.path.join(self.casPath, '%08x.0' % index), 'w') as fd:
+        fd.write(generateCertificate(key, 'Benchmark CA %d' % index))
+    self.proxyPath = os.path.join(self.path, 'proxy')
+    self.proxyData = generateCertificate(key, 'Benchmark user') + \
+        GSI.crypto.dump_privatekey(GSI.crypto.FILETYPE_PEM, key)
+    self.renewProxy()
+
+  def renewProxy(self):
+    with open(self.proxyPath, 'w') as fd:
+      fd.write(self.proxyData)
+    # Make sure the modification is seen even on file systems with a coarse time resolution
+    os.utime(self.proxyPath, (time.time(), time.time() + 1))
+
+  def close(self):
+    shutil.rmtree(self.path)
+
+
+def formerContext(casList, proxyPath):
+  """ The former SocketInfo.__generateContextWithProxy, with the CAs already loaded """
+  sslContext = GSI.SSL.Context(GSI.SSL.TLSv1_CLIENT_METHOD)
+  sslContext.set_cipher_list(DEFAULT_SSL_CIPHERS)
+  sslContext.set_options(GSI.SSL.OP_ALL)
+  sslContext.set_verify(GSI.SSL.VERIFY_PEER | GSI.SSL.VERIFY_FAIL_IF_NO_PEER_CERT, None, False)
+  caStore = GSI.crypto.X509Store()
+  for caCert in casList:
+    caStore.add_cert(caCert)
+  sslContext.set_cert_store(caStore)
+  sslContext.use_certificate_chain_file(proxyPath)
+  sslContext.use_privatekey_file(proxyPath)
+  return sslContext
+
+
+def timeCall(function, repetitions):
+  times = []
+  for _ in xrange(repetitions):
+    startTime = time.time()
+    function()
+    times.append(time.time() - startTime)
+  return min(times)
+
+
+def main(repetitions=20):
+  """ Create the contexts for several numbers of CAs and print the comparison """
+  gLogger.setLevel('ERROR')
+  print "%5s | %9s %9s %9s %9s %8s" % ('CAs', 'former', 'first', 'cached', 'renewed', 'gain')
+  for nbCAs in (10, 100, 500):
+    credentials = Credentials(nbCAs)
+    os.environ['X509_CERT_DIR'] = credentials.casPath
+    try:
+      SocketInfo.clearContextCache()
+      before = SocketInfo.getContextCacheStats()
+      infoDict = {'clientMode': True, 'proxyLocation': credentials.proxyPath, 'timeout': 600}
+      startTime = time.time()
+      SocketInfo(dict(infoDict))
+      firstTime = time.time() - startTime
+      casList = []
+      for fileName in os.listdir(credentials.casPath):
+        with open(os.path.join(credentials.casPath, fileName)) as fd:
+          casList.append(GSI.crypto.load_certificate(GSI.crypto.FILETYPE_PEM, fd.read()))
+      formerTime = timeCall(lambda: formerContext(casList, credentials.proxyPath), repetitions)
+      cachedTime = timeCall(lambda: SocketInfo(dict(infoDict)), repetitions)
+      credentials.renewProxy()
+      startTime = time.time()
+      SocketInfo(dict(infoDict))
+      renewedTime = time.time() - startTime
+      stats = SocketInfo.getContextCacheStats()
+      if (stats['Misses'] - before['Misses'], stats['Invalidated'] - before['Invalidated']) != (2, 1):
+        print "ERROR: unexpected cache statistics %s" % stats
+        return 1
+    finally:
+      credentials.close()
+    print "%5s | %7.2fms %7.2fms %7.3fms %7.2fms %7.1fx" % (nbCAs, formerTime * 1000, firstTime * 1000,
+                                                           cachedTime * 1000, renewedTime * 1000,
+                                                           formerTime / cachedTime)
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)
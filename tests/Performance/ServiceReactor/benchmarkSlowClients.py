@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+""" Benchmark of the calls to a service while slow clients are connected, against the former accept loop.
+
+    The former ServiceReactor queued each accepted connection to the thread pool of the service, where the
+    handshake and the reception of the proposal blocked a thread until the client sent them. The new one
+    does them in the ConnectionReactor event loop and only queues the connections whose proposal is there.
+    The service has 4 threads, nbSlowClients clients connect and send their proposal one byte every 0.1s,
+    meanwhile a client makes calls and measures their latency. The service uses dip, the slow clients
+    stand for the WAN clients taking time to handshake.
+
+    Usage::
+
+      python benchmarkSlowClients.py [nbSlowClients] [nbCalls]
+
+    It does not need any DIRAC installation, only the DIRAC python path.
+"""
+
+import sys
+import time
+import types
+import socket
+import threading
+
+from DIRAC import gLogger, S_OK
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+from DIRAC.Core.Utilities import DEncode
+from DIRAC.Core.DISET.RequestHandler import RequestHandler
+from DIRAC.Core.DISET.RPCClient import RPCClient
+from DIRAC.Core.DISET.private.Service import Service
+from DIRAC.Core.DISET.private.ConnectionReactor import ConnectionReactor
+from DIRAC.Core.DISET.private.Transports.PlainTransport import PlainTransport
+
+benchmarkCFG = """
+DIRAC
+{
+  Setup = Bench
+  Setups
+  {
+    Bench
+    {
+      Framework = Bench
+    }
+  }
+}
+Systems
+{
+  Framework
+  {
+    Bench
+    {
+      Services
+      {
+        Bench
+        {
+          MinThreads = 4
+          MaxThreads = 4
+        }
+      }
+    }
+  }
+}
+"""
+
+
+class BenchHandler(RequestHandler):
+
+  types_add = [int, int]
+
+  def export_add(self, first, second):
+    return S_OK(first + second)
+
+
+class BenchService(Service):
+  """ Service authorizing everybody """
+
+  def _authorizeProposal(self, actionTuple, trid, credDict):
+    return S_OK()
+
+
+def startService(useReactor):
+  """ Starts a service listening on a free port, with the former or the new accept loop """
+  module = types.ModuleType('BenchHandler')
+  module.__RCSID__ = '$Id$'
+  module.BenchHandler = BenchHandler
+  service = BenchService({'modName': 'Framework/Bench', 'loadName': 'Framework/Bench', 'standalone': True,
+                          'moduleObj': module, 'classObj': BenchHandler})
+  if not service.initialize()['OK']:
+    return None
+  listener = PlainTransport(('', 0), bServerMode=True)
+  listener.initAsServer()
+  if useReactor:
+    reactor = ConnectionReactor(lambda _name, transport, handshakeTime:
+                                service.handleConnection(transport, handshakeTime))
+    reactor.addListener('Framework/Bench', listener, 30)
+
+    def serve():
+      while True:
+        reactor.processEvents(1)
+  else:
+    def serve():
+      while True:
+        result = listener.acceptConnection()
+        if result['OK']:
+          service.handleConnection(result['Value'])
+  thread = threading.Thread(target=serve)
+  thread.setDaemon(True)
+  thread.start()
+  return listener.getSocket().getsockname()[1]
+
+
+def slowClient(port, stream):
+  oSocket = socket.create_connection(('localhost', port))
+  for char in stream:
+    oSocket.sendall(char)
+    time.sleep(0.1)
+  oSocket.close()
+
+
+def measure(useReactor, stream, nbSlowClients, nbCalls):
+  """ Latencies of the calls while the slow clients are connected """
+  port = startService(useReactor)
+  if not port:
+    return None
+  url = 'dip://localhost:%s/Framework/Bench' % port
+  for _ in xrange(nbSlowClients):
+    thread = threading.Thread(target=slowClient, args=(port, stream))
+    thread.setDaemon(True)
+    thread.start()
+  time.sleep(0.5)
+  latencies = []
+  for index in xrange(nbCalls):
+    startTime = time.time()
+    if RPCClient(url, timeout=120).add(index, 1).get('Value') != index + 1:
+      return None
+    latencies.append(time.time() - startTime)
+  return latencies
+
+
+def main(nbSlowClients=20, nbCalls=20):
+  """ Call the service with both accept loops and print the comparison """
+  gLogger.setLevel('FATAL')
+  gConfigurationData.localCFG.loadFromBuffer(benchmarkCFG)
+  gConfigurationData.sync()
+  data = DEncode.encode(S_OK((('Framework/Bench', 'Bench', 'vo'), ('RPC', 'add'), '')))
+  stream = '%s:%s' % (len(data), data)
+  print "%d slow clients sending their proposal in %.1fs, %d calls" % (nbSlowClients, 0.1 * len(stream), nbCalls)
+  print "%-8s | %9s %9s %9s" % ('loop', 'mean', 'median', 'max')
+  for name, useReactor in (('former', False), ('reactor', True)):
+    latencies = measure(useReactor, stream, nbSlowClients, nbCalls)
+    if not latencies:
+      print "ERROR: the calls with the %s loop failed" % name
+      return 1
+    latencies.sort()
+    print "%-8s | %7.3fs %7.3fs %7.3fs" % (name, sum(latencies) / len(latencies), latencies[len(latencies) // 2],
+                                          latencies[-1])
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(*[int(arg) for arg in sys.argv[1:3]])
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)
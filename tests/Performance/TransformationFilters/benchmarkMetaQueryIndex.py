@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+""" Benchmark of the MetaQueryIndex against the evaluation of each query with MetaQuery.applyQuery,
+    as TransformationDB._filterFileByMetadata did for each new file.
+
+    The queries mimic the input data queries of the transformations of a production system:
+    a few metadata with equality or 'in' conditions ( data type, configuration, processing pass ),
+    most of them with a run range, some excluding runs. The scenarios are:
+      * fewTransformations: 100 active input data queries
+      * production: 2000 queries
+      * largeProduction: 10000 queries
+
+    Usage::
+
+      python benchmarkMetaQueryIndex.py [nbRepetitions]
+
+    It does not need any DIRAC installation nor configuration, only the DIRAC python path.
+"""
+
+import sys
+import time
+import random
+import timeit
+
+from DIRAC.DataManagementSystem.Client.MetaQuery import MetaQuery
+from DIRAC.DataManagementSystem.Client.MetaQueryIndex import MetaQueryIndex
+
+TYPE_DICT = {'DataType': 'VARCHAR(128)', 'Configuration': 'VARCHAR(128)', 'ProcessingPass': 'VARCHAR(128)',
+             'RunNumber': 'INT', 'EventType': 'INT', 'Energy': 'FLOAT'}
+DATA_TYPES = ['RAW', 'DST', 'MDST', 'SIM', 'HIST']
+NB_CONFIGURATIONS = 50
+NB_PASSES = 20
+EVENT_TYPES = range(90000000, 90000050)
+MAX_RUN = 200000
+
+
+def transformationQuery(rand):
+  """ Input data query of a transformation """
+  query = {'DataType': rand.choice(DATA_TYPES),
+           'Configuration': 'Config%d' % rand.randrange(NB_CONFIGURATIONS)}
+  if rand.random() < 0.7:
+    query['ProcessingPass'] = 'Pass%d' % rand.randrange(NB_PASSES)
+  if rand.random() < 0.5:
+    query['EventType'] = rand.sample(EVENT_TYPES, rand.randint(1, 5))
+  if rand.random() < 0.8:
+    firstRun = rand.randrange(MAX_RUN)
+    query['RunNumber'] = {'>=': firstRun, '<': firstRun + rand.randrange(1, 20000)}
+    if rand.random() < 0.2:
+      query['RunNumber']['nin'] = [firstRun + rand.randrange(100) for _ in xrange(5)]
+  if rand.random() < 0.05:
+    query['Energy'] = 'Any'
+  return query
+
+
+def fileMetadata(rand):
+  """ Metadata of a new file, directory metadata included """
+  return {'DataType': rand.choice(DATA_TYPES),
+          'Configuration': 'Config%d' % rand.randrange(NB_CONFIGURATIONS),
+          'ProcessingPass': 'Pass%d' % rand.randrange(NB_PASSES),
+          'EventType': rand.choice(EVENT_TYPES),
+          'RunNumber': rand.randrange(MAX_RUN),
+          'Energy': rand.choice([3500., 6500.])}
+
+
+def loopMatch(queries, metadata):
+  """ Matching as done before, one MetaQuery per query """
+  transIDs = []
+  for transID, query in queries:
+    result = MetaQuery(query, TYPE_DICT).applyQuery(metadata)
+    if not result['OK']:
+      return result
+    if result['Value']:
+      transIDs.append(transID)
+  return transIDs
+
+
+def indexMatch(index, metadata):
+  """ Matching with the compiled queries """
+  return sorted(index.match(metadata)['Value'])
+
+
+SCENARIOS = (('fewTransformations', 100, 2000),
+             ('production', 2000, 500),
+             ('largeProduction', 10000, 100))
+
+
+def main(repetitions=5):
+  """ Run all the scenarios through both implementations and print the comparison """
+  print "%-20s %8s %6s | %10s %10s %10s %8s" % ('scenario', 'queries', 'files', 'loop', 'compile', 'index', 'gain')
+  for name, nbQueries, nbFiles in SCENARIOS:
+    rand = random.Random(nbQueries)
+    queries = [(transID, transformationQuery(rand)) for transID in xrange(nbQueries)]
+    files = [fileMetadata(rand) for _ in xrange(nbFiles)]
+    index = MetaQueryIndex(queries, TYPE_DICT)
+    for metadata in files:
+      if loopMatch(queries, metadata) != indexMatch(index, metadata):
+        print "ERROR: %s: matched transformations differ for %s" % (name, metadata)
+        return 1
+    loopTime = min(timeit.repeat(lambda: [loopMatch(queries, metadata) for metadata in files],
+                                 number=1, repeat=repetitions))
+    compileTime = min(timeit.repeat(lambda: MetaQueryIndex(queries, TYPE_DICT), number=1, repeat=repetitions))
+    indexTime = min(timeit.repeat(lambda: [indexMatch(index, metadata) for metadata in files],
+                                  number=1, repeat=repetitions))
+    print "%-20s %8s %6s | %9.1fms %9.1fms %9.1fms %7.1fx" % (name, nbQueries, nbFiles, loopTime * 1000,
+                                                              compileTime * 1000, indexTime * 1000,
+                                                              loopTime / indexTime)
+  return 0
+
+
+if __name__ == '__main__':
+  startTime = time.time()
+  retCode = main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
+  print "Total time %.1fs" % (time.time() - startTime)
+  sys.exit(retCode)